@@ -0,0 +1,315 @@
+"""
+Content-Addressed Artifact Store
+Generated images are stored once per SHA-256 digest in sharded directories
+(objects/ab/cd/<digest>.png), written atomically, and found through a small
+SQLite index that maps logical artifact names to digests
+"""
+
+import os
+import time
+import shutil
+import hashlib
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".webp", ".gif", ".avif"}
+
+
+def object_path(objects_dir: Union[str, Path], digest: str, extension: str) -> Path:
+    """Sharded location of an object: two levels of 256 directories each"""
+    return Path(objects_dir) / digest[:2] / digest[2:4] / f"{digest}{extension}"
+
+
+def write_object(objects_dir: Union[str, Path], data: bytes, extension: str, digest: Optional[str] = None) -> Tuple[str, Path, bool]:
+    """
+    Write bytes into the object directory unless they are already there.
+    Safe to call from worker processes.
+
+    Returns:
+        tuple: (digest, object path, created) - created is False for a duplicate
+    """
+    digest = digest or hashlib.sha256(data).hexdigest()
+    path = object_path(objects_dir, digest, extension)
+    if path.exists():
+        return digest, path, False
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    return digest, path, True
+
+
+def file_digest(path: Union[str, Path]) -> str:
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            sha256.update(block)
+    return sha256.hexdigest()
+
+
+class ArtifactStore:
+    """
+    Content-addressed image store with a name index.
+
+    Identical images are stored once however many names point at them.
+    Names are reserved atomically, so concurrent requests for the same
+    name get distinct artifacts instead of overwriting each other.
+    """
+
+    def __init__(self, root: str = "generated_nfts"):
+        """
+        Args:
+            root: Output root; objects go to <root>/objects, the index to <root>/artifacts.db
+        """
+        self.root = Path(root)
+        self.objects_dir = self.root / "objects"
+        self.objects_dir.mkdir(parents=True, exist_ok=True)
+
+        self._conn = sqlite3.connect(str(self.root / "artifacts.db"), check_same_thread=False)
+        self._lock = threading.Lock()
+        self.deduplicated = 0
+        # Last-served times, buffered in memory and written by flush_access()
+        self._accessed: Dict[str, float] = {}
+
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS names (
+                    name TEXT PRIMARY KEY,
+                    digest TEXT,
+                    extension TEXT,
+                    size INTEGER,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    last_access REAL
+                )
+                """
+            )
+            if "last_access" not in [row[1] for row in self._conn.execute("PRAGMA table_info(names)")]:
+                self._conn.execute("ALTER TABLE names ADD COLUMN last_access REAL")
+            self._conn.execute("UPDATE names SET last_access = updated_at WHERE last_access IS NULL")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_names_digest ON names (digest)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_names_access ON names (last_access, name)")
+
+    # Objects
+
+    def path_for(self, digest: str, extension: str) -> Path:
+        return object_path(self.objects_dir, digest, extension)
+
+    def put(self, data: bytes, extension: str, digest: Optional[str] = None) -> Tuple[str, Path]:
+        """
+        Store bytes (atomic write-then-rename); a no-op if the content is already stored.
+
+        Returns:
+            tuple: (digest, object path)
+        """
+        digest, path, created = write_object(self.objects_dir, data, extension, digest)
+        if not created:
+            self.deduplicated += 1
+        return digest, path
+
+    def put_file(self, source: Union[str, Path], extension: Optional[str] = None) -> Tuple[str, Path]:
+        """
+        Store an existing file, hardlinking it into the store instead of copying
+        where the filesystem allows it.
+
+        Returns:
+            tuple: (digest, object path)
+        """
+        source = Path(source)
+        extension = extension or source.suffix.lower()
+        digest = file_digest(source)
+        path = self.path_for(digest, extension)
+        if path.exists():
+            self.deduplicated += 1
+            return digest, path
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            os.link(source, tmp_path)
+        except OSError:
+            # Different filesystem (or no hardlink support): copy instead
+            shutil.copyfile(source, tmp_path)
+        os.replace(tmp_path, path)
+        return digest, path
+
+    # Names
+
+    def reserve_name(self, base: str) -> str:
+        """
+        Claim an unused artifact name: base itself, else base_2, base_3, ...
+
+        Returns:
+            str: The reserved name
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            for n in range(1, 10000):
+                name = base if n == 1 else f"{base}_{n}"
+                cursor = self._conn.execute(
+                    "INSERT OR IGNORE INTO names (name, created_at, updated_at, last_access) VALUES (?, ?, ?, ?)",
+                    (name, now, now, now)
+                )
+                if cursor.rowcount:
+                    return name
+        raise ValueError(f"No free artifact name for '{base}'")
+
+    def link(self, name: str, digest: str, extension: str, size: Optional[int] = None):
+        """Point a name at stored content (replaces any previous content for the name)"""
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                """
+                INSERT INTO names (name, digest, extension, size, created_at, updated_at, last_access)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(name) DO UPDATE SET
+                    digest = excluded.digest, extension = excluded.extension,
+                    size = excluded.size, updated_at = excluded.updated_at,
+                    last_access = excluded.last_access
+                """,
+                (name, digest, extension, size, now, now, now)
+            )
+
+    def unlink(self, name: str, keep_name: bool = False) -> Optional[str]:
+        """
+        Remove a name. The object is deleted once no other name points at it.
+
+        Args:
+            name: Artifact name
+            keep_name: Only drop the content and keep the name reserved, so
+                       reserve_name() never hands it to a new artifact
+
+        Returns:
+            str: The digest the name pointed at, or None if unknown
+        """
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT digest, extension FROM names WHERE name = ?", (name,)).fetchone()
+            if row is None:
+                return None
+            if keep_name:
+                self._conn.execute(
+                    "UPDATE names SET digest = NULL, extension = NULL, size = NULL, updated_at = ? WHERE name = ?",
+                    (time.time(), name)
+                )
+            else:
+                self._conn.execute("DELETE FROM names WHERE name = ?", (name,))
+            digest, extension = row
+            if digest is None:
+                return None
+            shared = self._conn.execute("SELECT 1 FROM names WHERE digest = ? LIMIT 1", (digest,)).fetchone()
+        if not shared:
+            try:
+                self.path_for(digest, extension).unlink()
+            except FileNotFoundError:
+                pass
+        return digest
+
+    def resolve(self, name: str) -> Optional[Path]:
+        """Object path for an artifact name (with or without its file extension)"""
+        candidates = [name]
+        stem, suffix = os.path.splitext(name)
+        if suffix.lower() in IMAGE_EXTENSIONS:
+            candidates.append(stem)
+        with self._lock:
+            for candidate in candidates:
+                row = self._conn.execute(
+                    "SELECT digest, extension FROM names WHERE name = ? AND digest IS NOT NULL", (candidate,)
+                ).fetchone()
+                if row:
+                    self._accessed[candidate] = time.time()
+                    return self.path_for(*row)
+        return None
+
+    def images(self) -> Iterator[Tuple[str, Path]]:
+        """(name, object path) for every stored artifact"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT name, digest, extension FROM names WHERE digest IS NOT NULL"
+            ).fetchall()
+        for name, digest, extension in rows:
+            yield name, self.path_for(digest, extension)
+
+    def flush_access(self) -> int:
+        """
+        Write buffered last-served times to the index.
+
+        Returns:
+            int: Number of names updated
+        """
+        with self._lock, self._conn:
+            accessed, self._accessed = self._accessed, {}
+            self._conn.executemany(
+                "UPDATE names SET last_access = MAX(last_access, ?) WHERE name = ?",
+                [(at, name) for name, at in accessed.items()]
+            )
+        return len(accessed)
+
+    def least_recent(self, limit: int, after: Optional[Tuple[float, str]] = None) -> List[dict]:
+        """
+        Stored artifacts, least recently served (or written) first.
+
+        Args:
+            limit: Page size
+            after: (last_access, name) of the previous page's last entry
+
+        Returns:
+            list: [{"name", "digest", "extension", "size", "last_access"}]
+        """
+        where, params = "digest IS NOT NULL", []
+        if after is not None:
+            where += " AND (last_access > ? OR (last_access = ? AND name > ?))"
+            params = [after[0], after[0], after[1]]
+        with self._lock:
+            rows = self._conn.execute(
+                f"""
+                SELECT name, digest, extension, size, last_access FROM names
+                WHERE {where} ORDER BY last_access, name LIMIT ?
+                """,
+                (*params, limit)
+            ).fetchall()
+        keys = ("name", "digest", "extension", "size", "last_access")
+        return [dict(zip(keys, row)) for row in rows]
+
+    def migrate(self, images_dir: Union[str, Path]) -> int:
+        """
+        Index images from the old flat images directory. Files are hardlinked
+        into the store, so migrating takes no extra space; the originals stay.
+
+        Returns:
+            int: Number of images migrated
+        """
+        images_dir = Path(images_dir)
+        if not images_dir.exists():
+            return 0
+        with self._lock:
+            known = {row[0] for row in self._conn.execute("SELECT name FROM names WHERE digest IS NOT NULL")}
+
+        migrated = 0
+        for path in images_dir.iterdir():
+            if path.suffix.lower() not in IMAGE_EXTENSIONS or path.name.startswith(".") or path.stem in known:
+                continue
+            try:
+                digest, _ = self.put_file(path)
+                self.link(path.stem, digest, path.suffix.lower(), path.stat().st_size)
+                migrated += 1
+            except OSError as e:
+                print(f"⚠️  Could not migrate {path}: {e}")
+        if migrated:
+            print(f"🗃️  Migrated {migrated} images into the artifact store")
+        return migrated
+
+    def stats(self) -> dict:
+        with self._lock:
+            names, objects = self._conn.execute(
+                "SELECT COUNT(*), COUNT(DISTINCT digest) FROM names WHERE digest IS NOT NULL"
+            ).fetchone()
+            # Shared objects count once
+            stored_bytes = self._conn.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM (SELECT MAX(size) AS size FROM names WHERE digest IS NOT NULL GROUP BY digest)"
+            ).fetchone()[0]
+        return {"names": names, "objects": objects, "bytes": stored_bytes, "deduplicated": self.deduplicated}
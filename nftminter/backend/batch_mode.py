@@ -0,0 +1,228 @@
+"""
+Gemini Batch Mode
+Offline batch jobs for bulk collection generation: many prompts are submitted
+as one asynchronous job, polled, and their images ingested when it finishes.
+Transports are pluggable so a local stub server can stand in for Gemini.
+"""
+
+import os
+import base64
+from typing import List, Optional
+
+import requests
+
+# Normalized batch job states
+BATCH_PENDING = "pending"
+BATCH_RUNNING = "running"
+BATCH_SUCCEEDED = "succeeded"
+BATCH_FAILED = "failed"
+BATCH_CANCELLED = "cancelled"
+BATCH_EXPIRED = "expired"
+
+TERMINAL_STATES = {BATCH_SUCCEEDED, BATCH_FAILED, BATCH_CANCELLED, BATCH_EXPIRED}
+
+
+class BatchTransportError(Exception):
+    """Raised when a batch job cannot be submitted or read"""
+
+
+def normalize_state(state: Optional[str]) -> str:
+    """Map JOB_STATE_* / BATCH_STATE_* names onto the normalized states"""
+    name = (state or "").upper()
+    for suffix, normalized in (
+        ("SUCCEEDED", BATCH_SUCCEEDED),
+        ("FAILED", BATCH_FAILED),
+        ("CANCELLED", BATCH_CANCELLED),
+        ("EXPIRED", BATCH_EXPIRED),
+        ("RUNNING", BATCH_RUNNING),
+    ):
+        if name.endswith(suffix):
+            return normalized
+    return BATCH_PENDING
+
+
+class BatchTransport:
+    """
+    Base class for batch job transports.
+
+    Requests are plain prompts (already wrapped in the prompt template); results
+    come back in request order as {"images": [(bytes, mime type)], "error": str or None},
+    with None for a request missing from the output.
+    """
+
+    name = "base"
+
+    def submit(self, model: str, prompts: List[str], display_name: str) -> str:
+        """Submit a batch job. Returns the job name used for polling."""
+        raise NotImplementedError
+
+    def get(self, job_name: str) -> dict:
+        """
+        Read a batch job.
+
+        Returns:
+            dict: {"state": normalized state, "results": list or None (until succeeded),
+                   "error": str or None}
+        """
+        raise NotImplementedError
+
+
+class GenaiBatchTransport(BatchTransport):
+    """Gemini Batch API through the google-genai client (client.batches)"""
+
+    name = "genai"
+
+    def __init__(self, client):
+        self.client = client
+
+    def submit(self, model: str, prompts: List[str], display_name: str) -> str:
+        src = [
+            {
+                "contents": [{"role": "user", "parts": [{"text": prompt}]}],
+                "config": {"response_modalities": ["IMAGE"], "temperature": 1.0},
+            }
+            for prompt in prompts
+        ]
+        try:
+            job = self.client.batches.create(model=model, src=src, config={"display_name": display_name})
+        except Exception as e:
+            raise BatchTransportError(f"Batch submit failed: {e}")
+        return job.name
+
+    def get(self, job_name: str) -> dict:
+        try:
+            job = self.client.batches.get(name=job_name)
+        except Exception as e:
+            raise BatchTransportError(f"Batch poll failed: {e}")
+
+        state = normalize_state(getattr(job.state, "name", None) or str(job.state))
+        status = {"state": state, "results": None, "error": str(job.error) if getattr(job, "error", None) else None}
+        if state == BATCH_SUCCEEDED:
+            responses = (job.dest.inlined_responses if job.dest else None) or []
+            status["results"] = [self._result(r) for r in responses]
+        return status
+
+    def _result(self, inlined) -> dict:
+        if getattr(inlined, "error", None):
+            return {"images": [], "error": str(inlined.error)}
+        images = []
+        response = inlined.response
+        for candidate in (response.candidates if response else None) or []:
+            if candidate.content is None or candidate.content.parts is None:
+                continue
+            for part in candidate.content.parts:
+                if part.inline_data and part.inline_data.data:
+                    images.append((part.inline_data.data, part.inline_data.mime_type))
+        return {"images": images, "error": None}
+
+
+class HTTPBatchTransport(BatchTransport):
+    """
+    Gemini Batch API over REST (batchGenerateContent).
+
+    Point base_url at a local stub server implementing the same two endpoints
+    to run batch mode without Gemini.
+    """
+
+    name = "http"
+
+    def __init__(self, api_key: Optional[str], base_url: str = "https://generativelanguage.googleapis.com/v1beta", timeout: float = 60.0):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+
+    def _headers(self) -> dict:
+        headers = {"Content-Type": "application/json"}
+        if self.api_key:
+            headers["x-goog-api-key"] = self.api_key
+        return headers
+
+    def submit(self, model: str, prompts: List[str], display_name: str) -> str:
+        body = {
+            "batch": {
+                "display_name": display_name,
+                "input_config": {
+                    "requests": {
+                        "requests": [
+                            {
+                                "request": {
+                                    "contents": [{"role": "user", "parts": [{"text": prompt}]}],
+                                    "generationConfig": {"responseModalities": ["IMAGE"], "temperature": 1.0},
+                                },
+                                "metadata": {"key": str(i)},
+                            }
+                            for i, prompt in enumerate(prompts)
+                        ]
+                    }
+                },
+            }
+        }
+        try:
+            response = requests.post(
+                f"{self.base_url}/models/{model}:batchGenerateContent",
+                json=body,
+                headers=self._headers(),
+                timeout=self.timeout
+            )
+            response.raise_for_status()
+            return response.json()["name"]
+        except (requests.exceptions.RequestException, KeyError, ValueError) as e:
+            raise BatchTransportError(f"Batch submit failed: {e}")
+
+    def get(self, job_name: str) -> dict:
+        try:
+            response = requests.get(f"{self.base_url}/{job_name}", headers=self._headers(), timeout=self.timeout)
+            response.raise_for_status()
+            job = response.json()
+        except (requests.exceptions.RequestException, ValueError) as e:
+            raise BatchTransportError(f"Batch poll failed: {e}")
+
+        metadata = job.get("metadata") or {}
+        state = normalize_state(metadata.get("state") or job.get("state"))
+        error = job.get("error")
+        status = {"state": state, "results": None, "error": error.get("message") if isinstance(error, dict) else error}
+        if state == BATCH_SUCCEEDED:
+            output = (job.get("response") or metadata.get("output") or {})
+            inlined = (output.get("inlinedResponses") or {}).get("inlinedResponses") or []
+            # Results may arrive out of order or not at all; the request key places each one
+            if all((r.get("metadata") or {}).get("key", "").isdigit() for r in inlined):
+                by_key = {int(r["metadata"]["key"]): r for r in inlined}
+                status["results"] = [
+                    self._result(by_key[i]) if i in by_key else None
+                    for i in range(max(by_key) + 1 if by_key else 0)
+                ]
+            else:
+                status["results"] = [self._result(r) for r in inlined]
+        return status
+
+    def _result(self, inlined: dict) -> dict:
+        if inlined.get("error"):
+            error = inlined["error"]
+            return {"images": [], "error": error.get("message") if isinstance(error, dict) else str(error)}
+        images = []
+        for candidate in (inlined.get("response") or {}).get("candidates") or []:
+            for part in (candidate.get("content") or {}).get("parts") or []:
+                data = part.get("inlineData") or part.get("inline_data")
+                if data and data.get("data"):
+                    images.append((base64.b64decode(data["data"]), data.get("mimeType") or data.get("mime_type") or "image/png"))
+        return {"images": images, "error": None}
+
+
+def create_batch_transport(client=None, api_key: Optional[str] = None) -> BatchTransport:
+    """
+    Build the batch transport selected by GEMINI_BATCH_TRANSPORT ("genai" or "http").
+
+    GEMINI_BATCH_URL overrides the REST base URL for the http transport
+    (e.g. a local stub server).
+    """
+    name = os.getenv("GEMINI_BATCH_TRANSPORT", "http" if os.getenv("GEMINI_BATCH_URL") else "genai").lower()
+    if name == "genai":
+        if client is None:
+            raise ValueError("The genai batch transport needs a google-genai client")
+        return GenaiBatchTransport(client)
+    if name == "http":
+        return HTTPBatchTransport(
+            api_key=api_key,
+            base_url=os.getenv("GEMINI_BATCH_URL", "https://generativelanguage.googleapis.com/v1beta")
+        )
+    raise ValueError(f"Unknown GEMINI_BATCH_TRANSPORT: {name}")
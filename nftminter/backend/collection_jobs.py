@@ -0,0 +1,615 @@
+"""
+Collection Jobs
+Persistent, resumable generation jobs for large NFT collections (1k-10k pieces).
+Progress is checkpointed per item in SQLite, so a crash or redeploy resumes
+without regenerating finished items. Collections run interactively (one Gemini
+call per item), as offline Gemini batch jobs, or composed locally from trait layers.
+"""
+
+import json
+import time
+import uuid
+import random
+import sqlite3
+import string
+import itertools
+import threading
+from pathlib import Path
+from typing import Optional, List, Dict, Iterable
+
+from batch_mode import TERMINAL_STATES, BATCH_SUCCEEDED
+from upload_outbox import HOOK_RECORD_CIDS
+
+
+# Collection states
+PENDING = "pending"
+RUNNING = "running"
+PAUSED = "paused"
+COMPLETED = "completed"
+CANCELLED = "cancelled"
+
+# Item states
+ITEM_PENDING = "pending"
+ITEM_RUNNING = "running"
+ITEM_DONE = "done"
+ITEM_FAILED = "failed"
+
+# Generation modes
+MODE_INTERACTIVE = "interactive"
+MODE_BATCH = "batch"
+MODE_LAYERED = "layered"
+
+# Item columns joined with their collection for the runner
+ITEM_SELECT = """
+    SELECT items.*, collections.name AS collection_name, collections.description AS collection_description,
+           collections.upload AS collection_upload
+    FROM items JOIN collections ON collections.id = items.collection_id
+"""
+
+
+def sample_traits(traits: Dict[str, object], count: int, seed: Optional[int] = None) -> List[Dict[str, str]]:
+    """
+    Sample unique trait combinations.
+
+    Each trait maps to either a list of values (equally likely) or a dict of
+    value -> weight. If the full combination space fits in `count`, every
+    combination is used once; otherwise unique combinations are sampled by weight.
+
+    Args:
+        traits: Trait values per trait name, in order
+        count: Number of combinations to produce
+        seed: Optional seed for reproducible sampling
+
+    Returns:
+        list: One {trait name: value} dict per combination
+    """
+    names = list(traits)
+    values, weights = [], []
+    for name in names:
+        options = traits[name]
+        if isinstance(options, dict):
+            values.append([str(v) for v in options])
+            weights.append([float(w) for w in options.values()])
+        else:
+            values.append([str(v) for v in options])
+            weights.append([1.0] * len(options))
+        if not values[-1]:
+            raise ValueError(f"Trait '{name}' has no values")
+
+    space = 1
+    for options in values:
+        space *= len(options)
+
+    rng = random.Random(seed)
+    if space <= count:
+        combos = list(itertools.product(*values))
+        rng.shuffle(combos)
+    else:
+        # Reject duplicates; give up on uniqueness only if sampling stalls
+        combos, seen = [], set()
+        attempts = 0
+        while len(combos) < count:
+            combo = tuple(rng.choices(options, weights=w)[0] for options, w in zip(values, weights))
+            attempts += 1
+            if combo in seen and attempts < count * 50:
+                continue
+            seen.add(combo)
+            combos.append(combo)
+
+    return [dict(zip(names, combo)) for combo in combos[:count]]
+
+
+def expand_template(template: str, traits: Dict[str, object], count: int, seed: Optional[int] = None) -> List[dict]:
+    """
+    Expand a prompt template with trait substitutions into collection items.
+
+    Trait combinations are sampled with sample_traits().
+
+    Args:
+        template: Prompt with {trait} placeholders, e.g. "A {animal} wearing a {hat}"
+        traits: Trait values (list) or value -> weight (dict) per placeholder
+        count: Number of items to produce
+        seed: Optional seed for reproducible sampling
+
+    Returns:
+        list: Items with prompt and attributes
+
+    Raises:
+        ValueError: A placeholder is not a plain trait name (e.g. "{0}" or "{x.y}"),
+                    has no trait values, or the template is malformed
+    """
+    for _, field, _, _ in string.Formatter().parse(template):
+        if field is None:
+            continue
+        if not field.isidentifier():
+            raise ValueError(f"Template placeholders must be trait names, got '{{{field}}}'")
+        if field not in traits:
+            raise ValueError(f"Template placeholder '{{{field}}}' has no trait values")
+
+    items = []
+    for substitutions in sample_traits(traits, count, seed):
+        items.append({
+            "prompt": template.format(**substitutions),
+            "attributes": [{"trait_type": name, "value": value} for name, value in substitutions.items()]
+        })
+    return items
+
+
+def parse_jsonl(lines: Iterable[str]) -> List[dict]:
+    """
+    Parse JSONL collection input. Each line is either a JSON string (the prompt)
+    or an object with "prompt" and optional "name" and "attributes".
+    """
+    items = []
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            entry = json.loads(line)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Line {number}: invalid JSON ({e})")
+        if isinstance(entry, str):
+            entry = {"prompt": entry}
+        if not isinstance(entry, dict) or not isinstance(entry.get("prompt"), str) or len(entry["prompt"]) < 3:
+            raise ValueError(f"Line {number}: expected a prompt string or an object with a 'prompt' field")
+        items.append({
+            "prompt": entry["prompt"],
+            "name": entry.get("name"),
+            "attributes": entry.get("attributes") or []
+        })
+    return items
+
+
+class CollectionJobStore:
+    """SQLite persistence for collection jobs and their per-item progress"""
+
+    def __init__(self, db_path: str = "generated_nfts/collections.db"):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS collections (
+                    id TEXT PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    description TEXT,
+                    status TEXT NOT NULL,
+                    total INTEGER NOT NULL,
+                    upload INTEGER NOT NULL DEFAULT 1,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS items (
+                    collection_id TEXT NOT NULL,
+                    idx INTEGER NOT NULL,
+                    prompt TEXT NOT NULL,
+                    name TEXT,
+                    attributes TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    result TEXT,
+                    error TEXT,
+                    updated_at REAL NOT NULL,
+                    PRIMARY KEY (collection_id, idx)
+                );
+                CREATE INDEX IF NOT EXISTS idx_items_status ON items (collection_id, status, idx);
+                """
+            )
+            if "mode" not in [row[1] for row in self._conn.execute("PRAGMA table_info(collections)")]:
+                self._conn.execute(f"ALTER TABLE collections ADD COLUMN mode TEXT NOT NULL DEFAULT '{MODE_INTERACTIVE}'")
+            item_columns = [row[1] for row in self._conn.execute("PRAGMA table_info(items)")]
+            if "batch_job" not in item_columns:
+                # Set while an item is part of a submitted batch job, with its position in the job
+                self._conn.execute("ALTER TABLE items ADD COLUMN batch_job TEXT")
+                self._conn.execute("ALTER TABLE items ADD COLUMN batch_pos INTEGER")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_items_batch ON items (batch_job)")
+
+    def create(self, name: str, items: List[dict], description: Optional[str] = None, upload: bool = True, mode: str = MODE_INTERACTIVE) -> str:
+        """Persist a new collection with all of its items. Returns the collection ID."""
+        collection_id = uuid.uuid4().hex[:12]
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO collections (id, name, description, status, total, upload, mode, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (collection_id, name, description, RUNNING, len(items), int(upload), mode, now, now)
+            )
+            self._conn.executemany(
+                "INSERT INTO items (collection_id, idx, prompt, name, attributes, status, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    (collection_id, i, item["prompt"], item.get("name"), json.dumps(item.get("attributes") or []), ITEM_PENDING, now)
+                    for i, item in enumerate(items)
+                )
+            )
+        return collection_id
+
+    def get(self, collection_id: str) -> Optional[dict]:
+        """Collection details with per-status progress counters"""
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM collections WHERE id = ?", (collection_id,)).fetchone()
+            if row is None:
+                return None
+            counts = dict(self._conn.execute(
+                "SELECT status, COUNT(*) FROM items WHERE collection_id = ? GROUP BY status", (collection_id,)
+            ).fetchall())
+
+        collection = dict(row)
+        collection["upload"] = bool(collection["upload"])
+        collection["progress"] = {
+            "pending": counts.get(ITEM_PENDING, 0),
+            "running": counts.get(ITEM_RUNNING, 0),
+            "done": counts.get(ITEM_DONE, 0),
+            "failed": counts.get(ITEM_FAILED, 0),
+        }
+        finished = collection["progress"]["done"] + collection["progress"]["failed"]
+        collection["progress"]["percent"] = round(100.0 * finished / collection["total"], 1) if collection["total"] else 100.0
+        return collection
+
+    def items(self, collection_id: str, status: Optional[str] = None, offset: int = 0, limit: int = 100) -> List[dict]:
+        """Page through a collection's items"""
+        query = "SELECT * FROM items WHERE collection_id = ?"
+        params: list = [collection_id]
+        if status:
+            query += " AND status = ?"
+            params.append(status)
+        query += " ORDER BY idx LIMIT ? OFFSET ?"
+        params += [limit, offset]
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        return [self._item_to_dict(row) for row in rows]
+
+    def set_status(self, collection_id: str, status: str) -> bool:
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "UPDATE collections SET status = ?, updated_at = ? WHERE id = ?", (status, time.time(), collection_id)
+            )
+        return cursor.rowcount > 0
+
+    def recover(self) -> int:
+        """
+        Return items interrupted by a crash to pending. Returns the number recovered.
+
+        Items inside a submitted batch job stay running; the job is polled again.
+        """
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "UPDATE items SET status = ? WHERE status = ? AND batch_job IS NULL", (ITEM_PENDING, ITEM_RUNNING)
+            )
+        return cursor.rowcount
+
+    def claim(self, limit: int, mode: str = MODE_INTERACTIVE) -> List[dict]:
+        """Claim up to `limit` pending items from running collections in a mode, oldest collection first"""
+        with self._lock, self._conn:
+            rows = self._conn.execute(
+                ITEM_SELECT + """
+                WHERE collections.status = ? AND collections.mode = ? AND items.status = ?
+                ORDER BY collections.created_at, items.idx
+                LIMIT ?
+                """,
+                (RUNNING, mode, ITEM_PENDING, limit)
+            ).fetchall()
+            self._conn.executemany(
+                "UPDATE items SET status = ?, attempts = attempts + 1, updated_at = ? WHERE collection_id = ? AND idx = ?",
+                ((ITEM_RUNNING, time.time(), row["collection_id"], row["idx"]) for row in rows)
+            )
+        claimed = []
+        for row in rows:
+            item = self._claimed_item(row)
+            item["attempts"] += 1
+            claimed.append(item)
+        return claimed
+
+    def assign_batch(self, items: List[dict], job_name: str):
+        """Record that claimed items were submitted, in order, as one batch job"""
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "UPDATE items SET batch_job = ?, batch_pos = ?, updated_at = ? WHERE collection_id = ? AND idx = ?",
+                ((job_name, pos, time.time(), item["collection_id"], item["index"]) for pos, item in enumerate(items))
+            )
+
+    def batch_jobs(self) -> List[str]:
+        """Names of submitted batch jobs that still have running items"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT DISTINCT batch_job FROM items WHERE status = ? AND batch_job IS NOT NULL", (ITEM_RUNNING,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def batch_items(self, job_name: str) -> List[dict]:
+        """Running items of a batch job, in submission order"""
+        with self._lock:
+            rows = self._conn.execute(
+                ITEM_SELECT + " WHERE items.batch_job = ? AND items.status = ? ORDER BY items.batch_pos",
+                (job_name, ITEM_RUNNING)
+            ).fetchall()
+        return [self._claimed_item(row) for row in rows]
+
+    def finish_item(self, collection_id: str, idx: int, status: str, result: Optional[dict] = None, error: Optional[str] = None):
+        """Checkpoint an item and complete the collection once nothing is left"""
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE items SET status = ?, result = ?, error = ?, batch_job = NULL, updated_at = ? WHERE collection_id = ? AND idx = ?",
+                (status, json.dumps(result) if result else None, error, now, collection_id, idx)
+            )
+            remaining = self._conn.execute(
+                "SELECT COUNT(*) FROM items WHERE collection_id = ? AND status IN (?, ?)",
+                (collection_id, ITEM_PENDING, ITEM_RUNNING)
+            ).fetchone()[0]
+            if remaining == 0:
+                self._conn.execute(
+                    "UPDATE collections SET status = ?, updated_at = ? WHERE id = ? AND status = ?",
+                    (COMPLETED, now, collection_id, RUNNING)
+                )
+
+    def _claimed_item(self, row: sqlite3.Row) -> dict:
+        item = self._item_to_dict(row)
+        item["collection_name"] = row["collection_name"]
+        item["collection_description"] = row["collection_description"]
+        item["collection_upload"] = bool(row["collection_upload"])
+        return item
+
+    def _item_to_dict(self, row: sqlite3.Row) -> dict:
+        return {
+            "collection_id": row["collection_id"],
+            "index": row["idx"],
+            "prompt": row["prompt"],
+            "name": row["name"],
+            "attributes": json.loads(row["attributes"]),
+            "status": row["status"],
+            "attempts": row["attempts"],
+            "result": json.loads(row["result"]) if row["result"] else None,
+            "error": row["error"],
+            "batch_job": row["batch_job"],
+            "batch_pos": row["batch_pos"],
+        }
+
+
+class CollectionRunner:
+    """
+    Background worker that drives collection jobs through the NFT generator.
+
+    Keeps at most `max_in_flight` items on the generator's shared pool, so
+    collection work shares the Gemini rate limit with interactive requests.
+    Batch-mode collections are submitted as offline batch jobs of up to
+    `batch_size` items and polled every `batch_poll_interval` seconds.
+    """
+
+    def __init__(
+        self,
+        store: CollectionJobStore,
+        generator,
+        upload_outbox=None,
+        max_in_flight: Optional[int] = None,
+        max_attempts: int = 3,
+        batch_size: int = 32,
+        batch_poll_interval: float = 30.0,
+        compositor=None
+    ):
+        """
+        Args:
+            store: Collection job store
+            generator: NFTGenerator used for each item
+            upload_outbox: Optional UploadOutbox; finished items are queued for IPFS upload
+            max_in_flight: Items submitted at once (defaults to the generator's concurrency)
+            max_attempts: Generation attempts per item before it is marked failed
+            batch_size: Maximum items per offline batch job. Results come back inline
+                        (base64 images in one response), so this bounds the memory
+                        a finished job takes to ingest.
+            batch_poll_interval: Seconds between polls of submitted batch jobs
+            compositor: Optional TraitCompositor for layered collections
+        """
+        self.store = store
+        self.generator = generator
+        self.upload_outbox = upload_outbox
+        self.max_in_flight = max_in_flight or generator.max_concurrency
+        self.max_attempts = max_attempts
+        self.batch_size = batch_size
+        self.batch_poll_interval = batch_poll_interval
+        self.compositor = compositor
+        self._last_batch_poll = 0.0
+
+        self._in_flight = 0
+        self._wakeup = threading.Condition()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """Recover interrupted items and start the runner thread"""
+        if self._thread:
+            return
+        recovered = self.store.recover()
+        if recovered:
+            print(f"♻️  Resuming {recovered} interrupted collection items")
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="collection-runner", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        self._stopping.set()
+        self.notify()
+        if self._thread:
+            self._thread.join(timeout=timeout)
+            self._thread = None
+
+    def notify(self):
+        """Wake the runner (new collection, resumed collection, finished item)"""
+        with self._wakeup:
+            self._wakeup.notify_all()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            with self._wakeup:
+                free = self.max_in_flight - self._in_flight
+            items = self.store.claim(free) if free > 0 else []
+
+            for item in items:
+                with self._wakeup:
+                    self._in_flight += 1
+                future = self.generator.submit_generation(
+                    item["prompt"],
+                    output_filename=self._filename_for(item),
+                    metadata_overrides=self._metadata_for(item)
+                )
+                future.add_done_callback(lambda f, item=item: self._on_done(item, f))
+
+            submitted = self._submit_batch()
+            if time.monotonic() - self._last_batch_poll >= self.batch_poll_interval:
+                self._last_batch_poll = time.monotonic()
+                self._poll_batches()
+            composed = self._compose_layered()
+
+            if not items and not submitted and not composed:
+                with self._wakeup:
+                    self._wakeup.wait(timeout=min(5.0, self.batch_poll_interval))
+
+    def _submit_batch(self) -> bool:
+        """Submit pending batch-mode items as one batch job. Returns True if a job was submitted."""
+        items = self.store.claim(self.batch_size, mode=MODE_BATCH)
+
+        # Prompts the guard rejects fail now instead of taking a batch round trip
+        accepted = []
+        for item in items:
+            reason = self.generator.prompt_guard.check(item["prompt"])
+            if reason:
+                self._finish(item, {"success": False, "error": reason})
+            else:
+                accepted.append(item)
+        items = accepted
+
+        if not items:
+            return False
+        try:
+            job_name = self.generator.submit_batch(
+                [item["prompt"] for item in items],
+                display_name=f"collection-{items[0]['collection_id']}"
+            )
+        except Exception as e:
+            print(f"⚠️  Batch submit failed: {e}")
+            for item in items:
+                self._finish(item, {"success": False, "error": str(e)})
+            return False
+        self.store.assign_batch(items, job_name)
+        return True
+
+    def _poll_batches(self):
+        """Poll submitted batch jobs and ingest the finished ones"""
+        for job_name in self.store.batch_jobs():
+            try:
+                status = self.generator.poll_batch(job_name)
+            except Exception as e:
+                print(f"⚠️  Batch poll failed for {job_name}: {e}")
+                continue
+            if status["state"] not in TERMINAL_STATES:
+                continue
+
+            items = self.store.batch_items(job_name)
+            if status["state"] == BATCH_SUCCEEDED:
+                # Items that already finished are not listed, so results are matched
+                # by each item's position in the job rather than by list order
+                job_results = status["results"] or []
+                results = self.generator.ingest_batch(
+                    [
+                        {
+                            "prompt": item["prompt"],
+                            "output_filename": self._filename_for(item),
+                            "metadata_overrides": self._metadata_for(item),
+                        }
+                        for item in items
+                    ],
+                    [job_results[item["batch_pos"]] if item["batch_pos"] < len(job_results) else None for item in items]
+                )
+            else:
+                error = status["error"] or f"Batch job {status['state']}"
+                results = [{"success": False, "error": error}] * len(items)
+
+            print(f"📦 Batch job {job_name} {status['state']}: {len(items)} items")
+            for item, result in zip(items, results):
+                self._finish(item, result)
+
+    def _compose_layered(self) -> bool:
+        """Compose a chunk of layered-mode items locally. Returns True if any were composed."""
+        if not self.compositor:
+            return False
+        items = self.store.claim(self.compositor.workers * self.compositor.chunk_size, mode=MODE_LAYERED)
+        if not items:
+            return False
+
+        try:
+            results = self.compositor.compose([
+                {
+                    "filename": self._filename_for(item),
+                    "traits": {a["trait_type"]: a["value"] for a in item["attributes"]},
+                    "metadata_overrides": self._metadata_for(item),
+                }
+                for item in items
+            ])
+        except Exception as e:
+            print(f"⚠️  Layer compositing failed: {e}")
+            results = [{"success": False, "error": str(e)}] * len(items)
+
+        for item, result in zip(items, results):
+            self._finish(item, result)
+        return True
+
+    def _filename_for(self, item: dict) -> str:
+        """Artifact name of a collection item, the same in every mode (and across retries)"""
+        return f"{item['collection_id']}_{item['index'] + 1:05d}"
+
+    def _metadata_for(self, item: dict) -> dict:
+        overrides = {
+            "name": item["name"] or f"{item['collection_name']} #{item['index'] + 1}",
+            "collection": item["collection_id"],
+            "attributes": item["attributes"],
+        }
+        if item["collection_description"]:
+            overrides["description"] = item["collection_description"]
+        return overrides
+
+    def _on_done(self, item: dict, future):
+        try:
+            try:
+                result = future.result()
+            except Exception as e:
+                result = {"success": False, "error": str(e)}
+            self._finish(item, result)
+        finally:
+            with self._wakeup:
+                self._in_flight -= 1
+                self._wakeup.notify_all()
+
+    def _finish(self, item: dict, result: dict):
+        """Checkpoint a generated item and queue its upload, or schedule a retry"""
+        # A near-duplicate rejected by PHASH_POLICY=reject comes back unsaved and is retried like a failure
+        duplicates = result.get("near_duplicates")
+        if result.get("success"):
+            checkpoint = {
+                "filename": result["filename"],
+                "image_path": result["image_path"],
+                "metadata_path": result["metadata_path"],
+            }
+            if duplicates:
+                checkpoint["near_duplicates"] = duplicates
+            image_bytes = result.pop("image_bytes", None)
+            image_write = result.pop("image_write", None)
+            if self.upload_outbox and item["collection_upload"]:
+                upload = self.upload_outbox.enqueue(
+                    result["image_path"],
+                    result["metadata"],
+                    image_bytes=image_bytes,
+                    persisted=image_write is not None or image_bytes is None or Path(result["image_path"]).exists(),
+                    artifact_name=result["filename"],
+                    hook=HOOK_RECORD_CIDS,
+                    image_write=image_write
+                )
+                checkpoint["upload_id"] = upload.upload_id
+            self.store.finish_item(item["collection_id"], item["index"], ITEM_DONE, result=checkpoint)
+        elif item["attempts"] >= self.max_attempts:
+            self.store.finish_item(item["collection_id"], item["index"], ITEM_FAILED, error=result.get("error"))
+        else:
+            self.store.finish_item(item["collection_id"], item["index"], ITEM_PENDING, error=result.get("error"))
@@ -0,0 +1,127 @@
+"""
+Draft Previews
+Short-lived, in-memory store for low-cost draft generations. Drafts are never
+pinned or written to the metadata store; a chosen draft is finalized later.
+"""
+
+import io
+import time
+import uuid
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+from PIL import Image
+
+
+@dataclass
+class Draft:
+    """A draft generation kept in memory until it is finalized or expires"""
+    draft_id: str
+    prompt: str
+    model: str
+    preview: bytes
+    preview_mime_type: str
+    original: Optional[bytes]
+    original_mime_type: Optional[str]
+    created_at: float
+
+    @property
+    def size(self) -> int:
+        return len(self.preview) + (len(self.original) if self.original else 0)
+
+
+def make_preview(image_data: bytes, max_size: int = 384, quality: int = 70) -> tuple:
+    """
+    Downscale an image into a small JPEG preview.
+
+    Returns:
+        tuple: (preview bytes, mime type)
+    """
+    with Image.open(io.BytesIO(image_data)) as image:
+        image = image.convert("RGB")
+        image.thumbnail((max_size, max_size))
+        buffer = io.BytesIO()
+        image.save(buffer, format="JPEG", quality=quality, optimize=True)
+    return buffer.getvalue(), "image/jpeg"
+
+
+class DraftStore:
+    """Size- and TTL-bounded LRU store for drafts"""
+
+    def __init__(self, max_bytes: int = 128 * 1024 * 1024, ttl: float = 3600.0):
+        """
+        Args:
+            max_bytes: Memory budget for previews and kept originals
+            ttl: Seconds a draft stays available for finalizing
+        """
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._drafts: "OrderedDict[str, Draft]" = OrderedDict()
+        self._used = 0
+        self._lock = threading.Lock()
+
+    def add(self, prompt: str, model: str, preview: bytes, preview_mime_type: str,
+            original: Optional[bytes] = None, original_mime_type: Optional[str] = None) -> Draft:
+        """Store a new draft and evict expired or least recently used drafts"""
+        draft = Draft(
+            draft_id=uuid.uuid4().hex[:16],
+            prompt=prompt,
+            model=model,
+            preview=preview,
+            preview_mime_type=preview_mime_type,
+            original=original,
+            original_mime_type=original_mime_type,
+            created_at=time.time()
+        )
+        with self._lock:
+            self._drafts[draft.draft_id] = draft
+            self._used += draft.size
+            self._evict()
+        return draft
+
+    def get(self, draft_id: str) -> Optional[Draft]:
+        with self._lock:
+            draft = self._drafts.get(draft_id)
+            if draft is None:
+                return None
+            if time.time() - draft.created_at > self.ttl:
+                self._remove(draft_id)
+                return None
+            self._drafts.move_to_end(draft_id)
+            return draft
+
+    def pop(self, draft_id: str) -> Optional[Draft]:
+        """Atomically take a draft out, so two concurrent finalizes cannot both get it"""
+        with self._lock:
+            draft = self._drafts.get(draft_id)
+            if draft is None:
+                return None
+            self._remove(draft_id)
+            if time.time() - draft.created_at > self.ttl:
+                return None
+            return draft
+
+    def restore(self, draft: Draft):
+        """Put back a draft taken with pop() (e.g. when finalizing it failed), unless it expired meanwhile"""
+        if time.time() - draft.created_at > self.ttl:
+            return
+        with self._lock:
+            if draft.draft_id in self._drafts:
+                return
+            self._drafts[draft.draft_id] = draft
+            self._used += draft.size
+            self._evict()
+
+    def _remove(self, draft_id: str):
+        draft = self._drafts.pop(draft_id, None)
+        if draft is not None:
+            self._used -= draft.size
+
+    def _evict(self):
+        now = time.time()
+        for draft_id in [d.draft_id for d in self._drafts.values() if now - d.created_at > self.ttl]:
+            self._remove(draft_id)
+        while self._used > self.max_bytes and len(self._drafts) > 1:
+            self._remove(next(iter(self._drafts)))
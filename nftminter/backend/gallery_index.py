@@ -0,0 +1,214 @@
+"""
+Gallery Index
+In-memory listing of generated NFTs for the gallery endpoint: entries sorted
+by creation time and by name, loaded once at startup and kept current from
+metadata writes, paged with opaque keyset cursors
+"""
+
+import json
+import time
+import base64
+import bisect
+import threading
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from rarity_index import extract_traits
+
+SORTS = ("newest", "oldest", "name")
+
+
+class _Entry:
+    __slots__ = ("filename", "name", "created", "pinned", "token_id", "collection", "traits")
+
+    def __init__(self, filename: str, metadata: dict, created: float):
+        self.filename = filename
+        self.name = metadata.get("name") or filename
+        self.created = created
+        self.pinned = str(metadata.get("metadata_uri") or "").startswith("ipfs://")
+        self.token_id = metadata.get("token_id")
+        self.collection = metadata.get("collection")
+        self.traits = extract_traits(metadata)
+
+    def to_dict(self) -> dict:
+        return {
+            "filename": self.filename,
+            "name": self.name,
+            "created": datetime.fromtimestamp(self.created).isoformat(),
+            "pinned": self.pinned,
+            "minted": self.token_id is not None,
+            "token_id": self.token_id,
+            "collection": self.collection,
+            "image_url": f"/api/v1/image/{self.filename}",
+            "thumbnail_url": f"/api/v1/image/{self.filename}?w=256&format=webp",
+            "metadata_url": f"/api/v1/metadata/{self.filename}",
+        }
+
+
+def _created_at(metadata: dict) -> Optional[float]:
+    """Creation time from the "Created" attribute written at generation time"""
+    for attribute in metadata.get("attributes") or []:
+        if isinstance(attribute, dict) and attribute.get("trait_type") == "Created":
+            try:
+                return datetime.fromisoformat(str(attribute.get("value"))).timestamp()
+            except ValueError:
+                return None
+    return None
+
+
+def encode_cursor(key: tuple) -> str:
+    return base64.urlsafe_b64encode(json.dumps(key).encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple:
+    """Raises ValueError for a malformed cursor"""
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if not isinstance(key, list) or not key:
+        raise ValueError("Invalid cursor")
+    return tuple(key)
+
+
+class GalleryIndex:
+    """
+    Every generated NFT, kept sorted so each gallery page costs a binary
+    search plus the entries on the page (and those skipped by filters).
+    """
+
+    def __init__(self):
+        self._entries: Dict[str, _Entry] = {}
+        self._by_created: List[Tuple[float, str]] = []
+        self._by_name: List[Tuple[str, str]] = []
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def update(self, filename: str, metadata: dict):
+        """Add or refresh one item (registered as a metadata listener)"""
+        with self._lock:
+            previous = self._entries.get(filename)
+            created = _created_at(metadata) or (previous.created if previous else time.time())
+            entry = _Entry(filename, metadata, created)
+            if previous is not None:
+                self._remove_keys(previous)
+            self._entries[filename] = entry
+            bisect.insort(self._by_created, (entry.created, filename))
+            bisect.insort(self._by_name, (entry.name.lower(), filename))
+
+    def _remove_keys(self, entry: _Entry):
+        for keys, key in ((self._by_created, (entry.created, entry.filename)), (self._by_name, (entry.name.lower(), entry.filename))):
+            i = bisect.bisect_left(keys, key)
+            if i < len(keys) and keys[i] == key:
+                del keys[i]
+
+    def load(self, items: Iterable[Tuple[str, dict]]) -> int:
+        """
+        Index existing metadata (e.g. MetadataStore.items()).
+
+        Returns:
+            int: Number of items indexed
+        """
+        loaded = 0
+        for filename, metadata in items:
+            self.update(filename, metadata)
+            loaded += 1
+        if loaded:
+            print(f"🖼️  Gallery index loaded: {loaded} items")
+        return loaded
+
+    def page(
+        self,
+        sort: str = "newest",
+        cursor: Optional[str] = None,
+        limit: int = 50,
+        minted: Optional[bool] = None,
+        collection: Optional[str] = None,
+        traits: Optional[Dict[str, str]] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None
+    ) -> dict:
+        """
+        One page of the gallery.
+
+        Args:
+            sort: "newest", "oldest" or "name"
+            cursor: next_cursor of the previous page
+            limit: Items per page
+            minted: Only minted (True) or unminted (False) items
+            collection: Only items of this collection
+            traits: Only items with all of these {trait_type: value}
+            since: Only items created at or after this Unix time
+            until: Only items created before this Unix time
+
+        Returns:
+            dict: {"items", "next_cursor" (None on the last page), "total" (all indexed items)}
+
+        Raises:
+            ValueError: Unknown sort or malformed cursor
+        """
+        if sort not in SORTS:
+            raise ValueError(f"Unknown sort '{sort}'. Use one of: {', '.join(SORTS)}.")
+        after = None
+        if cursor:
+            key = decode_cursor(cursor)
+            if key[0] != sort:
+                raise ValueError("Cursor belongs to a different sort order")
+            position_type = str if sort == "name" else (int, float)
+            if len(key) != 3 or not isinstance(key[1], position_type) or not isinstance(key[2], str):
+                raise ValueError("Invalid cursor")
+            after = key[1:]
+
+        def wanted(entry: _Entry) -> bool:
+            if minted is not None and (entry.token_id is not None) != minted:
+                return False
+            if collection is not None and entry.collection != collection:
+                return False
+            if sort == "name" and ((since is not None and entry.created < since) or (until is not None and entry.created >= until)):
+                return False
+            return not traits or all(entry.traits.get(t) == v for t, v in traits.items())
+
+        items, last_key = [], None
+        with self._lock:
+            for key in self._scan(sort, after, since, until):
+                entry = self._entries[key[1]]
+                if not wanted(entry):
+                    continue
+                if len(items) == limit:
+                    break
+                items.append(entry.to_dict())
+                last_key = key
+            else:
+                last_key = None
+            total = len(self._entries)
+
+        next_cursor = encode_cursor((sort, *last_key)) if last_key else None
+        return {"items": items, "next_cursor": next_cursor, "total": total}
+
+    def _scan(self, sort: str, after: Optional[tuple], since: Optional[float], until: Optional[float]):
+        """Keys in sort order, starting after the cursor key and bounded by the date range"""
+        if sort == "name":
+            keys = self._by_name
+            for i in range(bisect.bisect_right(keys, after) if after else 0, len(keys)):
+                yield keys[i]
+            return
+
+        keys = self._by_created
+        lo = bisect.bisect_left(keys, (since,)) if since is not None else 0
+        hi = bisect.bisect_left(keys, (until,)) if until is not None else len(keys)
+        if sort == "oldest":
+            if after:
+                lo = max(lo, bisect.bisect_right(keys, after))
+            for i in range(lo, hi):
+                yield keys[i]
+        else:
+            if after:
+                hi = min(hi, bisect.bisect_left(keys, after))
+            for i in range(hi - 1, lo - 1, -1):
+                yield keys[i]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"items": len(self._entries)}
@@ -4,30 +4,70 @@ Generates images using Google's Gemini 2.5 Flash Image model
 """
 
 import os
-import json
+import copy
+import time
 import hashlib
 import mimetypes
+from concurrent.futures import ThreadPoolExecutor, Future, as_completed
 from datetime import datetime
 from pathlib import Path
-from typing import Optional
+from typing import Optional, Callable
 
 from dotenv import load_dotenv
 from google import genai
 from google.genai import types
 
+from rate_limiter import TokenBucket, RateLimitTimeout
+from prompt_cache import PromptCache, cache_key, normalize_prompt
+from singleflight import SingleFlight
+from drafts import DraftStore, make_preview
+from prompt_guard import PromptGuard
+from resilience import ResilientCaller, CircuitOpenError
+from batch_mode import create_batch_transport, BatchTransport, HTTPBatchTransport, TERMINAL_STATES, BATCH_SUCCEEDED
+from phash_index import PerceptualIndex
+from artifact_store import ArtifactStore
+from metadata_store import MetadataStore
+
 # Load environment variables
 load_dotenv()
 
+# Wraps user prompts so the model reliably returns an image
+PROMPT_TEMPLATE = "Create a detailed, high-quality digital artwork image of: {prompt}. Style: digital art, vibrant colors, professional NFT artwork."
+
 
 class NFTGenerator:
     """Handle AI image generation and NFT metadata creation"""
     
-    def __init__(self, api_key: Optional[str] = None):
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        persist_images: Optional[bool] = None,
+        prompt_cache: Optional[PromptCache] = None,
+        prompt_guard: Optional[PromptGuard] = None,
+        batch_transport: Optional[BatchTransport] = None,
+        duplicate_index: Optional[PerceptualIndex] = None,
+        artifact_store: Optional[ArtifactStore] = None,
+        metadata_store: Optional[MetadataStore] = None
+    ):
         """
         Initialize the NFT Generator with Google Gemini AI.
         
         Args:
             api_key: Google AI API key. If None, will use GOOGLE_API_KEY env var.
+            persist_images: Write generated images to disk in the background.
+                            If None, will use PERSIST_IMAGES env var (default true).
+            prompt_cache: Optional cache of previous results for repeated prompts.
+                          If None, one is created when PROMPT_CACHE_ENABLED is true.
+            prompt_guard: Optional local prompt checks. If None, one is configured
+                          from the PROMPT_* env vars.
+            batch_transport: Optional transport for offline batch jobs. If None, one
+                             is selected by GEMINI_BATCH_TRANSPORT.
+            duplicate_index: Optional perceptual hash index used to flag near-duplicate
+                             images. If None, one is created unless PHASH_POLICY is "off".
+            artifact_store: Optional content-addressed image store. If None, one is
+                            created under generated_nfts.
+            metadata_store: Optional metadata repository. If None, one is configured
+                            from the METADATA_* env vars under generated_nfts.
         """
         self.api_key = api_key or os.getenv("GOOGLE_API_KEY")
         if not self.api_key:
@@ -45,29 +85,172 @@ class NFTGenerator:
         
         self.images_dir.mkdir(parents=True, exist_ok=True)
         self.metadata_dir.mkdir(parents=True, exist_ok=True)
+        
+        # Images are stored by SHA-256 in sharded directories; images_dir only holds pre-store files
+        self.artifacts = artifact_store or ArtifactStore(str(self.output_dir))
+        
+        # Metadata lives in SQLite (group-committed, cached in memory); JSON files are written on export
+        self.metadata = metadata_store or MetadataStore.from_env(self.output_dir)
+        
+        # Image bytes are handed to callers in memory; the disk copy is an optional side step
+        if persist_images is None:
+            persist_images = os.getenv("PERSIST_IMAGES", "true").lower() in ("1", "true", "yes")
+        self.persist_images = persist_images
+        self._image_writer = ThreadPoolExecutor(max_workers=2, thread_name_prefix="image-writer")
+        
+        # Opt-in: repeated prompts return the existing artifact instead of calling Gemini
+        if prompt_cache is None and os.getenv("PROMPT_CACHE_ENABLED", "false").lower() in ("1", "true", "yes"):
+            prompt_cache = PromptCache(
+                db_path=str(self.output_dir / "prompt_cache.db"),
+                max_entries=int(os.getenv("PROMPT_CACHE_MAX_ENTRIES", "1000"))
+            )
+        self.prompt_cache = prompt_cache
+        
+        # Length/blocklist checks and recently failed prompts are rejected before any Gemini call
+        self.prompt_guard = prompt_guard or PromptGuard.from_env()
+        
+        # Identical concurrent requests share one in-flight Gemini call
+        self._inflight = SingleFlight()
+        
+        # Gemini quota: one token bucket and one bounded worker pool shared by all requests
+        self.rpm = float(os.getenv("GEMINI_RPM", "10"))
+        self.max_concurrency = int(os.getenv("GEMINI_MAX_CONCURRENCY", str(max(1, min(8, int(self.rpm))))))
+        self.rate_limiter = TokenBucket(self.rpm, burst=self.max_concurrency)
+        self._generation_pool = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="generation")
+        
+        # Deadlines, idle timeouts, retries, hedging and a circuit breaker around every Gemini call
+        self.resilience = ResilientCaller.from_env()
+        
+        # Offline batch jobs for bulk collection runs (pluggable transport)
+        if batch_transport is None:
+            try:
+                batch_transport = create_batch_transport(self.client, self.api_key)
+            except ValueError as e:
+                # A batch misconfiguration must not take interactive generation down with it
+                print(f"⚠️  Batch transport: {e}. Using the REST batch transport.")
+                batch_transport = HTTPBatchTransport(self.api_key)
+        self.batch_transport = batch_transport
+        
+        # Near-duplicate detection: "flag" reports matches, "reject" also blocks pinning/minting
+        self.duplicate_policy = os.getenv("PHASH_POLICY", "flag").lower()
+        if duplicate_index is None and self.duplicate_policy != "off":
+            duplicate_index = PerceptualIndex(
+                db_path=str(self.output_dir / "phash.db"),
+                max_distance=int(os.getenv("PHASH_MAX_DISTANCE", "6"))
+            )
+        self.duplicate_index = duplicate_index
+        
+        # Draft previews: a local downscale, kept only in memory. By default the draft costs
+        # a full-quality call (there is no cheaper image model on this API), but finalizing
+        # then reuses the original; GEMINI_DRAFT_MODEL opts into a cheaper model.
+        self.draft_model = os.getenv("GEMINI_DRAFT_MODEL", self.model)
+        self.draft_preview_size = int(os.getenv("DRAFT_PREVIEW_SIZE", "384"))
+        self.drafts = DraftStore(
+            max_bytes=int(float(os.getenv("DRAFT_CACHE_MB", "128")) * 1024 * 1024),
+            ttl=float(os.getenv("DRAFT_TTL_SECONDS", "3600"))
+        )
+        
+        # Called with (filename, metadata) whenever metadata is saved
+        self._metadata_listeners = []
+    
+    def add_metadata_listener(self, callback: Callable[[str, dict], None]):
+        """Register a callback for every metadata document saved (e.g. to keep an index current)"""
+        self._metadata_listeners.append(callback)
     
-    def generate_image(self, prompt: str, output_filename: Optional[str] = None) -> dict:
+    def notify_metadata(self, filename: str, metadata: dict):
+        """Pass saved metadata to the listeners; a failing listener never fails a generation"""
+        for callback in self._metadata_listeners:
+            try:
+                callback(filename, metadata)
+            except Exception as e:
+                print(f"⚠️  Metadata listener failed for {filename}: {e}")
+    
+    def generate_image(
+        self,
+        prompt: str,
+        output_filename: Optional[str] = None,
+        metadata_overrides: Optional[dict] = None,
+        strict: bool = False,
+        variations: int = 1,
+        unique_name: bool = False
+    ) -> dict:
         """
         Generate an image using Google's Gemini 2.5 Flash Image model.
         
+        Concurrent calls for the same normalized prompt share one in-flight
+        generation; every caller still gets an artifact (name and metadata
+        record) of its own, linked to the same stored image. With strict=True
+        the output filename must match as well, and those calls share one artifact.
+        
         Args:
             prompt: Text description of the image to generate
             output_filename: Optional custom filename (without extension)
+            metadata_overrides: Optional metadata fields to set before the metadata
+                                is saved. An "attributes" list is appended to the
+                                generated attributes instead of replacing them.
+            strict: Only share an in-flight generation with calls using the same filename
+            variations: Number of image candidates to request in one call. Each is
+                        saved as its own artifact ("_v2", "_v3", ... suffixes) with
+                        linked metadata and listed under "variations".
+            unique_name: Treat output_filename as a base name and reserve an unused
+                         variant of it (name, name_2, ...) instead of replacing an
+                         existing artifact of that name
             
         Returns:
-            dict: Contains image path, metadata, and generation info
+            dict: Contains image bytes, image path, metadata, and generation info.
+                  "image_bytes" holds the generated image in memory; when image
+                  persistence is enabled "image_write" is a future for the disk copy.
         """
+        if metadata_overrides:
+            # Items with their own metadata are distinct artifacts; never coalesce them
+            return self._generate_image(prompt, output_filename, metadata_overrides, variations, unique_name)
+        
+        key = (self.model, normalize_prompt(prompt), output_filename if strict else None, variations)
+        result, shared = self._inflight.do(key, self._generate_image, prompt, output_filename, None, variations, unique_name)
+        if shared:
+            print(f"🔗 Joined in-flight generation for prompt: '{prompt}'")
+        
+        # Every caller gets its own copy, since callers customize the metadata
+        result = self._copy_result(result)
+        if shared and not strict and result["success"]:
+            # Same image, but an artifact of its own, so pinning and minting it never
+            # overwrite the record of the call that generated it
+            name = self._new_name(prompt, output_filename, unique_name, taken=result["filename"])
+            result = self._link_result(result, name)
+            # Its metadata is not the cached artifact's, so its CIDs must not be cached
+            result["cache_key"] = None
+        result["shared"] = shared
+        return result
+    
+    def _copy_result(self, result: dict) -> dict:
+        """Copy a result so callers can customize it without affecting each other"""
+        result = dict(result)
+        if "metadata" in result:
+            result["metadata"] = copy.deepcopy(result["metadata"])
+        if "variations" in result:
+            result["variations"] = [self._copy_result(v) for v in result["variations"]]
+        return result
+    
+    def _generate_image(
+        self,
+        prompt: str,
+        output_filename: Optional[str] = None,
+        metadata_overrides: Optional[dict] = None,
+        variations: int = 1,
+        unique_name: bool = False
+    ) -> dict:
+        """Run one generation against Gemini (see generate_image)"""
+        rejected = self._reject(prompt)
+        if rejected:
+            return rejected
+        
         print(f"🎨 Generating NFT image from prompt: '{prompt}'")
         
         try:
-            # Create filename
-            if not output_filename:
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                prompt_hash = hashlib.md5(prompt.encode()).hexdigest()[:8]
-                output_filename = f"nft_{timestamp}_{prompt_hash}"
-            
             # Enhance prompt to ensure image generation
-            enhanced_prompt = f"Create a detailed, high-quality digital artwork image of: {prompt}. Style: digital art, vibrant colors, professional NFT artwork."
+            enhanced_prompt = PROMPT_TEMPLATE.format(prompt=prompt)
+            if variations > 1:
+                enhanced_prompt += f" Provide {variations} distinct variations as separate images."
             
             # Prepare the content for Gemini
             contents = [
@@ -80,88 +263,601 @@ class NFTGenerator:
             ]
             
             # Configure to generate images
-            generate_content_config = types.GenerateContentConfig(
-                response_modalities=["IMAGE"],  # Only request IMAGE, not TEXT
-                temperature=1.0,
-            )
+            generation_settings = {
+                "response_modalities": ["IMAGE"],  # Only request IMAGE, not TEXT
+                "temperature": 1.0,
+            }
+            if variations > 1:
+                # Several candidates from one round trip instead of N calls
+                generation_settings["candidate_count"] = variations
+            generate_content_config = types.GenerateContentConfig(**generation_settings)
+            
+            # Serve repeated prompts from the cache (items with their own metadata always generate)
+            result_key = None
+            if self.prompt_cache and not metadata_overrides and variations == 1:
+                result_key = cache_key(self.model, PROMPT_TEMPLATE.format(prompt=normalize_prompt(prompt)), generation_settings)
+                cached = self.prompt_cache.lookup(result_key)
+                hit = self._cached_result(cached, prompt, result_key) if cached else None
+                if hit:
+                    # A new name for the cached image; the cached artifact's own record is never handed out
+                    return self._link_result(hit, self._new_name(prompt, output_filename, unique_name, taken=hit["filename"]), rename=False)
             
             # Generate the image
             print("⏳ Generating image with AI (this may take 10-30 seconds)...")
-            image_data = None
-            mime_type = None
+            images = self._stream_images(self.model, contents, generate_content_config, wanted=variations)
             
-            for chunk in self.client.models.generate_content_stream(
-                model=self.model,
-                contents=contents,
-                config=generate_content_config,
-            ):
-                if (
-                    chunk.candidates is None
-                    or chunk.candidates[0].content is None
-                    or chunk.candidates[0].content.parts is None
-                ):
-                    continue
-                
-                # Check if we have image data
-                if (chunk.candidates[0].content.parts[0].inline_data and 
-                    chunk.candidates[0].content.parts[0].inline_data.data):
-                    inline_data = chunk.candidates[0].content.parts[0].inline_data
-                    image_data = inline_data.data
-                    mime_type = inline_data.mime_type
-                    print("✅ Image data received from AI!")
-                    break
-                elif chunk.text:
-                    # Skip text responses
-                    print(f"💭 AI says: {chunk.text}")
-            
-            if not image_data:
-                raise Exception("No image data received from Gemini API. The prompt might be too vague or inappropriate. Try a more descriptive prompt like 'A golden Bitcoin coin floating in space with stars'.")
-            
-            # Determine file extension from mime type
-            file_extension = mimetypes.guess_extension(mime_type) or ".png"
-            image_path = self.images_dir / f"{output_filename}{file_extension}"
-            
-            # Save the image
-            with open(image_path, "wb") as f:
-                f.write(image_data)
-            
-            print(f"✅ Image generated successfully: {image_path}")
-            
-            # Create metadata
-            metadata = self.create_metadata(
-                name=f"AI Generated NFT - {output_filename}",
-                description=f"AI-generated artwork created from prompt: '{prompt}'",
-                image_path=str(image_path),
-                prompt=prompt,
-                attributes=[
-                    {"trait_type": "Generation Method", "value": "Gemini 2.5 Flash Image"},
-                    {"trait_type": "Created", "value": datetime.now().isoformat()},
-                ]
+            if not images:
+                error = "No image data received from Gemini API. The prompt might be too vague or inappropriate. Try a more descriptive prompt like 'A golden Bitcoin coin floating in space with stars'."
+                self.prompt_guard.record_failure(prompt, error)
+                raise Exception(error)
+            
+            # Names are reserved only now, so failed calls never use one up
+            output_filename = self._new_name(prompt, output_filename, unique_name)
+            
+            # One artifact per variation, linked through their metadata; each name is
+            # reserved, so a variation never overwrites an existing artifact
+            filenames = [output_filename] + [self.artifacts.reserve_name(f"{output_filename}_v{i + 1}") for i in range(1, len(images))]
+            artifacts = []
+            for i, (image_data, mime_type) in enumerate(images):
+                overrides = dict(metadata_overrides or {})
+                if len(images) > 1:
+                    overrides.update({
+                        "variation_group": output_filename,
+                        "variation_index": i,
+                        "variations": filenames,
+                    })
+                artifacts.append(self._save_artifact(image_data, mime_type, filenames[i], prompt, overrides))
+            
+            # Near-duplicates rejected by PHASH_POLICY=reject were not saved
+            saved = [artifact for artifact in artifacts if artifact["success"]]
+            if not saved:
+                return artifacts[0]
+            if len(saved) < len(artifacts) and len(artifacts) > 1:
+                kept = [artifact["filename"] for artifact in saved]
+                for artifact in saved:
+                    artifact["metadata"] = self.metadata.update(artifact["filename"], {"variations": kept}) or artifact["metadata"]
+                    self.notify_metadata(artifact["filename"], artifact["metadata"])
+            artifacts = saved
+            
+            result = dict(artifacts[0])
+            if result_key and result["image_write"] is not None:
+                # Cache the artifact only once its image is actually on disk
+                def remember(write, filename=result["filename"], image_path=result["image_path"], metadata_path=result["metadata_path"], mime_type=result["mime_type"]):
+                    if not write.cancelled() and write.exception() is None:
+                        self.prompt_cache.store(result_key, filename, image_path, metadata_path, mime_type)
+                result["image_write"].add_done_callback(remember)
+            
+            result.update({"cached": False, "cache_key": result_key})
+            if len(artifacts) > 1:
+                result["variations"] = artifacts
+            return result
+            
+        except Exception as e:
+            print(f"❌ Error generating image: {str(e)}")
+            return {
+                "success": False,
+                "error": str(e),
+                "prompt": prompt,
+                "unavailable": isinstance(e, (CircuitOpenError, RateLimitTimeout))
+            }
+    
+    def generate_draft(self, prompt: str) -> dict:
+        """
+        Generate a low-cost draft preview for a prompt.
+        
+        Uses GEMINI_DRAFT_MODEL (default: the full-quality model, billed like a
+        full generation) and returns a downscaled JPEG preview. Drafts live in memory only: nothing is written
+        to the metadata store or pinned. When the draft model is the full-quality
+        model the original image is kept so finalize_draft() needs no new call.
+        
+        Args:
+            prompt: Text description of the image to generate
+            
+        Returns:
+            dict: Contains draft_id, preview bytes and preview mime type
+        """
+        rejected = self._reject(prompt)
+        if rejected:
+            return rejected
+        
+        print(f"✏️  Generating draft from prompt: '{prompt}'")
+        
+        try:
+            contents = [
+                types.Content(
+                    role="user",
+                    parts=[types.Part.from_text(text=PROMPT_TEMPLATE.format(prompt=prompt))],
+                ),
+            ]
+            generate_content_config = types.GenerateContentConfig(
+                response_modalities=["IMAGE"],
+                temperature=1.0,
             )
             
-            # Save metadata
-            metadata_path = self.metadata_dir / f"{output_filename}.json"
-            with open(metadata_path, 'w') as f:
-                json.dump(metadata, f, indent=2)
+            images = self._stream_images(self.draft_model, contents, generate_content_config)
             
-            print(f"✅ Metadata saved: {metadata_path}")
+            if not images:
+                error = "No image data received from Gemini API. Try a more descriptive prompt."
+                self.prompt_guard.record_failure(prompt, error)
+                raise Exception(error)
             
+            image_data, mime_type = images[0]
+            preview, preview_mime_type = make_preview(image_data, max_size=self.draft_preview_size)
+            keep_original = self.draft_model == self.model
+            draft = self.drafts.add(
+                prompt=prompt,
+                model=self.draft_model,
+                preview=preview,
+                preview_mime_type=preview_mime_type,
+                original=image_data if keep_original else None,
+                original_mime_type=mime_type if keep_original else None
+            )
+            
+            print(f"✅ Draft ready: {draft.draft_id} ({len(preview)} bytes preview)")
             return {
                 "success": True,
-                "image_path": str(image_path),
-                "metadata_path": str(metadata_path),
-                "metadata": metadata,
-                "prompt": prompt,
-                "filename": output_filename
+                "draft_id": draft.draft_id,
+                "preview_bytes": preview,
+                "preview_mime_type": preview_mime_type,
+                "model": self.draft_model,
+                "prompt": prompt
             }
             
         except Exception as e:
-            print(f"❌ Error generating image: {str(e)}")
+            print(f"❌ Error generating draft: {str(e)}")
             return {
                 "success": False,
                 "error": str(e),
-                "prompt": prompt
+                "prompt": prompt,
+                "unavailable": isinstance(e, (CircuitOpenError, RateLimitTimeout))
+            }
+    
+    def finalize_draft(self, draft_id: str, output_filename: Optional[str] = None, metadata_overrides: Optional[dict] = None) -> dict:
+        """
+        Turn a draft into a full-quality artifact.
+        
+        If the draft kept its full-quality original it is saved as is; otherwise
+        the draft's prompt is generated again with the full-quality model.
+        
+        Args:
+            draft_id: ID returned by generate_draft()
+            output_filename: Optional base filename (without extension); an unused
+                             variant of it is reserved
+            metadata_overrides: Optional metadata fields (see generate_image)
+            
+        Returns:
+            dict: generate_image() style result, or None if the draft is unknown or expired
+        """
+        # Taken atomically, so concurrent finalize requests cannot both save it
+        draft = self.drafts.pop(draft_id)
+        if draft is None:
+            return None
+        
+        if draft.original is None:
+            print(f"🎨 Finalizing draft {draft_id} at full quality")
+            result = self._generate_image(draft.prompt, output_filename, metadata_overrides, unique_name=True)
+        else:
+            print(f"♻️  Finalizing draft {draft_id} from its original image")
+            try:
+                if not output_filename:
+                    output_filename = self._default_filename(draft.prompt)
+                else:
+                    output_filename = self.artifacts.reserve_name(output_filename)
+                result = self._save_artifact(draft.original, draft.original_mime_type, output_filename, draft.prompt, metadata_overrides)
+            except Exception as e:
+                print(f"❌ Error finalizing draft: {str(e)}")
+                result = {"success": False, "error": str(e), "prompt": draft.prompt}
+        
+        if not result.get("success"):
+            # Keep the draft so finalizing can be retried
+            self.drafts.restore(draft)
+            return result
+        result.setdefault("cached", False)
+        result.setdefault("cache_key", None)
+        return result
+    
+    def generate_raw_image(self, text: str) -> tuple:
+        """
+        Generate one image for a complete prompt without saving anything.
+        
+        Used for assets that are not NFTs themselves, such as trait layers.
+        
+        Args:
+            text: Full prompt sent to Gemini as is
+            
+        Returns:
+            tuple: (image bytes, mime type)
+        """
+        reason = self.prompt_guard.check(text)
+        if reason:
+            raise ValueError(reason)
+        
+        contents = [types.Content(role="user", parts=[types.Part.from_text(text=text)])]
+        config = types.GenerateContentConfig(response_modalities=["IMAGE"], temperature=1.0)
+        images = self._stream_images(self.model, contents, config)
+        if not images:
+            raise Exception("No image data received from Gemini API.")
+        return images[0]
+    
+    def submit_batch(self, prompts: list[str], display_name: Optional[str] = None) -> str:
+        """
+        Submit prompts as one offline Gemini batch job.
+        
+        Batch jobs trade latency (minutes to hours) for throughput and cost, and
+        do not go through the interactive RPM quota per prompt.
+        
+        Args:
+            prompts: Text prompts, one image each
+            display_name: Optional job label
+            
+        Returns:
+            str: Job name to pass to poll_batch()
+        """
+        display_name = display_name or f"nft-batch-{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        self.rate_limiter.acquire(timeout=self.resilience.quota_timeout)
+        job_name = self.batch_transport.submit(
+            self.model,
+            [PROMPT_TEMPLATE.format(prompt=prompt) for prompt in prompts],
+            display_name
+        )
+        print(f"📨 Submitted batch job {job_name} with {len(prompts)} prompts")
+        return job_name
+    
+    def poll_batch(self, job_name: str) -> dict:
+        """
+        Read the state of a batch job.
+        
+        Returns:
+            dict: {"state", "results", "error"}; results are set once the job succeeded
+        """
+        return self.batch_transport.get(job_name)
+    
+    def ingest_batch(self, items: list[dict], results: list[dict]) -> list[dict]:
+        """
+        Save the images of a finished batch job into generated_nfts.
+        
+        Args:
+            items: The submitted items in order: dicts with "prompt" and optional
+                   "output_filename" and "metadata_overrides"
+            results: poll_batch() results for those items, by position (None or
+                     a short list for items missing from the output)
+            
+        Returns:
+            list: generate_image() style results, in item order
+        """
+        ingested = []
+        for i, item in enumerate(items):
+            prompt = item["prompt"]
+            result = (results[i] if i < len(results) else None) or {"images": [], "error": "Missing from batch output"}
+            if not result["images"]:
+                error = result["error"] or "No image data received from Gemini API."
+                if not result["error"]:
+                    self.prompt_guard.record_failure(prompt, error)
+                ingested.append({"success": False, "error": error, "prompt": prompt})
+                continue
+            
+            image_data, mime_type = result["images"][0]
+            try:
+                artifact = self._save_artifact(
+                    image_data,
+                    mime_type,
+                    item.get("output_filename") or self._default_filename(prompt),
+                    prompt,
+                    item.get("metadata_overrides")
+                )
+            except Exception as e:
+                ingested.append({"success": False, "error": str(e), "prompt": prompt})
+                continue
+            artifact.update({"cached": False, "cache_key": None})
+            ingested.append(artifact)
+        
+        print(f"📥 Ingested batch: {sum(1 for r in ingested if r['success'])}/{len(items)} images")
+        return ingested
+    
+    def generate_batch_offline(self, items: list[dict], poll_interval: float = 30.0, timeout: Optional[float] = None) -> list[dict]:
+        """
+        Submit items as one batch job, wait for it and ingest the results.
+        
+        Args:
+            items: Dicts with "prompt" and optional "output_filename" and "metadata_overrides"
+            poll_interval: Seconds between polls
+            timeout: Optional maximum seconds to wait
+            
+        Returns:
+            list: generate_image() style results, in item order
+        """
+        job_name = self.submit_batch([item["prompt"] for item in items])
+        started = time.monotonic()
+        while True:
+            status = self.poll_batch(job_name)
+            if status["state"] in TERMINAL_STATES:
+                break
+            if timeout is not None and time.monotonic() - started > timeout:
+                raise TimeoutError(f"Batch job {job_name} did not finish within {timeout:g}s")
+            time.sleep(poll_interval)
+        
+        if status["state"] != BATCH_SUCCEEDED:
+            error = status["error"] or f"Batch job {status['state']}"
+            return [{"success": False, "error": error, "prompt": item["prompt"]} for item in items]
+        return self.ingest_batch(items, status["results"])
+    
+    def _default_filename(self, prompt: str) -> str:
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        prompt_hash = hashlib.md5(prompt.encode()).hexdigest()[:8]
+        # Same-second identical prompts get distinct names
+        return self.artifacts.reserve_name(f"nft_{timestamp}_{prompt_hash}")
+    
+    def _new_name(self, prompt: str, output_filename: Optional[str], unique_name: bool, taken: Optional[str] = None) -> str:
+        """
+        Artifact name for a new result.
+        
+        Args:
+            prompt: Prompt of the result (for the default name)
+            output_filename: Requested name, if any
+            unique_name: Reserve an unused variant of output_filename (see generate_image)
+            taken: Name of an existing artifact the result must not reuse
+        """
+        if not output_filename:
+            return self._default_filename(prompt)
+        if unique_name or output_filename == taken:
+            return self.artifacts.reserve_name(output_filename)
+        return output_filename
+    
+    def _reject(self, prompt: str) -> Optional[dict]:
+        """Failed generate_image() result if the prompt guard rejects the prompt"""
+        reason = self.prompt_guard.check(prompt)
+        if reason is None:
+            return None
+        print(f"🚫 Prompt rejected: {reason}")
+        return {
+            "success": False,
+            "error": reason,
+            "prompt": prompt,
+            "rejected": True
+        }
+    
+    def _stream_images(self, model: str, contents: list, config, wanted: int = 1) -> list:
+        """
+        Call Gemini through the resilience layer and collect the returned images.
+        
+        Every attempt (retries and hedges included) takes a token from the
+        shared RPM bucket; a hedge only starts if a token is free right away.
+        
+        Returns:
+            list: (image bytes, mime type) tuples
+        """
+        # The read timeout makes a hung stream fail by itself instead of holding an attempt worker
+        config = config.model_copy(update={
+            "http_options": types.HttpOptions(timeout=int(self.resilience.attempt_timeout * 1000))
+        })
+        
+        def attempt(progress):
+            stream = self.client.models.generate_content_stream(
+                model=model,
+                contents=contents,
+                config=config,
+            )
+            return self._collect_images(stream, wanted=wanted, on_chunk=progress)
+        
+        return self.resilience.call(
+            attempt,
+            acquire=lambda timeout: self.rate_limiter.acquire(timeout=timeout),
+            try_acquire=self.rate_limiter.try_acquire
+        )
+    
+    def _collect_images(self, stream, wanted: int = 1, on_chunk: Optional[Callable[[], None]] = None) -> list:
+        """
+        Read image parts from a Gemini response stream.
+        
+        Looks at every candidate and part, and stops once `wanted` images
+        have arrived.
+        
+        Args:
+            stream: Gemini response stream
+            wanted: Number of images to collect
+            on_chunk: Optional callback invoked for every chunk received
+        
+        Returns:
+            list: (image bytes, mime type) tuples
+        """
+        images = []
+        for chunk in stream:
+            if on_chunk:
+                on_chunk()
+            if chunk.candidates is None:
+                continue
+            
+            for candidate in chunk.candidates:
+                if candidate.content is None or candidate.content.parts is None:
+                    continue
+                for part in candidate.content.parts:
+                    # Check if we have image data
+                    if part.inline_data and part.inline_data.data:
+                        images.append((part.inline_data.data, part.inline_data.mime_type))
+                        print(f"✅ Image data received from AI! ({len(images)}/{wanted})")
+                    elif getattr(part, "text", None):
+                        # Skip text responses
+                        print(f"💭 AI says: {part.text}")
+            
+            if len(images) >= wanted:
+                break
+        
+        return images[:wanted]
+    
+    def _save_artifact(self, image_data: bytes, mime_type: str, output_filename: str, prompt: str, metadata_overrides: Optional[dict] = None) -> dict:
+        """
+        Store one generated image and its metadata.
+        
+        The near-duplicate check runs first: with PHASH_POLICY=reject a
+        near-duplicate is not stored at all and its reserved name is released.
+        
+        Returns:
+            dict: generate_image() style result for the artifact (success False for a rejected near-duplicate)
+        """
+        near_duplicates = self.find_near_duplicates(output_filename, image_data)
+        if near_duplicates and self.duplicate_policy == "reject":
+            self.duplicate_index.remove(output_filename)
+            self.artifacts.unlink(output_filename)
+            closest = near_duplicates[0]
+            return {
+                "success": False,
+                "error": f"'{output_filename}' is a near-duplicate of '{closest['filename']}' (distance {closest['distance']}); not saved",
+                "prompt": prompt,
+                "filename": output_filename,
+                "near_duplicates": near_duplicates
+            }
+        
+        # Determine file extension from mime type
+        file_extension = mimetypes.guess_extension(mime_type) or ".png"
+        digest = hashlib.sha256(image_data).hexdigest()
+        image_path = self.artifacts.path_for(digest, file_extension)
+        
+        # Save the image in the background; callers use the in-memory bytes
+        image_write = None
+        if self.persist_images:
+            image_write = self._image_writer.submit(self._write_image, image_data, file_extension, digest)
+            self.artifacts.link(output_filename, digest, file_extension, len(image_data))
+        
+        print(f"✅ Image generated successfully: {image_path}")
+        
+        # Create metadata
+        metadata = self.create_metadata(
+            name=f"AI Generated NFT - {output_filename}",
+            description=f"AI-generated artwork created from prompt: '{prompt}'",
+            image_path=str(image_path),
+            prompt=prompt,
+            attributes=[
+                {"trait_type": "Generation Method", "value": "Gemini 2.5 Flash Image"},
+                {"trait_type": "Created", "value": datetime.now().isoformat()},
+            ]
+        )
+        
+        if metadata_overrides:
+            overrides = dict(metadata_overrides)
+            metadata["attributes"].extend(overrides.pop("attributes", []))
+            metadata.update(overrides)
+        
+        # Save metadata (concurrent generations share one commit)
+        self.metadata.save(output_filename, metadata)
+        metadata_path = self.metadata.location(output_filename)
+        
+        print(f"✅ Metadata saved: {output_filename}")
+        self.notify_metadata(output_filename, metadata)
+        
+        return {
+            "success": True,
+            "image_bytes": image_data,
+            "mime_type": mime_type,
+            "image_write": image_write,
+            "image_path": str(image_path),
+            "metadata_path": str(metadata_path),
+            "metadata": metadata,
+            "prompt": prompt,
+            "filename": output_filename,
+            "near_duplicates": near_duplicates
+        }
+    
+    def find_near_duplicates(self, filename: str, image_data: bytes) -> list:
+        """
+        Index a new image and return earlier images that look nearly the same.
+        
+        Returns:
+            list: [{"filename", "distance"}], closest first (empty when disabled)
+        """
+        if self.duplicate_index is None:
+            return []
+        try:
+            duplicates = self.duplicate_index.check(filename, image_data)
+        except Exception as e:
+            print(f"⚠️  Could not hash {filename}: {e}")
+            return []
+        if duplicates:
+            print(f"👯 {filename} looks like {duplicates[0]['filename']} (distance {duplicates[0]['distance']})")
+        return duplicates
+    
+    def _cached_result(self, cached: dict, prompt: str, result_key: str) -> dict:
+        """Build a generate_image() result from a prompt cache entry (None if its metadata is gone)"""
+        metadata = self.metadata.get(cached["filename"])
+        if metadata is None:
+            return None
+        with open(cached["image_path"], 'rb') as f:
+            image_data = f.read()
+        
+        ipfs = None
+        if cached["image_cid"]:
+            ipfs = {
+                "image_cid": cached["image_cid"],
+                "image_ipfs_uri": f"ipfs://{cached['image_cid']}",
+                "metadata_cid": cached["metadata_cid"],
+                "metadata_ipfs_uri": f"ipfs://{cached['metadata_cid']}" if cached["metadata_cid"] else None,
             }
+        
+        print(f"⚡ Prompt cache hit: {cached['filename']}")
+        return {
+            "success": True,
+            "image_bytes": image_data,
+            "mime_type": cached["mime_type"],
+            "image_write": None,
+            "image_path": cached["image_path"],
+            "metadata_path": cached["metadata_path"],
+            "metadata": metadata,
+            "prompt": prompt,
+            "filename": cached["filename"],
+            "cached": True,
+            "cache_key": result_key,
+            "ipfs": ipfs
+        }
+    
+    def _link_result(self, source: dict, output_filename: str, rename: bool = True) -> dict:
+        """
+        Give the image(s) of an existing result a new artifact with its own metadata record.
+        
+        The new name points at the stored content, so nothing is generated or
+        written again, and the new artifact is pinned and minted independently.
+        
+        Args:
+            source: generate_image() style result (variations included)
+            output_filename: Name for the new artifact; variations get "_v2", "_v3", ...
+            rename: Name the metadata after the new artifact. Off for prompt cache hits,
+                    whose pinned metadata (and its CIDs) is reused as is.
+            
+        Returns:
+            dict: generate_image() style result for the new artifact
+        """
+        artifacts = source.get("variations") or [source]
+        filenames = [output_filename] + [self.artifacts.reserve_name(f"{output_filename}_v{i + 1}") for i in range(1, len(artifacts))]
+        linked = []
+        for filename, artifact in zip(filenames, artifacts):
+            if self.persist_images:
+                self.artifacts.link(
+                    filename,
+                    hashlib.sha256(artifact["image_bytes"]).hexdigest(),
+                    Path(artifact["image_path"]).suffix,
+                    len(artifact["image_bytes"])
+                )
+            
+            metadata = copy.deepcopy(artifact["metadata"])
+            # Minting belongs to the source artifact
+            metadata.pop("token_id", None)
+            metadata.pop("transaction_hash", None)
+            if rename:
+                metadata["name"] = f"AI Generated NFT - {filename}"
+            if len(artifacts) > 1:
+                metadata.update({"variation_group": output_filename, "variations": filenames})
+            self.metadata.save(filename, metadata)
+            self.notify_metadata(filename, metadata)
+            linked.append(dict(artifact, filename=filename, metadata=metadata, metadata_path=str(self.metadata.location(filename))))
+        
+        print(f"🔗 Linked {source['filename']} as {output_filename}")
+        result = dict(source, **linked[0])
+        if len(linked) > 1:
+            result["variations"] = linked
+        return result
+    
+    def _write_image(self, image_data: bytes, extension: str, digest: str) -> str:
+        """Store image bytes atomically in the artifact store (runs on the image writer pool)"""
+        _, image_path = self.artifacts.put(image_data, extension, digest)
+        return str(image_path)
     
     def create_metadata(
         self,
@@ -199,52 +895,98 @@ class NFTGenerator:
         
         return metadata
     
-    def generate_batch(self, prompts: list[str]) -> list[dict]:
+    def submit_generation(self, prompt: str, output_filename: Optional[str] = None, **kwargs) -> Future:
+        """
+        Queue a generation on the shared, bounded generation pool.
+        
+        Args:
+            prompt: Text description of the image to generate
+            output_filename: Optional custom filename (without extension)
+            **kwargs: Further generate_image() options
+            
+        Returns:
+            Future: Resolves to the generate_image() result dict
+        """
+        return self._generation_pool.submit(self.generate_image, prompt, output_filename, **kwargs)
+    
+    def generate_batch(self, prompts: list[str], on_result: Optional[Callable[[int, dict], None]] = None) -> list[dict]:
         """
         Generate multiple NFTs from a list of prompts.
         
+        Prompts are generated concurrently on the shared worker pool (bounded by
+        GEMINI_MAX_CONCURRENCY and the GEMINI_RPM token bucket), so wall-clock
+        time approaches that of the slowest single item.
+        
         Args:
             prompts: List of text prompts
+            on_result: Optional callback(index, result) invoked as soon as each
+                       item finishes, e.g. to start its IPFS upload
             
         Returns:
-            list: Results for each generation
+            list: Results for each generation, in prompt order
         """
-        results = []
+        results = [None] * len(prompts)
+        futures = {self.submit_generation(prompt): i for i, prompt in enumerate(prompts)}
         
-        for i, prompt in enumerate(prompts, 1):
-            print(f"\n📦 Generating NFT {i}/{len(prompts)}")
-            result = self.generate_image(prompt)
-            results.append(result)
+        for done, future in enumerate(as_completed(futures), 1):
+            i = futures[future]
+            results[i] = future.result()
+            print(f"\n📦 Generated NFT {done}/{len(prompts)} (prompt {i + 1})")
+            if on_result:
+                on_result(i, results[i])
         
         print(f"\n✅ Batch generation complete! {len(results)} NFTs generated.")
         return results
     
-    def update_metadata_with_ipfs(self, metadata_path: str, ipfs_image_uri: str, ipfs_metadata_uri: Optional[str] = None) -> dict:
+    def update_metadata_with_ipfs(
+        self,
+        metadata_path: str,
+        ipfs_image_uri: str,
+        ipfs_metadata_uri: Optional[str] = None,
+        fields: Optional[dict] = None
+    ) -> Optional[dict]:
         """
-        Update metadata file with IPFS URIs after uploading to IPFS.
+        Update stored metadata with IPFS URIs after uploading to IPFS.
         
         Args:
-            metadata_path: Path to the metadata JSON file
+            metadata_path: Artifact name, its metadata location ("metadata.db#name")
+                           or the path of an exported metadata JSON file
             ipfs_image_uri: IPFS URI for the image (e.g., ipfs://Qm...)
             ipfs_metadata_uri: Optional IPFS URI for the metadata itself
+            fields: Optional further fields that were pinned (e.g. a customized name)
             
         Returns:
-            dict: Updated metadata
+            dict: Updated metadata, or None if the artifact is unknown
         """
-        with open(metadata_path, 'r') as f:
-            metadata = json.load(f)
-        
-        # Update image URI to IPFS
-        metadata["image"] = ipfs_image_uri
-        
+        name = metadata_path.rsplit("#", 1)[1] if "#" in metadata_path else Path(metadata_path).stem
+        changes = dict(fields or {})
+        changes["image"] = ipfs_image_uri
         if ipfs_metadata_uri:
-            metadata["metadata_uri"] = ipfs_metadata_uri
+            changes["metadata_uri"] = ipfs_metadata_uri
         
-        # Save updated metadata
-        with open(metadata_path, 'w') as f:
-            json.dump(metadata, f, indent=2)
+        # Read-modify-write happens inside the metadata writer, so it is atomic
+        metadata = self.metadata.update(name, changes)
+        if metadata is None:
+            print(f"⚠️  No metadata to update for {name}")
+            return None
         
-        print(f"✅ Updated metadata with IPFS URI: {metadata_path}")
+        print(f"✅ Updated metadata with IPFS URI: {name}")
+        self.notify_metadata(name, metadata)
+        return metadata
+    
+    def record_mint(self, filename: str, token_id: int, transaction_hash: Optional[str] = None) -> Optional[dict]:
+        """
+        Record the token minted for an artifact.
+        
+        Returns:
+            dict: Updated metadata, or None if the artifact is unknown
+        """
+        changes = {"token_id": token_id}
+        if transaction_hash:
+            changes["transaction_hash"] = transaction_hash
+        metadata = self.metadata.update(filename, changes)
+        if metadata is not None:
+            self.notify_metadata(filename, metadata)
         return metadata
 
 
@@ -272,6 +1014,8 @@ if __name__ == "__main__":
     )
     
     if result["success"]:
+        if result["image_write"]:
+            result["image_write"].result()
         print(f"\n🎉 NFT Generated Successfully!")
         print(f"Image: {result['image_path']}")
         print(f"Metadata: {result['metadata_path']}")
@@ -0,0 +1,166 @@
+"""
+Pre-Pin Image Encoder
+Transcodes generated images to a smaller format (lossless WebP, AVIF or an
+optimized PNG) in a process pool before they are pinned; the original file
+stays on disk untouched
+"""
+
+import io
+import os
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Tuple
+
+from PIL import Image
+
+try:
+    # Registers AVIF support on Pillow releases without a built-in AVIF codec
+    import pillow_avif  # noqa: F401
+except ImportError:
+    pass
+
+# Output format -> (Pillow format name, mime type, file extension)
+FORMATS = {
+    "webp": ("WEBP", "image/webp", ".webp"),
+    "avif": ("AVIF", "image/avif", ".avif"),
+    "png": ("PNG", "image/png", ".png"),
+}
+
+
+def worker_context():
+    """
+    Start method for the image process pools: forkserver where available,
+    otherwise spawn. Forking the threaded server would copy locks held by
+    other threads (SQLite, logging, thread pools) into the workers; these
+    workers start clean and only import the module of their entry point.
+    """
+    method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    return multiprocessing.get_context(method)
+
+
+def encode_image(image_data: bytes, output_format: str, quality: int = 80, lossless: bool = True) -> Tuple[bytes, str]:
+    """
+    Transcode one image (runs inside the encoder's worker processes).
+
+    Args:
+        image_data: Original image bytes
+        output_format: "webp", "avif" or "png"
+        quality: Lossy quality (0-100); for lossless WebP it is the compression effort
+        lossless: Encode WebP losslessly (AVIF is always lossy)
+
+    Returns:
+        tuple: (encoded bytes, original format name, e.g. "PNG")
+    """
+    pil_format = FORMATS[output_format][0]
+    with Image.open(io.BytesIO(image_data)) as image:
+        original_format = image.format or "unknown"
+        image.load()
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "A" in image.getbands() or "transparency" in image.info else "RGB")
+
+        buffer = io.BytesIO()
+        if output_format == "webp":
+            image.save(buffer, pil_format, lossless=lossless, quality=quality, method=6 if lossless else 4)
+        elif output_format == "avif":
+            image.save(buffer, pil_format, quality=quality, speed=6)
+        else:
+            image.save(buffer, pil_format, optimize=True)
+    return buffer.getvalue(), original_format
+
+
+class ImageEncoder:
+    """Encode images for pinning on a pool of worker processes"""
+
+    def __init__(self, output_format: str = "webp", quality: int = 80, lossless: bool = True, workers: Optional[int] = None):
+        """
+        Args:
+            output_format: "webp", "avif" or "png"
+            quality: Lossy quality (0-100), or WebP compression effort when lossless
+            lossless: Encode WebP losslessly (AVIF is always lossy)
+            workers: Worker processes (defaults to the CPU count)
+        """
+        output_format = output_format.lower()
+        if output_format not in FORMATS:
+            raise ValueError(f"Unknown image encode format '{output_format}'. Use one of: {', '.join(FORMATS)}.")
+        Image.init()
+        if FORMATS[output_format][0] not in Image.SAVE:
+            hint = " (install pillow-avif-plugin)" if output_format == "avif" else ""
+            raise ValueError(f"This Pillow build cannot write {output_format.upper()}{hint}")
+        self.output_format = output_format
+        self.mime_type, self.extension = FORMATS[output_format][1:]
+        self.quality = quality
+        self.lossless = lossless
+        self.workers = workers or os.cpu_count() or 1
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self.encoded = 0
+        self.bytes_in = 0
+        self.bytes_saved = 0
+
+    @classmethod
+    def from_env(cls) -> Optional["ImageEncoder"]:
+        """Encoder configured by IMAGE_ENCODE_* env vars, or None when IMAGE_ENCODE_FORMAT is unset/off"""
+        output_format = os.getenv("IMAGE_ENCODE_FORMAT", "off").lower()
+        if output_format in ("", "off", "none"):
+            return None
+        return cls(
+            output_format=output_format,
+            quality=int(os.getenv("IMAGE_ENCODE_QUALITY", "80")),
+            lossless=os.getenv("IMAGE_ENCODE_LOSSLESS", "true").lower() in ("1", "true", "yes"),
+            workers=int(os.getenv("IMAGE_ENCODE_WORKERS", "0")) or None
+        )
+
+    def _executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            return self._get_pool()
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=worker_context())
+        return self._pool
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def encode(self, image_data: bytes) -> dict:
+        """
+        Encode an image for pinning. The original is kept when encoding does
+        not make it smaller.
+
+        Returns:
+            dict: {"data", "mime_type", "extension", "encoded" (bool), "original_format",
+                   "original_bytes", "encoded_bytes", "bytes_saved"}
+        """
+        encoded, original_format = self._executor().submit(
+            encode_image, image_data, self.output_format, self.quality, self.lossless
+        ).result()
+
+        original_bytes = len(image_data)
+        kept = len(encoded) >= original_bytes
+        result = {
+            "data": image_data if kept else encoded,
+            "mime_type": None if kept else self.mime_type,
+            "extension": None if kept else self.extension,
+            "encoded": not kept,
+            "original_format": original_format.lower(),
+            "original_bytes": original_bytes,
+            "encoded_bytes": original_bytes if kept else len(encoded),
+            "bytes_saved": 0 if kept else original_bytes - len(encoded),
+        }
+        with self._lock:
+            self.encoded += 1
+            self.bytes_in += original_bytes
+            self.bytes_saved += result["bytes_saved"]
+        return result
+
+    def stats(self) -> dict:
+        return {
+            "format": self.output_format,
+            "lossless": self.lossless,
+            "encoded": self.encoded,
+            "bytes_in": self.bytes_in,
+            "bytes_saved": self.bytes_saved,
+        }
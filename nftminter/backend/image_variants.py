@@ -0,0 +1,220 @@
+"""
+Responsive Image Variants
+Resized / re-encoded copies of generated images (thumbnails, WebP tiles),
+rendered on first request in a process pool and kept in a size-bounded
+disk cache with least-recently-used eviction
+"""
+
+import io
+import os
+import hashlib
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from PIL import Image
+
+from image_encoder import FORMATS as ENCODE_FORMATS, worker_context
+from singleflight import SingleFlight
+
+# Variant format -> (Pillow format name, mime type, file extension)
+FORMATS = {**ENCODE_FORMATS, "jpeg": ("JPEG", "image/jpeg", ".jpg")}
+
+# Requested widths are rounded up to one of these, so the cache stays bounded
+DEFAULT_WIDTHS = [64, 128, 256, 512, 1024, 2048]
+
+
+def render_variant(source_path: str, width: Optional[int], output_format: str, quality: int) -> bytes:
+    """
+    Resize and encode one image (runs inside the worker processes).
+
+    Args:
+        source_path: Original image file
+        width: Target width in pixels (None keeps the original size); never upscales
+        output_format: Key of FORMATS
+        quality: Encoder quality for lossy formats
+
+    Returns:
+        bytes: Encoded variant
+    """
+    pil_format = FORMATS[output_format][0]
+    with Image.open(source_path) as image:
+        if width and width < image.width:
+            height = max(1, round(image.height * width / image.width))
+            # Decode JPEGs at reduced scale before resampling
+            image.draft("RGB", (width, height))
+            image = image.resize((width, height), Image.LANCZOS, reducing_gap=3.0)
+        else:
+            image.load()
+        if output_format == "jpeg" and image.mode != "RGB":
+            image = image.convert("RGB")
+        elif image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA")
+
+        buffer = io.BytesIO()
+        if output_format == "png":
+            image.save(buffer, pil_format, optimize=True)
+        elif output_format == "webp":
+            image.save(buffer, pil_format, quality=quality, method=4)
+        elif output_format == "avif":
+            image.save(buffer, pil_format, quality=quality, speed=8)
+        else:
+            image.save(buffer, pil_format, quality=quality, optimize=True, progressive=True)
+    return buffer.getvalue()
+
+
+class ImageVariantCache:
+    """Disk cache of image variants, rendered on demand"""
+
+    def __init__(
+        self,
+        cache_dir: str = "generated_nfts/variants",
+        max_bytes: int = 512 * 1024 * 1024,
+        workers: Optional[int] = None,
+        widths: Optional[List[int]] = None,
+        quality: int = 80
+    ):
+        """
+        Args:
+            cache_dir: Directory for rendered variants
+            max_bytes: Size budget; least-recently-served variants are evicted beyond it
+            workers: Render processes (defaults to the CPU count)
+            widths: Allowed variant widths (requests are rounded up to the next one)
+            quality: Encoder quality for lossy formats
+        """
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.workers = workers or os.cpu_count() or 1
+        self.widths = sorted(widths or DEFAULT_WIDTHS)
+        self.quality = quality
+
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+        self._disk_lock = threading.Lock()
+        self._inflight = SingleFlight()
+
+        # One-time scan so the budget survives restarts
+        self._disk_used = sum(p.stat().st_size for p in self.cache_dir.glob("*/*") if p.is_file())
+        self.stats = {"hits": 0, "renders": 0, "evictions": 0}
+
+    @classmethod
+    def from_env(cls) -> "ImageVariantCache":
+        widths = os.getenv("IMAGE_VARIANT_WIDTHS")
+        return cls(
+            cache_dir=os.getenv("IMAGE_VARIANT_DIR", "generated_nfts/variants"),
+            max_bytes=int(float(os.getenv("IMAGE_VARIANT_CACHE_MB", "512")) * 1024 * 1024),
+            workers=int(os.getenv("IMAGE_VARIANT_WORKERS", "0")) or None,
+            widths=[int(w) for w in widths.split(",") if w.strip()] if widths else None,
+            quality=int(os.getenv("IMAGE_VARIANT_QUALITY", "80"))
+        )
+
+    def _executor(self) -> ProcessPoolExecutor:
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=worker_context())
+            return self._pool
+
+    def shutdown(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
+    def snap_width(self, width: Optional[int]) -> Optional[int]:
+        """Round a requested width up to the next allowed width (None = original size)"""
+        if not width:
+            return None
+        for allowed in self.widths:
+            if allowed >= width:
+                return allowed
+        return None
+
+    def _variant_path(self, source: Path, width: Optional[int], output_format: str) -> Path:
+        st = source.stat()
+        # Source size and mtime are part of the key, so a replaced original gets fresh variants
+        key = f"{source.resolve()}|{st.st_size}|{st.st_mtime_ns}|{width or 0}|{output_format}|{self.quality}"
+        digest = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        return self.cache_dir / digest[:2] / f"{source.stem}_w{width or 0}_{digest[:16]}{FORMATS[output_format][2]}"
+
+    def get(self, source: Path, width: Optional[int] = None, output_format: str = "webp") -> Tuple[Path, str]:
+        """
+        Return the cached variant of an image, rendering it on a miss.
+        Concurrent requests for the same variant share one render.
+
+        Args:
+            source: Original image file
+            width: Requested width (rounded up to an allowed width)
+            output_format: Key of FORMATS
+
+        Returns:
+            tuple: (variant file path, mime type)
+
+        Raises:
+            FileNotFoundError: The original does not exist
+            ValueError: Unknown or unsupported format
+        """
+        if output_format not in FORMATS:
+            raise ValueError(f"Unknown image format '{output_format}'. Use one of: {', '.join(FORMATS)}.")
+        Image.init()
+        if FORMATS[output_format][0] not in Image.SAVE:
+            raise ValueError(f"This server cannot encode {output_format.upper()} images")
+        width = self.snap_width(width)
+        path = self._variant_path(Path(source), width, output_format)
+        mime_type = FORMATS[output_format][1]
+
+        try:
+            # mtime doubles as the last-access time for LRU eviction
+            os.utime(path)
+            self.stats["hits"] += 1
+            return path, mime_type
+        except FileNotFoundError:
+            pass
+
+        self._inflight.do(path, self._render, Path(source), width, output_format, path)
+        return path, mime_type
+
+    def _render(self, source: Path, width: Optional[int], output_format: str, path: Path):
+        if path.exists():
+            return
+        data = self._executor().submit(render_variant, str(source), width, output_format, self.quality).result()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f".{path.name}.{threading.get_ident()}.tmp")
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, path)
+        self.stats["renders"] += 1
+
+        with self._disk_lock:
+            self._disk_used += len(data)
+            if self._disk_used > self.max_bytes:
+                self._evict(keep=path)
+
+    def _evict(self, keep: Path):
+        """Evict least-recently-served variants until the cache is at 90% of budget"""
+        entries = []
+        for p in self.cache_dir.glob("*/*"):
+            if p.name.startswith(".") or p == keep:
+                continue
+            try:
+                st = p.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, p))
+        entries.sort()
+
+        target = int(self.max_bytes * 0.9)
+        used = sum(size for _, size, _ in entries) + (keep.stat().st_size if keep.exists() else 0)
+        for _, size, p in entries:
+            if used <= target:
+                break
+            try:
+                p.unlink()
+                used -= size
+                self.stats["evictions"] += 1
+            except FileNotFoundError:
+                pass
+        self._disk_used = used
+
+    def usage(self) -> dict:
+        return {"disk_bytes": self._disk_used, "disk_budget": self.max_bytes, **self.stats}
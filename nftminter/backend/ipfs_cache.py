@@ -0,0 +1,306 @@
+"""
+IPFS Gateway Read Cache
+CID-keyed read-through cache (memory + disk) for pinned images and metadata.
+Misses are fetched by racing several public gateways for trustless responses
+that are verified against the CID.
+"""
+
+import os
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Optional, List
+
+import requests
+
+from ipfs_uploader import IPFSBackend
+from ipfs_verify import RAW, VerificationError, decode_cid, verified_content
+
+
+DEFAULT_GATEWAYS = [
+    "https://gateway.pinata.cloud/ipfs",
+    "https://ipfs.io/ipfs",
+    "https://dweb.link/ipfs",
+]
+
+# CIDv0 (base58btc "Qm...") or CIDv1 in base32 ("b...")
+CID_PATTERN = re.compile(r"^(Qm[1-9A-HJ-NP-Za-km-z]{44}|b[a-z2-7]{50,100})$")
+
+
+class IPFSFetchError(Exception):
+    """Raised when no gateway could return the requested content"""
+
+
+def is_valid_cid(cid: str) -> bool:
+    """Check that a string looks like an IPFS CID (also guards cache paths)"""
+    return bool(CID_PATTERN.match(cid))
+
+
+def guess_media_type(data: bytes) -> str:
+    """Guess a content type from the first bytes of IPFS content"""
+    if data.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if data.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if data[:6] in (b"GIF87a", b"GIF89a"):
+        return "image/gif"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    if data[4:12] in (b"ftypavif", b"ftypavis"):
+        return "image/avif"
+    if data.lstrip()[:1] in (b"{", b"["):
+        return "application/json"
+    return "application/octet-stream"
+
+
+class IPFSReadCache:
+    """
+    Read-through cache for immutable IPFS content.
+
+    CIDs never change, so entries are never invalidated: both tiers are only
+    bounded by size and evict least-recently-used content.
+    """
+
+    def __init__(
+        self,
+        gateways: Optional[List[str]] = None,
+        cache_dir: str = "generated_nfts/ipfs_cache",
+        memory_bytes: int = 64 * 1024 * 1024,
+        disk_bytes: int = 1024 * 1024 * 1024,
+        max_item_bytes: int = 32 * 1024 * 1024,
+        timeout: float = 15.0,
+        local_backend: Optional[IPFSBackend] = None
+    ):
+        """
+        Initialize the read cache.
+
+        Args:
+            gateways: Gateway base URLs to race (".../ipfs"). Defaults to IPFS_GATEWAYS
+                      env var (comma separated) or a list of public gateways. They
+                      must answer ?format=raw and ?format=car (trustless gateway).
+            cache_dir: Directory for the disk tier
+            memory_bytes: Size budget for the memory tier
+            disk_bytes: Size budget for the disk tier
+            max_item_bytes: Largest object that will be fetched and cached
+            timeout: Per-gateway request timeout in seconds
+            local_backend: Optional backend that can serve content directly
+                           (e.g. the in-memory fake), tried before the gateways
+        """
+        if gateways is None:
+            env_gateways = os.getenv("IPFS_GATEWAYS")
+            gateways = [g.strip() for g in env_gateways.split(",") if g.strip()] if env_gateways else DEFAULT_GATEWAYS
+        self.gateways = [g.rstrip("/") for g in gateways]
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self.max_item_bytes = max_item_bytes
+        self.timeout = timeout
+        self.local_backend = local_backend
+
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_used = 0
+        self._lock = threading.Lock()
+        self._disk_lock = threading.Lock()
+        self._session = requests.Session()
+        self._executor = ThreadPoolExecutor(max_workers=max(4, len(self.gateways) * 4), thread_name_prefix="ipfs-gateway")
+
+        # One-time scan so the disk budget survives restarts
+        self._disk_used = sum(p.stat().st_size for p in self.cache_dir.glob("*/*") if p.is_file())
+
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+
+    def get(self, cid: str) -> bytes:
+        """
+        Return the content for a CID, fetching and caching it on a miss.
+
+        Args:
+            cid: IPFS content identifier
+
+        Returns:
+            bytes: Content bytes
+
+        Raises:
+            ValueError: Malformed CID, or one whose content cannot be verified
+            IPFSFetchError: No gateway returned verifiable content
+        """
+        if not is_valid_cid(cid):
+            raise ValueError(f"Invalid CID: {cid}")
+        try:
+            codec, _ = decode_cid(cid)
+        except VerificationError as e:
+            raise ValueError(str(e))
+
+        data = self._memory_get(cid)
+        if data is not None:
+            self.stats["memory_hits"] += 1
+            return data
+
+        data = self._disk_get(cid)
+        if data is not None:
+            self.stats["disk_hits"] += 1
+            self._memory_put(cid, data)
+            return data
+
+        self.stats["misses"] += 1
+        data = self._fetch(cid, codec)
+        self._disk_put(cid, data)
+        self._memory_put(cid, data)
+        return data
+
+    def usage(self) -> dict:
+        """Current cache usage and hit counters"""
+        with self._lock:
+            memory_used, memory_items = self._memory_used, len(self._memory)
+        return {
+            "memory_bytes": memory_used,
+            "memory_items": memory_items,
+            "memory_budget": self.memory_bytes,
+            "disk_bytes": self._disk_used,
+            "disk_budget": self.disk_bytes,
+            **self.stats
+        }
+
+    # Memory tier
+
+    def _memory_get(self, cid: str) -> Optional[bytes]:
+        with self._lock:
+            data = self._memory.get(cid)
+            if data is not None:
+                self._memory.move_to_end(cid)
+            return data
+
+    def _memory_put(self, cid: str, data: bytes):
+        if len(data) > self.memory_bytes // 4:
+            return  # Large objects only live on disk
+        with self._lock:
+            if cid in self._memory:
+                return
+            self._memory[cid] = data
+            self._memory_used += len(data)
+            while self._memory_used > self.memory_bytes:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_used -= len(evicted)
+
+    # Disk tier
+
+    def _disk_path(self, cid: str) -> Path:
+        return self.cache_dir / cid[-2:] / cid
+
+    def _disk_get(self, cid: str) -> Optional[bytes]:
+        path = self._disk_path(cid)
+        try:
+            data = path.read_bytes()
+        except FileNotFoundError:
+            return None
+        # mtime doubles as the last-access time for LRU eviction
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return data
+
+    def _disk_put(self, cid: str, data: bytes):
+        path = self._disk_path(cid)
+        if path.exists():
+            return
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f".{cid}.{threading.get_ident()}.tmp")
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, path)
+
+        with self._disk_lock:
+            self._disk_used += len(data)
+            if self._disk_used > self.disk_bytes:
+                self._evict_disk()
+
+    def _evict_disk(self):
+        """Evict least-recently-used files until the disk tier is at 90% of budget"""
+        entries = []
+        for p in self.cache_dir.glob("*/*"):
+            try:
+                st = p.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, p))
+        entries.sort()
+
+        target = int(self.disk_bytes * 0.9)
+        used = sum(size for _, size, _ in entries)
+        for _, size, p in entries:
+            if used <= target:
+                break
+            try:
+                p.unlink()
+                used -= size
+            except FileNotFoundError:
+                pass
+        self._disk_used = used
+
+    # Fetching
+
+    def _fetch_from_gateway(self, gateway: str, cid: str, codec: int, settled: threading.Event, responses: list) -> bytes:
+        # A single verifiable block for raw CIDs, the whole DAG as a CAR otherwise
+        if codec == RAW:
+            url, accept, limit = f"{gateway}/{cid}?format=raw", "application/vnd.ipld.raw", self.max_item_bytes
+        else:
+            # CAR framing and UnixFS nodes add a little to the file size
+            url, accept, limit = f"{gateway}/{cid}?format=car&dag-scope=all", "application/vnd.ipld.car", self.max_item_bytes + self.max_item_bytes // 8 + 64 * 1024
+        if settled.is_set():
+            raise IPFSFetchError("Another gateway already answered")
+        response = self._session.get(url, headers={"Accept": accept}, timeout=self.timeout, stream=True)
+        with self._lock:
+            responses.append(response)
+        with response:
+            response.raise_for_status()
+            chunks, size = [], 0
+            for chunk in response.iter_content(chunk_size=64 * 1024):
+                if settled.is_set():
+                    raise IPFSFetchError("Another gateway already answered")
+                size += len(chunk)
+                if size > limit:
+                    raise IPFSFetchError(f"{cid} exceeds max cached size of {self.max_item_bytes} bytes")
+                chunks.append(chunk)
+
+        try:
+            return verified_content(cid, b"".join(chunks), self.max_item_bytes)
+        except VerificationError as e:
+            raise IPFSFetchError(f"{gateway} returned content that does not match {cid}: {e}")
+
+    def _fetch(self, cid: str, codec: int) -> bytes:
+        """Fetch a CID by racing all configured gateways; first verified response wins"""
+        if self.local_backend is not None and hasattr(self.local_backend, "get"):
+            try:
+                return bytes(self.local_backend.get(cid))
+            except KeyError:
+                pass
+
+        settled = threading.Event()
+        responses = []
+        futures = {
+            self._executor.submit(self._fetch_from_gateway, gateway, cid, codec, settled, responses): gateway
+            for gateway in self.gateways
+        }
+        errors = []
+        try:
+            for future in as_completed(futures):
+                try:
+                    data = future.result()
+                except Exception as e:
+                    errors.append(f"{futures[future]}: {e}")
+                    continue
+                print(f"📥 Fetched {cid} from {futures[future]}")
+                return data
+        finally:
+            # Stop the losing requests instead of letting them download in the background
+            settled.set()
+            for future in futures:
+                future.cancel()
+            with self._lock:
+                losers = list(responses)
+            for response in losers:
+                response.close()
+
+        raise IPFSFetchError(f"Could not fetch {cid} from any gateway: " + "; ".join(errors))
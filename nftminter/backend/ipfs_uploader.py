@@ -1,91 +1,441 @@
 """
 IPFS Uploader using Pinata
 Handles uploading images and metadata to IPFS
+
+The actual pinning is delegated to a pluggable backend:
+- PinataBackend: hosted pinning via https://api.pinata.cloud (default)
+- KuboBackend: a self-hosted Kubo (go-ipfs) node's HTTP API
+- InMemoryBackend: in-process content-addressed store for tests and offline benchmarks
 """
 
 import os
 import json
+import time
+import base64
+import random
+import hashlib
+import threading
 import requests
+from datetime import datetime, timezone
 from pathlib import Path
-from typing import Optional, Dict
+from typing import Optional, Dict, List, Union, BinaryIO
 from dotenv import load_dotenv
 
+from singleflight import SingleFlight
+
 load_dotenv()
 
+# Image content accepted by the uploader: a file path, in-memory bytes or a binary stream
+ImageSource = Union[str, Path, bytes, bytearray, memoryview, BinaryIO]
 
-class IPFSUploader:
-    """Handle IPFS uploads using Pinata API"""
+
+class IPFSBackendError(Exception):
+    """Raised by a backend when content could not be pinned"""
+
+
+# Kubo's default chunk size: larger files are split into a dag-pb tree of blocks
+CHUNK_SIZE = 256 * 1024
+
+# date_pinned of pins whose pin date is unknown (sorts before every real date)
+UNKNOWN_DATE = "1970-01-01T00:00:00+00:00"
+
+
+def json_bytes(content: dict) -> bytes:
+    """The exact bytes pinned for a JSON document (compact separators)"""
+    return json.dumps(content, separators=(",", ":")).encode("utf-8")
+
+
+def compute_cid(data: bytes) -> str:
+    """
+    Compute the CIDv1 (raw codec, sha2-256, base32) for a block of bytes.
     
-    def __init__(self, jwt: Optional[str] = None):
-        """
-        Initialize IPFS uploader with Pinata.
+    For content up to CHUNK_SIZE this is the CID a Kubo node returns when
+    adding with --cid-version=1 (raw leaves). Kubo splits larger content into
+    a dag-pb tree, so its CID differs from this single-block CID (which is
+    still a valid, verifiable CID for the same bytes).
+    
+    Args:
+        data: Raw content bytes
         
+    Returns:
+        str: CID string, e.g. "bafkrei..."
+    """
+    digest = hashlib.sha256(data).digest()
+    # <cid-version=1><codec=raw 0x55><multihash sha2-256 0x12><length 32>
+    cid_bytes = bytes([0x01, 0x55, 0x12, 0x20]) + digest
+    return "b" + base64.b32encode(cid_bytes).decode("ascii").lower().rstrip("=")
+
+
+class IPFSBackend:
+    """Interface for services that can pin content to IPFS"""
+    
+    name = "base"
+    gateway_base = "https://gateway.pinata.cloud/ipfs"
+    
+    def pin_file(self, data: Union[bytes, memoryview, BinaryIO], filename: str) -> str:
+        """Pin file content (bytes or a binary stream) and return the resulting CID"""
+        raise NotImplementedError
+    
+    def pin_json(self, content: dict, name: str) -> str:
+        """Pin a JSON document and return the resulting CID"""
+        raise NotImplementedError
+    
+    def list_pins(self, offset: int = 0, limit: int = 1000, since: Optional[str] = None) -> List[dict]:
+        """
+        Return one page of pinned content, as dicts with cid, name, size and
+        date_pinned (ISO 8601). If since is given, only pins at or after it.
+        """
+        raise NotImplementedError(f"{self.name} backend cannot list pins")
+    
+    def unpin(self, cid: str):
+        """Remove a pin"""
+        raise NotImplementedError(f"{self.name} backend cannot unpin")
+    
+    def gateway_url(self, cid: str) -> str:
+        """HTTP gateway URL for a CID"""
+        return f"{self.gateway_base}/{cid}"
+
+
+class PinataBackend(IPFSBackend):
+    """Pin content using the Pinata API"""
+    
+    name = "pinata"
+    
+    def __init__(self, jwt: Optional[str] = None, base_url: str = "https://api.pinata.cloud"):
+        """
         Args:
             jwt: Pinata JWT token. If None, will use PINATA_JWT env var.
+            base_url: Pinata API base URL
         """
         self.jwt = jwt or os.getenv("PINATA_JWT")
         if not self.jwt:
             raise ValueError("PINATA_JWT not found. Please set it in your .env file.")
         
-        self.base_url = "https://api.pinata.cloud"
+        self.base_url = base_url
         self.headers = {
             "Authorization": f"Bearer {self.jwt}"
         }
+        self.gateway_base = os.getenv("PINATA_GATEWAY_URL", "https://gateway.pinata.cloud/ipfs")
+    
+    def pin_file(self, data: Union[bytes, memoryview, BinaryIO], filename: str) -> str:
+        response = requests.post(
+            f"{self.base_url}/pinning/pinFileToIPFS",
+            headers=self.headers,
+            files={"file": (filename, data)},
+            data={"pinataMetadata": json.dumps({"name": filename})}
+        )
+        response.raise_for_status()
+        return response.json()["IpfsHash"]
+    
+    def pin_json(self, content: dict, name: str) -> str:
+        # Upload JSON directly using pinJSONToIPFS endpoint
+        response = requests.post(
+            f"{self.base_url}/pinning/pinJSONToIPFS",
+            headers={
+                **self.headers,
+                "Content-Type": "application/json"
+            },
+            json={
+                "pinataContent": content,
+                "pinataMetadata": {
+                    "name": name
+                }
+            }
+        )
+        response.raise_for_status()
+        return response.json()["IpfsHash"]
+    
+    def list_pins(self, offset: int = 0, limit: int = 1000, since: Optional[str] = None) -> List[dict]:
+        params = {"status": "pinned", "pageLimit": limit, "pageOffset": offset}
+        if since:
+            params["pinStart"] = since
+        response = requests.get(f"{self.base_url}/data/pinList", headers=self.headers, params=params)
+        response.raise_for_status()
+        return [
+            {
+                "cid": row["ipfs_pin_hash"],
+                "name": (row.get("metadata") or {}).get("name"),
+                "size": row.get("size") or 0,
+                "date_pinned": row["date_pinned"]
+            }
+            for row in response.json().get("rows", [])
+        ]
+    
+    def unpin(self, cid: str):
+        response = requests.delete(f"{self.base_url}/pinning/unpin/{cid}", headers=self.headers)
+        response.raise_for_status()
+
+
+class KuboBackend(IPFSBackend):
+    """Pin content on a local or self-hosted Kubo node through its HTTP RPC API"""
+    
+    name = "kubo"
     
-    def upload_image(self, image_path: str) -> Dict[str, str]:
+    def __init__(self, api_url: Optional[str] = None, gateway_base: Optional[str] = None):
         """
-        Upload an image to IPFS via Pinata.
+        Args:
+            api_url: Kubo RPC API URL. If None, will use KUBO_API_URL env var
+                     (default http://127.0.0.1:5001).
+            gateway_base: Gateway used for gateway URLs. If None, will use
+                          KUBO_GATEWAY_URL env var (default http://127.0.0.1:8080/ipfs).
+        """
+        self.api_url = (api_url or os.getenv("KUBO_API_URL", "http://127.0.0.1:5001")).rstrip("/")
+        self.gateway_base = (gateway_base or os.getenv("KUBO_GATEWAY_URL", "http://127.0.0.1:8080/ipfs")).rstrip("/")
+    
+    def pin_file(self, data: Union[bytes, memoryview, BinaryIO], filename: str) -> str:
+        # Kubo does not track pin dates, so the date goes into the pin name ("<date> <filename>")
+        pin_name = f"{datetime.now(timezone.utc).isoformat()} {filename}"
+        response = requests.post(
+            f"{self.api_url}/api/v0/add",
+            params={"cid-version": 1, "pin": "true", "pin-name": pin_name},
+            files={"file": (filename, data)}
+        )
+        response.raise_for_status()
+        return response.json()["Hash"]
+    
+    def pin_json(self, content: dict, name: str) -> str:
+        return self.pin_file(json_bytes(content), name)
+    
+    @staticmethod
+    def _parse_pin_name(pin_name: Optional[str]):
+        """(filename, date_pinned) from a pin name; pins made elsewhere get UNKNOWN_DATE"""
+        date, _, filename = (pin_name or "").partition(" ")
+        try:
+            datetime.fromisoformat(date)
+        except ValueError:
+            return pin_name or None, UNKNOWN_DATE
+        return filename or None, date
+    
+    def list_pins(self, offset: int = 0, limit: int = 1000, since: Optional[str] = None) -> List[dict]:
+        # Pins without a dated name (made outside this service) only show up in full listings
+        response = requests.post(f"{self.api_url}/api/v0/pin/ls", params={"type": "recursive", "names": "true"})
+        response.raise_for_status()
+        pins = []
+        for cid, info in (response.json().get("Keys") or {}).items():
+            name, date_pinned = self._parse_pin_name((info or {}).get("Name"))
+            if since and date_pinned < since:
+                continue
+            pins.append({"cid": cid, "name": name, "size": 0, "date_pinned": date_pinned})
+        pins.sort(key=lambda pin: (pin["date_pinned"], pin["cid"]), reverse=True)
+        return pins[offset:offset + limit]
+    
+    def unpin(self, cid: str):
+        response = requests.post(f"{self.api_url}/api/v0/pin/rm", params={"arg": cid})
+        response.raise_for_status()
+
+
+class InMemoryBackend(IPFSBackend):
+    """
+    In-process content-addressed store.
+    
+    Returns real CIDv1 identifiers without touching the network, and can
+    simulate upstream latency and failures for load tests and CI. Content is
+    stored as a single raw block, so CIDs of content larger than CHUNK_SIZE
+    differ from the ones a Kubo node or Pinata would return.
+    """
+    
+    name = "memory"
+    
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0, seed: Optional[int] = None):
+        """
+        Args:
+            latency: Seconds to sleep per pin call
+            jitter: Extra uniformly distributed random delay (seconds)
+            error_rate: Probability (0-1) that a pin call fails
+            seed: Optional seed for reproducible error injection
+        """
+        if not 0.0 <= error_rate <= 1.0:
+            raise ValueError("error_rate must be between 0 and 1")
+        
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.blocks: Dict[str, bytes] = {}
+        self.pins: Dict[str, dict] = {}
+        self.gateway_base = "memory://ipfs"
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+    
+    def _simulate(self):
+        with self._lock:
+            delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0.0)
+            fail = self._random.random() < self.error_rate
+        if delay:
+            time.sleep(delay)
+        if fail:
+            raise IPFSBackendError("Injected failure from in-memory IPFS backend")
+    
+    def pin_file(self, data: Union[bytes, memoryview, BinaryIO], filename: str) -> str:
+        self._simulate()
+        data = data.read() if hasattr(data, "read") else bytes(data)
+        cid = compute_cid(data)
+        with self._lock:
+            self.blocks[cid] = data
+            self.pins.setdefault(cid, {
+                "cid": cid,
+                "name": filename,
+                "size": len(data),
+                "date_pinned": datetime.now(timezone.utc).isoformat()
+            })
+        return cid
+    
+    def pin_json(self, content: dict, name: str) -> str:
+        return self.pin_file(json_bytes(content), name)
+    
+    def list_pins(self, offset: int = 0, limit: int = 1000, since: Optional[str] = None) -> List[dict]:
+        with self._lock:
+            pins = sorted(self.pins.values(), key=lambda pin: pin["date_pinned"], reverse=True)
+        if since:
+            pins = [pin for pin in pins if pin["date_pinned"] >= since]
+        return [dict(pin) for pin in pins[offset:offset + limit]]
+    
+    def unpin(self, cid: str):
+        with self._lock:
+            if cid not in self.pins:
+                raise IPFSBackendError(f"{cid} is not pinned")
+            del self.pins[cid]
+            del self.blocks[cid]
+    
+    def get(self, cid: str) -> bytes:
+        """Return previously pinned content"""
+        with self._lock:
+            if cid not in self.blocks:
+                raise KeyError(cid)
+            return self.blocks[cid]
+
+
+def create_backend(name: Optional[str] = None) -> IPFSBackend:
+    """
+    Create an IPFS backend from configuration.
+    
+    Args:
+        name: Backend name (pinata, kubo, memory). If None, will use
+              IPFS_BACKEND env var (default pinata).
+        
+    Returns:
+        IPFSBackend: Configured backend
+    """
+    name = (name or os.getenv("IPFS_BACKEND", "pinata")).strip().lower()
+    
+    if name == "pinata":
+        return PinataBackend()
+    if name == "kubo":
+        return KuboBackend()
+    if name == "memory":
+        seed = os.getenv("IPFS_FAKE_SEED")
+        return InMemoryBackend(
+            latency=float(os.getenv("IPFS_FAKE_LATENCY", "0")),
+            jitter=float(os.getenv("IPFS_FAKE_JITTER", "0")),
+            error_rate=float(os.getenv("IPFS_FAKE_ERROR_RATE", "0")),
+            seed=int(seed) if seed else None
+        )
+    
+    raise ValueError(f"Unknown IPFS_BACKEND '{name}'. Use one of: pinata, kubo, memory.")
+
+
+class IPFSUploader:
+    """Handle IPFS uploads using a pluggable pinning backend (Pinata by default)"""
+    
+    def __init__(self, jwt: Optional[str] = None, backend: Optional[IPFSBackend] = None, pin_mirror=None):
+        """
+        Initialize IPFS uploader.
         
         Args:
-            image_path: Path to the image file
+            jwt: Pinata JWT token. If None, will use PINATA_JWT env var.
+            backend: Pinning backend. If None, a PinataBackend is created.
+            pin_mirror: Optional PinMirror that records every pin we create
+        """
+        self.backend = backend or PinataBackend(jwt=jwt)
+        self.pin_mirror = pin_mirror
+        
+        # Concurrent uploads of identical content share one pin request
+        self._inflight = SingleFlight()
+    
+    def is_pinned(self, cid: str) -> bool:
+        """Check the local pin mirror for a CID (no API call)"""
+        return self.pin_mirror.is_pinned(cid) if self.pin_mirror else False
+    
+    def pin_usage(self) -> Dict[str, int]:
+        """Pin count and stored bytes from the local pin mirror"""
+        if not self.pin_mirror:
+            return {"pin_count": 0, "total_bytes": 0, "last_sync_at": None}
+        return self.pin_mirror.usage()
+    
+    def sync_pins(self, full: bool = False) -> Dict[str, int]:
+        """Sync the local pin mirror from the backend's pin list"""
+        if not self.pin_mirror:
+            raise ValueError("No pin mirror configured")
+        return self.pin_mirror.sync(full=full)
+    
+    def _record_pin(self, cid: str, name: str, size: Optional[int]):
+        if self.pin_mirror:
+            self.pin_mirror.record(cid, name=name, size=size)
+    
+    def _result(self, cid: str) -> Dict[str, str]:
+        return {
+            "cid": cid,
+            "ipfs_uri": f"ipfs://{cid}",
+            "gateway_url": self.backend.gateway_url(cid)
+        }
+    
+    def _pin_path(self, image_path: Union[str, Path], filename: str) -> str:
+        with open(image_path, 'rb') as f:
+            return self.backend.pin_file(f, filename)
+    
+    def upload_image(self, image: ImageSource, filename: Optional[str] = None) -> Dict[str, str]:
+        """
+        Upload an image to IPFS.
+        
+        Args:
+            image: Path to the image file, in-memory image bytes, or a binary stream
+            filename: Name to pin the image under (defaults to the file name)
             
         Returns:
             dict: Contains IPFS CID and full URI
         """
-        print(f"📤 Uploading image to IPFS (Pinata): {image_path}")
-        
-        if not Path(image_path).exists():
-            raise FileNotFoundError(f"Image not found: {image_path}")
+        if isinstance(image, (str, Path)):
+            image_path = Path(image)
+            filename = filename or image_path.name
+            print(f"📤 Uploading image to IPFS ({self.backend.name}): {image_path}")
+            
+            if not image_path.exists():
+                raise FileNotFoundError(f"Image not found: {image_path}")
+        else:
+            filename = filename or "image.png"
+            print(f"📤 Uploading image to IPFS ({self.backend.name}) from memory: {filename}")
         
         try:
-            # Upload the file
-            with open(image_path, 'rb') as f:
-                files = {
-                    'file': f
-                }
-                response = requests.post(
-                    f"{self.base_url}/pinning/pinFileToIPFS",
-                    headers=self.headers,
-                    files=files
-                )
-            
-            response.raise_for_status()
-            data = response.json()
+            # Upload the file (files are streamed rather than read into memory)
+            if isinstance(image, (str, Path)):
+                size = os.path.getsize(image)
+                cid, _ = self._inflight.do(("file", str(Path(image).resolve())), self._pin_path, image, filename)
+            elif hasattr(image, "read"):
+                size = None
+                cid = self.backend.pin_file(image, filename)
+            else:
+                size = memoryview(image).nbytes
+                key = ("bytes", hashlib.sha256(image).hexdigest())
+                cid, _ = self._inflight.do(key, self.backend.pin_file, image, filename)
             
-            cid = data["IpfsHash"]
-            ipfs_uri = f"ipfs://{cid}"
-            gateway_url = f"https://gateway.pinata.cloud/ipfs/{cid}"
+            self._record_pin(cid, filename, size)
+            result = self._result(cid)
             
             print(f"✅ Image uploaded to IPFS!")
             print(f"   CID: {cid}")
-            print(f"   IPFS URI: {ipfs_uri}")
-            print(f"   Gateway URL: {gateway_url}")
+            print(f"   IPFS URI: {result['ipfs_uri']}")
+            print(f"   Gateway URL: {result['gateway_url']}")
             
-            return {
-                "cid": cid,
-                "ipfs_uri": ipfs_uri,
-                "gateway_url": gateway_url
-            }
+            return result
         
-        except requests.exceptions.RequestException as e:
+        except (requests.exceptions.RequestException, IPFSBackendError) as e:
             print(f"❌ Error uploading image to IPFS: {str(e)}")
-            if hasattr(e.response, 'text'):
+            if getattr(e, 'response', None) is not None:
                 print(f"   Response: {e.response.text}")
             raise Exception(f"IPFS upload failed: {str(e)}")
     
     def upload_metadata(self, metadata: dict, filename: str = "metadata.json") -> Dict[str, str]:
         """
-        Upload NFT metadata to IPFS via Pinata.
+        Upload NFT metadata to IPFS.
         
         Args:
             metadata: NFT metadata dictionary
@@ -94,55 +444,35 @@ class IPFSUploader:
         Returns:
             dict: Contains IPFS CID and full URI
         """
-        print(f"📤 Uploading metadata to IPFS (Pinata)...")
+        print(f"📤 Uploading metadata to IPFS ({self.backend.name})...")
         
         try:
-            # Upload JSON directly using pinJSONToIPFS endpoint
-            response = requests.post(
-                f"{self.base_url}/pinning/pinJSONToIPFS",
-                headers={
-                    **self.headers,
-                    "Content-Type": "application/json"
-                },
-                json={
-                    "pinataContent": metadata,
-                    "pinataMetadata": {
-                        "name": filename
-                    }
-                }
-            )
-            
-            response.raise_for_status()
-            data = response.json()
-            
-            cid = data["IpfsHash"]
-            ipfs_uri = f"ipfs://{cid}"
-            gateway_url = f"https://gateway.pinata.cloud/ipfs/{cid}"
+            key = ("json", filename, hashlib.sha256(json.dumps(metadata, sort_keys=True).encode("utf-8")).hexdigest())
+            cid, _ = self._inflight.do(key, self.backend.pin_json, metadata, filename)
+            self._record_pin(cid, filename, len(json_bytes(metadata)))
+            result = self._result(cid)
             
             print(f"✅ Metadata uploaded to IPFS!")
             print(f"   CID: {cid}")
-            print(f"   IPFS URI: {ipfs_uri}")
-            print(f"   Gateway URL: {gateway_url}")
+            print(f"   IPFS URI: {result['ipfs_uri']}")
+            print(f"   Gateway URL: {result['gateway_url']}")
             
-            return {
-                "cid": cid,
-                "ipfs_uri": ipfs_uri,
-                "gateway_url": gateway_url
-            }
+            return result
         
-        except requests.exceptions.RequestException as e:
+        except (requests.exceptions.RequestException, IPFSBackendError) as e:
             print(f"❌ Error uploading metadata to IPFS: {str(e)}")
-            if hasattr(e.response, 'text'):
+            if getattr(e, 'response', None) is not None:
                 print(f"   Response: {e.response.text}")
             raise Exception(f"IPFS metadata upload failed: {str(e)}")
     
-    def upload_nft_complete(self, image_path: str, metadata: dict) -> Dict[str, str]:
+    def upload_nft_complete(self, image: ImageSource, metadata: dict, filename: Optional[str] = None) -> Dict[str, str]:
         """
         Complete NFT upload: image + metadata with updated image URI.
         
         Args:
-            image_path: Path to the NFT image
+            image: Path to the NFT image, in-memory image bytes, or a binary stream
             metadata: NFT metadata (will be updated with IPFS image URI)
+            filename: Name to pin the image under (defaults to the file name)
             
         Returns:
             dict: Contains all IPFS URIs and CIDs
@@ -150,7 +480,7 @@ class IPFSUploader:
         print(f"\n🚀 Starting complete NFT upload to IPFS...")
         
         # Step 1: Upload image
-        image_result = self.upload_image(image_path)
+        image_result = self.upload_image(image, filename=filename)
         
         # Step 2: Update metadata with IPFS image URI
         metadata["image"] = image_result["ipfs_uri"]
@@ -173,7 +503,7 @@ class IPFSUploader:
 # Standalone function for quick upload
 def upload_to_ipfs(image_path: str, metadata: dict, jwt: Optional[str] = None) -> Dict[str, str]:
     """
-    Quick function to upload an NFT to IPFS via Pinata.
+    Quick function to upload an NFT to IPFS via the configured backend.
     
     Args:
         image_path: Path to the image file
@@ -183,14 +513,14 @@ def upload_to_ipfs(image_path: str, metadata: dict, jwt: Optional[str] = None) -
     Returns:
         dict: IPFS upload results
     """
-    uploader = IPFSUploader(jwt=jwt)
+    uploader = IPFSUploader(backend=PinataBackend(jwt=jwt) if jwt else create_backend())
     return uploader.upload_nft_complete(image_path, metadata)
 
 
 # Example usage
 if __name__ == "__main__":
-    # Test upload (requires PINATA_JWT in .env)
-    print("🧪 Testing IPFS uploader with Pinata...")
+    # Test upload (requires PINATA_JWT in .env, or IPFS_BACKEND=memory / kubo)
+    print("🧪 Testing IPFS uploader...")
     
     # You would normally have these from generateNft.py
     test_image = "generated_nfts/images/test_image.png"
@@ -202,7 +532,7 @@ if __name__ == "__main__":
     }
     
     try:
-        uploader = IPFSUploader()
+        uploader = IPFSUploader(backend=create_backend())
         result = uploader.upload_nft_complete(test_image, test_metadata)
         print(f"\n✅ Test successful!")
         print(f"Use this URI for minting: {result['metadata_ipfs_uri']}")
@@ -0,0 +1,253 @@
+"""
+Trustless IPFS Responses
+Decodes CIDs, raw blocks and CAR files returned by trustless gateways
+(?format=raw / ?format=car), checks every block against the hash in its CID
+and reassembles UnixFS files, so no gateway has to be trusted
+"""
+
+import base64
+import hashlib
+from typing import Dict, List, Tuple
+
+# Multicodecs of the content we can verify and reassemble
+RAW = 0x55
+DAG_PB = 0x70
+
+# Multihash functions
+IDENTITY = 0x00
+SHA2_256 = 0x12
+
+# UnixFS node types that carry file bytes
+UNIXFS_RAW = 0
+UNIXFS_FILE = 2
+
+BASE58_ALPHABET = "123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz"
+
+
+class VerificationError(Exception):
+    """Raised when content does not match its CID or cannot be decoded"""
+
+
+def _varint(buf: bytes, pos: int) -> Tuple[int, int]:
+    """Decode an unsigned LEB128 varint; returns (value, next position)"""
+    value, shift = 0, 0
+    while True:
+        if pos >= len(buf) or shift > 63:
+            raise VerificationError("Truncated varint")
+        byte = buf[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return value, pos
+        shift += 7
+
+
+def _base58_decode(text: str) -> bytes:
+    value = 0
+    for char in text:
+        index = BASE58_ALPHABET.find(char)
+        if index < 0:
+            raise VerificationError(f"Invalid base58 character '{char}'")
+        value = value * 58 + index
+    raw = value.to_bytes((value.bit_length() + 7) // 8, "big")
+    return b"\x00" * (len(text) - len(text.lstrip("1"))) + raw
+
+
+def _read_cid(buf: bytes, pos: int) -> Tuple[int, bytes, int]:
+    """
+    Read a binary CID.
+
+    Returns:
+        tuple: (codec, multihash bytes, next position)
+    """
+    if buf[pos:pos + 2] == b"\x12\x20":
+        # CIDv0: a bare sha2-256 multihash of a dag-pb block
+        end = pos + 34
+        if end > len(buf):
+            raise VerificationError("Truncated CID")
+        return DAG_PB, bytes(buf[pos:end]), end
+    version, pos = _varint(buf, pos)
+    if version != 1:
+        raise VerificationError(f"Unsupported CID version {version}")
+    codec, pos = _varint(buf, pos)
+    start = pos
+    _, pos = _varint(buf, pos)
+    length, pos = _varint(buf, pos)
+    end = pos + length
+    if end > len(buf):
+        raise VerificationError("Truncated CID")
+    return codec, bytes(buf[start:end]), end
+
+
+def decode_cid(cid: str) -> Tuple[int, bytes]:
+    """
+    Decode a CIDv0 ("Qm...") or base32 CIDv1 ("b...").
+
+    Returns:
+        tuple: (codec, multihash bytes)
+
+    Raises:
+        VerificationError: Malformed CID, or a codec / hash this module cannot verify
+    """
+    if cid.startswith("Qm"):
+        raw = _base58_decode(cid)
+    elif cid.startswith("b"):
+        body = cid[1:].upper()
+        try:
+            raw = base64.b32decode(body + "=" * (-len(body) % 8))
+        except ValueError:
+            raise VerificationError(f"Invalid base32 CID: {cid}")
+    else:
+        raise VerificationError(f"Unsupported CID encoding: {cid}")
+
+    codec, multihash, end = _read_cid(raw, 0)
+    if end != len(raw):
+        raise VerificationError(f"Trailing bytes in CID: {cid}")
+    if codec not in (RAW, DAG_PB):
+        raise VerificationError(f"Unsupported codec 0x{codec:x} in {cid}")
+    if multihash[0] not in (SHA2_256, IDENTITY):
+        raise VerificationError(f"Unsupported hash function 0x{multihash[0]:x} in {cid}")
+    return codec, multihash
+
+
+def verify_block(multihash: bytes, data: bytes) -> bool:
+    """Whether a block hashes to the given multihash"""
+    code, pos = _varint(multihash, 0)
+    length, pos = _varint(multihash, pos)
+    digest = multihash[pos:]
+    if len(digest) != length:
+        return False
+    if code == SHA2_256:
+        return hashlib.sha256(data).digest() == digest
+    if code == IDENTITY:
+        return bytes(data) == digest
+    return False
+
+
+def read_car(data: bytes) -> Dict[bytes, Tuple[int, bytes]]:
+    """
+    Read a CARv1 file, verifying every block.
+
+    Returns:
+        dict: {multihash: (codec, block bytes)}
+    """
+    header_length, pos = _varint(data, 0)
+    pos += header_length
+    if pos > len(data):
+        raise VerificationError("Truncated CAR header")
+
+    blocks = {}
+    while pos < len(data):
+        length, pos = _varint(data, pos)
+        end = pos + length
+        if end > len(data):
+            raise VerificationError("Truncated CAR block")
+        codec, multihash, pos = _read_cid(data, pos)
+        block = data[pos:end]
+        if not verify_block(multihash, block):
+            raise VerificationError("CAR block does not match its CID")
+        blocks[multihash] = (codec, block)
+        pos = end
+    return blocks
+
+
+def _fields(buf: bytes) -> List[Tuple[int, object]]:
+    """Decode a protobuf message into (field number, value) pairs (varint and bytes fields only)"""
+    fields, pos = [], 0
+    while pos < len(buf):
+        key, pos = _varint(buf, pos)
+        number, wire_type = key >> 3, key & 0x07
+        if wire_type == 0:
+            value, pos = _varint(buf, pos)
+        elif wire_type == 2:
+            length, pos = _varint(buf, pos)
+            value = buf[pos:pos + length]
+            if len(value) != length:
+                raise VerificationError("Truncated protobuf field")
+            pos += length
+        else:
+            raise VerificationError(f"Unsupported protobuf wire type {wire_type}")
+        fields.append((number, value))
+    return fields
+
+
+def _dag_pb_node(block: bytes) -> Tuple[bytes, List[Tuple[int, bytes]]]:
+    """
+    Decode a dag-pb UnixFS file node.
+
+    Returns:
+        tuple: (inline file bytes, [(child codec, child multihash)] in order)
+    """
+    links, unixfs = [], b""
+    for number, value in _fields(block):
+        if number == 2:
+            for link_number, link_value in _fields(value):
+                if link_number == 1:
+                    codec, multihash, _ = _read_cid(link_value, 0)
+                    links.append((codec, multihash))
+        elif number == 1:
+            unixfs = value
+
+    node_type, inline = None, b""
+    for number, value in _fields(unixfs):
+        if number == 1:
+            node_type = value
+        elif number == 2:
+            inline = value
+    if node_type not in (UNIXFS_RAW, UNIXFS_FILE):
+        raise VerificationError(f"UnixFS node type {node_type} is not a file")
+    return bytes(inline), links
+
+
+def unixfs_file(codec: int, multihash: bytes, blocks: Dict[bytes, Tuple[int, bytes]], max_bytes: int) -> bytes:
+    """
+    Reassemble a file from verified blocks, depth first in link order.
+
+    Raises:
+        VerificationError: A block is missing, is not a file, or the file exceeds max_bytes
+    """
+    parts, size = [], 0
+    stack = [(codec, multihash)]
+    while stack:
+        codec, multihash = stack.pop()
+        if multihash[0] == IDENTITY:
+            block = multihash[2:]
+        elif multihash in blocks:
+            block = blocks[multihash][1]
+        else:
+            raise VerificationError("CAR is missing a block of the file")
+        if codec == RAW:
+            data, links = block, []
+        elif codec == DAG_PB:
+            data, links = _dag_pb_node(block)
+        else:
+            raise VerificationError(f"Unsupported codec 0x{codec:x} in file DAG")
+        size += len(data)
+        if size > max_bytes:
+            raise VerificationError(f"File exceeds {max_bytes} bytes")
+        parts.append(data)
+        stack.extend(reversed(links))
+    return b"".join(parts)
+
+
+def verified_content(cid: str, body: bytes, max_bytes: int) -> bytes:
+    """
+    File bytes of a trustless gateway response for a CID.
+
+    Args:
+        cid: Requested CID
+        body: ?format=raw block for raw CIDs, ?format=car archive otherwise
+        max_bytes: Largest file accepted
+
+    Returns:
+        bytes: Content, verified block by block
+
+    Raises:
+        VerificationError: The response does not prove the content of the CID
+    """
+    codec, multihash = decode_cid(cid)
+    if codec == RAW:
+        if not verify_block(multihash, body):
+            raise VerificationError(f"Block does not match {cid}")
+        return bytes(body)
+    return unixfs_file(codec, multihash, read_car(body), max_bytes)
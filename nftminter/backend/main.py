@@ -4,18 +4,33 @@ Provides REST API endpoints for generating and minting NFTs
 """
 
 import os
-from typing import Optional, List
+import re
+import json
+import asyncio
+import threading
+from typing import Optional, List, Dict, Union
 from datetime import datetime
 from pathlib import Path
 
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Query, UploadFile, File, Form, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, RedirectResponse, Response, StreamingResponse
 from pydantic import BaseModel, Field
 
 from generateNft import NFTGenerator, generate_nft_from_prompt
-from ipfs_uploader import IPFSUploader
+from ipfs_uploader import IPFSUploader, create_backend
+from upload_outbox import UploadOutbox, HOOK_RECORD_CIDS, HOOK_RECORD_PINNED
+from image_encoder import ImageEncoder
+from image_variants import ImageVariantCache, FORMATS as VARIANT_FORMATS
+from pin_mirror import PinMirror
+from collection_jobs import CollectionJobStore, CollectionRunner, expand_template, parse_jsonl, RUNNING, PAUSED, CANCELLED, MODE_INTERACTIVE, MODE_LAYERED
+from trait_compositor import LayerSet, TraitCompositor, chroma_key, LAYER_PROMPT_TEMPLATE, BACKGROUND_PROMPT_TEMPLATE
+from rarity_index import RarityIndex
+from gallery_index import GalleryIndex, SORTS as GALLERY_SORTS
+from retention import RetentionManager
+from ipfs_cache import IPFSReadCache, IPFSFetchError, is_valid_cid, guess_media_type
+from token_server import TokenMetadataServer, CACHE_CONTROL as TOKEN_CACHE_CONTROL, etag_matches, accepts_gzip
 from blockchain_minter import BlockchainMinter
 
 # Load environment variables from .env file
@@ -30,6 +45,9 @@ class GenerateNFTRequest(BaseModel):
     prompt: str = Field(..., description="Text prompt to generate NFT image", min_length=3)
     name: Optional[str] = Field(None, description="Optional custom name for the NFT")
     description: Optional[str] = Field(None, description="Optional custom description")
+    strict: bool = Field(False, description="Only share an in-flight generation with requests using the same name")
+    variations: int = Field(1, description="Number of variations to generate in one call; pick one with /api/v1/pin/{filename}", ge=1, le=4)
+    quality: str = Field("final", description="'draft' returns a low-cost preview to finalize later; 'final' generates and pins", pattern="^(draft|final)$")
 
 
 class GenerateNFTResponse(BaseModel):
@@ -42,17 +60,66 @@ class GenerateNFTResponse(BaseModel):
     filename: Optional[str] = None
     image_ipfs_uri: Optional[str] = None
     metadata_ipfs_uri: Optional[str] = None
+    upload_id: Optional[str] = None
+    variations: Optional[List[dict]] = None
+    draft_id: Optional[str] = None
+    preview_url: Optional[str] = None
+    near_duplicates: Optional[List[dict]] = None
     error: Optional[str] = None
 
 
+class PinArtifactRequest(BaseModel):
+    name: Optional[str] = Field(None, description="Optional custom name for the NFT")
+    description: Optional[str] = Field(None, description="Optional custom description")
+
+
 class BatchGenerateRequest(BaseModel):
     prompts: List[str] = Field(..., description="List of prompts to generate NFTs", min_items=1, max_items=10)
 
 
+# Upper bound for a single collection job
+COLLECTION_MAX_ITEMS = 10000
+
+
+class CollectionJobRequest(BaseModel):
+    name: str = Field(..., description="Collection name, used for item names (\"Name #1\")", min_length=1)
+    description: Optional[str] = Field(None, description="Optional description applied to every item")
+    template: str = Field(..., description="Prompt template with {trait} placeholders", min_length=3)
+    traits: Dict[str, Union[List[str], Dict[str, float]]] = Field(..., description="Values (or value -> weight) per placeholder")
+    count: int = Field(..., description="Number of items to generate", ge=1, le=COLLECTION_MAX_ITEMS)
+    seed: Optional[int] = Field(None, description="Seed for reproducible trait sampling")
+    upload: bool = Field(True, description="Queue each finished item for IPFS upload")
+    mode: str = Field(MODE_INTERACTIVE, description="'interactive' (one call per item) or 'batch' (offline Gemini batch jobs)", pattern="^(interactive|batch)$")
+
+
+class LayeredCollectionRequest(BaseModel):
+    name: str = Field(..., description="Collection name, used for item names (\"Name #1\")", min_length=1)
+    description: Optional[str] = Field(None, description="Optional description applied to every item")
+    count: int = Field(..., description="Number of items to compose", ge=1, le=COLLECTION_MAX_ITEMS)
+    seed: Optional[int] = Field(None, description="Seed for reproducible trait sampling")
+    upload: bool = Field(True, description="Queue each finished item for IPFS upload")
+
+
+class GenerateLayerRequest(BaseModel):
+    trait_type: str = Field(..., description="Trait the layer belongs to, e.g. 'Background' or 'Hat'", min_length=1)
+    value: str = Field(..., description="Trait value, e.g. 'Sunset'", min_length=1)
+    prompt: str = Field(..., description="What the layer should show", min_length=3)
+    weight: float = Field(1.0, description="Relative sampling weight", gt=0)
+    background: bool = Field(False, description="Full-frame background layer (no transparency)")
+    order: Optional[int] = Field(None, description="Draw order for a new trait type", ge=0)
+
+
 class HealthResponse(BaseModel):
     status: str
     timestamp: str
     api_configured: bool
+    gemini: Optional[dict] = None
+    image_encoding: Optional[dict] = None
+    metadata: Optional[dict] = None
+
+
+class MetadataExportRequest(BaseModel):
+    filenames: Optional[List[str]] = Field(None, description="Artifacts to export (default: all)")
 
 
 class MintNFTRequest(BaseModel):
@@ -61,6 +128,7 @@ class MintNFTRequest(BaseModel):
     description: Optional[str] = Field(None, description="Optional description")
     recipient_address: Optional[str] = Field(None, description="Recipient address (defaults to minter)")
     network: str = Field("sepolia", description="Blockchain network (sepolia, ganache-local)")
+    strict: bool = Field(False, description="Only share an in-flight generation with requests using the same name")
 
 
 class MintNFTResponse(BaseModel):
@@ -102,14 +170,111 @@ except ValueError as e:
     nft_generator = None
 
 # Initialize IPFS Uploader (optional, will check on use)
+# IPFS_BACKEND selects the pinning backend: pinata (default), kubo or memory
 try:
-    ipfs_uploader = IPFSUploader()
-    print("✅ IPFS Uploader initialized (Pinata)")
+    ipfs_backend = create_backend()
+    ipfs_uploader = IPFSUploader(
+        backend=ipfs_backend,
+        # Local SQLite mirror of our pins ("is this pinned?", storage totals)
+        pin_mirror=PinMirror(ipfs_backend, db_path=os.getenv("PIN_MIRROR_PATH", "generated_nfts/pins.db"))
+    )
+    print(f"✅ IPFS Uploader initialized ({ipfs_uploader.backend.name})")
 except ValueError as e:
     print(f"⚠️  Warning: {e}")
-    print("IPFS uploads will fail without PINATA_JWT")
+    print("IPFS uploads will fail without PINATA_JWT (or set IPFS_BACKEND=kubo / memory)")
     ipfs_uploader = None
 
+# Optional transcoding before pinning (IMAGE_ENCODE_FORMAT: webp, avif, png or off)
+try:
+    image_encoder = ImageEncoder.from_env()
+    if image_encoder:
+        print(f"✅ Images are encoded as {image_encoder.output_format} before pinning")
+except ValueError as e:
+    print(f"⚠️  Warning: {e}")
+    print("Images will be pinned in their original format")
+    image_encoder = None
+
+def record_upload(artifact: str, hook: str, metadata: dict, ipfs_result: dict):
+    """Outbox completion hook: store an artifact's CIDs (and pinned fields) with its metadata"""
+    if not nft_generator or not artifact:
+        return
+    fields = None
+    if hook == HOOK_RECORD_PINNED:
+        fields = {k: metadata[k] for k in ("name", "description") if k in metadata}
+    nft_generator.update_metadata_with_ipfs(
+        artifact, ipfs_result["image_ipfs_uri"], ipfs_result["metadata_ipfs_uri"], fields=fields
+    )
+
+
+# Durable upload outbox: every artifact is persisted before upload and
+# retried in the background, so IPFS outages never discard generated images
+upload_outbox = UploadOutbox(
+    ipfs_uploader,
+    db_path=os.getenv("UPLOAD_OUTBOX_PATH", "generated_nfts/upload_outbox.db"),
+    workers=int(os.getenv("UPLOAD_OUTBOX_WORKERS", "2")),
+    encoder=image_encoder,
+    on_complete=record_upload
+) if ipfs_uploader else None
+
+# How long a request waits for its upload before answering with the upload ID
+UPLOAD_WAIT_SECONDS = float(os.getenv("UPLOAD_WAIT_SECONDS", "60"))
+
+# Resumable collection jobs (progress checkpointed per item)
+collection_store = CollectionJobStore(db_path=os.getenv("COLLECTIONS_DB_PATH", "generated_nfts/collections.db"))
+# Local compositing of AI-generated trait layers for layered collections
+trait_layers = LayerSet(os.getenv("TRAIT_LAYERS_DIR", "generated_nfts/layers"))
+trait_compositor = TraitCompositor(
+    trait_layers,
+    workers=int(os.getenv("COMPOSITOR_WORKERS", "0")) or None,
+    size=int(os.getenv("COMPOSITOR_SIZE", "0")) or None,
+    cache_bytes=int(float(os.getenv("COMPOSITOR_CACHE_MB", "256")) * 1024 * 1024),
+    on_metadata=nft_generator.notify_metadata if nft_generator else None,
+    store=nft_generator.artifacts if nft_generator else None,
+    metadata_store=nft_generator.metadata if nft_generator else None
+)
+
+# Columnar trait index for collection rarity, kept current as metadata is written
+rarity_index = RarityIndex()
+if nft_generator:
+    nft_generator.add_metadata_listener(rarity_index.update)
+
+# Sorted in-memory listing for /api/v1/gallery, kept current the same way
+gallery_index = GalleryIndex()
+if nft_generator:
+    nft_generator.add_metadata_listener(gallery_index.update)
+
+collection_runner = CollectionRunner(
+    collection_store,
+    nft_generator,
+    upload_outbox,
+    batch_size=int(os.getenv("GEMINI_BATCH_MAX_REQUESTS", "32")),
+    batch_poll_interval=float(os.getenv("GEMINI_BATCH_POLL_SECONDS", "30")),
+    compositor=trait_compositor
+) if nft_generator else None
+
+# Byte/count budget for stored images; only pinned artifacts are evicted (RETENTION_MAX_MB / RETENTION_MAX_ITEMS)
+retention = RetentionManager.from_env(
+    nft_generator.artifacts,
+    nft_generator.metadata,
+    pin_mirror=ipfs_uploader.pin_mirror if ipfs_uploader else None
+) if nft_generator else None
+
+# Thumbnails and re-encoded copies for /api/v1/image (?w=&format=), rendered on demand
+image_variants = ImageVariantCache.from_env()
+
+# Read-through cache for pinned content (gateways from IPFS_GATEWAYS)
+ipfs_cache = IPFSReadCache(
+    cache_dir=os.getenv("IPFS_CACHE_DIR", "generated_nfts/ipfs_cache"),
+    memory_bytes=int(os.getenv("IPFS_CACHE_MEMORY_MB", "64")) * 1024 * 1024,
+    disk_bytes=int(os.getenv("IPFS_CACHE_DISK_MB", "1024")) * 1024 * 1024,
+    local_backend=ipfs_uploader.backend if ipfs_uploader else None
+)
+
+# Optional ERC-721 metadata server (TOKEN_METADATA_SERVER=true): token ID -> pinned metadata
+token_server = TokenMetadataServer.from_env(ipfs_cache.get)
+if token_server and nft_generator:
+    nft_generator.add_metadata_listener(token_server.update)
+
 # Initialize Blockchain Minter (optional, will check on use)
 try:
     contract_address = os.getenv("CONTRACT_ADDRESS")
@@ -124,6 +289,159 @@ except ValueError as e:
     blockchain_minter = None
 
 
+def queue_upload(result: dict, metadata: dict, customized: bool = False):
+    """
+    Queue a generation result for IPFS upload.
+    
+    The in-memory image is handed over until its background write reaches
+    disk (the outbox keeps it itself if the write fails), and is released
+    from the result.
+    Once pinned, the CIDs are remembered by the prompt cache (the metadata CID
+    only when the metadata was not customized for this request).
+    """
+    image_bytes = result.pop("image_bytes", None)
+    image_write = result.pop("image_write", None)
+    # The outbox records the CIDs (and the metadata as pinned) in the metadata store
+    upload = upload_outbox.enqueue(
+        result["image_path"],
+        metadata,
+        image_bytes=image_bytes,
+        persisted=image_write is not None or image_bytes is None or Path(result["image_path"]).exists(),
+        artifact_name=result.get("filename"),
+        hook=(HOOK_RECORD_PINNED if customized else HOOK_RECORD_CIDS) if result.get("filename") else None,
+        image_write=image_write
+    )
+    
+    if result.get("cache_key") and nft_generator.prompt_cache:
+        def remember_cids(future, key=result["cache_key"]):
+            if not future.cancelled() and future.exception() is None:
+                ipfs_result = future.result()
+                nft_generator.prompt_cache.record_cids(
+                    key,
+                    image_cid=ipfs_result["image_cid"],
+                    metadata_cid=None if customized else ipfs_result["metadata_cid"]
+                )
+        upload.future.add_done_callback(remember_cids)
+    
+    return upload
+
+
+def artifact_name(name: Optional[str]) -> Optional[str]:
+    """Filename-safe base name for an artifact from a user-supplied NFT name"""
+    if not name:
+        return None
+    slug = re.sub(r"[^a-z0-9_-]+", "_", name.lower()).strip("_")[:80]
+    return slug or None
+
+
+def cached_ipfs_result(result: dict) -> Optional[dict]:
+    """Previously pinned CIDs for a prompt cache hit, if both are known"""
+    ipfs = result.get("ipfs")
+    if result.get("cached") and ipfs and ipfs.get("metadata_cid"):
+        result.pop("image_bytes", None)
+        return ipfs
+    return None
+
+
+def generation_error_status(result: dict) -> int:
+    """HTTP status for a failed generation: 400 rejected prompt, 409 near-duplicate, 503 Gemini unavailable, else 500"""
+    if result.get("rejected"):
+        return 400
+    if result.get("near_duplicates"):
+        return 409
+    if result.get("unavailable"):
+        return 503
+    return 500
+
+
+def reject_near_duplicates(filename: str, duplicates: Optional[List[dict]]):
+    """Refuse to pin or mint a near-duplicate image when PHASH_POLICY=reject"""
+    if duplicates and nft_generator.duplicate_policy == "reject":
+        closest = duplicates[0]
+        raise HTTPException(
+            status_code=409,
+            detail=f"'{filename}' is a near-duplicate of '{closest['filename']}' (distance {closest['distance']}); not pinned"
+        )
+
+
+@app.on_event("startup")
+async def start_background_workers():
+    """Start background workers"""
+    if upload_outbox:
+        upload_outbox.start()
+    
+    if collection_runner:
+        collection_runner.start()
+    
+    if nft_generator:
+        threading.Thread(target=sync_artifacts, name="artifact-sync", daemon=True).start()
+    
+    if nft_generator:
+        threading.Thread(target=sync_metadata, name="metadata-sync", daemon=True).start()
+    
+    if retention:
+        retention.start()
+    
+    if ipfs_uploader and os.getenv("PIN_MIRROR_SYNC_ON_STARTUP", "true").lower() in ("1", "true", "yes"):
+        threading.Thread(target=sync_pin_mirror, name="pin-mirror-sync", daemon=True).start()
+
+
+def sync_artifacts():
+    """Move pre-store images into the artifact store, then bring the perceptual index up to date"""
+    try:
+        nft_generator.artifacts.migrate(nft_generator.images_dir)
+        if nft_generator.duplicate_index is not None:
+            nft_generator.duplicate_index.sync(nft_generator.artifacts.images())
+    except Exception as e:
+        print(f"⚠️  Artifact sync failed: {e}")
+
+
+def sync_metadata():
+    """Import pre-store metadata files, then load the rarity and gallery indexes from the metadata store"""
+    try:
+        nft_generator.metadata.migrate(nft_generator.metadata_dir)
+        rarity_index.load(nft_generator.metadata.items(collection_only=True))
+        gallery_index.load(nft_generator.metadata.items())
+        if token_server:
+            token_server.load(
+                (row["token_id"], row["metadata_cid"])
+                for row in nft_generator.metadata.query(minted=True, pinned=True, limit=None)
+            )
+    except Exception as e:
+        print(f"⚠️  Metadata sync failed: {e}")
+
+
+def sync_pin_mirror():
+    """Incrementally sync the local pin mirror (runs off the request path)"""
+    try:
+        ipfs_uploader.sync_pins()
+    except NotImplementedError as e:
+        print(f"ℹ️  Pin mirror sync skipped: {e}")
+    except Exception as e:
+        print(f"⚠️  Pin mirror sync failed: {e}")
+
+
+@app.on_event("shutdown")
+async def stop_background_workers():
+    """Stop background workers (queued work stays persisted)"""
+    if collection_runner:
+        collection_runner.stop()
+    trait_compositor.shutdown()
+    if retention:
+        retention.stop()
+    if image_encoder:
+        image_encoder.shutdown()
+    image_variants.shutdown()
+    if token_server:
+        token_server.shutdown()
+    
+    if upload_outbox:
+        upload_outbox.stop()
+    
+    if nft_generator:
+        nft_generator.metadata.close()
+
+
 @app.get("/", response_model=dict)
 async def root():
     """Root endpoint with API information"""
@@ -136,6 +454,15 @@ async def root():
             "health": "/health",
             "generate": "/api/v1/generate-nft",
             "batch_generate": "/api/v1/generate-batch",
+            "pin_artifact": "/api/v1/pin/{filename}",
+            "finalize_draft": "/api/v1/drafts/{draft_id}/finalize",
+            "batch_generate_stream": "/api/v1/generate-batch/stream",
+            "collections": "/api/v1/collections",
+            "layers": "/api/v1/layers",
+            "upload_status": "/api/v1/uploads/{upload_id}",
+            "ipfs_content": "/api/v1/ipfs/{cid}",
+            "pins": "/api/v1/pins",
+            "duplicates": "/api/v1/duplicates/{filename}",
             "docs": "/docs"
         }
     }
@@ -144,10 +471,14 @@ async def root():
 @app.get("/health", response_model=HealthResponse)
 async def health_check():
     """Health check endpoint"""
+    gemini = nft_generator.resilience.stats() if nft_generator else None
     return {
-        "status": "healthy",
+        "status": "degraded" if gemini and gemini["circuit"] == "open" else "healthy",
         "timestamp": datetime.now().isoformat(),
-        "api_configured": nft_generator is not None
+        "api_configured": nft_generator is not None,
+        "gemini": gemini,
+        "image_encoding": image_encoder.stats() if image_encoder else None,
+        "metadata": nft_generator.metadata.stats() if nft_generator else None
     }
 
 
@@ -168,20 +499,63 @@ async def generate_nft(request: GenerateNFTRequest):
     if not ipfs_uploader:
         raise HTTPException(
             status_code=503,
-            detail="IPFS Uploader not initialized. Please configure PINATA_JWT."
+            detail="IPFS Uploader not initialized. Please configure PINATA_JWT or IPFS_BACKEND."
         )
     
     try:
         print(f"\n🎨 Generating NFT from prompt: {request.prompt}")
         
-        # Step 1: Generate the NFT image
-        result = nft_generator.generate_image(
+        # Draft mode: preview only, nothing is saved or pinned until finalized
+        if request.quality == "draft":
+            draft = await asyncio.to_thread(nft_generator.generate_draft, request.prompt)
+            if not draft["success"]:
+                raise HTTPException(status_code=generation_error_status(draft), detail=draft.get("error", "Draft generation failed"))
+            return GenerateNFTResponse(
+                success=True,
+                message="Draft generated. Finalize it with POST /api/v1/drafts/{draft_id}/finalize.",
+                prompt=draft["prompt"],
+                draft_id=draft["draft_id"],
+                preview_url=f"/api/v1/drafts/{draft['draft_id']}/preview"
+            )
+        
+        # Step 1: Generate the NFT image (off the event loop, so concurrent requests overlap and coalesce)
+        result = await asyncio.to_thread(
+            nft_generator.generate_image,
             prompt=request.prompt,
-            output_filename=request.name.replace(" ", "_").lower() if request.name else None
+            output_filename=artifact_name(request.name),
+            strict=request.strict,
+            variations=request.variations,
+            unique_name=True
         )
         
         if not result["success"]:
-            raise HTTPException(status_code=500, detail=result.get("error", "Generation failed"))
+            raise HTTPException(status_code=generation_error_status(result), detail=result.get("error", "Generation failed"))
+        
+        # Several variations: let the user pick one before anything is pinned
+        if result.get("variations"):
+            result.pop("image_bytes", None)
+            variations = [
+                {
+                    "filename": v["filename"],
+                    "image_path": v["image_path"],
+                    "metadata_path": v["metadata_path"],
+                    "image_url": f"/api/v1/image/{v['filename']}",
+                    "pin_url": f"/api/v1/pin/{v['filename']}",
+                    "near_duplicates": v.get("near_duplicates") or [],
+                }
+                for v in result["variations"]
+            ]
+            print(f"✅ Generated {len(variations)} variations")
+            return GenerateNFTResponse(
+                success=True,
+                message=f"Generated {len(variations)} variations. Pick one with POST /api/v1/pin/{{filename}}.",
+                image_path=result["image_path"],
+                metadata_path=result["metadata_path"],
+                metadata=result["metadata"],
+                prompt=result["prompt"],
+                filename=result["filename"],
+                variations=variations
+            )
         
         # Step 2: Update metadata with custom name/description
         metadata = result["metadata"]
@@ -192,12 +566,42 @@ async def generate_nft(request: GenerateNFTRequest):
         
         print(f"✅ Image generated: {result['image_path']}")
         
-        # Step 3: Upload to IPFS
+        # Cache hit for an already pinned artifact: nothing to upload
+        customized = bool(request.name or request.description)
+        cached_ipfs = None if customized else cached_ipfs_result(result)
+        if cached_ipfs:
+            print(f"⚡ Reusing pinned artifact: {cached_ipfs['metadata_ipfs_uri']}")
+            return GenerateNFTResponse(
+                success=True,
+                message="NFT served from prompt cache (already on IPFS)",
+                image_path=result["image_path"],
+                metadata_path=result["metadata_path"],
+                metadata=metadata,
+                prompt=result["prompt"],
+                filename=result["filename"],
+                image_ipfs_uri=cached_ipfs["image_ipfs_uri"],
+                metadata_ipfs_uri=cached_ipfs["metadata_ipfs_uri"]
+            )
+        
+        # Step 3: Upload to IPFS (queued durably, then awaited)
         print("📤 Uploading to IPFS...")
-        ipfs_result = ipfs_uploader.upload_nft_complete(
-            image_path=result["image_path"],
-            metadata=metadata
-        )
+        upload = queue_upload(result, metadata, customized=customized)
+        
+        try:
+            ipfs_result = await upload.wait_async(timeout=UPLOAD_WAIT_SECONDS)
+        except asyncio.TimeoutError:
+            print(f"⏳ IPFS upload still pending, queued as {upload.upload_id}")
+            return GenerateNFTResponse(
+                success=True,
+                message="NFT generated. IPFS upload is queued and will be retried in the background.",
+                image_path=result["image_path"],
+                metadata_path=result["metadata_path"],
+                metadata=metadata,
+                prompt=result["prompt"],
+                filename=result["filename"],
+                upload_id=upload.upload_id,
+                near_duplicates=result.get("near_duplicates") or None
+            )
         
         print(f"✅ Uploaded to IPFS:")
         print(f"   Image: {ipfs_result['image_ipfs_uri']}")
@@ -212,7 +616,9 @@ async def generate_nft(request: GenerateNFTRequest):
             prompt=result["prompt"],
             filename=result["filename"],
             image_ipfs_uri=ipfs_result["image_ipfs_uri"],
-            metadata_ipfs_uri=ipfs_result["metadata_ipfs_uri"]
+            metadata_ipfs_uri=ipfs_result["metadata_ipfs_uri"],
+            upload_id=upload.upload_id,
+            near_duplicates=result.get("near_duplicates") or None
         )
     
     except HTTPException:
@@ -222,13 +628,192 @@ async def generate_nft(request: GenerateNFTRequest):
         raise HTTPException(status_code=500, detail=f"Error generating NFT: {str(e)}")
 
 
+@app.post("/api/v1/pin/{filename}", response_model=GenerateNFTResponse)
+async def pin_artifact(filename: str, request: Optional[PinArtifactRequest] = None):
+    """
+    Upload a previously generated artifact (e.g. the chosen variation) to IPFS.
+    """
+    if not nft_generator or not ipfs_uploader:
+        raise HTTPException(status_code=503, detail="NFT Generator or IPFS Uploader not initialized.")
+    
+    if Path(filename).name != filename:
+        raise HTTPException(status_code=400, detail="Invalid filename")
+    
+    metadata = nft_generator.metadata.get(filename)
+    if metadata is None:
+        raise HTTPException(status_code=404, detail="Artifact not found")
+    metadata_path = nft_generator.metadata.location(filename)
+    
+    image_path = Path(metadata["image"])
+    if not image_path.exists():
+        raise HTTPException(status_code=404, detail="Artifact image not found")
+    
+    if nft_generator.duplicate_index is not None:
+        reject_near_duplicates(filename, nft_generator.duplicate_index.similar(filename))
+    
+    customized = bool(request and (request.name or request.description))
+    if request and request.name:
+        metadata["name"] = request.name
+    if request and request.description:
+        metadata["description"] = request.description
+    
+    upload = queue_upload({"image_path": str(image_path), "filename": filename}, metadata, customized=customized)
+    try:
+        ipfs_result = await upload.wait_async(timeout=UPLOAD_WAIT_SECONDS)
+    except asyncio.TimeoutError:
+        return GenerateNFTResponse(
+            success=True,
+            message="IPFS upload is queued and will be retried in the background.",
+            image_path=str(image_path),
+            metadata_path=str(metadata_path),
+            metadata=metadata,
+            prompt=metadata.get("prompt", ""),
+            filename=filename,
+            upload_id=upload.upload_id
+        )
+    
+    return GenerateNFTResponse(
+        success=True,
+        message="Artifact uploaded to IPFS successfully",
+        image_path=str(image_path),
+        metadata_path=str(metadata_path),
+        metadata=metadata,
+        prompt=metadata.get("prompt", ""),
+        filename=filename,
+        image_ipfs_uri=ipfs_result["image_ipfs_uri"],
+        metadata_ipfs_uri=ipfs_result["metadata_ipfs_uri"],
+        upload_id=upload.upload_id
+    )
+
+
+@app.get("/api/v1/drafts/{draft_id}/preview")
+async def get_draft_preview(draft_id: str):
+    """Serve the downscaled preview of a draft (kept in memory only)"""
+    if not nft_generator:
+        raise HTTPException(status_code=503, detail="NFT Generator not initialized.")
+    
+    draft = nft_generator.drafts.get(draft_id)
+    if draft is None:
+        raise HTTPException(status_code=404, detail="Draft not found or expired")
+    
+    return Response(
+        content=draft.preview,
+        media_type=draft.preview_mime_type,
+        headers={"Cache-Control": "private, max-age=300"}
+    )
+
+
+@app.post("/api/v1/drafts/{draft_id}/finalize", response_model=GenerateNFTResponse)
+async def finalize_draft(draft_id: str, request: Optional[PinArtifactRequest] = None):
+    """
+    Finalize a draft at full quality, save it and upload it to IPFS.
+    """
+    if not nft_generator or not ipfs_uploader:
+        raise HTTPException(status_code=503, detail="NFT Generator or IPFS Uploader not initialized.")
+    
+    name = request.name if request else None
+    description = request.description if request else None
+    result = await asyncio.to_thread(
+        nft_generator.finalize_draft,
+        draft_id,
+        output_filename=artifact_name(name)
+    )
+    if result is None:
+        raise HTTPException(status_code=404, detail="Draft not found or expired")
+    if not result["success"]:
+        raise HTTPException(status_code=generation_error_status(result), detail=result.get("error", "Finalizing draft failed"))
+    
+    metadata = result["metadata"]
+    if name:
+        metadata["name"] = name
+    if description:
+        metadata["description"] = description
+    
+    upload = queue_upload(result, metadata, customized=bool(name or description))
+    try:
+        ipfs_result = await upload.wait_async(timeout=UPLOAD_WAIT_SECONDS)
+    except asyncio.TimeoutError:
+        return GenerateNFTResponse(
+            success=True,
+            message="Draft finalized. IPFS upload is queued and will be retried in the background.",
+            image_path=result["image_path"],
+            metadata_path=result["metadata_path"],
+            metadata=metadata,
+            prompt=result["prompt"],
+            filename=result["filename"],
+            upload_id=upload.upload_id
+        )
+    
+    return GenerateNFTResponse(
+        success=True,
+        message="Draft finalized and uploaded to IPFS successfully",
+        image_path=result["image_path"],
+        metadata_path=result["metadata_path"],
+        metadata=metadata,
+        prompt=result["prompt"],
+        filename=result["filename"],
+        image_ipfs_uri=ipfs_result["image_ipfs_uri"],
+        metadata_ipfs_uri=ipfs_result["metadata_ipfs_uri"],
+        upload_id=upload.upload_id
+    )
+
+
+async def generate_and_upload(i: int, prompt: str, total: int) -> dict:
+    """
+    Generate one batch item on the shared generation pool, then upload it to IPFS.
+    
+    Returns the result dict with a status of success, queued or error.
+    """
+    result = await asyncio.wrap_future(nft_generator.submit_generation(prompt))
+    
+    if not result.get("success"):
+        result["status"] = "error"  # Ensure failed generations have error status
+        return result
+    
+    cached_ipfs = cached_ipfs_result(result)
+    if cached_ipfs:
+        result["ipfs_uri"] = cached_ipfs["image_ipfs_uri"]
+        result["image_ipfs_uri"] = cached_ipfs["image_ipfs_uri"]
+        result["metadata_ipfs_uri"] = cached_ipfs["metadata_ipfs_uri"]
+        result["status"] = "success"
+        return result
+    
+    print(f"📤 Queueing image {i+1}/{total} for IPFS upload...")
+    upload = queue_upload(result, result["metadata"])
+    result["upload_id"] = upload.upload_id
+    
+    try:
+        ipfs_result = await upload.wait_async(timeout=UPLOAD_WAIT_SECONDS)
+        
+        # Add IPFS URIs to the result
+        result["ipfs_uri"] = ipfs_result["image_ipfs_uri"]
+        result["image_ipfs_uri"] = ipfs_result["image_ipfs_uri"]
+        result["metadata_ipfs_uri"] = ipfs_result["metadata_ipfs_uri"]
+        result["status"] = "success"  # Ensure status is set correctly
+        
+        print(f"✅ Image {i+1} uploaded: {ipfs_result['image_ipfs_uri']}")
+    
+    except asyncio.TimeoutError:
+        print(f"⏳ Image {i+1} upload still pending (queued as {upload.upload_id})")
+        result["status"] = "queued"
+    
+    except Exception as e:
+        print(f"❌ Failed to upload image {i+1} to IPFS: {str(e)}")
+        result["success"] = False
+        result["status"] = "error"
+        result["error"] = f"IPFS upload failed: {str(e)}"
+    
+    return result
+
+
 @app.post("/api/v1/generate-batch", response_model=dict)
 async def generate_batch(request: BatchGenerateRequest, background_tasks: BackgroundTasks):
     """
     Generate multiple NFTs from a list of prompts and upload to IPFS.
     
     This is useful for creating NFT collections. Limited to 10 prompts per request.
-    Each generated image is uploaded to IPFS for decentralized storage.
+    Prompts are generated concurrently (bounded by GEMINI_MAX_CONCURRENCY and
+    GEMINI_RPM) and each image is uploaded to IPFS as soon as it is ready.
     """
     if not nft_generator:
         raise HTTPException(
@@ -239,54 +824,32 @@ async def generate_batch(request: BatchGenerateRequest, background_tasks: Backgr
     if not ipfs_uploader:
         raise HTTPException(
             status_code=503,
-            detail="IPFS Uploader not initialized. Please configure PINATA_JWT."
+            detail="IPFS Uploader not initialized. Please configure PINATA_JWT or IPFS_BACKEND."
         )
     
     try:
         print(f"\n🎨 Starting batch generation for {len(request.prompts)} prompts...")
         
-        # Generate all images locally first
-        results = nft_generator.generate_batch(request.prompts)
-        
-        # Process each successful result to upload to IPFS
-        for i, result in enumerate(results):
-            if result.get("success"):
-                try:
-                    print(f"📤 Uploading image {i+1}/{len(results)} to IPFS...")
-                    
-                    # Upload to IPFS
-                    ipfs_result = ipfs_uploader.upload_nft_complete(
-                        image_path=result["image_path"],
-                        metadata=result["metadata"]
-                    )
-                    
-                    # Add IPFS URIs to the result
-                    result["ipfs_uri"] = ipfs_result["image_ipfs_uri"]
-                    result["image_ipfs_uri"] = ipfs_result["image_ipfs_uri"]
-                    result["metadata_ipfs_uri"] = ipfs_result["metadata_ipfs_uri"]
-                    result["status"] = "success"  # Ensure status is set correctly
-                    
-                    print(f"✅ Image {i+1} uploaded: {ipfs_result['image_ipfs_uri']}")
-                    
-                except Exception as e:
-                    print(f"❌ Failed to upload image {i+1} to IPFS: {str(e)}")
-                    result["success"] = False
-                    result["status"] = "error"
-                    result["error"] = f"IPFS upload failed: {str(e)}"
-            else:
-                result["status"] = "error"  # Ensure failed generations have error status
+        # Every prompt runs on the shared generation pool and flows straight
+        # into its IPFS upload as soon as it finishes
+        results = await asyncio.gather(*(
+            generate_and_upload(i, prompt, len(request.prompts))
+            for i, prompt in enumerate(request.prompts)
+        ))
         
         successful = [r for r in results if r.get("success") and r.get("status") == "success"]
         failed = [r for r in results if not r.get("success") or r.get("status") == "error"]
+        queued = [r for r in results if r.get("status") == "queued"]
         
-        print(f"✅ Batch generation complete: {len(successful)} succeeded, {len(failed)} failed")
+        print(f"✅ Batch generation complete: {len(successful)} succeeded, {len(failed)} failed, {len(queued)} queued")
         
         return {
             "success": True,
-            "message": f"Batch generation complete. {len(successful)} succeeded, {len(failed)} failed.",
+            "message": f"Batch generation complete. {len(successful)} succeeded, {len(failed)} failed, {len(queued)} queued.",
             "total": len(results),
             "successful": len(successful),
             "failed": len(failed),
+            "queued": len(queued),
             "results": results
         }
     
@@ -294,17 +857,359 @@ async def generate_batch(request: BatchGenerateRequest, background_tasks: Backgr
         raise HTTPException(status_code=500, detail=f"Error in batch generation: {str(e)}")
 
 
+@app.post("/api/v1/generate-batch/stream")
+async def generate_batch_stream(
+    request: BatchGenerateRequest,
+    format: str = Query("ndjson", pattern="^(ndjson|sse)$", description="ndjson or sse")
+):
+    """
+    Streaming variant of /api/v1/generate-batch.
+    
+    Emits one event per item as soon as it is generated and uploaded (or fails),
+    followed by a final summary event. Results are not held in memory once sent.
+    Use format=sse for Server-Sent Events, otherwise newline-delimited JSON.
+    """
+    if not nft_generator:
+        raise HTTPException(
+            status_code=503,
+            detail="NFT Generator not initialized. Please configure GOOGLE_API_KEY."
+        )
+    
+    if not ipfs_uploader:
+        raise HTTPException(
+            status_code=503,
+            detail="IPFS Uploader not initialized. Please configure PINATA_JWT or IPFS_BACKEND."
+        )
+    
+    def encode(event: str, payload: dict) -> str:
+        if format == "sse":
+            return f"event: {event}\ndata: {json.dumps(payload, default=str)}\n\n"
+        return json.dumps({"event": event, **payload}, default=str) + "\n"
+    
+    async def indexed(i: int, prompt: str) -> tuple:
+        return i, await generate_and_upload(i, prompt, len(request.prompts))
+    
+    async def events():
+        print(f"\n🎨 Streaming batch generation for {len(request.prompts)} prompts...")
+        counts = {"successful": 0, "failed": 0, "queued": 0}
+        tasks = [asyncio.ensure_future(indexed(i, prompt)) for i, prompt in enumerate(request.prompts)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                i, result = await next_done
+                status = result.get("status", "error")
+                counts["successful" if status == "success" else status if status == "queued" else "failed"] += 1
+                yield encode("result", {"index": i, **result})
+            
+            print(f"✅ Streamed batch complete: {counts['successful']} succeeded, {counts['failed']} failed, {counts['queued']} queued")
+            yield encode("summary", {
+                "success": True,
+                "message": f"Batch generation complete. {counts['successful']} succeeded, {counts['failed']} failed, {counts['queued']} queued.",
+                "total": len(request.prompts),
+                **counts
+            })
+        finally:
+            # Client went away: stop waiting on items that have not finished
+            for task in tasks:
+                task.cancel()
+    
+    media_type = "text/event-stream" if format == "sse" else "application/x-ndjson"
+    return StreamingResponse(events(), media_type=media_type, headers={"Cache-Control": "no-cache"})
+
+
+def start_collection(name: str, items: List[dict], description: Optional[str], upload: bool, mode: str = MODE_INTERACTIVE) -> dict:
+    """Persist a collection job and wake the runner"""
+    if not collection_runner:
+        raise HTTPException(
+            status_code=503,
+            detail="NFT Generator not initialized. Please configure GOOGLE_API_KEY."
+        )
+    if not items:
+        raise HTTPException(status_code=400, detail="Collection has no items")
+    if len(items) > COLLECTION_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"Collections are limited to {COLLECTION_MAX_ITEMS} items")
+    
+    collection_id = collection_store.create(name, items, description=description, upload=upload and upload_outbox is not None, mode=mode)
+    collection_runner.notify()
+    print(f"🗂️  Collection '{name}' created with {len(items)} items ({collection_id}, {mode} mode)")
+    return collection_store.get(collection_id)
+
+
+@app.post("/api/v1/collections")
+async def create_collection(request: CollectionJobRequest):
+    """
+    Start a collection job from a prompt template with trait substitutions.
+    
+    The job runs in the background, survives restarts and never regenerates
+    finished items. Poll /api/v1/collections/{id} for progress.
+    """
+    try:
+        items = expand_template(request.template, request.traits, request.count, seed=request.seed)
+    except (KeyError, IndexError) as e:
+        raise HTTPException(status_code=400, detail=f"Template placeholder has no trait values: {e}")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return start_collection(request.name, items, request.description, request.upload, request.mode)
+
+
+@app.post("/api/v1/collections/upload")
+async def create_collection_from_file(
+    file: UploadFile = File(..., description="JSONL file: one prompt string or {prompt, name, attributes} per line"),
+    name: str = Form(...),
+    description: Optional[str] = Form(None),
+    upload: bool = Form(True),
+    mode: str = Form(MODE_INTERACTIVE, pattern="^(interactive|batch)$")
+):
+    """
+    Start a collection job from an uploaded JSONL file of prompts.
+    """
+    content = (await file.read()).decode("utf-8")
+    try:
+        items = parse_jsonl(content.splitlines())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return start_collection(name, items, description, upload, mode)
+
+
+@app.post("/api/v1/collections/layered")
+async def create_layered_collection(request: LayeredCollectionRequest):
+    """
+    Start a collection composed locally from trait layers.
+    
+    Trait combinations are sampled by weight without duplicates; each piece is
+    alpha-composited from its layers instead of being generated by Gemini.
+    """
+    try:
+        combos = trait_compositor.sample(request.count, seed=request.seed)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    items = [
+        {
+            "prompt": trait_compositor.describe(traits),
+            "attributes": [{"trait_type": t, "value": v} for t, v in traits.items()]
+        }
+        for traits in combos
+    ]
+    return start_collection(request.name, items, request.description, request.upload, MODE_LAYERED)
+
+
+@app.get("/api/v1/layers")
+async def get_trait_layers():
+    """Trait layers available for layered collections (value -> weight, in draw order)"""
+    traits = trait_layers.traits()
+    combinations = 1
+    for values in traits.values():
+        combinations *= len(values)
+    return {"traits": traits, "combinations": combinations if traits else 0}
+
+
+@app.post("/api/v1/layers")
+async def generate_trait_layer(request: GenerateLayerRequest):
+    """
+    Generate a trait layer with Gemini.
+    
+    Non-background layers are generated on a green key color that is made
+    transparent, so they can be stacked.
+    """
+    if not nft_generator:
+        raise HTTPException(status_code=503, detail="NFT Generator not initialized. Please configure GOOGLE_API_KEY.")
+    
+    if request.background:
+        text = BACKGROUND_PROMPT_TEMPLATE.format(prompt=request.prompt)
+    else:
+        text = LAYER_PROMPT_TEMPLATE.format(trait=request.trait_type.lower(), prompt=request.prompt)
+    
+    try:
+        image_data, _ = await asyncio.to_thread(nft_generator.generate_raw_image, text)
+        if not request.background:
+            image_data = await asyncio.to_thread(chroma_key, image_data)
+        path = trait_layers.add_layer(request.trait_type, request.value, image_data, weight=request.weight, order=request.order)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        print(f"❌ Error generating layer: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error generating layer: {str(e)}")
+    
+    print(f"🧩 Layer saved: {path}")
+    return {"success": True, "trait_type": request.trait_type, "value": request.value, "path": str(path)}
+
+
+@app.get("/api/v1/collections/{collection_id}")
+async def get_collection(collection_id: str):
+    """
+    Collection job status and progress counters.
+    """
+    collection = collection_store.get(collection_id)
+    if not collection:
+        raise HTTPException(status_code=404, detail="Collection not found")
+    return collection
+
+
+@app.get("/api/v1/collections/{collection_id}/items")
+async def get_collection_items(
+    collection_id: str,
+    status: Optional[str] = Query(None, pattern="^(pending|running|done|failed)$"),
+    offset: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000)
+):
+    """
+    Page through a collection's items and their results.
+    """
+    if not collection_store.get(collection_id):
+        raise HTTPException(status_code=404, detail="Collection not found")
+    return {
+        "collection_id": collection_id,
+        "offset": offset,
+        "items": collection_store.items(collection_id, status=status, offset=offset, limit=limit)
+    }
+
+
+@app.get("/api/v1/collections/{collection_id}/rarity")
+async def get_collection_rarity(
+    collection_id: str,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=10000)
+):
+    """
+    Trait frequencies and rarity ranking (rarest first) of a collection's finished items.
+    """
+    if not collection_store.get(collection_id):
+        raise HTTPException(status_code=404, detail="Collection not found")
+    
+    rarity = rarity_index.rarity(collection_id, offset=offset, limit=limit)
+    if rarity is None:
+        rarity = {"items": 0, "traits": {}, "ranking": []}
+    return {"collection_id": collection_id, "offset": offset, **rarity}
+
+
+@app.post("/api/v1/collections/{collection_id}/{action}")
+async def control_collection(collection_id: str, action: str):
+    """
+    Pause, resume or cancel a collection job (action: pause, resume, cancel).
+    """
+    statuses = {"pause": PAUSED, "resume": RUNNING, "cancel": CANCELLED}
+    if action not in statuses:
+        raise HTTPException(status_code=404, detail="Unknown action")
+    if not collection_store.set_status(collection_id, statuses[action]):
+        raise HTTPException(status_code=404, detail="Collection not found")
+    if collection_runner:
+        collection_runner.notify()
+    return collection_store.get(collection_id)
+
+
+@app.get("/api/v1/gallery")
+async def get_gallery(
+    sort: str = Query("newest", pattern=f"^({'|'.join(GALLERY_SORTS)})$"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    limit: int = Query(50, ge=1, le=500),
+    minted: Optional[bool] = None,
+    collection: Optional[str] = None,
+    trait: Optional[List[str]] = Query(None, description="Trait filter as 'Type:Value' (repeatable)"),
+    since: Optional[str] = Query(None, description="Created at or after (ISO date/time)"),
+    until: Optional[str] = Query(None, description="Created before (ISO date/time)")
+):
+    """
+    Page through generated NFTs, newest first by default.
+    """
+    if not nft_generator:
+        raise HTTPException(status_code=503, detail="NFT Generator not initialized.")
+    
+    traits = {}
+    for value in trait or []:
+        trait_type, sep, trait_value = value.partition(":")
+        if not sep:
+            raise HTTPException(status_code=400, detail=f"Invalid trait filter '{value}'; use 'Type:Value'")
+        traits[trait_type] = trait_value
+    
+    try:
+        since_ts = datetime.fromisoformat(since).timestamp() if since else None
+        until_ts = datetime.fromisoformat(until).timestamp() if until else None
+        return gallery_index.page(
+            sort=sort, cursor=cursor, limit=limit, minted=minted, collection=collection,
+            traits=traits, since=since_ts, until=until_ts
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
 @app.get("/api/v1/image/{filename}")
-async def get_image(filename: str):
+async def get_image(
+    filename: str,
+    w: Optional[int] = Query(None, ge=1, le=8192, description="Variant width (rounded up to IMAGE_VARIANT_WIDTHS)"),
+    format: Optional[str] = Query(None, pattern=f"^({'|'.join(VARIANT_FORMATS)})$", description="Variant format")
+):
     """
-    Retrieve a generated image by filename.
+    Retrieve a generated image by filename, or a resized/re-encoded variant of it.
     """
-    image_path = nft_generator.images_dir / filename
+    if not nft_generator:
+        raise HTTPException(status_code=503, detail="NFT Generator not initialized.")
+    if Path(filename).name != filename:
+        raise HTTPException(status_code=400, detail="Invalid filename")
+    
+    # Artifact names resolve through the content-addressed store; older images live in images_dir
+    image_path = nft_generator.artifacts.resolve(filename) or nft_generator.images_dir / filename
     
     if not image_path.exists():
+        # Evicted by retention: the pinned copy is still served through the IPFS read cache
+        metadata = nft_generator.metadata.get(os.path.splitext(filename)[0]) or nft_generator.metadata.get(filename)
+        image_uri = (metadata or {}).get("image", "")
+        if image_uri.startswith("ipfs://"):
+            return RedirectResponse(f"/api/v1/ipfs/{image_uri[len('ipfs://'):]}")
+        raise HTTPException(status_code=404, detail="Image not found")
+    
+    if w is None and format is None:
+        return FileResponse(image_path)
+    
+    try:
+        variant_path, media_type = await asyncio.to_thread(image_variants.get, image_path, w, format or "webp")
+    except FileNotFoundError:
         raise HTTPException(status_code=404, detail="Image not found")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Could not render image variant: {str(e)}")
+    return FileResponse(variant_path, media_type=media_type, headers={"Cache-Control": "public, max-age=86400"})
+
+
+@app.get("/api/v1/metadata")
+async def list_metadata(
+    minted: Optional[bool] = None,
+    pinned: Optional[bool] = None,
+    collection: Optional[str] = None,
+    prompt: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    offset: int = Query(0, ge=0)
+):
+    """
+    Find artifacts through the metadata store's indexes, e.g. ?minted=false for
+    everything not minted yet.
+    """
+    if not nft_generator:
+        raise HTTPException(status_code=503, detail="NFT Generator not initialized.")
+    
+    items = await asyncio.to_thread(
+        nft_generator.metadata.query,
+        minted=minted, pinned=pinned, collection=collection, prompt=prompt, limit=limit, offset=offset
+    )
+    return {"items": items, "offset": offset, "limit": limit}
+
+
+@app.post("/api/v1/metadata/export")
+async def export_metadata(request: Optional[MetadataExportRequest] = None):
+    """
+    Write metadata documents as JSON files under generated_nfts/metadata.
+    """
+    if not nft_generator:
+        raise HTTPException(status_code=503, detail="NFT Generator not initialized.")
+    
+    filenames = request.filenames if request else None
+    if filenames and any(Path(f).name != f for f in filenames):
+        raise HTTPException(status_code=400, detail="Invalid filename")
     
-    return FileResponse(image_path)
+    exported = await asyncio.to_thread(nft_generator.metadata.export, filenames)
+    return {"success": True, "exported": exported, "directory": str(nft_generator.metadata.export_dir)}
 
 
 @app.get("/api/v1/metadata/{filename}")
@@ -312,15 +1217,162 @@ async def get_metadata(filename: str):
     """
     Retrieve NFT metadata by filename.
     """
-    # Support both .json and without extension
-    metadata_path = nft_generator.metadata_dir / filename
-    if not filename.endswith('.json'):
-        metadata_path = nft_generator.metadata_dir / f"{filename}.json"
+    if not nft_generator:
+        raise HTTPException(status_code=503, detail="NFT Generator not initialized.")
     
-    if not metadata_path.exists():
+    # Support both .json and without extension
+    name = filename[:-len(".json")] if filename.endswith(".json") else filename
+    document = nft_generator.metadata.get_json(name)
+    if document is None:
         raise HTTPException(status_code=404, detail="Metadata not found")
     
-    return FileResponse(metadata_path)
+    return Response(content=document, media_type="application/json")
+
+
+@app.get("/api/v1/token/{token_ref}")
+async def get_token_metadata(token_ref: str, request: Request):
+    """
+    ERC-721 token metadata by token ID (/api/v1/token/42 or /api/v1/token/42.json):
+    the exact document pinned for the token, usable as the contract's base URI.
+    """
+    if not token_server:
+        raise HTTPException(status_code=404, detail="Token metadata server is disabled (set TOKEN_METADATA_SERVER=true)")
+    
+    token_id = token_ref[:-len(".json")] if token_ref.endswith(".json") else token_ref
+    if not token_id.isdigit():
+        raise HTTPException(status_code=404, detail="Token not found")
+    document = token_server.get(int(token_id))
+    if document is None:
+        raise HTTPException(status_code=404, detail="Token not found")
+    
+    headers = {"ETag": document.etag, "Cache-Control": TOKEN_CACHE_CONTROL, "Vary": "Accept-Encoding"}
+    if etag_matches(document.etag, request.headers.get("if-none-match")):
+        return Response(status_code=304, headers=headers)
+    if accepts_gzip(request.headers.get("accept-encoding")):
+        headers["Content-Encoding"] = "gzip"
+        return Response(content=document.gzip_body, media_type="application/json", headers=headers)
+    return Response(content=document.body, media_type="application/json", headers=headers)
+
+
+def is_known_cid(cid: str) -> bool:
+    """Whether a CID is ours: in the pin mirror or recorded in the metadata store"""
+    if ipfs_uploader and ipfs_uploader.is_pinned(cid):
+        return True
+    return bool(nft_generator and nft_generator.metadata.has_cid(cid))
+
+
+@app.get("/api/v1/ipfs/{cid}")
+async def get_ipfs_content(cid: str):
+    """
+    Serve pinned IPFS content (images or metadata) through the local read cache.
+    
+    Only CIDs we pinned or recorded are served, so this is not an open
+    gateway proxy. Content is addressed by CID and therefore immutable, so
+    responses can be cached by clients and CDNs indefinitely.
+    """
+    if not is_valid_cid(cid):
+        raise HTTPException(status_code=400, detail="Invalid CID")
+    if not await asyncio.to_thread(is_known_cid, cid):
+        raise HTTPException(status_code=404, detail="Unknown CID")
+    
+    try:
+        data = await asyncio.to_thread(ipfs_cache.get, cid)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except IPFSFetchError as e:
+        raise HTTPException(status_code=502, detail=str(e))
+    
+    return Response(
+        content=data,
+        media_type=guess_media_type(data),
+        headers={
+            "Cache-Control": "public, max-age=31536000, immutable",
+            "ETag": f'"{cid}"'
+        }
+    )
+
+
+@app.get("/api/v1/pins")
+async def get_pin_usage():
+    """
+    Pin count and total pinned bytes, answered from the local pin mirror.
+    """
+    if not ipfs_uploader:
+        raise HTTPException(status_code=503, detail="IPFS Uploader not initialized.")
+    
+    return ipfs_uploader.pin_usage()
+
+
+@app.get("/api/v1/pins/{cid}")
+async def get_pin_status(cid: str):
+    """
+    Check whether a CID is pinned, using the local pin mirror.
+    """
+    if not ipfs_uploader:
+        raise HTTPException(status_code=503, detail="IPFS Uploader not initialized.")
+    
+    return {"cid": cid, "pinned": ipfs_uploader.is_pinned(cid)}
+
+
+@app.get("/api/v1/storage")
+async def get_storage_usage():
+    """
+    Local storage usage: stored images against the retention budget, and the variant cache.
+    """
+    if not nft_generator:
+        raise HTTPException(status_code=503, detail="NFT Generator not initialized.")
+    
+    return {
+        "artifacts": await asyncio.to_thread(retention.usage),
+        "variants": image_variants.usage()
+    }
+
+
+@app.get("/api/v1/duplicates/{filename}")
+async def get_near_duplicates(filename: str, max_distance: Optional[int] = None):
+    """
+    List generated images that look nearly the same as an artifact (perceptual hash).
+    """
+    if not nft_generator:
+        raise HTTPException(status_code=503, detail="NFT Generator not initialized.")
+    if nft_generator.duplicate_index is None:
+        raise HTTPException(status_code=404, detail="Near-duplicate detection is disabled (PHASH_POLICY=off)")
+    if max_distance is not None and not 0 <= max_distance <= 64:
+        raise HTTPException(status_code=400, detail="max_distance must be between 0 and 64")
+    
+    duplicates = nft_generator.duplicate_index.similar(filename, max_distance)
+    if duplicates is None:
+        raise HTTPException(status_code=404, detail="Artifact not indexed")
+    return {"filename": filename, "near_duplicates": duplicates}
+
+
+@app.get("/api/v1/uploads/{upload_id}")
+async def get_upload_status(upload_id: str):
+    """
+    Poll the state of a queued IPFS upload.
+    """
+    if not upload_outbox:
+        raise HTTPException(status_code=503, detail="IPFS Uploader not initialized.")
+    
+    record = upload_outbox.get(upload_id)
+    if not record:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    
+    return record
+
+
+@app.post("/api/v1/uploads/{upload_id}/retry")
+async def retry_upload(upload_id: str):
+    """
+    Requeue an upload that permanently failed.
+    """
+    if not upload_outbox:
+        raise HTTPException(status_code=503, detail="IPFS Uploader not initialized.")
+    
+    if not upload_outbox.retry(upload_id):
+        raise HTTPException(status_code=404, detail="No failed upload with this ID")
+    
+    return {"success": True, "upload_id": upload_id, "status": "pending"}
 
 
 @app.post("/api/v1/mint-nft", response_model=MintNFTResponse)
@@ -346,7 +1398,7 @@ async def mint_nft_complete(request: MintNFTRequest):
     if not ipfs_uploader:
         raise HTTPException(
             status_code=503,
-            detail="IPFS Uploader not initialized. Please configure PINATA_JWT."
+            detail="IPFS Uploader not initialized. Please configure PINATA_JWT or IPFS_BACKEND."
         )
     
     # Check if contract address is configured
@@ -363,14 +1415,17 @@ async def mint_nft_complete(request: MintNFTRequest):
         
         # Step 1: Generate the AI image
         print("\n[1/4] Generating AI image...")
-        generation_result = nft_generator.generate_image(
+        generation_result = await asyncio.to_thread(
+            nft_generator.generate_image,
             prompt=request.prompt,
-            output_filename=request.name.replace(" ", "_").lower() if request.name else None
+            output_filename=artifact_name(request.name),
+            strict=request.strict,
+            unique_name=True
         )
         
         if not generation_result["success"]:
             raise HTTPException(
-                status_code=500,
+                status_code=generation_error_status(generation_result),
                 detail=f"Image generation failed: {generation_result.get('error')}"
             )
         
@@ -382,12 +1437,16 @@ async def mint_nft_complete(request: MintNFTRequest):
         
         print(f"✅ Image generated: {generation_result['image_path']}")
         
-        # Step 2: Upload to IPFS
+        # Step 2: Upload to IPFS (queued durably so the image survives IPFS outages)
         print("\n[2/4] Uploading to IPFS...")
-        ipfs_result = ipfs_uploader.upload_nft_complete(
-            image_path=generation_result["image_path"],
-            metadata=metadata
-        )
+        upload = queue_upload(generation_result, metadata, customized=True)
+        try:
+            ipfs_result = await upload.wait_async(timeout=UPLOAD_WAIT_SECONDS)
+        except asyncio.TimeoutError:
+            raise HTTPException(
+                status_code=503,
+                detail=f"IPFS upload is delayed; the generated image was kept and queued as upload {upload.upload_id}. Check /api/v1/uploads/{upload.upload_id} and retry minting later."
+            )
         
         print(f"✅ Uploaded to IPFS:")
         print(f"   Image: {ipfs_result['image_ipfs_uri']}")
@@ -413,7 +1472,8 @@ async def mint_nft_complete(request: MintNFTRequest):
         # Create blockchain minter for this request (supports different networks)
         minter = BlockchainMinter()
         
-        mint_result = minter.mint_nft(
+        mint_result = await asyncio.to_thread(
+            minter.mint_nft,
             recipient_address=recipient,
             token_uri=ipfs_result["metadata_ipfs_uri"]
         )
@@ -427,6 +1487,12 @@ async def mint_nft_complete(request: MintNFTRequest):
         print(f"✅ Minted on blockchain:")
         print(f"   Token ID: {mint_result['token_id']}")
         print(f"   Transaction: {mint_result['transaction_hash']}")
+        try:
+            await asyncio.to_thread(
+                nft_generator.record_mint, generation_result["filename"], mint_result["token_id"], mint_result["transaction_hash"]
+            )
+        except Exception as e:
+            print(f"⚠️  Could not record token ID: {e}")
         
         # Step 4: Return complete result
         print("\n[4/4] Complete! NFT successfully minted! 🎉")
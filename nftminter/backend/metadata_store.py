@@ -0,0 +1,492 @@
+"""
+Metadata Repository
+NFT metadata kept in SQLite (the JSON document plus indexed name, prompt hash,
+CIDs, token ID and collection), written by a single writer thread that commits
+queued writes together, and read through an in-memory cache. JSON files are
+only written when exported
+"""
+
+import os
+import json
+import time
+import queue
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from prompt_cache import normalize_prompt
+
+# Indexed columns derived from each metadata document
+INDEXED_FIELDS = ("nft_name", "prompt_hash", "image_cid", "metadata_cid", "token_id", "collection")
+
+
+def prompt_hash(prompt: str) -> str:
+    """Hash of a normalized prompt, so spelling variants of a prompt match"""
+    return hashlib.sha256(normalize_prompt(prompt).encode("utf-8")).hexdigest()
+
+
+def _cid(uri) -> Optional[str]:
+    if isinstance(uri, str) and uri.startswith("ipfs://"):
+        return uri[len("ipfs://"):].split("/", 1)[0] or None
+    return None
+
+
+def index_fields(metadata: dict) -> dict:
+    """Values of the indexed columns for a metadata document"""
+    token_id = metadata.get("token_id")
+    collection = metadata.get("collection")
+    return {
+        "nft_name": metadata.get("name"),
+        "prompt_hash": prompt_hash(metadata["prompt"]) if metadata.get("prompt") else None,
+        "image_cid": _cid(metadata.get("image")),
+        "metadata_cid": _cid(metadata.get("metadata_uri")),
+        "token_id": int(token_id) if token_id is not None else None,
+        "collection": str(collection) if collection else None,
+    }
+
+
+class _Write:
+    """One queued write: a full document (save) or fields merged into the current one (update)"""
+
+    __slots__ = ("name", "document", "merge", "future")
+
+    def __init__(self, name: str, document: dict, merge: bool):
+        self.name = name
+        self.document = document
+        self.merge = merge
+        self.future: Future = Future()
+
+
+class MetadataStore:
+    """
+    SQLite-backed NFT metadata with group commit and a read cache.
+
+    Writes are queued to one writer thread, which applies everything waiting
+    in the queue in a single transaction, so concurrent generations share one
+    commit (and one fsync). Reads come from an LRU cache of serialized
+    documents and fall back to the database.
+    """
+
+    def __init__(
+        self,
+        db_path: str = "generated_nfts/metadata.db",
+        export_dir: str = "generated_nfts/metadata",
+        cache_entries: int = 4096,
+        commit_delay: float = 0.0,
+        max_batch: int = 512
+    ):
+        """
+        Args:
+            db_path: SQLite database file
+            export_dir: Directory metadata JSON files are exported to (and legacy files imported from)
+            cache_entries: Documents kept in the in-memory read cache
+            commit_delay: Seconds the writer waits for more writes before committing a batch
+            max_batch: Most writes committed in one transaction
+        """
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.export_dir = Path(export_dir)
+        self.export_dir.mkdir(parents=True, exist_ok=True)
+        self.cache_entries = cache_entries
+        self.commit_delay = commit_delay
+        self.max_batch = max_batch
+
+        # Request threads read through their own connection; the writer thread owns another
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS metadata (
+                    name TEXT PRIMARY KEY,
+                    document TEXT NOT NULL,
+                    nft_name TEXT,
+                    prompt_hash TEXT,
+                    image_cid TEXT,
+                    metadata_cid TEXT,
+                    token_id INTEGER,
+                    collection TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+                """
+            )
+            for field in INDEXED_FIELDS:
+                self._conn.execute(f"CREATE INDEX IF NOT EXISTS idx_metadata_{field} ON metadata ({field})")
+
+        self._cache: "OrderedDict[str, str]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+        # Bumped on every cache write, so a slow database read never caches a stale document
+        self._cache_version = 0
+        self.stats_counters = {"hits": 0, "misses": 0, "commits": 0, "writes": 0}
+
+        self._queue: "queue.Queue[Optional[_Write]]" = queue.Queue()
+        self._writer = threading.Thread(target=self._write_loop, name="metadata-writer", daemon=True)
+        self._writer.start()
+
+    @classmethod
+    def from_env(cls, output_dir: Union[str, Path] = "generated_nfts") -> "MetadataStore":
+        output_dir = Path(output_dir)
+        return cls(
+            db_path=os.getenv("METADATA_DB_PATH", str(output_dir / "metadata.db")),
+            export_dir=str(output_dir / "metadata"),
+            cache_entries=int(os.getenv("METADATA_CACHE_ENTRIES", "4096")),
+            commit_delay=float(os.getenv("METADATA_COMMIT_DELAY_MS", "0")) / 1000
+        )
+
+    def close(self, timeout: float = 5.0):
+        """Commit queued writes and stop the writer thread"""
+        self._queue.put(None)
+        self._writer.join(timeout)
+
+    # Writes
+
+    def save(self, name: str, metadata: dict, wait: bool = True) -> Future:
+        """
+        Store (or replace) the metadata document of an artifact.
+
+        Args:
+            name: Artifact name
+            metadata: Metadata document
+            wait: Block until the write is committed
+
+        Returns:
+            Future: Resolves to the stored document once committed
+
+        Raises:
+            ValueError: The document cannot be stored (e.g. a non-integer token_id)
+        """
+        write = self._prepare(name, metadata)
+        self._queue.put(write)
+        if wait:
+            write.future.result()
+        return write.future
+
+    def save_many(self, items: Iterable[Tuple[str, dict]]):
+        """
+        Store several documents; they are committed together.
+
+        Raises:
+            ValueError: A document cannot be stored (nothing is queued then)
+        """
+        writes = [self._prepare(name, metadata) for name, metadata in items]
+        for write in writes:
+            self._queue.put(write)
+        for write in writes:
+            write.future.result()
+
+    @staticmethod
+    def _prepare(name: str, metadata: dict) -> _Write:
+        """Copy and validate a document before it is queued, so it cannot fail a whole batch"""
+        document = json.loads(json.dumps(metadata))
+        try:
+            index_fields(document)
+        except (TypeError, ValueError, OverflowError) as e:
+            raise ValueError(f"Invalid metadata for '{name}': {e}")
+        return _Write(name, document, merge=False)
+
+    def update(self, name: str, fields: dict) -> Optional[dict]:
+        """
+        Atomically merge fields into an artifact's metadata document.
+
+        Returns:
+            dict: The updated document, or None if the artifact is unknown
+        """
+        write = _Write(name, json.loads(json.dumps(fields)), merge=True)
+        self._queue.put(write)
+        return write.future.result()
+
+    def _write_loop(self):
+        conn = sqlite3.connect(str(self.db_path))
+        conn.execute("PRAGMA busy_timeout=5000")
+        stopping = False
+        while not stopping:
+            first = self._queue.get()
+            if first is None:
+                break
+            batch = [first]
+            deadline = time.monotonic() + self.commit_delay
+            # Everything that queued up while the previous batch was committing goes in this one
+            while len(batch) < self.max_batch:
+                try:
+                    remaining = deadline - time.monotonic()
+                    write = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if write is None:
+                    stopping = True
+                    break
+                batch.append(write)
+            self._commit(conn, batch)
+        conn.close()
+
+    def _commit(self, conn: sqlite3.Connection, batch: List[_Write]):
+        now = time.time()
+        documents: Dict[str, Optional[str]] = {}
+        results = []
+        try:
+            with conn:
+                for write in batch:
+                    try:
+                        results.append(self._apply(conn, write, now, documents))
+                    except (TypeError, ValueError, OverflowError, sqlite3.IntegrityError) as e:
+                        # One bad document (e.g. merged into an invalid token_id) fails alone;
+                        # each statement is atomic, so the rest of the batch still commits
+                        print(f"⚠️  Skipped metadata write for {write.name}: {e}")
+                        results.append(e)
+        except Exception as e:
+            print(f"❌ Metadata commit failed ({len(batch)} writes): {e}")
+            for write in batch:
+                write.future.set_exception(e)
+            return
+
+        with self._cache_lock:
+            for name, text in documents.items():
+                self._cache_put(name, text)
+            self.stats_counters["commits"] += 1
+            self.stats_counters["writes"] += len(batch)
+        for write, result in zip(batch, results):
+            if isinstance(result, Exception):
+                write.future.set_exception(ValueError(f"Invalid metadata for '{write.name}': {result}"))
+            else:
+                write.future.set_result(result)
+
+    def _apply(self, conn: sqlite3.Connection, write: _Write, now: float, documents: Dict[str, Optional[str]]) -> Optional[dict]:
+        """Write one queued document; returns it, or None when merging into an unknown artifact"""
+        document = write.document
+        if write.merge:
+            row = conn.execute("SELECT document FROM metadata WHERE name = ?", (write.name,)).fetchone()
+            if row is None:
+                return None
+            document = {**json.loads(row[0]), **write.document}
+        text = json.dumps(document, separators=(",", ":"))
+        fields = index_fields(document)
+        conn.execute(
+            f"""
+            INSERT INTO metadata (name, document, {", ".join(INDEXED_FIELDS)}, created_at, updated_at)
+            VALUES (?, ?, {", ".join("?" for _ in INDEXED_FIELDS)}, ?, ?)
+            ON CONFLICT(name) DO UPDATE SET
+                document = excluded.document,
+                {", ".join(f"{field} = excluded.{field}" for field in INDEXED_FIELDS)},
+                updated_at = excluded.updated_at
+            """,
+            (write.name, text, *(fields[field] for field in INDEXED_FIELDS), now, now)
+        )
+        documents[write.name] = text
+        return document
+
+    def _cache_put(self, name: str, text: str):
+        self._cache_version += 1
+        self._cache[name] = text
+        self._cache.move_to_end(name)
+        while len(self._cache) > self.cache_entries:
+            self._cache.popitem(last=False)
+
+    # Reads
+
+    def get_json(self, name: str) -> Optional[str]:
+        """Serialized metadata document of an artifact (served as-is by the API)"""
+        with self._cache_lock:
+            text = self._cache.get(name)
+            if text is not None:
+                self._cache.move_to_end(name)
+                self.stats_counters["hits"] += 1
+                return text
+            self.stats_counters["misses"] += 1
+            version = self._cache_version
+
+        with self._lock:
+            row = self._conn.execute("SELECT document FROM metadata WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            return None
+        with self._cache_lock:
+            if self._cache_version == version:
+                self._cache_put(name, row[0])
+        return row[0]
+
+    def get(self, name: str) -> Optional[dict]:
+        """Metadata document of an artifact (a fresh copy the caller may modify)"""
+        text = self.get_json(name)
+        return json.loads(text) if text is not None else None
+
+    def query(
+        self,
+        minted: Optional[bool] = None,
+        pinned: Optional[bool] = None,
+        collection: Optional[str] = None,
+        prompt: Optional[str] = None,
+        limit: Optional[int] = 100,
+        offset: int = 0
+    ) -> List[dict]:
+        """
+        Find artifacts by their indexed fields, newest first.
+
+        Args:
+            minted: Only minted (True) or unminted (False) artifacts
+            pinned: Only artifacts whose metadata is (True) or is not (False) pinned
+            collection: Only artifacts of this collection
+            prompt: Only artifacts generated from this prompt (after normalization)
+            limit: Maximum number of results (None for all)
+            offset: Results to skip
+
+        Returns:
+            list: [{"name", "nft_name", "image_cid", "metadata_cid", "token_id", "collection", "updated_at"}]
+        """
+        clauses, params = [], []
+        if minted is not None:
+            clauses.append("token_id IS NOT NULL" if minted else "token_id IS NULL")
+        if pinned is not None:
+            clauses.append("metadata_cid IS NOT NULL" if pinned else "metadata_cid IS NULL")
+        if collection is not None:
+            clauses.append("collection = ?")
+            params.append(collection)
+        if prompt is not None:
+            clauses.append("prompt_hash = ?")
+            params.append(prompt_hash(prompt))
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+        with self._lock:
+            rows = self._conn.execute(
+                f"""
+                SELECT name, nft_name, image_cid, metadata_cid, token_id, collection, updated_at
+                FROM metadata {where}
+                ORDER BY created_at DESC, name
+                LIMIT ? OFFSET ?
+                """,
+                (*params, -1 if limit is None else limit, offset)
+            ).fetchall()
+        keys = ("name", "nft_name", "image_cid", "metadata_cid", "token_id", "collection", "updated_at")
+        return [dict(zip(keys, row)) for row in rows]
+
+    def has_cid(self, cid: str) -> bool:
+        """Whether a CID is the pinned image or metadata of a stored artifact"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM metadata WHERE image_cid = ? OR metadata_cid = ? LIMIT 1", (cid, cid)
+            ).fetchone()
+        return row is not None
+
+    def unminted(self, collection: Optional[str] = None, limit: int = 100, offset: int = 0) -> List[dict]:
+        """Artifacts without a token ID (see query)"""
+        return self.query(minted=False, collection=collection, limit=limit, offset=offset)
+
+    def pin_status(self, names: List[str]) -> Dict[str, Tuple[bool, bool, Optional[str]]]:
+        """
+        Whether artifacts are pinned and minted.
+
+        Returns:
+            dict: {name: (pinned, minted, image CID)}; unknown names are left out
+        """
+        status = {}
+        with self._lock:
+            for n in range(0, len(names), 500):
+                chunk = names[n:n + 500]
+                rows = self._conn.execute(
+                    f"""
+                    SELECT name, metadata_cid IS NOT NULL, token_id IS NOT NULL, image_cid FROM metadata
+                    WHERE name IN ({", ".join("?" for _ in chunk)})
+                    """,
+                    chunk
+                ).fetchall()
+                status.update((name, (bool(pinned), bool(minted), image_cid)) for name, pinned, minted, image_cid in rows)
+        return status
+
+    def items(self, collection_only: bool = False) -> Iterator[Tuple[str, dict]]:
+        """(name, metadata) for every stored document"""
+        where = "WHERE collection IS NOT NULL" if collection_only else ""
+        with self._lock:
+            rows = self._conn.execute(f"SELECT name, document FROM metadata {where}").fetchall()
+        for name, text in rows:
+            yield name, json.loads(text)
+
+    # Files
+
+    def location(self, name: str) -> str:
+        """
+        Where an artifact's metadata lives: "<db_path>#<name>". JSON files are
+        only written by export(), so this never points at a missing file.
+        """
+        return f"{self.db_path}#{name}"
+
+    def export(self, names: Optional[Iterable[str]] = None, export_dir: Optional[Union[str, Path]] = None) -> int:
+        """
+        Write metadata documents as pretty-printed JSON files (atomically).
+
+        Args:
+            names: Artifacts to export (default: all)
+            export_dir: Target directory (default: the store's export directory)
+
+        Returns:
+            int: Number of files written
+        """
+        export_dir = Path(export_dir) if export_dir else self.export_dir
+        export_dir.mkdir(parents=True, exist_ok=True)
+        if names is None:
+            documents = self.items()
+        else:
+            documents = ((name, self.get(name)) for name in names)
+
+        written = 0
+        for name, metadata in documents:
+            if metadata is None:
+                continue
+            path = export_dir / f"{name}.json"
+            tmp_path = path.with_name(f".{path.name}.{threading.get_ident()}.tmp")
+            with open(tmp_path, 'w') as f:
+                json.dump(metadata, f, indent=2)
+            os.replace(tmp_path, path)
+            written += 1
+        return written
+
+    def migrate(self, metadata_dir: Optional[Union[str, Path]] = None) -> int:
+        """
+        Import metadata JSON files written before the store existed. Files of
+        artifacts the store already knows are skipped; the files stay in place.
+
+        Returns:
+            int: Number of documents imported
+        """
+        metadata_dir = Path(metadata_dir) if metadata_dir else self.export_dir
+        if not metadata_dir.exists():
+            return 0
+        with self._lock:
+            known = {row[0] for row in self._conn.execute("SELECT name FROM metadata")}
+
+        items = []
+        for path in metadata_dir.glob("*.json"):
+            if path.name.startswith(".") or path.stem in known:
+                continue
+            try:
+                with open(path, 'r') as f:
+                    items.append(self._prepare(path.stem, json.load(f)))
+            except (OSError, ValueError, TypeError) as e:
+                # A bad file is skipped; it must not stop the rest of the import
+                print(f"⚠️  Could not import {path}: {e}")
+        imported = 0
+        for n in range(0, len(items), self.max_batch):
+            writes = items[n:n + self.max_batch]
+            for write in writes:
+                self._queue.put(write)
+            for write in writes:
+                try:
+                    write.future.result()
+                    imported += 1
+                except ValueError:
+                    pass
+        if imported:
+            print(f"🗃️  Imported {imported} metadata files into the metadata store")
+        return imported
+
+    def stats(self) -> dict:
+        with self._lock:
+            total, minted, pinned = self._conn.execute(
+                "SELECT COUNT(*), COUNT(token_id), COUNT(metadata_cid) FROM metadata"
+            ).fetchone()
+        with self._cache_lock:
+            cached = len(self._cache)
+        return {"documents": total, "minted": minted, "pinned": pinned, "cached": cached, **self.stats_counters}
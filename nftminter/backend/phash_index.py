@@ -0,0 +1,246 @@
+"""
+Perceptual Hash Index
+64-bit dHash fingerprints for generated images, kept in SQLite (8 bytes per
+image) and searched in memory with multi-index hashing, so near-duplicates can
+be flagged or rejected before pinning and minting
+"""
+
+import io
+import sqlite3
+import threading
+from itertools import combinations
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple, Union
+
+import numpy as np
+from PIL import Image
+
+HASH_BITS = 64
+IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".webp", ".gif", ".avif"}
+
+
+def dhash(image: Union[bytes, str, Path], hash_size: int = 8) -> int:
+    """
+    Difference hash: sign of horizontal gradients on a (hash_size+1) x hash_size
+    grayscale thumbnail. Robust to rescaling, recompression and small color shifts.
+
+    Returns:
+        int: Unsigned 64-bit hash (for hash_size=8)
+    """
+    source = io.BytesIO(image) if isinstance(image, bytes) else image
+    with Image.open(source) as img:
+        img.draft("L", (hash_size * 4, hash_size * 4))
+        small = img.convert("L").resize((hash_size + 1, hash_size), Image.BILINEAR)
+    pixels = np.asarray(small, dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+def _to_signed(value: int) -> int:
+    """SQLite integers are signed 64-bit"""
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+
+def _to_unsigned(value: int) -> int:
+    return value + (1 << 64) if value < 0 else value
+
+
+class PerceptualIndex:
+    """
+    Near-duplicate index over image fingerprints.
+
+    The 64-bit hash is split into `chunks` substrings, each with its own
+    hash table. Two hashes within distance r agree to within r // chunks bits
+    on at least one substring (pigeonhole), so a query only probes the
+    substring neighbourhoods instead of scanning every image.
+    """
+
+    def __init__(self, db_path: str = "generated_nfts/phash.db", max_distance: int = 6, chunks: int = 4):
+        """
+        Args:
+            db_path: SQLite file holding filename -> hash
+            max_distance: Default Hamming distance (of 64 bits) that counts as a near-duplicate
+            chunks: Number of substring tables (64 must be divisible by it)
+        """
+        if HASH_BITS % chunks:
+            raise ValueError("chunks must divide 64")
+        self.max_distance = max_distance
+        self.chunks = chunks
+        self.chunk_bits = HASH_BITS // chunks
+        self.chunk_mask = (1 << self.chunk_bits) - 1
+
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._lock = threading.Lock()
+
+        self._hashes: Dict[str, int] = {}
+        self._tables: List[Dict[int, Set[str]]] = [{} for _ in range(chunks)]
+        self._flips: Dict[int, List[int]] = {}
+
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS phashes (
+                    filename TEXT PRIMARY KEY,
+                    hash INTEGER NOT NULL,
+                    mtime REAL
+                )
+                """
+            )
+            for filename, value, _ in self._conn.execute("SELECT filename, hash, mtime FROM phashes"):
+                self._insert(filename, _to_unsigned(value))
+
+    def __len__(self) -> int:
+        return len(self._hashes)
+
+    def _substrings(self, value: int) -> List[int]:
+        return [(value >> (i * self.chunk_bits)) & self.chunk_mask for i in range(self.chunks)]
+
+    def _insert(self, filename: str, value: int):
+        old = self._hashes.get(filename)
+        if old is not None:
+            self._discard(filename, old)
+        self._hashes[filename] = value
+        for table, key in zip(self._tables, self._substrings(value)):
+            table.setdefault(key, set()).add(filename)
+
+    def _discard(self, filename: str, value: int):
+        for table, key in zip(self._tables, self._substrings(value)):
+            bucket = table.get(key)
+            if bucket:
+                bucket.discard(filename)
+                if not bucket:
+                    del table[key]
+
+    def _neighbour_masks(self, radius: int) -> List[int]:
+        """XOR masks of all substrings within `radius` bits (cached per radius)"""
+        masks = self._flips.get(radius)
+        if masks is None:
+            masks = [0]
+            for r in range(1, radius + 1):
+                for bits in combinations(range(self.chunk_bits), r):
+                    mask = 0
+                    for bit in bits:
+                        mask |= 1 << bit
+                    masks.append(mask)
+            self._flips[radius] = masks
+        return masks
+
+    def add(self, filename: str, value: int, mtime: Optional[float] = None):
+        """Index (or re-index) an image hash"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO phashes (filename, hash, mtime) VALUES (?, ?, ?)",
+                (filename, _to_signed(value), mtime)
+            )
+            self._insert(filename, value)
+
+    def remove(self, filename: str):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM phashes WHERE filename = ?", (filename,))
+            value = self._hashes.pop(filename, None)
+            if value is not None:
+                self._discard(filename, value)
+
+    def query(self, value: int, max_distance: Optional[int] = None, exclude: Optional[str] = None) -> List[Tuple[str, int]]:
+        """
+        Find indexed images within max_distance of a hash.
+
+        Returns:
+            list: (filename, distance) pairs, closest first
+        """
+        max_distance = self.max_distance if max_distance is None else max_distance
+        radius = max_distance // self.chunks
+        masks = self._neighbour_masks(radius)
+
+        matches = {}
+        with self._lock:
+            for table, key in zip(self._tables, self._substrings(value)):
+                for mask in masks:
+                    for filename in table.get(key ^ mask, ()):
+                        if filename in matches or filename == exclude:
+                            continue
+                        distance = hamming(value, self._hashes[filename])
+                        if distance <= max_distance:
+                            matches[filename] = distance
+        return sorted(matches.items(), key=lambda m: (m[1], m[0]))
+
+    def similar(self, filename: str, max_distance: Optional[int] = None) -> Optional[List[dict]]:
+        """Near-duplicates of an indexed image, or None if it is not indexed"""
+        value = self._hashes.get(filename)
+        if value is None:
+            return None
+        return [
+            {"filename": other, "distance": distance}
+            for other, distance in self.query(value, max_distance, exclude=filename)
+        ]
+
+    def check(self, filename: str, image: Union[bytes, str, Path], add: bool = True) -> List[dict]:
+        """
+        Hash an image, report its near-duplicates and (optionally) index it.
+
+        Returns:
+            list: [{"filename", "distance"}] of other images within max_distance
+        """
+        value = dhash(image)
+        duplicates = [
+            {"filename": other, "distance": distance}
+            for other, distance in self.query(value, exclude=filename)
+        ]
+        if add:
+            self.add(filename, value)
+        return duplicates
+
+    def sync(self, images: Union[str, Path, Iterable[Tuple[str, Path]]]) -> dict:
+        """
+        Bring the index in line with the stored images: hash new or changed
+        files and drop entries whose files are gone.
+
+        Args:
+            images: An images directory (file stem = filename) or (filename, path) pairs
+        """
+        if isinstance(images, (str, Path)):
+            images_dir = Path(images)
+            images = [
+                (path.stem, path)
+                for path in (images_dir.iterdir() if images_dir.exists() else [])
+                if path.suffix.lower() in IMAGE_EXTENSIONS and not path.name.startswith(".")
+            ]
+        with self._lock:
+            known = {
+                filename: mtime
+                for filename, mtime in self._conn.execute("SELECT filename, mtime FROM phashes")
+            }
+
+        added = removed = 0
+        seen = set()
+        for filename, path in images:
+            try:
+                mtime = path.stat().st_mtime
+            except FileNotFoundError:
+                continue
+            seen.add(filename)
+            if known.get(filename) == mtime:
+                continue
+            try:
+                self.add(filename, dhash(path), mtime=mtime)
+                added += 1
+            except Exception as e:
+                print(f"⚠️  Could not hash {path}: {e}")
+
+        for filename in set(known) - seen:
+            self.remove(filename)
+            removed += 1
+
+        if added or removed:
+            print(f"🧬 Perceptual index synced: +{added} -{removed} ({len(self)} images)")
+        return {"added": added, "removed": removed, "total": len(self)}
+
+    def stats(self) -> dict:
+        return {"images": len(self), "max_distance": self.max_distance, "chunks": self.chunks}
@@ -0,0 +1,278 @@
+"""
+Local Pin Mirror
+SQLite mirror of the content pinned by our IPFS backend, synced incrementally
+from the backend's paged pin list. Answers "is this pinned?" and "how much are
+we storing?" without API calls, and bulk-unpins orphaned content.
+
+Usage:
+    python pin_mirror.py sync [--full]
+    python pin_mirror.py stats
+    python pin_mirror.py unpin --name-like "test%" [--older-than-days 7] [--dry-run]
+    python pin_mirror.py unpin <cid> [<cid> ...]
+"""
+
+import sqlite3
+import argparse
+import threading
+from datetime import datetime, timezone, timedelta
+from pathlib import Path
+from typing import Optional, List, Dict
+
+
+class PinMirror:
+    """Local SQLite mirror of pinned content (CID, name, size, date)"""
+
+    def __init__(self, backend, db_path: str = "generated_nfts/pins.db", page_size: int = 1000):
+        """
+        Initialize the pin mirror.
+
+        Args:
+            backend: IPFSBackend providing list_pins() and unpin()
+            db_path: SQLite database file for the mirror
+            page_size: Page size used when walking the backend's pin list
+        """
+        self.backend = backend
+        self.page_size = page_size
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._lock = threading.Lock()
+
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS pins (
+                    cid TEXT PRIMARY KEY,
+                    name TEXT,
+                    size INTEGER NOT NULL DEFAULT 0,
+                    date_pinned TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_pins_name ON pins (name);
+                CREATE INDEX IF NOT EXISTS idx_pins_date ON pins (date_pinned);
+
+                -- Running totals so usage() never scans the table
+                CREATE TABLE IF NOT EXISTS totals (
+                    id INTEGER PRIMARY KEY CHECK (id = 1),
+                    pin_count INTEGER NOT NULL,
+                    total_bytes INTEGER NOT NULL
+                );
+                INSERT OR IGNORE INTO totals (id, pin_count, total_bytes) VALUES (1, 0, 0);
+
+                CREATE TRIGGER IF NOT EXISTS pins_insert AFTER INSERT ON pins BEGIN
+                    UPDATE totals SET pin_count = pin_count + 1, total_bytes = total_bytes + NEW.size WHERE id = 1;
+                END;
+                CREATE TRIGGER IF NOT EXISTS pins_delete AFTER DELETE ON pins BEGIN
+                    UPDATE totals SET pin_count = pin_count - 1, total_bytes = total_bytes - OLD.size WHERE id = 1;
+                END;
+                CREATE TRIGGER IF NOT EXISTS pins_update AFTER UPDATE OF size ON pins BEGIN
+                    UPDATE totals SET total_bytes = total_bytes - OLD.size + NEW.size WHERE id = 1;
+                END;
+
+                CREATE TABLE IF NOT EXISTS sync_state (
+                    key TEXT PRIMARY KEY,
+                    value TEXT
+                );
+                """
+            )
+
+    def record(self, cid: str, name: Optional[str] = None, size: Optional[int] = None, date_pinned: Optional[str] = None):
+        """Record a pin we just created (keeps the mirror current between syncs)"""
+        date_pinned = date_pinned or datetime.now(timezone.utc).isoformat()
+        with self._lock, self._conn:
+            self._upsert(cid, name, size, date_pinned)
+
+    def is_pinned(self, cid: str) -> bool:
+        """Check whether a CID is pinned, using only the local mirror"""
+        with self._lock:
+            row = self._conn.execute("SELECT 1 FROM pins WHERE cid = ?", (cid,)).fetchone()
+        return row is not None
+
+    def usage(self) -> Dict[str, int]:
+        """Number of pins and total pinned bytes"""
+        with self._lock:
+            count, total = self._conn.execute(
+                "SELECT pin_count, total_bytes FROM totals WHERE id = 1"
+            ).fetchone()
+            last_sync = self._get_state("last_sync_at")
+        return {"pin_count": count, "total_bytes": total, "last_sync_at": last_sync}
+
+    def find(self, name_like: Optional[str] = None, older_than: Optional[datetime] = None, limit: int = 10000) -> List[dict]:
+        """
+        Find mirrored pins by name pattern (SQL LIKE) and/or age.
+
+        Args:
+            name_like: SQL LIKE pattern for the pin name, e.g. "test%"
+            older_than: Only return pins created before this time
+            limit: Maximum number of rows
+
+        Returns:
+            list: Matching pins
+        """
+        clauses, params = [], []
+        if name_like:
+            clauses.append("name LIKE ?")
+            params.append(name_like)
+        if older_than:
+            clauses.append("date_pinned < ?")
+            params.append(older_than.astimezone(timezone.utc).isoformat())
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT cid, name, size, date_pinned FROM pins {where} ORDER BY date_pinned LIMIT ?",
+                (*params, limit)
+            ).fetchall()
+        return [{"cid": r[0], "name": r[1], "size": r[2], "date_pinned": r[3]} for r in rows]
+
+    def sync(self, full: bool = False) -> Dict[str, int]:
+        """
+        Sync the mirror from the backend's pin list.
+
+        Incremental syncs only request pins newer than the newest one already
+        mirrored. A full sync walks the whole list and also drops pins that
+        were removed outside this service.
+
+        Args:
+            full: Walk the complete pin list and remove stale entries
+
+        Returns:
+            dict: Number of pins added and removed
+        """
+        with self._lock:
+            since = None if full else self._get_state("newest_date_pinned")
+
+        print(f"🔄 Syncing pin mirror ({'full' if full else 'incremental'}) from {self.backend.name}...")
+        seen = set()
+        added = 0
+        newest = since
+        offset = 0
+
+        while True:
+            page = self.backend.list_pins(offset=offset, limit=self.page_size, since=since)
+            with self._lock, self._conn:
+                for pin in page:
+                    seen.add(pin["cid"])
+                    if self._upsert(pin["cid"], pin.get("name"), pin.get("size"), pin["date_pinned"]):
+                        added += 1
+                    if newest is None or pin["date_pinned"] > newest:
+                        newest = pin["date_pinned"]
+            if len(page) < self.page_size:
+                break
+            offset += len(page)
+
+        removed = 0
+        with self._lock, self._conn:
+            if full:
+                # Mark-and-sweep: anything not listed is no longer pinned
+                self._conn.execute("CREATE TEMP TABLE IF NOT EXISTS seen_pins (cid TEXT PRIMARY KEY)")
+                self._conn.execute("DELETE FROM seen_pins")
+                self._conn.executemany("INSERT OR IGNORE INTO seen_pins (cid) VALUES (?)", ((c,) for c in seen))
+                removed = self._conn.execute(
+                    "DELETE FROM pins WHERE cid NOT IN (SELECT cid FROM seen_pins)"
+                ).rowcount
+            if newest:
+                self._set_state("newest_date_pinned", newest)
+            self._set_state("last_sync_at", datetime.now(timezone.utc).isoformat())
+
+        print(f"✅ Pin mirror synced: {added} added, {removed} removed")
+        return {"added": added, "removed": removed}
+
+    def unpin(self, cids: List[str], dry_run: bool = False) -> Dict[str, list]:
+        """
+        Unpin content from the backend and drop it from the mirror.
+
+        Args:
+            cids: CIDs to unpin
+            dry_run: Only report what would be unpinned
+
+        Returns:
+            dict: Lists of unpinned and failed CIDs
+        """
+        unpinned, failed = [], []
+        for cid in cids:
+            if dry_run:
+                unpinned.append(cid)
+                continue
+            try:
+                self.backend.unpin(cid)
+            except Exception as e:
+                print(f"❌ Failed to unpin {cid}: {e}")
+                failed.append(cid)
+                continue
+            with self._lock, self._conn:
+                self._conn.execute("DELETE FROM pins WHERE cid = ?", (cid,))
+            unpinned.append(cid)
+
+        print(f"🧹 {'Would unpin' if dry_run else 'Unpinned'} {len(unpinned)} CIDs ({len(failed)} failed)")
+        return {"unpinned": unpinned, "failed": failed}
+
+    def _upsert(self, cid: str, name: Optional[str], size: Optional[int], date_pinned: str) -> bool:
+        """Insert or update a pin. Returns True if the CID was new. Caller holds the lock."""
+        cursor = self._conn.execute(
+            "INSERT OR IGNORE INTO pins (cid, name, size, date_pinned) VALUES (?, ?, ?, ?)",
+            (cid, name, size or 0, date_pinned)
+        )
+        if cursor.rowcount:
+            return True
+        self._conn.execute(
+            "UPDATE pins SET name = COALESCE(?, name), size = CASE WHEN ? > 0 THEN ? ELSE size END WHERE cid = ?",
+            (name, size or 0, size or 0, cid)
+        )
+        return False
+
+    def _get_state(self, key: str) -> Optional[str]:
+        row = self._conn.execute("SELECT value FROM sync_state WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_state(self, key: str, value: str):
+        self._conn.execute(
+            "INSERT INTO sync_state (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            (key, value)
+        )
+
+
+# Command line interface
+if __name__ == "__main__":
+    import os
+    from ipfs_uploader import create_backend
+
+    parser = argparse.ArgumentParser(description="Manage the local mirror of pinned IPFS content")
+    parser.add_argument("--db", default=os.getenv("PIN_MIRROR_PATH", "generated_nfts/pins.db"))
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    sync_parser = subparsers.add_parser("sync", help="Sync the mirror from the pin list")
+    sync_parser.add_argument("--full", action="store_true", help="Full resync, dropping stale pins")
+
+    subparsers.add_parser("stats", help="Show pin count and stored bytes")
+
+    unpin_parser = subparsers.add_parser("unpin", help="Bulk unpin orphaned content")
+    unpin_parser.add_argument("cids", nargs="*", help="Explicit CIDs to unpin")
+    unpin_parser.add_argument("--name-like", help="SQL LIKE pattern on the pin name, e.g. 'test%%'")
+    unpin_parser.add_argument("--older-than-days", type=float, help="Only pins older than this many days")
+    unpin_parser.add_argument("--dry-run", action="store_true", help="List matches without unpinning")
+
+    args = parser.parse_args()
+    mirror = PinMirror(create_backend(), db_path=args.db)
+
+    if args.command == "sync":
+        mirror.sync(full=args.full)
+    elif args.command == "stats":
+        usage = mirror.usage()
+        print(f"📌 Pins: {usage['pin_count']}")
+        print(f"💾 Stored: {usage['total_bytes'] / (1024 * 1024):.2f} MB")
+        print(f"🕒 Last sync: {usage['last_sync_at'] or 'never'}")
+    elif args.command == "unpin":
+        cids = list(args.cids)
+        if args.name_like or args.older_than_days is not None:
+            older_than = None
+            if args.older_than_days is not None:
+                older_than = datetime.now(timezone.utc) - timedelta(days=args.older_than_days)
+            matches = mirror.find(name_like=args.name_like, older_than=older_than)
+            for pin in matches:
+                print(f"   {pin['cid']}  {pin['name']}  {pin['size']} bytes  {pin['date_pinned']}")
+            cids.extend(pin["cid"] for pin in matches)
+        if not cids:
+            parser.error("nothing to unpin: pass CIDs or --name-like / --older-than-days")
+        mirror.unpin(cids, dry_run=args.dry_run)
@@ -0,0 +1,131 @@
+"""
+Prompt Result Cache
+Opt-in cache that maps (model, normalized enhanced prompt, generation config)
+to an image already in the generated_nfts store, plus its IPFS CIDs once known
+"""
+
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from pathlib import Path
+from typing import Optional
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Normalize a prompt so trivially different spellings share a cache entry"""
+    prompt = re.sub(r"\s+", " ", prompt.strip().lower())
+    return prompt.rstrip(" .!")
+
+
+def cache_key(model: str, enhanced_prompt: str, config: dict) -> str:
+    """Stable cache key for a generation request"""
+    payload = json.dumps(
+        {"model": model, "prompt": normalize_prompt(enhanced_prompt), "config": config},
+        sort_keys=True
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class PromptCache:
+    """
+    LRU index over previously generated artifacts.
+
+    Entries only point at files in the generated_nfts store; evicting an entry
+    never deletes the artifact itself, since it may already be pinned or minted.
+    """
+
+    def __init__(self, db_path: str = "generated_nfts/prompt_cache.db", max_entries: int = 1000):
+        """
+        Args:
+            db_path: SQLite database file for the cache index
+            max_entries: Maximum number of cached prompts (least recently used are evicted)
+        """
+        self.max_entries = max_entries
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS prompt_cache (
+                    key TEXT PRIMARY KEY,
+                    filename TEXT NOT NULL,
+                    image_path TEXT NOT NULL,
+                    metadata_path TEXT NOT NULL,
+                    mime_type TEXT,
+                    image_cid TEXT,
+                    metadata_cid TEXT,
+                    hits INTEGER NOT NULL DEFAULT 0,
+                    created_at REAL NOT NULL,
+                    last_used REAL NOT NULL
+                )
+                """
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_prompt_cache_lru ON prompt_cache (last_used)")
+
+    def lookup(self, key: str) -> Optional[dict]:
+        """
+        Return the cached entry for a key, or None.
+
+        Entries whose image no longer exists are dropped (metadata lives in
+        the metadata store, which the caller checks).
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM prompt_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+
+            if not Path(row["image_path"]).exists():
+                with self._conn:
+                    self._conn.execute("DELETE FROM prompt_cache WHERE key = ?", (key,))
+                return None
+
+            with self._conn:
+                self._conn.execute(
+                    "UPDATE prompt_cache SET hits = hits + 1, last_used = ? WHERE key = ?", (time.time(), key)
+                )
+        return dict(row)
+
+    def store(self, key: str, filename: str, image_path: str, metadata_path: str, mime_type: Optional[str] = None):
+        """Add (or replace) an entry and evict least recently used entries over the limit"""
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                """
+                INSERT OR REPLACE INTO prompt_cache (key, filename, image_path, metadata_path, mime_type, created_at, last_used)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                (key, filename, image_path, metadata_path, mime_type, now, now)
+            )
+            self._conn.execute(
+                """
+                DELETE FROM prompt_cache WHERE key IN (
+                    SELECT key FROM prompt_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?
+                )
+                """,
+                (self.max_entries,)
+            )
+
+    def record_cids(self, key: str, image_cid: Optional[str] = None, metadata_cid: Optional[str] = None):
+        """Remember the IPFS CIDs of a cached artifact once it has been pinned"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                """
+                UPDATE prompt_cache
+                SET image_cid = COALESCE(?, image_cid), metadata_cid = COALESCE(?, metadata_cid)
+                WHERE key = ?
+                """,
+                (image_cid, metadata_cid, key)
+            )
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries, hits = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(hits), 0) FROM prompt_cache").fetchone()
+        return {"entries": entries, "hits": hits, "max_entries": self.max_entries}
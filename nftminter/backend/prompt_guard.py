@@ -0,0 +1,137 @@
+"""
+Prompt Guard
+Cheap local checks run before a prompt reaches Gemini: length limits, a
+precompiled blocklist, and a TTL cache of prompts that recently produced no image
+"""
+
+import os
+import re
+import time
+import threading
+from collections import OrderedDict
+from typing import Iterable, Optional
+
+from prompt_cache import normalize_prompt
+
+
+def compile_blocklist(patterns: Iterable[str]) -> Optional[re.Pattern]:
+    """
+    Compile blocklist patterns into a single case-insensitive matcher.
+
+    Plain words match whole words only; entries wrapped in slashes
+    ("/regex/") are used as regular expressions.
+    """
+    parts = []
+    for pattern in patterns:
+        pattern = pattern.strip()
+        if not pattern:
+            continue
+        if len(pattern) > 2 and pattern.startswith("/") and pattern.endswith("/"):
+            parts.append(f"(?:{pattern[1:-1]})")
+        else:
+            parts.append(rf"\b{re.escape(pattern)}\b")
+    if not parts:
+        return None
+    return re.compile("|".join(parts), re.IGNORECASE)
+
+
+def load_blocklist() -> list:
+    """Blocklist entries from PROMPT_BLOCKLIST (comma separated) and PROMPT_BLOCKLIST_FILE (one per line)"""
+    entries = [p for p in os.getenv("PROMPT_BLOCKLIST", "").split(",") if p.strip()]
+    path = os.getenv("PROMPT_BLOCKLIST_FILE")
+    if path and os.path.exists(path):
+        with open(path, "r") as f:
+            entries.extend(line.strip() for line in f if line.strip() and not line.startswith("#"))
+    return entries
+
+
+class PromptGuard:
+    """Reject prompts locally instead of spending a Gemini call on them"""
+
+    def __init__(
+        self,
+        min_length: int = 3,
+        max_length: int = 2000,
+        blocklist: Optional[Iterable[str]] = None,
+        negative_ttl: float = 3600.0,
+        max_entries: int = 10000
+    ):
+        """
+        Args:
+            min_length: Minimum prompt length after trimming
+            max_length: Maximum prompt length
+            blocklist: Words or "/regex/" patterns that are always rejected
+            negative_ttl: Seconds a prompt that produced no image stays rejected (0 disables)
+            max_entries: Maximum number of remembered failing prompts
+        """
+        self.min_length = min_length
+        self.max_length = max_length
+        self.blocklist = compile_blocklist(blocklist or [])
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self._failures: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.rejections = 0
+
+    @classmethod
+    def from_env(cls) -> "PromptGuard":
+        return cls(
+            min_length=int(os.getenv("PROMPT_MIN_LENGTH", "3")),
+            max_length=int(os.getenv("PROMPT_MAX_LENGTH", "2000")),
+            blocklist=load_blocklist(),
+            negative_ttl=float(os.getenv("PROMPT_NEGATIVE_TTL_SECONDS", "3600"))
+        )
+
+    def check(self, prompt: str) -> Optional[str]:
+        """
+        Validate a prompt.
+
+        Returns:
+            str: Reason the prompt is rejected, or None if it may be generated
+        """
+        reason = self._check(prompt)
+        if reason:
+            self.rejections += 1
+        return reason
+
+    def _check(self, prompt: str) -> Optional[str]:
+        length = len(prompt.strip())
+        if length < self.min_length:
+            return f"Prompt is too short (minimum {self.min_length} characters)"
+        if length > self.max_length:
+            return f"Prompt is too long (maximum {self.max_length} characters)"
+
+        if self.blocklist is not None and self.blocklist.search(prompt):
+            return "Prompt contains blocked content"
+
+        if self.negative_ttl > 0:
+            key = normalize_prompt(prompt)
+            with self._lock:
+                entry = self._failures.get(key)
+                if entry is not None:
+                    failed_at, error = entry
+                    if time.time() - failed_at < self.negative_ttl:
+                        return f"{error} (cached failure, retry later or rephrase the prompt)"
+                    del self._failures[key]
+        return None
+
+    def record_failure(self, prompt: str, error: str):
+        """Remember that a prompt produced no image"""
+        if self.negative_ttl <= 0:
+            return
+        key = normalize_prompt(prompt)
+        with self._lock:
+            self._failures[key] = (time.time(), error)
+            self._failures.move_to_end(key)
+            while len(self._failures) > self.max_entries:
+                self._failures.popitem(last=False)
+
+    def forget(self, prompt: str):
+        """Drop a cached failure, e.g. after a manual retry succeeded"""
+        with self._lock:
+            self._failures.pop(normalize_prompt(prompt), None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            failures = len(self._failures)
+        return {"negative_entries": failures, "rejections": self.rejections}
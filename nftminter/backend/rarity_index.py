@@ -0,0 +1,237 @@
+"""
+Collection Rarity Index
+Columnar trait index over collection metadata: one integer-coded column per
+trait type, updated as metadata is written, with trait frequencies and rarity
+scores computed by vectorized NumPy operations
+"""
+
+import json
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+
+# Per-item timestamps are unique and say nothing about rarity
+EXCLUDED_TRAITS = {"Created"}
+
+# Value recorded for items that lack a trait
+MISSING_VALUE = "None"
+
+
+class _TraitColumn:
+    """Integer codes for one trait type; code 0 is MISSING_VALUE"""
+
+    def __init__(self, capacity: int):
+        self.values: List[str] = [MISSING_VALUE]
+        self.codes: Dict[str, int] = {MISSING_VALUE: 0}
+        self.data = np.zeros(capacity, dtype=np.int32)
+
+    def code(self, value: str) -> int:
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def grow(self, capacity: int):
+        data = np.zeros(capacity, dtype=np.int32)
+        data[:len(self.data)] = self.data
+        self.data = data
+
+
+class _CollectionColumns:
+    """Rows (one per item) and trait columns of one collection"""
+
+    def __init__(self, capacity: int = 1024):
+        self.capacity = capacity
+        self.rows: Dict[str, int] = {}
+        self.filenames: List[str] = []
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.columns: Dict[str, _TraitColumn] = {}
+        self.version = 0
+        self.computed = None
+
+    def _grow(self):
+        self.capacity *= 2
+        alive = np.zeros(self.capacity, dtype=bool)
+        alive[:len(self.alive)] = self.alive
+        self.alive = alive
+        for column in self.columns.values():
+            column.grow(self.capacity)
+
+    def set(self, filename: str, traits: Dict[str, str]):
+        row = self.rows.get(filename)
+        if row is None:
+            if len(self.filenames) == self.capacity:
+                self._grow()
+            row = self.rows[filename] = len(self.filenames)
+            self.filenames.append(filename)
+        self.alive[row] = True
+
+        for trait_type in traits:
+            if trait_type not in self.columns:
+                self.columns[trait_type] = _TraitColumn(self.capacity)
+        for trait_type, column in self.columns.items():
+            value = traits.get(trait_type)
+            column.data[row] = column.code(value) if value is not None else 0
+        self.version += 1
+
+    def remove(self, filename: str) -> bool:
+        row = self.rows.get(filename)
+        if row is None or not self.alive[row]:
+            return False
+        self.alive[row] = False
+        self.version += 1
+        return True
+
+
+def extract_traits(metadata: dict) -> Dict[str, str]:
+    """{trait_type: value} from OpenSea-style attributes, minus excluded traits"""
+    traits = {}
+    for attribute in metadata.get("attributes") or []:
+        if not isinstance(attribute, dict):
+            continue
+        trait_type = attribute.get("trait_type")
+        if trait_type is None or trait_type in EXCLUDED_TRAITS:
+            continue
+        traits[str(trait_type)] = str(attribute.get("value"))
+    return traits
+
+
+class RarityIndex:
+    """
+    Trait statistics for every collection found in metadata.
+
+    Items are grouped by the metadata "collection" field (set by collection
+    jobs); metadata without it is ignored. Scores use the statistical rarity
+    method: the sum over traits of 1 / trait frequency, with missing traits
+    counted as a "None" value.
+    """
+
+    def __init__(self):
+        self._collections: Dict[str, _CollectionColumns] = {}
+        self._locations: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def update(self, filename: str, metadata: dict):
+        """Index (or re-index) one item's metadata"""
+        collection_id = metadata.get("collection")
+        with self._lock:
+            previous = self._locations.get(filename)
+            if previous is not None and previous != collection_id:
+                self._collections[previous].remove(filename)
+                del self._locations[filename]
+            if not collection_id:
+                return
+            collection_id = str(collection_id)
+            columns = self._collections.get(collection_id)
+            if columns is None:
+                columns = self._collections[collection_id] = _CollectionColumns()
+            columns.set(filename, extract_traits(metadata))
+            self._locations[filename] = collection_id
+
+    def remove(self, filename: str):
+        with self._lock:
+            collection_id = self._locations.pop(filename, None)
+            if collection_id is not None:
+                self._collections[collection_id].remove(filename)
+
+    def load(self, source: Union[str, Path, Iterable[Tuple[str, dict]]]) -> int:
+        """
+        Index existing metadata.
+
+        Args:
+            source: A directory of metadata JSON files, or (filename, metadata) pairs
+
+        Returns:
+            int: Number of collection items indexed
+        """
+        if isinstance(source, (str, Path)):
+            source = self._read_dir(Path(source))
+        loaded = 0
+        for filename, metadata in source:
+            if metadata.get("collection"):
+                self.update(filename, metadata)
+                loaded += 1
+        if loaded:
+            print(f"📊 Rarity index loaded: {loaded} items in {len(self._collections)} collections")
+        return loaded
+
+    def _read_dir(self, metadata_dir: Path) -> Iterable[Tuple[str, dict]]:
+        for path in metadata_dir.glob("*.json") if metadata_dir.exists() else []:
+            try:
+                with open(path, 'r') as f:
+                    yield path.stem, json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"⚠️  Could not read {path}: {e}")
+
+    def rarity(self, collection_id: str, offset: int = 0, limit: Optional[int] = None) -> Optional[dict]:
+        """
+        Trait frequencies and per-item rarity for a collection.
+
+        Args:
+            collection_id: Collection to report on
+            offset: First ranking entry to return
+            limit: Number of ranking entries to return (None for all)
+
+        Returns:
+            dict: {"items", "traits": {trait_type: {value: {"count", "frequency"}}},
+                   "ranking": [{"filename", "score", "rank"}] rarest first},
+                  or None if no item of the collection is indexed
+        """
+        with self._lock:
+            columns = self._collections.get(collection_id)
+            if columns is None:
+                return None
+            if columns.computed is None or columns.computed[0] != columns.version:
+                columns.computed = (columns.version, self._compute(columns))
+            computed = columns.computed[1]
+
+        end = None if limit is None else offset + limit
+        ranking = [
+            {"filename": filename, "score": round(float(score), 4), "rank": int(rank)}
+            for filename, score, rank in zip(
+                computed["filenames"][offset:end], computed["scores"][offset:end], computed["ranks"][offset:end]
+            )
+        ]
+        return {"items": computed["items"], "traits": computed["traits"], "ranking": ranking}
+
+    def _compute(self, columns: _CollectionColumns) -> dict:
+        rows = np.flatnonzero(columns.alive[:len(columns.filenames)])
+        total = len(rows)
+        traits = {}
+        scores = np.zeros(total, dtype=np.float64)
+
+        for trait_type, column in columns.columns.items():
+            codes = column.data[rows]
+            counts = np.bincount(codes, minlength=len(column.values))
+            present = np.flatnonzero(counts)
+            if total:
+                scores += total / counts[codes]
+            traits[trait_type] = {
+                column.values[code]: {"count": int(count), "frequency": round(float(count) / total, 6)}
+                for code, count in zip(present.tolist(), counts[present].tolist())
+            }
+
+        # Rarest first; ties broken by filename so the order is stable across reloads
+        filenames = np.array(columns.filenames, dtype=object)[rows]
+        order = np.lexsort((filenames.astype(str), -scores)) if total else np.zeros(0, dtype=np.int64)
+        sorted_scores = scores[order]
+        # Equal scores share a rank
+        new_rank = np.r_[True, sorted_scores[1:] != sorted_scores[:-1]] if total else np.zeros(0, dtype=bool)
+        ranks = np.flatnonzero(new_rank)[np.cumsum(new_rank) - 1] + 1
+        return {
+            "items": total,
+            "traits": traits,
+            "filenames": filenames[order].tolist(),
+            "scores": sorted_scores,
+            "ranks": ranks,
+        }
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "collections": len(self._collections),
+                "items": len(self._locations),
+            }
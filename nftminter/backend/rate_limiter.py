@@ -0,0 +1,89 @@
+"""
+Rate Limiter
+Thread-safe token bucket used to keep Gemini calls within the RPM quota
+across all concurrent requests
+"""
+
+import time
+import asyncio
+import threading
+from typing import Optional
+
+
+class RateLimitTimeout(Exception):
+    """Raised when a token could not be acquired in time"""
+
+
+def _on_event_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at a fixed rate"""
+
+    def __init__(self, rate_per_minute: float, burst: Optional[int] = None):
+        """
+        Initialize the bucket (starts full).
+
+        Args:
+            rate_per_minute: Sustained number of acquisitions allowed per minute
+            burst: Bucket capacity, i.e. how many calls may start back to back.
+                   Defaults to one second's worth of tokens, at least 1.
+        """
+        if rate_per_minute <= 0:
+            raise ValueError("rate_per_minute must be positive")
+
+        self.rate = rate_per_minute / 60.0
+        self.capacity = float(burst if burst is not None else max(1, int(self.rate)))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+        """Take tokens if available without waiting"""
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return True
+            return False
+
+    def acquire(self, tokens: float = 1.0, timeout: Optional[float] = None):
+        """
+        Block until tokens are available.
+
+        Args:
+            tokens: Number of tokens to take
+            timeout: Maximum seconds to wait (None = wait forever, only
+                     allowed off the event loop)
+
+        Raises:
+            RateLimitTimeout: No tokens within the timeout
+            RuntimeError: Called without a timeout on a thread running an event loop
+        """
+        if timeout is None and _on_event_loop():
+            raise RuntimeError("TokenBucket.acquire() without a timeout would block the event loop")
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise RateLimitTimeout("Timed out waiting for generation rate limit")
+                wait = min(wait, remaining)
+            time.sleep(wait)
@@ -0,0 +1,355 @@
+"""
+Generation Resilience
+Deadlines, idle timeouts, classified retries with jitter, optional hedged
+requests and a circuit breaker around upstream (Gemini) calls
+"""
+
+import os
+import time
+import random
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Any, Callable, Optional
+
+import httpx
+
+# HTTP status codes worth retrying: timeouts, throttling and server-side errors
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+class GenerationTimeout(Exception):
+    """Raised when an attempt exceeds the deadline or stops sending data"""
+
+
+class CircuitOpenError(Exception):
+    """Raised while the circuit breaker rejects calls"""
+
+
+class AttemptAbandoned(Exception):
+    """Raised inside an attempt that was given up on (timed out or lost a hedge race)"""
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Classify an upstream error as transient (retry) or permanent (fail now)"""
+    if isinstance(error, (GenerationTimeout, TimeoutError, ConnectionError, httpx.TransportError)):
+        return True
+    code = getattr(error, "code", None)
+    if not isinstance(code, int):
+        code = getattr(error, "status_code", None)
+    return isinstance(code, int) and code in RETRYABLE_STATUS
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+
+    After `failure_threshold` transient failures in a row the circuit opens and
+    calls fail immediately. After `reset_timeout` seconds one probe call is let
+    through; its outcome closes or re-opens the circuit.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return self.HALF_OPEN
+            return self._state
+
+    def before_call(self):
+        """Raise CircuitOpenError unless a call may go through"""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return
+            remaining = self.reset_timeout - (time.monotonic() - self._opened_at)
+            if remaining > 0 or self._probing:
+                raise CircuitOpenError(
+                    f"Gemini is unavailable (circuit open, retry in {max(remaining, 1):.0f}s)"
+                )
+            # Let a single probe through
+            self._probing = True
+
+    def record_success(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._probing or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    print(f"🔌 Circuit opened after {self._failures} consecutive failures")
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+            self._probing = False
+
+    def release_probe(self):
+        """Give up the probe slot of a call that never reached upstream"""
+        with self._lock:
+            self._probing = False
+
+
+class LatencyTracker:
+    """Rolling window of successful attempt latencies"""
+
+    def __init__(self, window: int = 100, min_samples: int = 10):
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, p: float) -> Optional[float]:
+        """Latency at percentile p (0-100), or None until enough samples exist"""
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return None
+            samples = sorted(self._samples)
+        return samples[min(len(samples) - 1, int(len(samples) * p / 100))]
+
+
+class _Attempt:
+    """One upstream attempt running on the caller's bounded attempt pool"""
+
+    def __init__(self, fn: Callable[[Callable[[], None]], Any], executor: ThreadPoolExecutor):
+        self.future = Future()
+        self.started = time.monotonic()
+        self.last_progress = self.started
+        self.abandoned = False
+        executor.submit(self._run, fn)
+
+    def progress(self):
+        """Called by the attempt for every chunk received"""
+        if self.abandoned:
+            raise AttemptAbandoned()
+        self.last_progress = time.monotonic()
+
+    def abandon(self):
+        # A hung stream stops at its next chunk or when its read timeout fires
+        self.abandoned = True
+
+    def _run(self, fn):
+        if self.abandoned:
+            # Given up on while it was still queued for a worker
+            self.future.set_exception(AttemptAbandoned())
+            return
+        try:
+            self.future.set_result(fn(self.progress))
+        except BaseException as e:
+            self.future.set_exception(e)
+
+
+class ResilientCaller:
+    """Run upstream calls with deadlines, retries, hedging and a circuit breaker"""
+
+    def __init__(
+        self,
+        deadline: float = 120.0,
+        idle_timeout: float = 45.0,
+        max_attempts: int = 3,
+        base_delay: float = 1.0,
+        max_delay: float = 20.0,
+        hedge: bool = False,
+        hedge_percentile: float = 95.0,
+        breaker: Optional[CircuitBreaker] = None,
+        latency: Optional[LatencyTracker] = None,
+        max_workers: int = 16,
+        quota_timeout: float = 300.0
+    ):
+        """
+        Args:
+            deadline: Overall seconds for all attempts of one call
+            idle_timeout: Seconds an attempt may go without receiving a chunk
+            max_attempts: Attempts per call, including the first
+            base_delay: Base for exponential backoff between attempts
+            max_delay: Cap for a single backoff delay
+            hedge: Start a second, parallel attempt once the first runs longer
+                   than the `hedge_percentile` latency; the first to succeed wins
+            hedge_percentile: Latency percentile that triggers a hedge
+            breaker: Circuit breaker shared by all calls
+            latency: Latency statistics used for hedging
+            max_workers: Threads running attempts. Abandoned attempts keep their
+                         worker until their read timeout (the idle timeout, see
+                         attempt_timeout) fires, so this bounds them too.
+            quota_timeout: Most seconds the first attempt waits for a rate-limit token
+        """
+        self.deadline = deadline
+        self.idle_timeout = idle_timeout
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.breaker = breaker or CircuitBreaker()
+        self.latency = latency or LatencyTracker()
+        self.quota_timeout = quota_timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="gemini-attempt")
+        self.retries = 0
+        self.hedges = 0
+
+    @property
+    def attempt_timeout(self) -> float:
+        """
+        Read timeout (seconds) attempts should set on their HTTP requests, so
+        a hung stream fails on its own and frees its worker
+        """
+        return self.idle_timeout
+
+    @classmethod
+    def from_env(cls) -> "ResilientCaller":
+        return cls(
+            deadline=float(os.getenv("GEMINI_DEADLINE_SECONDS", "120")),
+            idle_timeout=float(os.getenv("GEMINI_IDLE_TIMEOUT_SECONDS", "45")),
+            max_attempts=int(os.getenv("GEMINI_MAX_ATTEMPTS", "3")),
+            base_delay=float(os.getenv("GEMINI_RETRY_BASE_DELAY", "1")),
+            max_delay=float(os.getenv("GEMINI_RETRY_MAX_DELAY", "20")),
+            hedge=os.getenv("GEMINI_HEDGE", "false").lower() in ("1", "true", "yes"),
+            max_workers=int(os.getenv("GEMINI_ATTEMPT_WORKERS", "16")),
+            quota_timeout=float(os.getenv("GEMINI_QUOTA_TIMEOUT_SECONDS", "300")),
+            breaker=CircuitBreaker(
+                failure_threshold=int(os.getenv("GEMINI_BREAKER_THRESHOLD", "5")),
+                reset_timeout=float(os.getenv("GEMINI_BREAKER_RESET_SECONDS", "30"))
+            )
+        )
+
+    def call(
+        self,
+        fn: Callable[[Callable[[], None]], Any],
+        acquire: Optional[Callable[[Optional[float]], None]] = None,
+        try_acquire: Optional[Callable[[], bool]] = None
+    ) -> Any:
+        """
+        Call fn until it succeeds, fails permanently or runs out of time.
+
+        Args:
+            fn: One attempt. Receives a progress() callback that must be called
+                for every chunk received; it raises once the attempt is abandoned.
+            acquire: Optional quota hook called with the most seconds it may wait
+                     (quota_timeout for the first attempt, then the time left)
+                     before every attempt
+            try_acquire: Optional non-blocking quota hook; a hedge only starts if
+                         it returns True
+
+        Returns:
+            The result of the first successful attempt
+
+        Raises:
+            CircuitOpenError: The circuit is open
+            RateLimitTimeout: No quota within quota_timeout (raised by acquire)
+            GenerationTimeout: The deadline passed or an attempt went idle
+            Exception: The last upstream error if it is permanent or retries ran out
+        """
+        # Waiting for quota does not count against the deadline, but is bounded too
+        self._admit(acquire, self.quota_timeout)
+        deadline = time.monotonic() + self.deadline
+
+        attempt = 1
+        while True:
+            try:
+                result = self._run(fn, deadline, try_acquire)
+            except Exception as e:
+                if not is_retryable(e):
+                    # Gemini answered; the request itself is at fault
+                    self.breaker.record_success()
+                    raise
+                self.breaker.record_failure()
+
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** (attempt - 1))))
+                if attempt >= self.max_attempts or time.monotonic() + delay >= deadline:
+                    raise
+                print(f"🔁 Gemini attempt {attempt} failed ({e}); retrying in {delay:.1f}s")
+                time.sleep(delay)
+
+                attempt += 1
+                self.retries += 1
+                self._admit(acquire, max(0.0, deadline - time.monotonic()))
+                continue
+
+            self.breaker.record_success()
+            return result
+
+    def _admit(self, acquire: Optional[Callable[[Optional[float]], None]], timeout: float):
+        """Pass the circuit breaker, then wait for quota for at most timeout seconds"""
+        self.breaker.before_call()
+        if not acquire:
+            return
+        try:
+            acquire(timeout)
+        except BaseException:
+            # No attempt is made, so a half-open probe must not stay claimed
+            self.breaker.release_probe()
+            raise
+
+    def _run(self, fn, deadline: float, try_acquire: Optional[Callable[[], bool]]) -> Any:
+        """Run one attempt (plus an optional hedge) and return the first success"""
+        attempts = [_Attempt(fn, self._executor)]
+        hedge_at = None
+        if self.hedge:
+            threshold = self.latency.percentile(self.hedge_percentile)
+            if threshold is not None:
+                hedge_at = attempts[0].started + threshold
+        errors = []
+
+        while True:
+            for a in list(attempts):
+                if not a.future.done():
+                    continue
+                attempts.remove(a)
+                if a.future.exception() is None:
+                    self.latency.record(time.monotonic() - a.started)
+                    for other in attempts:
+                        other.abandon()
+                    return a.future.result()
+                errors.append(a.future.exception())
+
+            now = time.monotonic()
+            for a in list(attempts):
+                if now - a.last_progress > self.idle_timeout:
+                    a.abandon()
+                    attempts.remove(a)
+                    errors.append(GenerationTimeout(f"No data from Gemini for {self.idle_timeout:g}s"))
+
+            if now >= deadline:
+                for a in attempts:
+                    a.abandon()
+                raise GenerationTimeout(f"Gemini call exceeded the {self.deadline:g}s deadline")
+
+            if hedge_at is not None and now >= hedge_at and attempts:
+                hedge_at = None
+                if try_acquire is None or try_acquire():
+                    self.hedges += 1
+                    print("🪁 Gemini call slower than usual; starting a hedged request")
+                    attempts.append(_Attempt(fn, self._executor))
+
+            if not attempts:
+                raise errors[0]
+
+            wake = [deadline] + [a.last_progress + self.idle_timeout for a in attempts]
+            if hedge_at is not None:
+                wake.append(hedge_at)
+            wait([a.future for a in attempts], timeout=max(0.01, min(wake) - now), return_when=FIRST_COMPLETED)
+
+    def stats(self) -> dict:
+        return {
+            "circuit": self.breaker.state,
+            "retries": self.retries,
+            "hedges": self.hedges,
+            "p95_seconds": self.latency.percentile(95),
+        }
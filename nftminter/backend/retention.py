@@ -0,0 +1,199 @@
+"""
+Artifact Retention
+Keeps the artifact store under a byte and/or count budget by evicting the
+least recently served images that are already safe on IPFS, a small batch at
+a time in a background thread
+"""
+
+import os
+import time
+import threading
+from typing import Optional
+
+from artifact_store import ArtifactStore
+from metadata_store import MetadataStore
+from pin_mirror import PinMirror
+
+# Artifacts are checked against the metadata store in pages of this size
+PAGE_SIZE = 256
+
+
+class RetentionManager:
+    """
+    Size-capped retention for generated artifacts.
+
+    Pinned and minted artifacts are evicted first, then pinned ones that are
+    not minted yet; unpinned artifacts are never evicted. An artifact counts
+    as pinned when its metadata is pinned and its image CID is in the pin
+    mirror (when one is configured). Eviction only
+    removes the local image - metadata stays, and the pinned image remains
+    available through IPFS.
+    """
+
+    def __init__(
+        self,
+        artifacts: ArtifactStore,
+        metadata: MetadataStore,
+        pin_mirror: Optional[PinMirror] = None,
+        max_bytes: int = 0,
+        max_items: int = 0,
+        interval: float = 60.0,
+        batch: int = 200
+    ):
+        """
+        Args:
+            artifacts: Store whose images are evicted
+            metadata: Metadata store that knows which artifacts are pinned / minted
+            pin_mirror: Local pin mirror; an image is only evicted while its CID is pinned
+            max_bytes: Byte budget for stored images (0 for none)
+            max_items: Budget for the number of artifacts (0 for none)
+            interval: Seconds between background runs
+            batch: Most artifacts evicted per run, so one run never stalls the store
+        """
+        self.artifacts = artifacts
+        self.metadata = metadata
+        self.pin_mirror = pin_mirror
+        self.max_bytes = max_bytes
+        self.max_items = max_items
+        self.interval = interval
+        self.batch = batch
+
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._run_lock = threading.Lock()
+        self.evicted = 0
+        self.bytes_freed = 0
+        self.last_run: Optional[float] = None
+        self.skipped_unpinned = 0
+
+    @classmethod
+    def from_env(cls, artifacts: ArtifactStore, metadata: MetadataStore, pin_mirror: Optional[PinMirror] = None) -> "RetentionManager":
+        return cls(
+            artifacts,
+            metadata,
+            pin_mirror=pin_mirror,
+            max_bytes=int(float(os.getenv("RETENTION_MAX_MB", "0")) * 1024 * 1024),
+            max_items=int(os.getenv("RETENTION_MAX_ITEMS", "0")),
+            interval=float(os.getenv("RETENTION_INTERVAL_SECONDS", "60")),
+            batch=int(os.getenv("RETENTION_BATCH", "200"))
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.max_bytes or self.max_items)
+
+    def start(self):
+        """Start the background retention thread (a no-op without a budget)"""
+        if self._thread or not self.enabled:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._loop, name="retention", daemon=True)
+        self._thread.start()
+        print(f"✅ Retention started (max {self.max_bytes // (1024 * 1024) or '-'} MB, max {self.max_items or '-'} items)")
+
+    def stop(self, timeout: float = 5.0):
+        self._stopping.set()
+        if self._thread:
+            self._thread.join(timeout=timeout)
+            self._thread = None
+
+    def _loop(self):
+        while not self._stopping.is_set():
+            try:
+                evicted = self.run_once()
+            except Exception as e:
+                print(f"⚠️  Retention run failed: {e}")
+                evicted = 0
+            # A full batch means more is over budget: continue after a short pause
+            self._stopping.wait(1.0 if evicted >= self.batch else self.interval)
+
+    def _over_budget(self, stored_bytes: int, items: int, target: float = 1.0) -> bool:
+        return bool(
+            (self.max_bytes and stored_bytes > self.max_bytes * target)
+            or (self.max_items and items > self.max_items * target)
+        )
+
+    def run_once(self) -> int:
+        """
+        Evict up to one batch of artifacts if the store is over budget.
+
+        Returns:
+            int: Number of artifacts evicted
+        """
+        with self._run_lock:
+            self.last_run = time.time()
+            self.artifacts.flush_access()
+            stats = self.artifacts.stats()
+            stored_bytes, items = stats["bytes"], stats["names"]
+            if not self._over_budget(stored_bytes, items):
+                return 0
+
+            evicted = 0
+            skipped = 0
+            # Evict down to 90% of the budget, so eviction does not run on every new artifact
+            for tier in ("minted", "pinned"):
+                after = None
+                while evicted < self.batch and self._over_budget(stored_bytes, items, 0.9):
+                    page = self.artifacts.least_recent(PAGE_SIZE, after)
+                    if not page:
+                        break
+                    after = (page[-1]["last_access"], page[-1]["name"])
+                    status = self.metadata.pin_status([entry["name"] for entry in page])
+                    for entry in page:
+                        pinned, minted, image_cid = status.get(entry["name"], (False, False, None))
+                        if not self._image_pinned(pinned, image_cid):
+                            skipped += tier == "pinned"
+                            continue
+                        if tier == "minted" and not minted:
+                            continue
+                        freed = self._evict(entry)
+                        evicted += 1
+                        items -= 1
+                        stored_bytes -= freed
+                        if evicted >= self.batch or not self._over_budget(stored_bytes, items, 0.9):
+                            break
+
+            self.skipped_unpinned = skipped
+            if evicted:
+                print(f"🧹 Retention evicted {evicted} artifacts ({stats['bytes'] - stored_bytes} bytes freed)")
+            return evicted
+
+    def _image_pinned(self, pinned: bool, image_cid: Optional[str]) -> bool:
+        """Whether the local image can be dropped: the metadata and the image itself are pinned"""
+        if not pinned or not image_cid:
+            return False
+        return self.pin_mirror is None or self.pin_mirror.is_pinned(image_cid)
+
+    def _evict(self, entry: dict) -> int:
+        """
+        Drop one artifact's image; returns the bytes freed (0 while other
+        names share the image or another hardlink, e.g. a legacy copy in the
+        images directory, keeps the file alive)
+        """
+        path = self.artifacts.path_for(entry["digest"], entry["extension"])
+        try:
+            links = path.stat().st_nlink
+        except FileNotFoundError:
+            links = 0
+        # The name stays reserved: its metadata (and any token) still refers to it
+        digest = self.artifacts.unlink(entry["name"], keep_name=True)
+        self.evicted += 1
+        if digest is None or links != 1 or path.exists():
+            return 0
+        freed = entry["size"] or 0
+        self.bytes_freed += freed
+        return freed
+
+    def usage(self) -> dict:
+        stats = self.artifacts.stats()
+        return {
+            "bytes": stats["bytes"],
+            "items": stats["names"],
+            "objects": stats["objects"],
+            "max_bytes": self.max_bytes or None,
+            "max_items": self.max_items or None,
+            "evicted": self.evicted,
+            "bytes_freed": self.bytes_freed,
+            "skipped_unpinned": self.skipped_unpinned,
+            "last_run": self.last_run,
+        }
@@ -0,0 +1,63 @@
+"""
+Single-Flight Call Coalescing
+Concurrent calls with the same key share one in-flight execution and its
+result, so duplicate upstream work (Gemini generations, IPFS pins) is avoided
+during traffic spikes. Nothing is cached once the call completes.
+"""
+
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+
+class SingleFlight:
+    """In-process single-flight group"""
+
+    def __init__(self):
+        self._calls: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+        self.shared_calls = 0
+
+    def do(self, key: Hashable, fn: Callable, *args, **kwargs) -> Tuple[Any, bool]:
+        """
+        Run fn once for all concurrent callers using the same key.
+
+        Args:
+            key: Coalescing key
+            fn: Function to execute
+            *args, **kwargs: Arguments for fn
+
+        Returns:
+            tuple: (result, shared) where shared is True if this caller joined
+                   a call started by another thread. Exceptions propagate to
+                   every caller.
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                self.shared_calls += 1
+                leader = False
+            else:
+                future = Future()
+                self._calls[key] = future
+                leader = True
+
+        if not leader:
+            return future.result(), True
+
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+    def in_flight(self) -> int:
+        """Number of distinct calls currently running"""
+        with self._lock:
+            return len(self._calls)
@@ -0,0 +1,67 @@
+"""
+Shared fixtures for the backend unit tests
+Run from nftminter/backend with: python -m pytest -q tests
+"""
+
+import io
+import sys
+import time
+import random
+import threading
+from pathlib import Path
+
+import pytest
+
+# The backend is a flat set of modules, imported by name like main.py does
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def png_bytes(seed: int = 0, size: int = 64) -> bytes:
+    """A PNG of random 8x8 blocks; different seeds never look alike"""
+    from PIL import Image
+
+    rng = random.Random(seed)
+    image = Image.new("L", (8, 8))
+    image.putdata([rng.randrange(256) for _ in range(64)])
+    buffer = io.BytesIO()
+    image.resize((size, size), Image.NEAREST).convert("RGB").save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+class FakeGeminiModels:
+    """Stands in for client.models: one image per requested candidate"""
+
+    def __init__(self):
+        self.calls = []
+        self.delay = 0.0
+        self._lock = threading.Lock()
+
+    def generate_content_stream(self, model, contents, config):
+        from google.genai import types
+
+        with self._lock:
+            self.calls.append((model, contents, config))
+            seed = len(self.calls) * 100
+        time.sleep(self.delay)
+        candidates = [
+            types.Candidate(content=types.Content(parts=[types.Part.from_bytes(data=png_bytes(seed + i), mime_type="image/png")]))
+            for i in range(config.candidate_count or 1)
+        ]
+        yield types.GenerateContentResponse(candidates=candidates)
+
+
+class FakeGeminiClient:
+    def __init__(self):
+        self.models = FakeGeminiModels()
+
+
+@pytest.fixture
+def generator(tmp_path, monkeypatch):
+    """NFTGenerator writing under tmp_path, with Gemini replaced by FakeGeminiClient"""
+    from generateNft import NFTGenerator
+
+    monkeypatch.chdir(tmp_path)
+    nft_generator = NFTGenerator(api_key="test-key")
+    nft_generator.client = FakeGeminiClient()
+    yield nft_generator
+    nft_generator.metadata.close()
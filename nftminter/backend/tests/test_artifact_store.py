@@ -0,0 +1,87 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from artifact_store import ArtifactStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ArtifactStore(str(tmp_path / "out"))
+
+
+def test_identical_content_is_stored_once(store):
+    # Arrange
+    digest, path = store.put(b"image", ".png")
+    store.link("a", digest, ".png", 5)
+
+    # Act
+    again, same_path = store.put(b"image", ".png")
+    store.link("b", again, ".png", 5)
+
+    # Assert
+    assert (again, same_path) == (digest, path)
+    assert path.relative_to(store.objects_dir).parts[:2] == (digest[:2], digest[2:4])
+    assert store.resolve("a") == store.resolve("b.png") == path
+    assert store.stats() == {"names": 2, "objects": 1, "bytes": 5, "deduplicated": 1}
+
+
+def test_object_is_deleted_with_its_last_name(store):
+    digest, path = store.put(b"image", ".png")
+    store.link("a", digest, ".png")
+    store.link("b", digest, ".png")
+
+    assert store.unlink("a") == digest
+    assert path.exists()
+    assert store.unlink("b") == digest
+    assert not path.exists()
+    assert store.unlink("b") is None
+
+
+def test_concurrent_reservations_get_distinct_names(store):
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        names = list(pool.map(lambda _: store.reserve_name("cat"), range(20)))
+
+    assert len(set(names)) == 20
+    assert "cat" in names and "cat_20" in names
+
+
+def test_unlink_keep_name_stays_reserved(store):
+    digest, _ = store.put(b"image", ".png")
+    name = store.reserve_name("cat")
+    store.link(name, digest, ".png")
+
+    store.unlink(name, keep_name=True)
+
+    assert store.resolve(name) is None
+    assert store.reserve_name("cat") == "cat_2"
+
+
+def test_least_recent_pages_in_access_order(store):
+    # Arrange
+    for name in ["a", "b", "c"]:
+        digest, _ = store.put(name.encode(), ".png")
+        store.link(name, digest, ".png")
+    store.resolve("a")
+    assert store.flush_access() == 1
+
+    # Act
+    first = store.least_recent(2)
+    second = store.least_recent(2, after=(first[-1]["last_access"], first[-1]["name"]))
+
+    # Assert
+    assert [e["name"] for e in first + second] == ["b", "c", "a"]
+
+
+def test_migrate_hardlinks_the_old_images(store, tmp_path):
+    images = tmp_path / "images"
+    images.mkdir()
+    (images / "old.png").write_bytes(b"old image")
+    (images / "notes.txt").write_text("skip")
+
+    assert store.migrate(images) == 1
+    assert store.migrate(images) == 0
+    path = store.resolve("old")
+    assert path.read_bytes() == b"old image"
+    assert os.stat(path).st_nlink == 2
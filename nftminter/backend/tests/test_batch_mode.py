@@ -0,0 +1,152 @@
+import json
+import base64
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from conftest import png_bytes
+from batch_mode import (
+    HTTPBatchTransport, BatchTransportError, normalize_state,
+    BATCH_PENDING, BATCH_RUNNING, BATCH_SUCCEEDED, BATCH_FAILED,
+)
+
+
+class StubBatchServer:
+    """
+    Local stand-in for the Gemini batch REST endpoints.
+
+    A job reports running for `polls_running` polls, then succeeds with one
+    image per request, in reverse order and without the requests in `dropped`.
+    """
+
+    def __init__(self, polls_running=1, dropped=()):
+        self.polls_running = polls_running
+        self.dropped = set(dropped)
+        self.jobs = {}
+        self.polls = 0
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                name = f"batches/{len(stub.jobs) + 1}"
+                stub.jobs[name] = body["batch"]["input_config"]["requests"]["requests"]
+                self._send({"name": name, "metadata": {"state": "BATCH_STATE_PENDING"}})
+
+            def do_GET(self):
+                name = self.path[len("/v1beta/"):]
+                if name not in stub.jobs:
+                    self.send_error(404)
+                    return
+                stub.polls += 1
+                if stub.polls <= stub.polls_running:
+                    self._send({"name": name, "metadata": {"state": "BATCH_STATE_RUNNING"}})
+                    return
+                responses = [
+                    {
+                        "metadata": request["metadata"],
+                        "response": {"candidates": [{"content": {"parts": [{
+                            "inlineData": {"mimeType": "image/png", "data": base64.b64encode(png_bytes(pos)).decode()}
+                        }]}}]},
+                    }
+                    for pos, request in enumerate(stub.jobs[name])
+                    if pos not in stub.dropped
+                ]
+                self._send({
+                    "name": name,
+                    "metadata": {"state": "BATCH_STATE_SUCCEEDED"},
+                    "response": {"inlinedResponses": {"inlinedResponses": responses[::-1]}},
+                })
+
+            def _send(self, document):
+                data = json.dumps(document).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/v1beta"
+        threading.Thread(target=self.server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def stub():
+    server = StubBatchServer()
+    yield server
+    server.close()
+
+
+def test_states_are_normalized():
+    assert normalize_state("JOB_STATE_SUCCEEDED") == BATCH_SUCCEEDED
+    assert normalize_state("BATCH_STATE_RUNNING") == BATCH_RUNNING
+    assert normalize_state("JOB_STATE_FAILED") == BATCH_FAILED
+    assert normalize_state(None) == BATCH_PENDING
+
+
+def test_http_transport_places_results_by_request_key(stub):
+    # Arrange
+    stub.polls_running = 0
+    stub.dropped = {1}
+    transport = HTTPBatchTransport("test-key", base_url=stub.url)
+
+    # Act
+    job_name = transport.submit("gemini-2.5-flash-image", ["zero", "one", "two"], "drop")
+    status = transport.get(job_name)
+
+    # Assert
+    assert status["state"] == BATCH_SUCCEEDED
+    first, missing, last = status["results"]
+    assert first["images"] == [(png_bytes(0), "image/png")]
+    assert missing is None
+    assert last["images"] == [(png_bytes(2), "image/png")]
+
+
+def test_http_transport_reports_unknown_jobs(stub):
+    transport = HTTPBatchTransport("test-key", base_url=stub.url)
+
+    with pytest.raises(BatchTransportError, match="poll failed"):
+        transport.get("batches/unknown")
+
+
+def test_submit_poll_and_ingest(generator, stub):
+    # Arrange
+    generator.batch_transport = HTTPBatchTransport("test-key", base_url=stub.url)
+    items = [{"prompt": "a red fox", "output_filename": "fox"}, {"prompt": "a blue owl", "output_filename": "owl"}]
+
+    # Act
+    job_name = generator.submit_batch([item["prompt"] for item in items])
+    running = generator.poll_batch(job_name)
+    done = generator.poll_batch(job_name)
+    results = generator.ingest_batch(items, done["results"])
+
+    # Assert
+    assert running["state"] == BATCH_RUNNING
+    assert "a red fox" in stub.jobs[job_name][0]["request"]["contents"][0]["parts"][0]["text"]
+    assert [result["filename"] for result in results] == ["fox", "owl"]
+    assert results[1]["image_bytes"] == png_bytes(1)
+    assert generator.metadata.get("owl")["prompt"] == "a blue owl"
+
+
+def test_generate_batch_offline_fails_only_missing_items(generator, stub):
+    # Arrange
+    stub.dropped = {0}
+    generator.batch_transport = HTTPBatchTransport("test-key", base_url=stub.url)
+    items = [{"prompt": "a red fox"}, {"prompt": "a blue owl", "output_filename": "owl"}]
+
+    # Act
+    results = generator.generate_batch_offline(items, poll_interval=0.01, timeout=5)
+
+    # Assert
+    assert results[0] == {"success": False, "error": "Missing from batch output", "prompt": "a red fox"}
+    assert results[1]["success"]
+    assert results[1]["image_bytes"] == png_bytes(1)
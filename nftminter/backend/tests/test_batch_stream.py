@@ -0,0 +1,63 @@
+import json
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+
+@pytest.fixture(scope="module")
+def main_module(tmp_path_factory):
+    with pytest.MonkeyPatch.context() as mp:
+        mp.chdir(tmp_path_factory.mktemp("server"))
+        mp.setenv("GOOGLE_API_KEY", "test-key")
+        mp.setenv("IPFS_BACKEND", "memory")
+        import main
+        yield main
+
+
+@pytest.fixture
+def client(main_module, monkeypatch):
+    # Items finish in reverse order; "bad" fails and "slow" stays queued
+    async def generate_and_upload(i, prompt, total):
+        await asyncio.sleep((total - i) * 0.02)
+        if prompt == "bad":
+            return {"success": False, "status": "error", "error": "No image"}
+        return {"success": True, "status": "queued" if prompt == "slow" else "success", "prompt": prompt}
+
+    monkeypatch.setattr(main_module, "generate_and_upload", generate_and_upload)
+    return TestClient(main_module.app)
+
+
+def test_ndjson_stream_sends_each_item_as_it_finishes(client):
+    # Act
+    response = client.post("/api/v1/generate-batch/stream", json={"prompts": ["fox", "bad", "slow"]})
+
+    # Assert
+    assert response.headers["content-type"] == "application/x-ndjson"
+    events = [json.loads(line) for line in response.text.splitlines()]
+    assert [(event["event"], event.get("index")) for event in events] == [
+        ("result", 2), ("result", 1), ("result", 0), ("summary", None)
+    ]
+    assert events[0]["prompt"] == "slow"
+    summary = events[-1]
+    assert (summary["total"], summary["successful"], summary["failed"], summary["queued"]) == (3, 1, 1, 1)
+
+
+def test_sse_stream_frames_named_events(client):
+    # Act
+    response = client.post("/api/v1/generate-batch/stream?format=sse", json={"prompts": ["fox", "owl"]})
+
+    # Assert
+    assert response.headers["content-type"].startswith("text/event-stream")
+    frames = response.text.split("\n\n")
+    assert frames[-1] == ""
+    parsed = [frame.split("\n") for frame in frames[:-1]]
+    assert [lines[0] for lines in parsed] == ["event: result", "event: result", "event: summary"]
+    assert json.loads(parsed[0][1][len("data: "):]) == {"index": 1, "success": True, "status": "success", "prompt": "owl"}
+    assert json.loads(parsed[2][1][len("data: "):])["successful"] == 2
+
+
+def test_unknown_stream_formats_are_rejected(client):
+    response = client.post("/api/v1/generate-batch/stream?format=xml", json={"prompts": ["fox"]})
+
+    assert response.status_code == 422
@@ -0,0 +1,203 @@
+import time
+import threading
+from concurrent.futures import Future
+
+import pytest
+
+from batch_mode import BATCH_RUNNING, BATCH_SUCCEEDED
+from collection_jobs import (
+    CollectionJobStore, CollectionRunner, sample_traits, expand_template, parse_jsonl,
+    COMPLETED, ITEM_DONE, ITEM_FAILED, ITEM_RUNNING, MODE_BATCH,
+)
+
+
+class FakeGuard:
+    def check(self, prompt):
+        return "Prompt is blocked" if "blocked" in prompt else None
+
+
+class FakeGenerator:
+    """Stands in for NFTGenerator: fails the first `failures` generations"""
+
+    max_concurrency = 2
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.calls = []
+        self.batches = {}
+        self.prompt_guard = FakeGuard()
+        self.lock = threading.Lock()
+
+    def _result(self, prompt, filename):
+        return {"success": True, "filename": filename, "image_path": f"{filename}.png", "metadata_path": f"db#{filename}", "metadata": {"name": prompt}}
+
+    def submit_generation(self, prompt, output_filename=None, metadata_overrides=None):
+        future = Future()
+        with self.lock:
+            self.calls.append((prompt, output_filename, metadata_overrides))
+            failed = len(self.calls) <= self.failures
+        future.set_result({"success": False, "error": "quota"} if failed else self._result(prompt, output_filename))
+        return future
+
+    def submit_batch(self, prompts, display_name=None):
+        name = f"batches/{len(self.batches)}"
+        self.batches[name] = prompts
+        return name
+
+    def poll_batch(self, job_name):
+        results = [{"images": [(b"image", "image/png")], "error": None, "prompt": p} for p in self.batches[job_name]]
+        return {"state": BATCH_SUCCEEDED, "results": results, "error": None}
+
+    def ingest_batch(self, items, results):
+        self.ingested = [(item["prompt"], result["prompt"]) for item, result in zip(items, results)]
+        return [self._result(item["prompt"], item["output_filename"]) for item in items]
+
+
+@pytest.fixture
+def store(tmp_path):
+    return CollectionJobStore(db_path=str(tmp_path / "collections.db"))
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise TimeoutError("condition not met")
+        time.sleep(0.01)
+
+
+def test_sample_traits_uses_every_combination_once_when_it_fits():
+    combos = sample_traits({"animal": ["cat", "dog"], "hat": ["cap", "crown"]}, count=10, seed=1)
+
+    assert len(combos) == 4
+    assert len({tuple(c.items()) for c in combos}) == 4
+
+
+def test_sample_traits_is_unique_and_reproducible():
+    traits = {"color": {str(i): 1.0 for i in range(20)}, "size": ["s", "m", "l"]}
+
+    first = sample_traits(traits, count=30, seed=7)
+
+    assert first == sample_traits(traits, count=30, seed=7)
+    assert len({tuple(c.items()) for c in first}) == 30
+
+
+def test_expand_template_fills_prompts_and_attributes():
+    items = expand_template("A {animal} in a {hat}", {"animal": ["cat"], "hat": ["cap"]}, count=1)
+
+    assert items == [{
+        "prompt": "A cat in a cap",
+        "attributes": [{"trait_type": "animal", "value": "cat"}, {"trait_type": "hat", "value": "cap"}],
+    }]
+
+
+@pytest.mark.parametrize("template", ["{0}", "{animal.__class__}", "{animal[0]}", "{}", "{size}", "{animal"])
+def test_expand_template_rejects_anything_but_trait_placeholders(template):
+    with pytest.raises(ValueError):
+        expand_template(template, {"animal": ["cat"]}, count=1)
+
+
+def test_parse_jsonl_accepts_strings_and_objects():
+    items = parse_jsonl(['"a red fox"', "", '{"prompt": "a blue owl", "name": "Owl"}'])
+
+    assert [item["prompt"] for item in items] == ["a red fox", "a blue owl"]
+    assert items[1]["name"] == "Owl"
+    with pytest.raises(ValueError, match="Line 1"):
+        parse_jsonl(['{"name": "no prompt"}'])
+
+
+def test_interrupted_items_are_recovered(store):
+    # Arrange
+    collection_id = store.create("Drop", [{"prompt": "one"}, {"prompt": "two"}])
+    claimed = store.claim(1)
+
+    # Act
+    recovered = store.recover()
+
+    # Assert
+    assert [item["index"] for item in claimed] == [0]
+    assert recovered == 1
+    assert store.get(collection_id)["progress"]["pending"] == 2
+
+
+def test_runner_retries_items_and_completes_the_collection(store):
+    # Arrange
+    generator = FakeGenerator(failures=1)
+    collection_id = store.create("Drop", [{"prompt": "a cat"}, {"prompt": "a dog"}], upload=False)
+    runner = CollectionRunner(store, generator, max_attempts=3, batch_poll_interval=0.05)
+
+    # Act
+    runner.start()
+    wait_for(lambda: store.get(collection_id)["status"] == COMPLETED)
+    runner.stop()
+
+    # Assert
+    collection = store.get(collection_id)
+    assert collection["progress"]["done"] == 2
+    filenames = {item["result"]["filename"] for item in store.items(collection_id)}
+    assert filenames == {f"{collection_id}_00001", f"{collection_id}_00002"}
+    assert generator.calls[0][2]["name"] == "Drop #1"
+
+
+def test_runner_fails_items_after_max_attempts(store):
+    generator = FakeGenerator(failures=100)
+    collection_id = store.create("Drop", [{"prompt": "a cat"}], upload=False)
+    runner = CollectionRunner(store, generator, max_attempts=2, batch_poll_interval=0.05)
+
+    runner.start()
+    wait_for(lambda: store.get(collection_id)["status"] == COMPLETED)
+    runner.stop()
+
+    item = store.items(collection_id)[0]
+    assert item["status"] == ITEM_FAILED
+    assert item["attempts"] == 2
+    assert item["error"] == "quota"
+
+
+def test_batch_items_keep_the_collection_file_names(store):
+    # Arrange
+    generator = FakeGenerator()
+    items = [{"prompt": "a cat"}, {"prompt": "a blocked prompt"}]
+    collection_id = store.create("Drop", items, upload=False, mode=MODE_BATCH)
+    runner = CollectionRunner(store, generator, max_attempts=1)
+
+    # Act
+    assert runner._submit_batch()
+    assert store.batch_jobs() == ["batches/0"]
+    runner._poll_batches()
+
+    # Assert
+    done, failed = store.items(collection_id)
+    assert done["status"] == ITEM_DONE
+    assert done["result"]["filename"] == f"{collection_id}_00001"
+    assert failed["status"] == ITEM_FAILED
+    assert failed["error"] == "Prompt is blocked"
+    assert store.get(collection_id)["status"] == COMPLETED
+
+
+def test_running_batch_items_survive_recovery(store):
+    generator = FakeGenerator()
+    generator.poll_batch = lambda job_name: {"state": BATCH_RUNNING, "results": None, "error": None}
+    collection_id = store.create("Drop", [{"prompt": "a cat"}], upload=False, mode=MODE_BATCH)
+    runner = CollectionRunner(store, generator)
+
+    runner._submit_batch()
+    runner._poll_batches()
+    store.recover()
+
+    assert store.items(collection_id)[0]["status"] == ITEM_RUNNING
+
+
+def test_batch_results_are_matched_by_job_position(store):
+    # Arrange: the first item of the job finished before the job did
+    generator = FakeGenerator()
+    collection_id = store.create("Drop", [{"prompt": "a cat"}, {"prompt": "a dog"}, {"prompt": "an owl"}], upload=False, mode=MODE_BATCH)
+    runner = CollectionRunner(store, generator, max_attempts=1)
+    runner._submit_batch()
+    store.finish_item(collection_id, 0, ITEM_FAILED, error="Cancelled")
+
+    # Act
+    runner._poll_batches()
+
+    # Assert: (item prompt, prompt its result was generated for)
+    assert generator.ingested == [("a dog", "a dog"), ("an owl", "an owl")]
@@ -0,0 +1,95 @@
+import io
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from PIL import Image
+
+import drafts
+from drafts import DraftStore, make_preview
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(drafts.time, "time", clock)
+    return clock
+
+
+def png(size):
+    buffer = io.BytesIO()
+    Image.new("RGBA", size, (10, 200, 30, 255)).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def test_preview_is_a_small_jpeg():
+    preview, mime_type = make_preview(png((1024, 512)), max_size=256)
+
+    assert mime_type == "image/jpeg"
+    with Image.open(io.BytesIO(preview)) as image:
+        assert image.size == (256, 128)
+
+
+def test_drafts_expire_after_the_ttl(clock):
+    store = DraftStore(ttl=60)
+    draft = store.add("a cat", "model", b"preview", "image/jpeg")
+
+    clock.now += 30
+    assert store.get(draft.draft_id) is draft
+
+    clock.now += 31
+    assert store.get(draft.draft_id) is None
+    assert store._used == 0
+
+
+def test_least_recently_used_drafts_are_evicted_over_budget(clock):
+    # Arrange
+    store = DraftStore(max_bytes=20)
+    first = store.add("one", "model", b"x" * 8, "image/jpeg")
+    second = store.add("two", "model", b"x" * 8, "image/jpeg")
+    store.get(first.draft_id)
+
+    # Act
+    store.add("three", "model", b"x" * 8, "image/jpeg")
+
+    # Assert
+    assert store.get(second.draft_id) is None
+    assert store.get(first.draft_id) is first
+
+
+def test_only_one_concurrent_pop_gets_the_draft(clock):
+    store = DraftStore()
+    draft = store.add("a cat", "model", b"preview", "image/jpeg", original=b"png", original_mime_type="image/png")
+    barrier = threading.Barrier(8)
+
+    def pop():
+        barrier.wait()
+        return store.pop(draft.draft_id)
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(lambda _: pop(), range(8)))
+
+    assert [r for r in results if r is not None] == [draft]
+    assert store._used == 0
+
+
+def test_restore_puts_back_a_popped_draft_unless_expired(clock):
+    store = DraftStore(ttl=60)
+    draft = store.add("a cat", "model", b"preview", "image/jpeg")
+
+    store.restore(store.pop(draft.draft_id))
+    assert store.get(draft.draft_id) is draft
+    assert store._used == draft.size
+
+    taken = store.pop(draft.draft_id)
+    clock.now += 61
+    store.restore(taken)
+    assert store.get(draft.draft_id) is None
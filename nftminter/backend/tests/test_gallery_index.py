@@ -0,0 +1,95 @@
+import pytest
+
+from gallery_index import GalleryIndex, encode_cursor
+
+
+def metadata(name, day, **extra):
+    return {
+        "name": name,
+        "attributes": [{"trait_type": "Created", "value": f"2026-01-{day:02d}T12:00:00"}, {"trait_type": "Hat", "value": extra.pop("hat", "Cap")}],
+        **extra,
+    }
+
+
+@pytest.fixture
+def index():
+    index = GalleryIndex()
+    index.load([
+        ("a", metadata("Zebra", 1)),
+        ("b", metadata("apple", 2, token_id=1, metadata_uri="ipfs://bafy")),
+        ("c", metadata("Mango", 3, collection="c1", hat="Crown")),
+        ("d", metadata("banana", 4, collection="c1")),
+        ("e", metadata("Cherry", 4)),
+    ])
+    return index
+
+
+def walk(index, **kwargs):
+    """Filenames of every page, following next_cursor"""
+    seen, cursor = [], None
+    while True:
+        page = index.page(cursor=cursor, limit=2, **kwargs)
+        seen += [item["filename"] for item in page["items"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return seen
+
+
+def test_cursors_walk_every_item_once_in_each_order(index):
+    assert walk(index, sort="newest") == ["e", "d", "c", "b", "a"]
+    assert walk(index, sort="oldest") == ["a", "b", "c", "d", "e"]
+    assert walk(index, sort="name") == ["b", "d", "e", "c", "a"]
+
+
+def test_last_page_has_no_cursor(index):
+    page = index.page(limit=5)
+
+    assert len(page["items"]) == 5
+    assert page["next_cursor"] is None
+    assert page["total"] == 5
+
+
+def test_filters(index):
+    assert walk(index, minted=True) == ["b"]
+    assert walk(index, collection="c1") == ["d", "c"]
+    assert walk(index, traits={"Hat": "Crown"}) == ["c"]
+
+    since = index._entries["b"].created
+    until = index._entries["d"].created
+    assert walk(index, sort="oldest", since=since, until=until) == ["b", "c"]
+    assert walk(index, sort="name", since=since, until=until) == ["b", "c"]
+
+
+def test_updates_keep_cursors_valid(index):
+    # Arrange
+    first = index.page(sort="oldest", limit=2)
+
+    # Act: an item before the cursor is renamed, a new one is added at the end
+    index.update("a", metadata("Aardvark", 1))
+    index.update("f", metadata("Fig", 5))
+
+    # Assert
+    rest = index.page(sort="oldest", cursor=first["next_cursor"], limit=10)
+    assert [item["filename"] for item in rest["items"]] == ["c", "d", "e", "f"]
+    assert len(index) == 6
+
+
+def test_bad_cursors_and_sorts_are_rejected(index):
+    name_cursor = index.page(sort="name", limit=1)["next_cursor"]
+
+    for kwargs in (
+        {"sort": "random"},
+        {"cursor": "not base64 json"},
+        {"cursor": name_cursor},
+        {"sort": "oldest", "cursor": encode_cursor(("oldest", "not a time", "a"))},
+    ):
+        with pytest.raises(ValueError):
+            index.page(**kwargs)
+
+
+def test_items_link_to_their_images(index):
+    item = index.page(minted=True)["items"][0]
+
+    assert item["pinned"] and item["minted"]
+    assert item["image_url"] == "/api/v1/image/b"
+    assert item["thumbnail_url"].endswith("?w=256&format=webp")
@@ -0,0 +1,115 @@
+import time
+import threading
+from pathlib import Path
+
+from prompt_cache import PromptCache
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise TimeoutError("condition not met")
+        time.sleep(0.01)
+
+
+def generate_concurrently(generator, count, **kwargs):
+    results = []
+    lock = threading.Lock()
+
+    def generate():
+        result = generator.generate_image("a red fox", **kwargs)
+        with lock:
+            results.append(result)
+
+    threads = [threading.Thread(target=generate) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_image_bytes_are_returned_and_written_in_the_background(generator):
+    # Act
+    result = generator.generate_image("a red fox")
+
+    # Assert
+    assert result["success"]
+    image_path = result["image_write"].result()
+    assert Path(image_path).read_bytes() == result["image_bytes"]
+    assert generator.artifacts.resolve(result["filename"]) == Path(image_path)
+
+
+def test_images_stay_in_memory_when_persistence_is_off(generator):
+    generator.persist_images = False
+
+    result = generator.generate_image("a red fox")
+
+    assert result["image_write"] is None
+    assert result["image_bytes"].startswith(b"\x89PNG")
+    assert not Path(result["image_path"]).exists()
+
+
+def test_cache_hit_gets_an_artifact_of_its_own(generator, tmp_path):
+    # Arrange
+    generator.prompt_cache = PromptCache(db_path=str(tmp_path / "prompt_cache.db"))
+    first = generator.generate_image("a red fox")
+    wait_for(lambda: generator.prompt_cache.lookup(first["cache_key"]) is not None)
+
+    # Act
+    hit = generator.generate_image("A red  fox")
+    generator.record_mint(hit["filename"], 7)
+
+    # Assert
+    assert hit["cached"]
+    assert len(generator.client.models.calls) == 1
+    assert hit["filename"] != first["filename"]
+    assert generator.artifacts.resolve(hit["filename"]) == generator.artifacts.resolve(first["filename"])
+    assert generator.metadata.get(hit["filename"])["token_id"] == 7
+    assert "token_id" not in generator.metadata.get(first["filename"])
+
+
+def test_concurrent_calls_share_one_generation_but_not_the_artifact(generator):
+    # Arrange
+    generator.client.models.delay = 0.3
+
+    # Act
+    results = generate_concurrently(generator, 3)
+    generator.record_mint(results[0]["filename"], 1)
+
+    # Assert
+    assert len(generator.client.models.calls) == 1
+    assert sorted(result["shared"] for result in results) == [False, True, True]
+    filenames = {result["filename"] for result in results}
+    assert len(filenames) == 3
+    assert len({generator.artifacts.resolve(name) for name in filenames}) == 1
+    minted = [name for name in filenames if "token_id" in generator.metadata.get(name)]
+    assert minted == [results[0]["filename"]]
+
+
+def test_strict_calls_for_the_same_file_share_the_artifact(generator):
+    generator.client.models.delay = 0.3
+
+    results = generate_concurrently(generator, 2, output_filename="fox", strict=True)
+
+    assert len(generator.client.models.calls) == 1
+    assert [result["filename"] for result in results] == ["fox", "fox"]
+
+
+def test_variations_come_from_one_call(generator):
+    # Act
+    result = generator.generate_image("a red fox", output_filename="fox", variations=3)
+
+    # Assert
+    models = generator.client.models
+    assert len(models.calls) == 1
+    assert models.calls[0][2].candidate_count == 3
+    names = [variation["filename"] for variation in result["variations"]]
+    assert names == ["fox", "fox_v2", "fox_v3"]
+    assert len({variation["image_bytes"] for variation in result["variations"]}) == 3
+    for i, name in enumerate(names):
+        metadata = generator.metadata.get(name)
+        assert metadata["variation_group"] == "fox"
+        assert metadata["variation_index"] == i
+        assert metadata["variations"] == names
@@ -0,0 +1,70 @@
+import io
+
+import pytest
+from PIL import Image
+
+from image_encoder import ImageEncoder
+
+
+def png(**save_options):
+    buffer = io.BytesIO()
+    Image.new("RGB", (64, 64), (200, 40, 40)).save(buffer, "PNG", **save_options)
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def encoder():
+    encoders = []
+
+    def make(output_format):
+        encoders.append(ImageEncoder(output_format, workers=1))
+        return encoders[-1]
+
+    yield make
+    for encoder in encoders:
+        encoder.shutdown()
+
+
+def test_images_are_transcoded_when_smaller(encoder):
+    # Arrange
+    original = png(compress_level=0)
+
+    # Act
+    result = encoder("webp").encode(original)
+
+    # Assert
+    assert result["encoded"]
+    assert result["mime_type"] == "image/webp"
+    assert result["extension"] == ".webp"
+    assert result["original_format"] == "png"
+    assert result["data"][8:12] == b"WEBP"
+    assert result["bytes_saved"] == len(original) - len(result["data"]) > 0
+
+
+def test_original_is_kept_when_encoding_is_not_smaller(encoder):
+    # Arrange: re-optimizing an optimized PNG cannot shrink it
+    original = png(optimize=True)
+    png_encoder = encoder("png")
+
+    # Act
+    result = png_encoder.encode(original)
+
+    # Assert
+    assert not result["encoded"]
+    assert result["data"] is original
+    assert result["mime_type"] is None and result["extension"] is None
+    assert result["bytes_saved"] == 0
+    assert png_encoder.stats()["bytes_in"] == len(original)
+
+
+def test_unknown_formats_are_rejected():
+    with pytest.raises(ValueError, match="Unknown image encode format"):
+        ImageEncoder("gif")
+
+
+def test_encoding_is_off_unless_configured(monkeypatch):
+    monkeypatch.delenv("IMAGE_ENCODE_FORMAT", raising=False)
+    assert ImageEncoder.from_env() is None
+
+    monkeypatch.setenv("IMAGE_ENCODE_FORMAT", "PNG")
+    assert ImageEncoder.from_env().output_format == "png"
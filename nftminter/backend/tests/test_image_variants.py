@@ -0,0 +1,78 @@
+import io
+import os
+
+import pytest
+from PIL import Image
+
+from image_variants import ImageVariantCache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    variants = ImageVariantCache(cache_dir=str(tmp_path / "variants"), workers=1, widths=[64, 256])
+    yield variants
+    variants.shutdown()
+
+
+def write_png(path, size=(128, 64)):
+    Image.new("RGB", size, (10, 120, 200)).save(path, "PNG")
+    return path
+
+
+def test_widths_snap_up_to_an_allowed_width(cache):
+    assert cache.snap_width(1) == 64
+    assert cache.snap_width(64) == 64
+    assert cache.snap_width(65) == 256
+    assert cache.snap_width(257) is None
+    assert cache.snap_width(None) is None
+
+
+def test_variants_render_once_and_are_then_served_from_disk(cache, tmp_path):
+    # Arrange
+    source = write_png(tmp_path / "fox.png")
+
+    # Act
+    path, mime_type = cache.get(source, width=50, output_format="png")
+    again, _ = cache.get(source, width=60, output_format="png")
+
+    # Assert
+    assert path == again
+    assert mime_type == "image/png"
+    with Image.open(path) as image:
+        assert image.size == (64, 32)
+    assert (cache.stats["renders"], cache.stats["hits"]) == (1, 1)
+
+
+def test_variants_are_never_upscaled(cache, tmp_path):
+    source = write_png(tmp_path / "fox.png")
+
+    path, _ = cache.get(source, width=256, output_format="jpeg")
+
+    with Image.open(io.BytesIO(path.read_bytes())) as image:
+        assert image.size == (128, 64)
+
+
+def test_least_recently_served_variants_are_evicted(cache, tmp_path):
+    # Arrange: three sources whose variants have the same size
+    a, b, c = (write_png(tmp_path / f"{name}.png") for name in "abc")
+    path_a, _ = cache.get(a, output_format="png")
+    path_b, _ = cache.get(b, output_format="png")
+    size = path_a.stat().st_size
+    os.utime(path_a, (1000, 1000))
+    os.utime(path_b, (2000, 2000))
+    cache.get(a, output_format="png")
+    cache.max_bytes = size * 5 // 2
+
+    # Act
+    path_c, _ = cache.get(c, output_format="png")
+
+    # Assert: b was served least recently, a was just served and c is new
+    assert not path_b.exists()
+    assert path_a.exists() and path_c.exists()
+    assert cache.usage()["disk_bytes"] == size * 2
+    assert cache.stats["evictions"] == 1
+
+
+def test_unknown_formats_are_rejected(cache, tmp_path):
+    with pytest.raises(ValueError, match="Unknown image format"):
+        cache.get(write_png(tmp_path / "fox.png"), output_format="gif")
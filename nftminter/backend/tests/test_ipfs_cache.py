@@ -0,0 +1,199 @@
+import base64
+import hashlib
+import threading
+
+import pytest
+
+from ipfs_cache import IPFSReadCache, IPFSFetchError, guess_media_type
+from ipfs_uploader import compute_cid
+from ipfs_verify import RAW, DAG_PB, VerificationError, decode_cid, verified_content
+
+BASE58 = "123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz"
+
+
+def varint(n):
+    out = bytearray()
+    while True:
+        byte = n & 0x7F
+        n >>= 7
+        if n:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def field(number, value):
+    return varint(number << 3 | 2) + varint(len(value)) + value
+
+
+def cid_bytes(codec, block):
+    return b"\x01" + bytes([codec]) + b"\x12\x20" + hashlib.sha256(block).digest()
+
+
+def cid_string(raw):
+    return "b" + base64.b32encode(raw).decode("ascii").lower().rstrip("=")
+
+
+def file_car(chunks):
+    """(CID, CAR bytes) of a UnixFS file made of raw leaves under one dag-pb root"""
+    leaves = [(cid_bytes(RAW, chunk), chunk) for chunk in chunks]
+    unixfs = varint(1 << 3) + varint(2)  # Type = File
+    root = b"".join(field(2, field(1, cid)) for cid, _ in leaves) + field(1, unixfs)
+    root_cid = cid_bytes(DAG_PB, root)
+    header = b"car header"  # not interpreted by the reader
+    car = varint(len(header)) + header
+    for cid, block in [(root_cid, root)] + leaves:
+        car += varint(len(cid) + len(block)) + cid + block
+    return cid_string(root_cid), car
+
+
+def base58(raw):
+    value = int.from_bytes(raw, "big")
+    text = ""
+    while value:
+        value, rem = divmod(value, 58)
+        text = BASE58[rem] + text
+    return text
+
+
+class FakeResponse:
+    def __init__(self, body, status=200):
+        self.body = body
+        self.status = status
+        self.closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def raise_for_status(self):
+        if self.status >= 400:
+            raise IPFSFetchError(f"HTTP {self.status}")
+
+    def iter_content(self, chunk_size):
+        for i in range(0, len(self.body), chunk_size):
+            yield self.body[i:i + chunk_size]
+
+    def close(self):
+        self.closed = True
+
+
+class FakeSession:
+    """Answers gateway requests from {gateway: body}"""
+
+    def __init__(self, bodies):
+        self.bodies = bodies
+        self.urls = []
+        self.lock = threading.Lock()
+
+    def get(self, url, headers=None, timeout=None, stream=False):
+        with self.lock:
+            self.urls.append(url)
+        gateway = url.split("/ipfs/")[0]
+        body = self.bodies.get(gateway)
+        return FakeResponse(body) if body is not None else FakeResponse(b"", status=504)
+
+
+def make_cache(tmp_path, bodies, **kwargs):
+    cache = IPFSReadCache(gateways=[f"{g}/ipfs" for g in bodies], cache_dir=str(tmp_path / "cache"), **kwargs)
+    cache._session = FakeSession(bodies)
+    return cache
+
+
+def test_raw_block_is_verified_against_its_cid():
+    data = b"\x89PNG\r\n\x1a\n" + b"pixels"
+    cid = compute_cid(data)
+
+    assert decode_cid(cid)[0] == RAW
+    assert verified_content(cid, data, 1024) == data
+    with pytest.raises(VerificationError):
+        verified_content(cid, data + b"tampered", 1024)
+
+
+def test_cidv0_decodes_as_dag_pb():
+    block = bytes.fromhex("0a0408021800")
+    cid = base58(b"\x12\x20" + hashlib.sha256(block).digest())
+
+    assert cid.startswith("Qm")
+    codec, multihash = decode_cid(cid)
+    assert codec == DAG_PB
+    assert multihash[2:] == hashlib.sha256(block).digest()
+
+
+def test_car_file_is_reassembled_in_link_order():
+    cid, car = file_car([b"first chunk ", b"second chunk"])
+
+    assert verified_content(cid, car, 1024) == b"first chunk second chunk"
+    with pytest.raises(VerificationError):
+        verified_content(cid, car, 10)
+    with pytest.raises(VerificationError):
+        verified_content(cid, car.replace(b"second", b"SECOND"), 1024)
+
+
+def test_unsupported_codec_is_rejected():
+    dag_cbor = cid_string(b"\x01\x71\x12\x20" + hashlib.sha256(b"{}").digest())
+
+    with pytest.raises(VerificationError):
+        decode_cid(dag_cbor)
+
+
+def test_gateway_with_bad_content_loses_the_race(tmp_path):
+    # Arrange
+    data = b'{"name": "NFT"}'
+    cid = compute_cid(data)
+    cache = make_cache(tmp_path, {"http://liar": b'{"name": "Fake"}', "http://honest": data})
+
+    # Act
+    fetched = cache.get(cid)
+
+    # Assert
+    assert fetched == data
+    assert all(url.endswith("?format=raw") for url in cache._session.urls)
+    assert guess_media_type(fetched) == "application/json"
+
+
+def test_no_verifiable_gateway_raises(tmp_path):
+    cid = compute_cid(b"content")
+    cache = make_cache(tmp_path, {"http://liar": b"other", "http://down": None})
+
+    with pytest.raises(IPFSFetchError):
+        cache.get(cid)
+
+
+def test_dag_pb_content_is_fetched_as_car(tmp_path):
+    cid, car = file_car([b"a" * 10, b"b" * 10])
+    cache = make_cache(tmp_path, {"http://gateway": car})
+
+    assert cache.get(cid) == b"a" * 10 + b"b" * 10
+    assert "?format=car" in cache._session.urls[0]
+
+
+def test_invalid_or_unsupported_cids_raise_value_error(tmp_path):
+    cache = make_cache(tmp_path, {"http://gateway": b""})
+    dag_cbor = cid_string(b"\x01\x71\x12\x20" + hashlib.sha256(b"{}").digest())
+
+    for cid in ("../etc/passwd", dag_cbor):
+        with pytest.raises(ValueError):
+            cache.get(cid)
+    assert cache._session.urls == []
+
+
+def test_hits_are_served_from_memory_then_disk(tmp_path):
+    # Arrange
+    data = b"image bytes"
+    cid = compute_cid(data)
+    cache = make_cache(tmp_path, {"http://gateway": data})
+
+    # Act
+    cache.get(cid)
+    cache.get(cid)
+    restarted = make_cache(tmp_path, {"http://gateway": None})
+
+    # Assert
+    assert cache.usage()["misses"] == 1
+    assert cache.usage()["memory_hits"] == 1
+    assert restarted.get(cid) == data
+    assert restarted.usage()["disk_hits"] == 1
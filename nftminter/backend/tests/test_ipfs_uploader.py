@@ -0,0 +1,118 @@
+import io
+import json
+
+import pytest
+
+from ipfs_uploader import IPFSUploader, InMemoryBackend, IPFSBackendError, compute_cid, create_backend
+
+
+@pytest.fixture
+def backend():
+    return InMemoryBackend()
+
+
+@pytest.fixture
+def uploader(backend):
+    return IPFSUploader(backend=backend)
+
+
+def test_compute_cid_matches_ipfs():
+    # `ipfs add --cid-version=1 --raw-leaves` of the same bytes
+    assert compute_cid(b"hello world") == "bafkreifzjut3te2nhyekklss27nh3k72ysco7y32koao5eei66wof36n5e"
+
+
+def test_memory_backend_is_content_addressed(backend):
+    # Act
+    cid = backend.pin_file(b"image", "a.png")
+    again = backend.pin_file(io.BytesIO(b"image"), "b.png")
+
+    # Assert
+    assert cid == again == compute_cid(b"image")
+    assert backend.get(cid) == b"image"
+    assert [(pin["cid"], pin["name"], pin["size"]) for pin in backend.list_pins()] == [(cid, "a.png", 5)]
+
+
+def test_memory_backend_pins_compact_json(backend):
+    cid = backend.pin_json({"name": "Fox", "attributes": []}, "fox.json")
+
+    assert backend.get(cid) == b'{"name":"Fox","attributes":[]}'
+
+
+def test_memory_backend_lists_newest_first_and_unpins(backend):
+    # Arrange
+    first = backend.pin_file(b"first", "first.png")
+    second = backend.pin_file(b"second", "second.png")
+    backend.pins[first]["date_pinned"] = "2024-01-01T00:00:00+00:00"
+
+    # Act
+    listed = [pin["cid"] for pin in backend.list_pins()]
+    since = [pin["cid"] for pin in backend.list_pins(since="2025-01-01T00:00:00+00:00")]
+    backend.unpin(first)
+
+    # Assert
+    assert listed == [second, first]
+    assert since == [second]
+    with pytest.raises(KeyError):
+        backend.get(first)
+    with pytest.raises(IPFSBackendError):
+        backend.unpin(first)
+
+
+def test_memory_backend_injects_failures():
+    backend = InMemoryBackend(error_rate=1.0)
+
+    with pytest.raises(IPFSBackendError, match="Injected"):
+        backend.pin_file(b"image", "a.png")
+    with pytest.raises(ValueError):
+        InMemoryBackend(error_rate=2.0)
+
+
+def test_backend_is_chosen_by_configuration(monkeypatch):
+    monkeypatch.setenv("IPFS_BACKEND", "memory")
+    monkeypatch.setenv("IPFS_FAKE_LATENCY", "0.5")
+
+    backend = create_backend()
+
+    assert isinstance(backend, InMemoryBackend)
+    assert backend.latency == 0.5
+    with pytest.raises(ValueError, match="Unknown IPFS_BACKEND"):
+        create_backend("s3")
+
+
+def test_images_upload_from_bytes_streams_and_paths(uploader, tmp_path):
+    # Arrange
+    path = tmp_path / "fox.png"
+    path.write_bytes(b"fox image")
+
+    # Act
+    from_bytes = uploader.upload_image(b"fox image", filename="fox.png")
+    from_view = uploader.upload_image(memoryview(b"fox image"), filename="fox.png")
+    from_stream = uploader.upload_image(io.BytesIO(b"fox image"), filename="fox.png")
+    from_path = uploader.upload_image(path)
+
+    # Assert
+    cids = {result["cid"] for result in (from_bytes, from_view, from_stream, from_path)}
+    assert cids == {compute_cid(b"fox image")}
+    assert from_path["ipfs_uri"] == f"ipfs://{from_path['cid']}"
+
+
+def test_missing_image_files_are_reported(uploader, tmp_path):
+    with pytest.raises(FileNotFoundError):
+        uploader.upload_image(tmp_path / "missing.png")
+
+
+def test_complete_upload_points_the_metadata_at_the_image(uploader, backend):
+    # Act
+    result = uploader.upload_nft_complete(b"fox image", {"name": "Fox"}, filename="fox.png")
+
+    # Assert
+    pinned = json.loads(backend.get(result["metadata_cid"]))
+    assert pinned == {"name": "Fox", "image": f"ipfs://{result['image_cid']}"}
+    assert result["image_cid"] == compute_cid(b"fox image")
+
+
+def test_backend_failures_surface_as_upload_errors():
+    uploader = IPFSUploader(backend=InMemoryBackend(error_rate=1.0))
+
+    with pytest.raises(Exception, match="IPFS upload failed"):
+        uploader.upload_image(b"fox image")
@@ -0,0 +1,117 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from metadata_store import MetadataStore, _Write
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = MetadataStore(db_path=str(tmp_path / "metadata.db"), export_dir=str(tmp_path / "metadata"))
+    yield store
+    store.close()
+
+
+def nft(name, **fields):
+    return {"name": name, "prompt": f"A {name}", "image": "ipfs://bafyimage", **fields}
+
+
+def test_documents_round_trip_and_are_indexed(store):
+    # Act
+    store.save("cat", nft("Cat", metadata_uri="ipfs://bafymeta/", token_id="7", collection="c1"))
+
+    # Assert
+    assert store.get("cat")["name"] == "Cat"
+    row = store.query(minted=True)[0]
+    assert (row["name"], row["metadata_cid"], row["token_id"], row["collection"]) == ("cat", "bafymeta", 7, "c1")
+    assert store.query(prompt="a cat.")[0]["name"] == "cat"
+    assert store.has_cid("bafymeta") and store.has_cid("bafyimage")
+    assert store.pin_status(["cat", "unknown"]) == {"cat": (True, True, "bafyimage")}
+    assert store.location("cat").endswith("metadata.db#cat")
+
+
+def test_returned_documents_are_copies(store):
+    store.save("cat", nft("Cat"))
+
+    store.get("cat")["name"] = "Changed"
+
+    assert store.get("cat")["name"] == "Cat"
+
+
+def test_concurrent_saves_share_commits(store):
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        list(pool.map(lambda i: store.save(f"nft{i}", nft(f"NFT {i}")), range(200)))
+
+    stats = store.stats()
+    assert stats["documents"] == 200
+    assert stats["writes"] == 200
+    assert stats["commits"] < 200
+
+
+def test_update_merges_fields(store):
+    store.save("cat", nft("Cat"))
+
+    updated = store.update("cat", {"metadata_uri": "ipfs://bafymeta"})
+
+    assert updated["name"] == "Cat"
+    assert store.query(pinned=True)[0]["name"] == "cat"
+    assert store.update("unknown", {"token_id": 1}) is None
+
+
+def test_invalid_documents_fail_alone(store):
+    # Arrange
+    store.save("cat", nft("Cat"))
+
+    # Act / Assert: a bad document is rejected before it is queued
+    with pytest.raises(ValueError):
+        store.save("bad", nft("Bad", token_id="seven"))
+
+    # A bad merge is only found by the writer; the writes queued with it still commit
+    writes = [store._prepare("ok1", nft("OK 1")), _Write("cat", {"token_id": "seven"}, merge=True), store._prepare("ok2", nft("OK 2"))]
+    for write in writes:
+        store._queue.put(write)
+    with pytest.raises(ValueError):
+        writes[1].future.result(timeout=5)
+    assert [write.future.result(timeout=5)["name"] for write in (writes[0], writes[2])] == ["OK 1", "OK 2"]
+    assert store.stats()["documents"] == 3
+    assert "token_id" not in store.get("cat")
+
+
+def test_migrate_imports_files_and_skips_bad_ones(store, tmp_path):
+    # Arrange
+    legacy = tmp_path / "legacy"
+    legacy.mkdir()
+    (legacy / "a.json").write_text(json.dumps(nft("A")))
+    (legacy / "b.json").write_text(json.dumps(nft("B", token_id=2)))
+    (legacy / "broken.json").write_text("{")
+    (legacy / "bad_token.json").write_text(json.dumps(nft("Bad", token_id="x")))
+
+    # Act
+    imported = store.migrate(legacy)
+    again = store.migrate(legacy)
+
+    # Assert
+    assert imported == 2
+    assert again == 0
+    assert {row["name"] for row in store.query()} == {"a", "b"}
+
+
+def test_export_writes_json_files(store, tmp_path):
+    store.save("cat", nft("Cat"))
+    store.save("dog", nft("Dog"))
+
+    assert store.export(["cat", "missing"]) == 1
+    assert json.loads((tmp_path / "metadata" / "cat.json").read_text())["name"] == "Cat"
+    assert store.export(export_dir=tmp_path / "all") == 2
+
+
+def test_documents_survive_a_restart(store, tmp_path):
+    store.save("cat", nft("Cat"))
+    store.close()
+
+    reopened = MetadataStore(db_path=str(tmp_path / "metadata.db"), export_dir=str(tmp_path / "metadata"))
+
+    assert reopened.get("cat")["name"] == "Cat"
+    assert [name for name, _ in reopened.items()] == ["cat"]
+    reopened.close()
@@ -0,0 +1,106 @@
+import io
+import random
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from phash_index import PerceptualIndex, dhash, hamming
+
+
+def gradient_png(size=256, flip=False):
+    x = np.linspace(0, 255, size, dtype=np.uint8)
+    pixels = np.tile(x[::-1] if flip else x, (size, 1))
+    pixels[size // 3: size // 2, size // 4: size // 2] = 40
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).convert("RGB").save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def resized_jpeg(data, size):
+    buffer = io.BytesIO()
+    with Image.open(io.BytesIO(data)) as image:
+        image.resize((size, size)).save(buffer, "JPEG", quality=70)
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def index(tmp_path):
+    return PerceptualIndex(db_path=str(tmp_path / "phash.db"), max_distance=6)
+
+
+def test_dhash_survives_rescaling_and_recompression():
+    original = gradient_png()
+
+    assert hamming(dhash(original), dhash(resized_jpeg(original, 100))) <= 4
+    assert hamming(dhash(original), dhash(gradient_png(flip=True))) > 20
+
+
+def test_query_matches_a_brute_force_scan(index):
+    # Arrange
+    rng = random.Random(3)
+    hashes = {f"img{i}": rng.getrandbits(64) for i in range(300)}
+    base = hashes["img0"]
+    for i, bits in enumerate([1, 3, 6, 7]):
+        near = base
+        for bit in rng.sample(range(64), bits):
+            near ^= 1 << bit
+        hashes[f"near{i}"] = near
+    for filename, value in hashes.items():
+        index.add(filename, value)
+
+    # Act
+    found = index.query(base, exclude="img0")
+
+    # Assert
+    expected = sorted(
+        ((f, hamming(base, v)) for f, v in hashes.items() if f != "img0" and hamming(base, v) <= 6),
+        key=lambda m: (m[1], m[0])
+    )
+    assert found == expected
+    assert [f for f, _ in found] == ["near0", "near1", "near2"]
+
+
+def test_hashes_with_the_top_bit_survive_a_reload(index, tmp_path):
+    value = (1 << 63) | 0xABCDEF
+    index.add("high", value)
+
+    reloaded = PerceptualIndex(db_path=str(tmp_path / "phash.db"))
+
+    assert reloaded.query(value) == [("high", 0)]
+
+
+def test_check_reports_then_indexes(index):
+    original = gradient_png()
+
+    assert index.check("first", original) == []
+    duplicates = index.check("second", resized_jpeg(original, 120))
+
+    assert [d["filename"] for d in duplicates] == ["first"]
+    assert [d["filename"] for d in index.similar("first")] == ["second"]
+    index.remove("second")
+    assert index.similar("first") == []
+    assert index.similar("second") is None
+
+
+def test_sync_hashes_new_files_and_drops_missing_ones(index, tmp_path):
+    # Arrange
+    images = tmp_path / "images"
+    images.mkdir()
+    (images / "a.png").write_bytes(gradient_png())
+    (images / "b.png").write_bytes(gradient_png(flip=True))
+    (images / "notes.txt").write_text("not an image")
+
+    # Act
+    first = index.sync(images)
+    (images / "b.png").unlink()
+    second = index.sync(images)
+
+    # Assert
+    assert first == {"added": 2, "removed": 0, "total": 2}
+    assert second == {"added": 0, "removed": 1, "total": 1}
+
+
+def test_chunks_must_divide_the_hash():
+    with pytest.raises(ValueError):
+        PerceptualIndex(db_path=":memory:", chunks=5)
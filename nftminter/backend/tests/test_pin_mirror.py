@@ -0,0 +1,96 @@
+from datetime import datetime, timezone, timedelta
+
+import pytest
+
+from ipfs_uploader import InMemoryBackend
+from pin_mirror import PinMirror
+
+
+@pytest.fixture
+def backend():
+    return InMemoryBackend()
+
+
+@pytest.fixture
+def mirror(backend, tmp_path):
+    return PinMirror(backend, db_path=str(tmp_path / "pins.db"), page_size=2)
+
+
+def test_totals_follow_inserts_updates_and_deletes(mirror, backend):
+    # Arrange
+    cid = backend.pin_file(b"image", "a.png")
+
+    # Act / Assert
+    mirror.record(cid, name="a.png")
+    assert mirror.usage()["pin_count"] == 1
+    assert mirror.usage()["total_bytes"] == 0
+
+    mirror.record(cid, size=5)
+    assert mirror.usage()["total_bytes"] == 5
+
+    mirror.record("bafyother", name="b.json", size=7)
+    assert mirror.usage() == {"pin_count": 2, "total_bytes": 12, "last_sync_at": None}
+
+    mirror.unpin([cid])
+    assert mirror.usage()["pin_count"] == 1
+    assert mirror.usage()["total_bytes"] == 7
+    assert not mirror.is_pinned(cid)
+
+
+def test_incremental_sync_pages_through_new_pins(mirror, backend):
+    # Arrange
+    cids = [backend.pin_file(f"content {i}".encode(), f"{i}.png") for i in range(5)]
+
+    # Act
+    first = mirror.sync()
+    second = mirror.sync()
+
+    # Assert
+    assert first == {"added": 5, "removed": 0}
+    assert second["added"] == 0
+    assert all(mirror.is_pinned(cid) for cid in cids)
+    assert mirror.usage()["total_bytes"] == sum(len(f"content {i}") for i in range(5))
+    assert mirror.usage()["last_sync_at"] is not None
+
+
+def test_full_sync_drops_pins_removed_elsewhere(mirror, backend):
+    # Arrange
+    kept = backend.pin_file(b"kept", "kept.png")
+    gone = backend.pin_file(b"gone", "gone.png")
+    mirror.sync()
+    backend.unpin(gone)
+
+    # Act
+    result = mirror.sync(full=True)
+
+    # Assert
+    assert result == {"added": 0, "removed": 1}
+    assert mirror.is_pinned(kept)
+    assert not mirror.is_pinned(gone)
+    assert mirror.usage()["pin_count"] == 1
+
+
+def test_find_and_dry_run_unpin(mirror, backend):
+    # Arrange
+    old = (datetime.now(timezone.utc) - timedelta(days=10)).isoformat()
+    mirror.record("bafytest1", name="test-1.png", size=1, date_pinned=old)
+    mirror.record("bafytest2", name="test-2.png", size=1)
+    mirror.record("bafyprod", name="nft.png", size=1, date_pinned=old)
+
+    # Act
+    matches = mirror.find(name_like="test%", older_than=datetime.now(timezone.utc) - timedelta(days=7))
+    report = mirror.unpin([pin["cid"] for pin in matches], dry_run=True)
+
+    # Assert
+    assert [pin["cid"] for pin in matches] == ["bafytest1"]
+    assert report == {"unpinned": ["bafytest1"], "failed": []}
+    assert mirror.is_pinned("bafytest1")
+
+
+def test_failed_unpin_keeps_the_mirror_entry(mirror):
+    mirror.record("bafyunknown", name="x.png", size=3)
+
+    report = mirror.unpin(["bafyunknown"])
+
+    assert report == {"unpinned": [], "failed": ["bafyunknown"]}
+    assert mirror.is_pinned("bafyunknown")
@@ -0,0 +1,77 @@
+import itertools
+
+import pytest
+
+import prompt_cache
+from prompt_cache import PromptCache, cache_key, normalize_prompt
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Strictly increasing time, so LRU order never ties"""
+    ticks = itertools.count(1000)
+    monkeypatch.setattr(prompt_cache.time, "time", lambda: float(next(ticks)))
+
+
+@pytest.fixture
+def cache(tmp_path, clock):
+    return PromptCache(db_path=str(tmp_path / "prompt_cache.db"), max_entries=2)
+
+
+def image(tmp_path, name):
+    path = tmp_path / f"{name}.png"
+    path.write_bytes(b"png")
+    return str(path)
+
+
+def test_normalized_prompts_share_a_key():
+    config = {"aspect_ratio": "1:1"}
+
+    assert normalize_prompt("  A Cat   in Space!! ") == "a cat in space"
+    assert cache_key("gemini", "A cat in space.", config) == cache_key("gemini", "a cat  in space", config)
+    assert cache_key("gemini", "a cat", config) != cache_key("other-model", "a cat", config)
+    assert cache_key("gemini", "a cat", config) != cache_key("gemini", "a cat", {"aspect_ratio": "16:9"})
+
+
+def test_lookup_counts_hits(cache, tmp_path):
+    cache.store("k", "cat", image(tmp_path, "cat"), "db#cat", "image/png")
+
+    entry = cache.lookup("k")
+
+    assert entry["filename"] == "cat"
+    assert cache.lookup("missing") is None
+    assert cache.stats() == {"entries": 1, "hits": 1, "max_entries": 2}
+
+
+def test_least_recently_used_entry_is_evicted(cache, tmp_path):
+    # Arrange
+    cache.store("a", "a", image(tmp_path, "a"), "db#a")
+    cache.store("b", "b", image(tmp_path, "b"), "db#b")
+    cache.lookup("a")
+
+    # Act
+    cache.store("c", "c", image(tmp_path, "c"), "db#c")
+
+    # Assert
+    assert cache.lookup("b") is None
+    assert cache.lookup("a") is not None
+    assert cache.lookup("c") is not None
+
+
+def test_entry_without_its_image_is_dropped(cache, tmp_path):
+    path = image(tmp_path, "gone")
+    cache.store("k", "gone", path, "db#gone")
+    (tmp_path / "gone.png").unlink()
+
+    assert cache.lookup("k") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_cids_are_recorded_without_overwriting(cache, tmp_path):
+    cache.store("k", "cat", image(tmp_path, "cat"), "db#cat")
+
+    cache.record_cids("k", image_cid="bafyimage")
+    cache.record_cids("k", metadata_cid="bafymeta")
+
+    entry = cache.lookup("k")
+    assert (entry["image_cid"], entry["metadata_cid"]) == ("bafyimage", "bafymeta")
@@ -0,0 +1,65 @@
+import pytest
+
+import prompt_guard
+from prompt_guard import PromptGuard, compile_blocklist, load_blocklist
+
+
+def test_length_limits():
+    guard = PromptGuard(min_length=3, max_length=10)
+
+    assert "too short" in guard.check("  ab  ")
+    assert "too long" in guard.check("x" * 11)
+    assert guard.check("a red fox") is None
+    assert guard.stats()["rejections"] == 2
+
+
+def test_blocklist_matches_whole_words_and_regexes():
+    matcher = compile_blocklist(["gore", "/\\bnsfw\\d*\\b/", " "])
+
+    assert matcher.search("a GORE scene")
+    assert not matcher.search("a gorecki symphony")
+    assert matcher.search("nsfw42 poster")
+    assert compile_blocklist(["", "  "]) is None
+
+
+def test_blocklist_is_loaded_from_env_and_file(tmp_path, monkeypatch):
+    path = tmp_path / "blocklist.txt"
+    path.write_text("# comment\nspam\n\n/eggs+/\n")
+    monkeypatch.setenv("PROMPT_BLOCKLIST", "ham, bacon")
+    monkeypatch.setenv("PROMPT_BLOCKLIST_FILE", str(path))
+
+    assert [e.strip() for e in load_blocklist()] == ["ham", "bacon", "spam", "/eggs+/"]
+
+
+def test_failed_prompts_are_rejected_until_the_ttl_passes(monkeypatch):
+    # Arrange
+    now = [1000.0]
+    monkeypatch.setattr(prompt_guard.time, "time", lambda: now[0])
+    guard = PromptGuard(negative_ttl=60)
+
+    # Act
+    guard.record_failure("A cat in space.", "No image generated")
+
+    # Assert: normalized spellings share the cached failure
+    assert "cached failure" in guard.check("a cat  in space")
+    now[0] += 61
+    assert guard.check("a cat in space") is None
+    assert guard.stats()["negative_entries"] == 0
+
+
+def test_forget_and_capacity():
+    guard = PromptGuard(max_entries=2)
+    for prompt in ("first prompt", "second prompt", "third prompt"):
+        guard.record_failure(prompt, "blocked")
+
+    assert guard.check("first prompt") is None
+    guard.forget("second prompt")
+    assert guard.check("second prompt") is None
+    assert guard.check("third prompt") is not None
+
+
+def test_negative_cache_can_be_disabled():
+    guard = PromptGuard(negative_ttl=0)
+    guard.record_failure("a cat", "blocked")
+
+    assert guard.check("a cat") is None
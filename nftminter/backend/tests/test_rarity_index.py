@@ -0,0 +1,83 @@
+import json
+
+from rarity_index import RarityIndex, extract_traits
+
+
+def metadata(collection, **traits):
+    attributes = [{"trait_type": t, "value": v} for t, v in traits.items()]
+    attributes.append({"trait_type": "Created", "value": "2026-01-01T00:00:00"})
+    return {"collection": collection, "attributes": attributes}
+
+
+def test_extract_traits_skips_timestamps_and_junk():
+    meta = metadata("c", Hat="Cap")
+    meta["attributes"] += ["not a dict", {"value": "no type"}]
+
+    assert extract_traits(meta) == {"Hat": "Cap"}
+
+
+def test_frequencies_and_statistical_rarity():
+    # Arrange
+    index = RarityIndex()
+    index.update("a", metadata("c1", Hat="Cap", Eyes="Blue"))
+    index.update("b", metadata("c1", Hat="Cap", Eyes="Blue"))
+    index.update("c", metadata("c1", Hat="Crown", Eyes="Blue"))
+    index.update("d", metadata("c1", Eyes="Laser"))
+    index.update("other", metadata("c2", Hat="Cap"))
+    index.update("loose", {"attributes": []})
+
+    # Act
+    report = index.rarity("c1")
+
+    # Assert
+    assert report["items"] == 4
+    assert report["traits"]["Hat"] == {
+        "None": {"count": 1, "frequency": 0.25},
+        "Cap": {"count": 2, "frequency": 0.5},
+        "Crown": {"count": 1, "frequency": 0.25},
+    }
+    # score = sum of 1 / frequency: d = 4 + 4, c = 4 + 4/3, a = b = 2 + 4/3
+    assert [(r["filename"], r["score"], r["rank"]) for r in report["ranking"]] == [
+        ("d", 8.0, 1), ("c", 5.3333, 2), ("a", 3.3333, 3), ("b", 3.3333, 3),
+    ]
+    assert index.rarity("missing") is None
+    assert index.stats() == {"collections": 2, "items": 5}
+
+
+def test_updates_moves_and_removals_refresh_the_report():
+    index = RarityIndex()
+    index.update("a", metadata("c1", Hat="Cap"))
+    index.update("b", metadata("c1", Hat="Crown"))
+    assert index.rarity("c1")["items"] == 2
+
+    index.update("b", metadata("c2", Hat="Crown"))
+    assert index.rarity("c1")["items"] == 1
+    assert index.rarity("c2")["items"] == 1
+
+    index.update("a", metadata("c1", Hat="Crown"))
+    assert index.rarity("c1")["traits"]["Hat"] == {"Crown": {"count": 1, "frequency": 1.0}}
+
+    index.remove("a")
+    assert index.rarity("c1") == {"items": 0, "traits": {"Hat": {}}, "ranking": []}
+
+
+def test_ranking_pages_and_columns_grow():
+    index = RarityIndex()
+    for i in range(1500):
+        index.update(f"item{i:04d}", metadata("big", Color=str(i % 3), Rare="yes" if i == 7 else "no"))
+
+    page = index.rarity("big", offset=0, limit=2)["ranking"]
+
+    assert page[0]["filename"] == "item0007"
+    assert len(page) == 2
+
+
+def test_load_from_a_metadata_directory(tmp_path):
+    (tmp_path / "a.json").write_text(json.dumps(metadata("c1", Hat="Cap")))
+    (tmp_path / "b.json").write_text(json.dumps({"name": "not in a collection"}))
+    (tmp_path / "broken.json").write_text("{")
+
+    index = RarityIndex()
+
+    assert index.load(tmp_path) == 1
+    assert index.rarity("c1")["ranking"][0]["filename"] == "a"
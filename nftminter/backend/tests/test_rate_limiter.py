@@ -0,0 +1,53 @@
+import asyncio
+import time
+
+import pytest
+
+from rate_limiter import TokenBucket, RateLimitTimeout
+
+
+def test_bucket_starts_full_and_then_refuses():
+    bucket = TokenBucket(rate_per_minute=60, burst=3)
+
+    assert [bucket.try_acquire() for _ in range(4)] == [True, True, True, False]
+
+
+def test_default_burst_is_one_second_of_tokens():
+    assert TokenBucket(rate_per_minute=600).capacity == 10
+    assert TokenBucket(rate_per_minute=6).capacity == 1
+
+
+def test_acquire_waits_for_the_refill():
+    # Arrange: 1200 per minute = one token every 50ms
+    bucket = TokenBucket(rate_per_minute=1200, burst=1)
+    bucket.acquire()
+
+    # Act
+    started = time.monotonic()
+    bucket.acquire(timeout=1.0)
+
+    # Assert
+    assert 0.03 <= time.monotonic() - started < 0.5
+
+
+def test_acquire_times_out():
+    bucket = TokenBucket(rate_per_minute=1, burst=1)
+    bucket.acquire()
+
+    with pytest.raises(RateLimitTimeout):
+        bucket.acquire(timeout=0.05)
+
+
+def test_acquire_without_timeout_refuses_to_block_the_event_loop():
+    bucket = TokenBucket(rate_per_minute=60)
+
+    async def acquire_on_loop():
+        bucket.acquire()
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(acquire_on_loop())
+
+
+def test_invalid_rate_is_rejected():
+    with pytest.raises(ValueError):
+        TokenBucket(rate_per_minute=0)
@@ -0,0 +1,189 @@
+import time
+import threading
+
+import pytest
+
+from rate_limiter import RateLimitTimeout
+from resilience import (
+    ResilientCaller, CircuitBreaker, LatencyTracker, CircuitOpenError, GenerationTimeout, is_retryable,
+)
+
+
+class UpstreamError(Exception):
+    def __init__(self, code):
+        super().__init__(f"HTTP {code}")
+        self.code = code
+
+
+def make_caller(**kwargs):
+    kwargs.setdefault("base_delay", 0.001)
+    kwargs.setdefault("max_delay", 0.001)
+    return ResilientCaller(**kwargs)
+
+
+def test_errors_are_classified():
+    assert is_retryable(UpstreamError(503))
+    assert is_retryable(UpstreamError(429))
+    assert is_retryable(ConnectionError())
+    assert not is_retryable(UpstreamError(400))
+    assert not is_retryable(ValueError("bad prompt"))
+
+
+def test_transient_errors_are_retried():
+    caller = make_caller(max_attempts=3)
+    calls = []
+
+    def flaky(progress):
+        calls.append(1)
+        if len(calls) < 3:
+            raise UpstreamError(503)
+        return "image"
+
+    assert caller.call(flaky) == "image"
+    assert caller.retries == 2
+
+
+def test_permanent_errors_fail_immediately():
+    caller = make_caller(max_attempts=3)
+    calls = []
+
+    def rejected(progress):
+        calls.append(1)
+        raise UpstreamError(400)
+
+    with pytest.raises(UpstreamError):
+        caller.call(rejected)
+    assert len(calls) == 1
+    assert caller.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_circuit_opens_and_a_probe_closes_it():
+    # Arrange
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+    caller = make_caller(max_attempts=1, breaker=breaker)
+
+    def down(progress):
+        raise UpstreamError(503)
+
+    # Act / Assert
+    for _ in range(2):
+        with pytest.raises(UpstreamError):
+            caller.call(down)
+    assert breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpenError):
+        caller.call(lambda progress: "image")
+
+    time.sleep(0.06)
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert caller.call(lambda progress: "image") == "image"
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_idle_attempt_times_out_and_stops_at_its_next_chunk():
+    caller = make_caller(max_attempts=1, idle_timeout=0.05)
+    stopped = threading.Event()
+
+    def hung(progress):
+        time.sleep(0.15)
+        try:
+            progress()
+        except Exception:
+            stopped.set()
+            raise
+
+    with pytest.raises(GenerationTimeout):
+        caller.call(hung)
+    assert stopped.wait(1)
+
+
+def test_deadline_bounds_a_streaming_attempt():
+    caller = make_caller(max_attempts=1, deadline=0.1, idle_timeout=1.0)
+
+    def endless(progress):
+        while True:
+            progress()
+            time.sleep(0.01)
+
+    started = time.monotonic()
+    with pytest.raises(GenerationTimeout, match="deadline"):
+        caller.call(endless)
+    assert time.monotonic() - started < 0.5
+
+
+def test_slow_attempt_is_hedged():
+    # Arrange: usual latency is 10ms, this call would take a second
+    latency = LatencyTracker(min_samples=1)
+    latency.record(0.01)
+    caller = make_caller(hedge=True, latency=latency)
+    calls = []
+
+    def first_slow(progress):
+        calls.append(1)
+        if len(calls) == 1:
+            for _ in range(100):
+                time.sleep(0.01)
+                progress()
+        return len(calls)
+
+    # Act
+    result = caller.call(first_slow, try_acquire=lambda: True)
+
+    # Assert
+    assert result == 2
+    assert caller.hedges == 1
+
+
+def test_quota_wait_is_bounded_by_quota_timeout():
+    caller = make_caller(quota_timeout=7.0)
+    waits = []
+
+    caller.call(lambda progress: "image", acquire=waits.append)
+
+    assert waits == [7.0]
+
+
+def test_attempts_share_a_bounded_pool():
+    caller = make_caller(max_workers=2)
+    running, peak = [0], [0]
+    lock = threading.Lock()
+
+    def attempt(progress):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.02)
+        with lock:
+            running[0] -= 1
+        return "image"
+
+    threads = [threading.Thread(target=caller.call, args=(attempt,)) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert peak[0] <= 2
+
+
+def test_probe_is_released_when_quota_runs_out():
+    # Arrange: open the circuit and let it go half-open
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    caller = make_caller(max_attempts=1, breaker=breaker)
+
+    def down(progress):
+        raise UpstreamError(503)
+
+    with pytest.raises(UpstreamError):
+        caller.call(down)
+    time.sleep(0.06)
+
+    def no_quota(timeout):
+        raise RateLimitTimeout("Timed out waiting for generation rate limit")
+
+    # Act: the probe never reaches Gemini
+    with pytest.raises(RateLimitTimeout):
+        caller.call(lambda progress: "image", acquire=no_quota)
+
+    # Assert: the next call may still probe
+    assert caller.call(lambda progress: "image") == "image"
+    assert breaker.state == CircuitBreaker.CLOSED
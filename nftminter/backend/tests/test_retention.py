@@ -0,0 +1,95 @@
+import pytest
+
+from artifact_store import ArtifactStore
+from ipfs_uploader import InMemoryBackend
+from metadata_store import MetadataStore
+from pin_mirror import PinMirror
+from retention import RetentionManager
+
+
+@pytest.fixture
+def artifacts(tmp_path):
+    return ArtifactStore(str(tmp_path / "out"))
+
+
+@pytest.fixture
+def metadata(tmp_path):
+    store = MetadataStore(db_path=str(tmp_path / "metadata.db"), export_dir=str(tmp_path / "metadata"))
+    yield store
+    store.close()
+
+
+@pytest.fixture
+def mirror(tmp_path):
+    return PinMirror(InMemoryBackend(), db_path=str(tmp_path / "pins.db"))
+
+
+def add_artifact(artifacts, metadata, mirror, name, pinned=True, minted=False, image_pinned=True):
+    data = name.encode() * 10
+    digest, _ = artifacts.put(data, ".png")
+    artifacts.link(name, digest, ".png", len(data))
+    document = {"name": name, "image": f"ipfs://bafy{name}"}
+    if pinned:
+        document["metadata_uri"] = f"ipfs://bafymeta{name}"
+    if minted:
+        document["token_id"] = len(name)
+    metadata.save(name, document)
+    if image_pinned:
+        mirror.record(f"bafy{name}", name=name, size=len(data))
+
+
+def test_nothing_is_evicted_under_budget(artifacts, metadata, mirror):
+    add_artifact(artifacts, metadata, mirror, "a")
+    retention = RetentionManager(artifacts, metadata, pin_mirror=mirror, max_items=5)
+
+    assert retention.run_once() == 0
+
+
+def test_minted_artifacts_go_first_and_unpinned_ones_stay(artifacts, metadata, mirror):
+    # Arrange
+    add_artifact(artifacts, metadata, mirror, "draft", pinned=False)
+    add_artifact(artifacts, metadata, mirror, "pinned")
+    add_artifact(artifacts, metadata, mirror, "minted", minted=True)
+    retention = RetentionManager(artifacts, metadata, pin_mirror=mirror, max_items=2)
+
+    # Act: 3 items over a budget of 2 -> down to 90%, i.e. one item
+    evicted = retention.run_once()
+
+    # Assert
+    assert evicted == 2
+    assert artifacts.resolve("minted") is None
+    assert artifacts.resolve("pinned") is None
+    assert artifacts.resolve("draft") is not None
+    assert retention.usage()["skipped_unpinned"] == 1
+    assert metadata.get("minted")["token_id"] == 6
+    assert artifacts.reserve_name("minted") == "minted_2"
+
+
+def test_image_missing_from_the_pin_mirror_is_kept(artifacts, metadata, mirror):
+    add_artifact(artifacts, metadata, mirror, "a", image_pinned=False)
+    add_artifact(artifacts, metadata, mirror, "b")
+    retention = RetentionManager(artifacts, metadata, pin_mirror=mirror, max_items=1)
+
+    assert retention.run_once() == 1
+    assert artifacts.resolve("a") is not None
+    assert artifacts.resolve("b") is None
+
+
+def test_bytes_are_only_counted_when_the_file_is_freed(artifacts, metadata, mirror, tmp_path):
+    # Arrange: "legacy" is hardlinked from the old images directory
+    images = tmp_path / "images"
+    images.mkdir()
+    (images / "legacy.png").write_bytes(b"legacy image")
+    artifacts.migrate(images)
+    metadata.save("legacy", {"name": "legacy", "image": "ipfs://bafylegacy", "metadata_uri": "ipfs://bafymeta"})
+    mirror.record("bafylegacy")
+    add_artifact(artifacts, metadata, mirror, "own")
+    retention = RetentionManager(artifacts, metadata, pin_mirror=mirror, max_bytes=1)
+
+    # Act
+    evicted = retention.run_once()
+
+    # Assert
+    assert evicted == 2
+    assert retention.bytes_freed == len(b"own" * 10)
+    assert (images / "legacy.png").exists()
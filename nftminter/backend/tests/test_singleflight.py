@@ -0,0 +1,66 @@
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from singleflight import SingleFlight
+
+
+def test_concurrent_callers_share_one_execution():
+    # Arrange
+    group = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def slow(value):
+        calls.append(value)
+        started.set()
+        release.wait(5)
+        return value * 2
+
+    # Act
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        leader = pool.submit(group.do, "key", slow, 21)
+        started.wait(5)
+        followers = [pool.submit(group.do, "key", slow, 21) for _ in range(3)]
+        while group.shared_calls < 3:
+            time.sleep(0.005)
+        release.set()
+        results = [leader.result()] + [f.result() for f in followers]
+
+    # Assert
+    assert calls == [21]
+    assert results == [(42, False)] + [(42, True)] * 3
+    assert group.in_flight() == 0
+
+
+def test_errors_reach_every_caller_and_are_not_cached():
+    group = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+
+    def failing():
+        started.set()
+        release.wait(5)
+        raise ConnectionError("upstream down")
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        leader = pool.submit(group.do, "key", failing)
+        started.wait(5)
+        follower = pool.submit(group.do, "key", failing)
+        while group.shared_calls < 1:
+            time.sleep(0.005)
+        release.set()
+        for future in (leader, follower):
+            with pytest.raises(ConnectionError):
+                future.result()
+
+    assert group.do("key", lambda: "fresh") == ("fresh", False)
+
+
+def test_different_keys_run_independently():
+    group = SingleFlight()
+
+    assert group.do("a", lambda: 1) == (1, False)
+    assert group.do("b", lambda: 2) == (2, False)
+    assert group.shared_calls == 0
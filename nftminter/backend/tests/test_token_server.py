@@ -0,0 +1,107 @@
+import gzip
+import json
+import time
+
+import pytest
+
+import token_server
+from token_server import TokenMetadataServer, accepts_gzip, etag_matches
+
+
+class FakeFetch:
+    def __init__(self, documents):
+        self.documents = documents
+        self.calls = []
+
+    def __call__(self, cid):
+        self.calls.append(cid)
+        document = self.documents[cid]
+        if isinstance(document, Exception):
+            raise document
+        return document
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise TimeoutError("condition not met")
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def documents():
+    return {"bafyone": json.dumps({"name": "One"}).encode(), "bafybad": b"not json", "bafydown": ConnectionError("gateway down")}
+
+
+@pytest.fixture
+def server(documents):
+    server = TokenMetadataServer(FakeFetch(documents), workers=2)
+    yield server
+    server.shutdown()
+
+
+def test_minted_tokens_are_served_with_etag_and_gzip(server, documents):
+    # Act
+    server.update("cat", {"token_id": 1, "metadata_uri": "ipfs://bafyone"})
+    server.update("draft", {"metadata_uri": "ipfs://bafyone"})
+    wait_for(lambda: server.get(1) is not None)
+
+    # Assert
+    document = server.get(1)
+    assert document.body == documents["bafyone"]
+    assert gzip.decompress(document.gzip_body) == document.body
+    assert document.etag == '"bafyone"'
+    assert server.stats() == {"tokens": 1, "pending": 0}
+
+
+def test_documents_that_are_not_json_are_not_served(server):
+    server.add(2, "bafybad")
+
+    wait_for(lambda: server._pending[2][1] > 0)
+    assert server.get(2) is None
+
+
+def test_failed_fetches_are_retried_after_a_pause(server, documents, monkeypatch):
+    # Arrange
+    server.add(3, "bafydown")
+    wait_for(lambda: server._pending[3][1] > 0)
+    documents["bafydown"] = json.dumps({"name": "Three"}).encode()
+
+    # Act / Assert
+    assert server.get(3) is None
+    assert server.fetch.calls == ["bafydown"]
+    monkeypatch.setattr(token_server, "RETRY_SECONDS", 0.0)
+    server.get(3)
+    wait_for(lambda: server.get(3) is not None)
+
+
+def test_load_queues_existing_tokens(server):
+    assert server.load([(1, "bafyone"), ("4", "bafyone")]) == 2
+    wait_for(lambda: server.stats()["tokens"] == 2)
+
+
+@pytest.mark.parametrize("header, expected", [
+    (None, False),
+    ('"bafyone"', True),
+    ('"other", W/"bafyone"', True),
+    ("*", True),
+    ('"bafyone-suffix"', False),
+    ('"bafyon"', False),
+])
+def test_if_none_match(header, expected):
+    assert etag_matches('"bafyone"', header) is expected
+
+
+@pytest.mark.parametrize("header, expected", [
+    (None, False),
+    ("gzip, deflate, br", True),
+    ("GZIP;Q=0.5", True),
+    ("gzip;q=0", False),
+    ("br, *;q=0.1", True),
+    ("*;q=1, gzip;q=0", False),
+    ("identity", False),
+    ("x-gzip", True),
+])
+def test_accept_encoding(header, expected):
+    assert accepts_gzip(header) is expected
@@ -0,0 +1,133 @@
+import io
+from collections import OrderedDict
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import trait_compositor
+from artifact_store import ArtifactStore
+from metadata_store import MetadataStore
+from trait_compositor import LayerSet, TraitCompositor, NO_LAYER, alpha_composite, _load_layer
+
+
+def layer_png(rgba, size=8):
+    buffer = io.BytesIO()
+    Image.new("RGBA", (size, size), rgba).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def premultiplied(rgba):
+    layer = np.array([[rgba]], dtype=np.float32) / 255.0
+    layer[..., :3] *= layer[..., 3:4]
+    return layer
+
+
+@pytest.fixture
+def layers(tmp_path):
+    return LayerSet(str(tmp_path / "layers"))
+
+
+def test_upper_layers_are_drawn_over_lower_ones():
+    # Arrange
+    red = premultiplied((255, 0, 0, 255))
+    blue = premultiplied((0, 0, 255, 255))
+    half_blue = premultiplied((0, 0, 255, 128))
+
+    # Act / Assert: opaque layers cover what is below, half transparent ones blend
+    assert alpha_composite([red, blue])[0, 0].tolist() == [0, 0, 255, 255]
+    assert alpha_composite([blue, red])[0, 0].tolist() == [255, 0, 0, 255]
+    assert alpha_composite([red, half_blue])[0, 0].tolist() == [127, 0, 128, 255]
+
+
+def test_transparent_layers_keep_straight_alpha():
+    half_red = premultiplied((255, 0, 0, 128))
+    clear = premultiplied((0, 0, 0, 0))
+
+    assert alpha_composite([clear, half_red])[0, 0].tolist() == [255, 0, 0, 128]
+
+
+def test_layer_set_reads_order_and_weights(layers):
+    # Arrange
+    layers.add_layer("Hat", "Cap", layer_png((0, 0, 255, 255)), weight=3, order=2)
+    layers.add_layer("Background", "Sunset", layer_png((255, 0, 0, 255)), order=1)
+    layers.add_layer("Hat", NO_LAYER, None, weight=0.5)
+
+    # Act
+    traits = layers.traits()
+
+    # Assert
+    assert list(traits) == ["Background", "Hat"]
+    assert traits["Hat"] == {"Cap": 3.0, NO_LAYER: 0.5}
+    assert layers.layer_paths()["Hat"][NO_LAYER] is None
+
+
+def test_drawn_values_need_an_image(layers):
+    with pytest.raises(ValueError, match="needs an image"):
+        layers.add_layer("Hat", "Cap", None)
+
+
+def test_heavier_values_are_sampled_more_often(layers, tmp_path):
+    # Arrange
+    layers.add_layer("Background", "Gold", layer_png((255, 215, 0, 255)), weight=9, order=1)
+    layers.add_layer("Background", "Grey", layer_png((128, 128, 128, 255)), order=1)
+    for i in range(50):
+        layers.add_layer("Eyes", f"Eyes {i}", layer_png((0, 0, i, 255)), order=2)
+    compositor = TraitCompositor(layers, output_dir=str(tmp_path))
+
+    # Act
+    combos = compositor.sample(40, seed=3)
+
+    # Assert
+    gold = sum(1 for combo in combos if combo["Background"] == "Gold")
+    assert gold >= 30
+    assert len({tuple(combo.items()) for combo in combos}) == 40
+
+
+def test_compose_stores_images_and_trait_metadata(layers, tmp_path):
+    # Arrange
+    layers.add_layer("Background", "Red", layer_png((255, 0, 0, 255)), order=1)
+    layers.add_layer("Hat", "Blue", layer_png((0, 0, 255, 255)), order=2)
+    layers.add_layer("Hat", NO_LAYER, None)
+    store = ArtifactStore(str(tmp_path))
+    metadata = MetadataStore(db_path=str(tmp_path / "metadata.db"))
+    compositor = TraitCompositor(layers, workers=1, store=store, metadata_store=metadata)
+
+    # Act
+    try:
+        hat, bare = compositor.compose([
+            {"filename": "hat", "traits": {"Background": "Red", "Hat": "Blue"}},
+            {"filename": "bare", "traits": {"Background": "Red", "Hat": NO_LAYER}},
+        ])
+    finally:
+        compositor.shutdown()
+
+    # Assert
+    with Image.open(store.resolve("hat")) as image:
+        assert image.getpixel((0, 0)) == (0, 0, 255)
+    with Image.open(store.resolve("bare")) as image:
+        assert image.getpixel((0, 0)) == (255, 0, 0)
+    attributes = metadata.get("hat")["attributes"]
+    assert {"trait_type": "Hat", "value": "Blue"} in attributes
+    assert bare["success"]
+
+
+def test_layer_cache_is_bounded_by_bytes(tmp_path, monkeypatch):
+    # Arrange: each 8x8 float32 RGBA layer takes 1KB
+    monkeypatch.setattr(trait_compositor, "_LAYER_CACHE", OrderedDict())
+    monkeypatch.setattr(trait_compositor, "_layer_cache_bytes", 0)
+    paths = []
+    for i in range(4):
+        path = tmp_path / f"layer{i}.png"
+        path.write_bytes(layer_png((i, 0, 0, 255)))
+        paths.append(str(path))
+
+    # Act
+    for path in paths[:3]:
+        _load_layer(path, (8, 8), cache_bytes=2048)
+    _load_layer(paths[1], (8, 8), cache_bytes=2048)
+    _load_layer(paths[3], (8, 8), cache_bytes=2048)
+
+    # Assert: the least recently used layers were dropped
+    assert [key[0] for key in trait_compositor._LAYER_CACHE] == [paths[1], paths[3]]
+    assert trait_compositor._layer_cache_bytes == 2048
@@ -0,0 +1,164 @@
+import threading
+from concurrent.futures import Future
+
+import pytest
+
+from upload_outbox import UploadOutbox, DONE, FAILED, PENDING, IN_PROGRESS, HOOK_RECORD_CIDS
+
+
+class FakeUploader:
+    """Stands in for IPFSUploader: fails the first `failures` calls"""
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def upload_nft_complete(self, image, metadata, filename=None):
+        with self.lock:
+            self.calls.append((image, filename))
+            if len(self.calls) <= self.failures:
+                raise ConnectionError("gateway down")
+        return {"image_cid": "bafyimage", "metadata_cid": "bafymeta", "metadata_uri": "ipfs://bafymeta"}
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "outbox.db")
+
+
+def make_outbox(db_path, uploader, **kwargs):
+    kwargs.setdefault("base_delay", 0.01)
+    kwargs.setdefault("max_delay", 0.05)
+    return UploadOutbox(uploader, db_path=db_path, workers=1, **kwargs)
+
+
+def test_upload_is_retried_until_it_succeeds(db_path, tmp_path):
+    # Arrange
+    image = tmp_path / "nft.png"
+    image.write_bytes(b"png")
+    uploader = FakeUploader(failures=2)
+    outbox = make_outbox(db_path, uploader)
+    outbox.start()
+
+    # Act
+    handle = outbox.enqueue(str(image), {"name": "NFT"})
+    result = handle.wait(timeout=5)
+    outbox.stop()
+
+    # Assert
+    assert result["metadata_cid"] == "bafymeta"
+    assert len(uploader.calls) == 3
+    record = handle.status()
+    assert record["status"] == DONE
+    assert record["attempts"] == 3
+
+
+def test_upload_fails_after_max_attempts(db_path, tmp_path):
+    # Arrange
+    image = tmp_path / "nft.png"
+    image.write_bytes(b"png")
+    outbox = make_outbox(db_path, FakeUploader(failures=10), max_attempts=2)
+    outbox.start()
+
+    # Act
+    handle = outbox.enqueue(str(image), {"name": "NFT"})
+    with pytest.raises(Exception, match="gateway down"):
+        handle.wait(timeout=5)
+    outbox.stop()
+
+    # Assert
+    assert handle.status()["status"] == FAILED
+    assert outbox.retry(handle.upload_id)
+    assert outbox.get(handle.upload_id)["status"] == PENDING
+
+
+def test_interrupted_upload_resumes_after_restart(db_path):
+    # Arrange: an upload claimed by a drainer when the process died
+    outbox = make_outbox(db_path, FakeUploader())
+    handle = outbox.enqueue("missing.png", {"name": "NFT"}, image_bytes=b"png", persisted=False)
+    assert outbox._claim_next()["id"] == handle.upload_id
+    assert outbox.get(handle.upload_id)["status"] == IN_PROGRESS
+
+    # Act
+    uploader = FakeUploader()
+    restarted = make_outbox(db_path, uploader)
+    resumed = restarted.handle(handle.upload_id)
+    restarted.start()
+    result = resumed.wait(timeout=5)
+    restarted.stop()
+
+    # Assert: the image was kept in the outbox, so it survived the restart
+    assert result["image_cid"] == "bafyimage"
+    assert uploader.calls[0][0] == b"png"
+    assert restarted.get(handle.upload_id)["status"] == DONE
+
+
+def test_hook_runs_before_the_upload_is_done(db_path, tmp_path):
+    # Arrange
+    image = tmp_path / "nft.png"
+    image.write_bytes(b"png")
+    applied = []
+    failures = [ValueError("metadata store busy")]
+
+    def on_complete(artifact_name, hook, metadata, result):
+        if failures:
+            raise failures.pop()
+        applied.append((artifact_name, hook, result["metadata_cid"]))
+
+    outbox = make_outbox(db_path, FakeUploader(), on_complete=on_complete)
+    outbox.start()
+
+    # Act
+    handle = outbox.enqueue(str(image), {"name": "NFT"}, artifact_name="nft_1", hook=HOOK_RECORD_CIDS)
+    handle.wait(timeout=5)
+    outbox.stop()
+
+    # Assert: the failed hook was retried with the upload
+    assert applied == [("nft_1", HOOK_RECORD_CIDS, "bafymeta")]
+    assert handle.status()["attempts"] == 2
+
+
+def test_failed_image_write_keeps_the_image_in_the_outbox(db_path, tmp_path):
+    # Arrange
+    image_write = Future()
+    uploader = FakeUploader()
+    outbox = make_outbox(db_path, uploader)
+    handle = outbox.enqueue(str(tmp_path / "never-written.png"), {"name": "NFT"}, image_bytes=b"png", image_write=image_write)
+
+    # Act
+    image_write.set_exception(OSError("disk full"))
+    outbox.start()
+    handle.wait(timeout=5)
+    outbox.stop()
+
+    # Assert
+    assert uploader.calls[0][0] == b"png"
+    assert outbox._payloads == {}
+
+
+def test_successful_image_write_frees_the_bytes(db_path, tmp_path):
+    # Arrange
+    image = tmp_path / "nft.png"
+    image_write = Future()
+    uploader = FakeUploader()
+    outbox = make_outbox(db_path, uploader)
+    handle = outbox.enqueue(str(image), {"name": "NFT"}, image_bytes=b"png", image_write=image_write)
+    assert outbox._payloads
+
+    # Act
+    image.write_bytes(b"png")
+    image_write.set_result(None)
+    outbox.start()
+    handle.wait(timeout=5)
+    outbox.stop()
+
+    # Assert: the drainer read the written file
+    assert outbox._payloads == {}
+    assert uploader.calls[0][0] == str(image)
+
+
+def test_enqueue_requires_bytes_when_not_persisted(db_path):
+    outbox = make_outbox(db_path, FakeUploader())
+    with pytest.raises(ValueError):
+        outbox.enqueue("nft.png", {}, persisted=False)
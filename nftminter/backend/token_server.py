@@ -0,0 +1,186 @@
+"""
+Token Metadata Server
+Serves the exact metadata document pinned for each minted token ID from an
+in-memory map, with the metadata CID as a strong ETag and a precompressed
+gzip body, so a contract's HTTP base URI answers without an IPFS gateway
+"""
+
+import os
+import json
+import gzip
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+# Token metadata never changes once minted (the CID pins its bytes)
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# Seconds before a token whose document could not be fetched is tried again
+RETRY_SECONDS = 60.0
+
+
+def etag_matches(etag: str, if_none_match: Optional[str]) -> bool:
+    """
+    Whether an If-None-Match header matches an ETag (weak comparison, RFC 9110).
+
+    Args:
+        etag: Strong ETag of the current document, quoted
+        if_none_match: Header value: "*" or a comma separated list of (W/-prefixed) tags
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag == etag:
+            return True
+    return False
+
+
+def accepts_gzip(accept_encoding: Optional[str]) -> bool:
+    """
+    Whether an Accept-Encoding header allows gzip ("gzip;q=0" refuses it,
+    "*" accepts it unless gzip is listed separately).
+    """
+    if not accept_encoding:
+        return False
+    qualities = {}
+    for coding in accept_encoding.split(","):
+        name, _, params = coding.partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    quality = float(value.strip())
+                except ValueError:
+                    quality = 0.0
+        qualities[name] = quality
+    for name in ("gzip", "x-gzip", "*"):
+        if name in qualities:
+            return qualities[name] > 0
+    return False
+
+
+class TokenDocument:
+    """Response bodies for one token, prepared once"""
+
+    __slots__ = ("token_id", "cid", "body", "gzip_body", "etag")
+
+    def __init__(self, token_id: int, cid: str, body: bytes):
+        self.token_id = token_id
+        self.cid = cid
+        self.body = body
+        # mtime=0 keeps the compressed bytes identical across restarts
+        self.gzip_body = gzip.compress(body, compresslevel=9, mtime=0)
+        self.etag = f'"{cid}"'
+
+
+class TokenMetadataServer:
+    """
+    Token ID -> pinned metadata document.
+
+    Documents are fetched by metadata CID (through the IPFS read cache) in a
+    background pool when a token is minted or at startup, so requests only
+    do a dictionary lookup.
+    """
+
+    def __init__(self, fetch: Callable[[str], bytes], workers: int = 4):
+        """
+        Args:
+            fetch: Returns the bytes pinned under a CID (e.g. IPFSReadCache.get)
+            workers: Threads fetching documents
+        """
+        self.fetch = fetch
+        self._tokens: Dict[int, TokenDocument] = {}
+        # token_id -> (metadata CID, time of the last failed fetch) for documents not loaded yet
+        self._pending: Dict[int, Tuple[str, float]] = {}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="token-metadata")
+
+    @classmethod
+    def from_env(cls, fetch: Callable[[str], bytes]) -> Optional["TokenMetadataServer"]:
+        """Server enabled by TOKEN_METADATA_SERVER, or None when it is off"""
+        if os.getenv("TOKEN_METADATA_SERVER", "false").lower() not in ("1", "true", "yes"):
+            return None
+        return cls(fetch, workers=int(os.getenv("TOKEN_METADATA_WORKERS", "4")))
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def add(self, token_id: int, cid: str):
+        """Fetch and index a token's metadata document in the background"""
+        with self._lock:
+            current = self._tokens.get(token_id)
+            if current is not None and current.cid == cid:
+                return
+            self._pending[token_id] = (cid, 0.0)
+        self._pool.submit(self._load, token_id, cid)
+
+    def update(self, filename: str, metadata: dict):
+        """Metadata listener: index tokens as they are minted"""
+        token_id = metadata.get("token_id")
+        uri = metadata.get("metadata_uri")
+        if token_id is None or not isinstance(uri, str) or not uri.startswith("ipfs://"):
+            return
+        self.add(int(token_id), uri[len("ipfs://"):])
+
+    def load(self, tokens: Iterable[Tuple[int, str]]) -> int:
+        """
+        Index existing tokens (fetched in the background).
+
+        Args:
+            tokens: (token_id, metadata CID) pairs
+
+        Returns:
+            int: Number of tokens queued
+        """
+        queued = 0
+        for token_id, cid in tokens:
+            self.add(int(token_id), cid)
+            queued += 1
+        if queued:
+            print(f"🪙 Loading metadata for {queued} minted tokens")
+        return queued
+
+    def _load(self, token_id: int, cid: str):
+        try:
+            body = self.fetch(cid)
+            # Only well-formed JSON is served as token metadata
+            json.loads(body)
+        except Exception as e:
+            print(f"⚠️  Could not load metadata for token {token_id} ({cid}): {e}")
+            with self._lock:
+                if self._pending.get(token_id, (None,))[0] == cid:
+                    self._pending[token_id] = (cid, time.time())
+            return
+
+        document = TokenDocument(token_id, cid, bytes(body))
+        with self._lock:
+            if self._pending.get(token_id, (None,))[0] == cid:
+                del self._pending[token_id]
+            self._tokens[token_id] = document
+
+    def get(self, token_id: int) -> Optional[TokenDocument]:
+        """The prepared document for a token, or None (a failed fetch is retried in the background)"""
+        document = self._tokens.get(token_id)
+        if document is not None:
+            return document
+        with self._lock:
+            pending = self._pending.get(token_id)
+            if pending is None or not pending[1] or time.time() - pending[1] < RETRY_SECONDS:
+                return None
+            self._pending[token_id] = (pending[0], 0.0)
+        self._pool.submit(self._load, token_id, pending[0])
+        return None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"tokens": len(self._tokens), "pending": len(self._pending)}
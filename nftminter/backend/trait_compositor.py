@@ -0,0 +1,362 @@
+"""
+Layered Trait Compositor
+Builds generative collections locally from a small set of (AI-generated) trait
+layers: weighted unique trait sampling, vectorized NumPy alpha compositing in a
+process pool, and attributes metadata for every piece
+"""
+
+import io
+import os
+import re
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+from PIL import Image
+
+from collection_jobs import sample_traits
+from artifact_store import ArtifactStore, write_object
+from metadata_store import MetadataStore
+from image_encoder import worker_context
+
+# Layer value that draws nothing (e.g. an optional accessory)
+NO_LAYER = "None"
+
+# Asks Gemini for a single trait on a flat key color that is removed afterwards
+LAYER_PROMPT_TEMPLATE = (
+    "Create a single {trait} for a layered NFT collection: {prompt}. Centered, flat digital art, "
+    "same framing as a portrait avatar. Place it on a solid pure green (#00FF00) background with no shadows."
+)
+BACKGROUND_PROMPT_TEMPLATE = (
+    "Create a full-frame background for a layered NFT collection: {prompt}. Flat digital art, no characters or text."
+)
+
+LAYER_DIR_PATTERN = re.compile(r"^(\d+)_(.+)$")
+
+
+def chroma_key(image_data: bytes, key: tuple = (0, 255, 0), tolerance: int = 90, softness: int = 60) -> bytes:
+    """
+    Make the key color transparent (vectorized) and return an RGBA PNG.
+
+    Pixels within `tolerance` (L1 distance) of the key become fully transparent,
+    with a linear ramp over the next `softness` to keep edges smooth.
+    """
+    with Image.open(io.BytesIO(image_data)) as image:
+        rgb = np.asarray(image.convert("RGB"), dtype=np.int16)
+    distance = np.abs(rgb - np.array(key, dtype=np.int16)).sum(axis=-1)
+    alpha = np.clip((distance - tolerance) * 255 // max(softness, 1), 0, 255).astype(np.uint8)
+    rgba = np.dstack([rgb.astype(np.uint8), alpha])
+
+    buffer = io.BytesIO()
+    Image.fromarray(rgba, "RGBA").save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+class LayerSet:
+    """
+    Trait layers on disk.
+
+    Layout: <root>/<order>_<trait_type>/<value>[#<weight>].png, e.g.
+    layers/01_Background/Sunset#10.png. Layers are drawn in order; a file named
+    "None[#weight].<ext>" is a value that draws nothing.
+    """
+
+    def __init__(self, root: str = "generated_nfts/layers"):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def _trait_dirs(self) -> list:
+        dirs = []
+        for path in self.root.iterdir():
+            match = LAYER_DIR_PATTERN.match(path.name)
+            if path.is_dir() and match:
+                dirs.append((int(match.group(1)), match.group(2), path))
+        return sorted(dirs)
+
+    def traits(self) -> "OrderedDict[str, Dict[str, float]]":
+        """Trait types in draw order, each mapping value -> weight"""
+        traits = OrderedDict()
+        for _, trait_type, path in self._trait_dirs():
+            values = {}
+            for layer in sorted(path.iterdir()):
+                if layer.name.startswith("."):
+                    continue
+                value, _, weight = layer.stem.partition("#")
+                values[value] = float(weight) if weight else 1.0
+            if values:
+                traits[trait_type] = values
+        return traits
+
+    def layer_paths(self) -> Dict[str, Dict[str, Optional[str]]]:
+        """trait_type -> value -> layer file (None for values that draw nothing)"""
+        paths = {}
+        for _, trait_type, path in self._trait_dirs():
+            paths[trait_type] = {}
+            for layer in path.iterdir():
+                if layer.name.startswith("."):
+                    continue
+                value = layer.stem.partition("#")[0]
+                paths[trait_type][value] = None if value == NO_LAYER else str(layer)
+        return paths
+
+    def add_layer(self, trait_type: str, value: str, image_data: Optional[bytes], weight: float = 1.0, order: Optional[int] = None) -> Path:
+        """
+        Store a layer image (None stores the "draws nothing" value NO_LAYER).
+
+        Args:
+            trait_type: Trait name, e.g. "Background"
+            value: Trait value, e.g. "Sunset"
+            image_data: PNG bytes (RGBA for everything above the background);
+                        None only for value NO_LAYER
+            weight: Relative sampling weight
+            order: Draw order for a new trait type (defaults to after the last one)
+
+        Raises:
+            ValueError: Invalid trait type or value, or no image for a drawn value
+        """
+        if not re.fullmatch(r"[\w\- ]+", trait_type) or not re.fullmatch(r"[\w\- ]+", value):
+            raise ValueError("Trait types and values may only contain letters, digits, spaces, '-' and '_'")
+        if image_data is None and value != NO_LAYER:
+            raise ValueError(f"Layer '{trait_type}/{value}' needs an image; only '{NO_LAYER}' may draw nothing")
+
+        existing = {name: path for _, name, path in self._trait_dirs()}
+        directory = existing.get(trait_type)
+        if directory is None:
+            if order is None:
+                order = max([o for o, _, _ in self._trait_dirs()], default=0) + 1
+            directory = self.root / f"{order:02d}_{trait_type}"
+            directory.mkdir(parents=True, exist_ok=True)
+
+        for old in directory.glob(f"{value}*"):
+            if old.stem.partition("#")[0] == value:
+                old.unlink()
+
+        suffix = f"#{weight:g}" if weight != 1.0 else ""
+        path = directory / f"{value}{suffix}{'.png' if image_data is not None else '.none'}"
+        path.write_bytes(image_data or b"")
+        return path
+
+
+# Per-process LRU cache of premultiplied layers: (path, mtime, size) -> float32 RGBA array.
+# A 1024px layer takes 16MB, so the cache is bounded by bytes, not entries.
+_LAYER_CACHE: "OrderedDict[tuple, np.ndarray]" = OrderedDict()
+_layer_cache_bytes = 0
+
+
+def _load_layer(path: str, size: tuple, cache_bytes: int) -> np.ndarray:
+    global _layer_cache_bytes
+    key = (path, os.path.getmtime(path), size)
+    layer = _LAYER_CACHE.get(key)
+    if layer is not None:
+        _LAYER_CACHE.move_to_end(key)
+        return layer
+
+    with Image.open(path) as image:
+        image = image.convert("RGBA")
+        if image.size != size:
+            image = image.resize(size, Image.LANCZOS)
+        layer = np.asarray(image, dtype=np.float32) / 255.0
+    # Premultiply once, so compositing is a single multiply-add per layer
+    layer[..., :3] *= layer[..., 3:4]
+
+    _LAYER_CACHE[key] = layer
+    _layer_cache_bytes += layer.nbytes
+    # Replaced layer files (new mtime) and rarely drawn values age out first
+    while _layer_cache_bytes > cache_bytes and len(_LAYER_CACHE) > 1:
+        _, evicted = _LAYER_CACHE.popitem(last=False)
+        _layer_cache_bytes -= evicted.nbytes
+    return layer
+
+
+def alpha_composite(layers: List[np.ndarray]) -> np.ndarray:
+    """
+    Composite premultiplied float RGBA layers (bottom first) with the "over" operator.
+
+    Returns:
+        np.ndarray: uint8 RGBA image (straight alpha)
+    """
+    out = layers[0].copy()
+    for layer in layers[1:]:
+        out *= 1.0 - layer[..., 3:4]
+        out += layer
+    alpha = out[..., 3:4]
+    rgb = np.divide(out[..., :3], alpha, out=np.zeros_like(out[..., :3]), where=alpha > 0)
+    return (np.concatenate([rgb, alpha], axis=-1) * 255.0 + 0.5).astype(np.uint8)
+
+
+def _compose_chunk(tasks: List[List[str]], size: tuple, compress_level: int, objects_dir: str, cache_bytes: int) -> List[dict]:
+    """Worker: compose a chunk of tasks (each a list of layer paths) into the artifact store"""
+    results = []
+    for layer_paths in tasks:
+        try:
+            pixels = alpha_composite([_load_layer(p, size, cache_bytes) for p in layer_paths])
+            image = Image.fromarray(pixels, "RGBA")
+            if pixels[..., 3].min() == 255:
+                image = image.convert("RGB")
+            buffer = io.BytesIO()
+            image.save(buffer, format="PNG", compress_level=compress_level)
+            digest, image_path, _ = write_object(objects_dir, buffer.getvalue(), ".png")
+            results.append({"success": True, "digest": digest, "image_path": str(image_path), "size": buffer.tell()})
+        except Exception as e:
+            results.append({"success": False, "error": str(e)})
+    return results
+
+
+class TraitCompositor:
+    """Generative collection builder that composes trait layers instead of calling Gemini per piece"""
+
+    def __init__(
+        self,
+        layers: LayerSet,
+        output_dir: str = "generated_nfts",
+        workers: Optional[int] = None,
+        size: Optional[int] = None,
+        chunk_size: int = 32,
+        compress_level: int = 3,
+        cache_bytes: int = 256 * 1024 * 1024,
+        on_metadata: Optional[Callable[[str, dict], None]] = None,
+        store: Optional[ArtifactStore] = None,
+        metadata_store: Optional[MetadataStore] = None
+    ):
+        """
+        Args:
+            layers: Trait layers to compose
+            output_dir: Collection output root (artifact store and metadata/ like NFTGenerator)
+            workers: Worker processes (defaults to the CPU count)
+            size: Output edge length in pixels (defaults to the first layer's size)
+            chunk_size: Images per worker task
+            compress_level: PNG compression level (lower is faster)
+            cache_bytes: Decoded layers each worker process keeps in memory
+            on_metadata: Called with (filename, metadata) for every metadata document saved
+            store: Artifact store for the composed images (defaults to one under output_dir)
+            metadata_store: Metadata repository (defaults to one under output_dir)
+        """
+        self.layers = layers
+        self.store = store or ArtifactStore(output_dir)
+        self.metadata = metadata_store or MetadataStore.from_env(output_dir)
+        self.workers = workers or os.cpu_count() or 1
+        self.size = size
+        self.chunk_size = chunk_size
+        self.compress_level = compress_level
+        self.cache_bytes = cache_bytes
+        self.on_metadata = on_metadata
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=worker_context())
+        return self._pool
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def sample(self, count: int, seed: Optional[int] = None) -> List[Dict[str, str]]:
+        """Weighted, duplicate-free trait combinations from the layer set"""
+        traits = self.layers.traits()
+        if not traits:
+            raise ValueError(f"No trait layers found in {self.layers.root}")
+        return sample_traits(traits, count, seed)
+
+    def _canvas_size(self, paths: Dict[str, Dict[str, Optional[str]]]) -> tuple:
+        if self.size:
+            return (self.size, self.size)
+        for values in paths.values():
+            for path in values.values():
+                if path:
+                    with Image.open(path) as image:
+                        return image.size
+        raise ValueError("No layer images to compose")
+
+    def compose(self, items: List[dict]) -> List[dict]:
+        """
+        Compose items and save their images and metadata.
+
+        Args:
+            items: Dicts with "filename", "traits" ({trait_type: value}) and
+                   optional "metadata_overrides" (see NFTGenerator.generate_image)
+
+        Returns:
+            list: generate_image() style results, in item order
+        """
+        paths = self.layers.layer_paths()
+        size = self._canvas_size(paths)
+
+        tasks, results = [], [None] * len(items)
+        for i, item in enumerate(items):
+            try:
+                layer_files = [
+                    paths[trait_type][value]
+                    for trait_type, value in item["traits"].items()
+                    if paths[trait_type][value] is not None
+                ]
+            except KeyError as e:
+                results[i] = {"success": False, "error": f"Unknown trait layer: {e}"}
+                continue
+            if not layer_files:
+                results[i] = {"success": False, "error": "Combination has no layers to draw"}
+                continue
+            tasks.append((i, layer_files))
+
+        chunks = [tasks[n:n + self.chunk_size] for n in range(0, len(tasks), self.chunk_size)]
+        objects_dir = str(self.store.objects_dir)
+        futures = [
+            (chunk, self._executor().submit(_compose_chunk, [l for _, l in chunk], size, self.compress_level, objects_dir, self.cache_bytes))
+            for chunk in chunks
+        ]
+        for chunk, future in futures:
+            saved = []
+            for (i, _), composed in zip(chunk, future.result()):
+                if composed["success"]:
+                    self.store.link(items[i]["filename"], composed["digest"], ".png", composed["size"])
+                    results[i] = self._build_result(items[i], composed["image_path"])
+                    saved.append(results[i])
+                else:
+                    results[i] = {"success": False, "error": composed["error"]}
+            # One commit per chunk
+            self.metadata.save_many((result["filename"], result["metadata"]) for result in saved)
+            if self.on_metadata:
+                for result in saved:
+                    self.on_metadata(result["filename"], result["metadata"])
+
+        for i, result in enumerate(results):
+            result.setdefault("prompt", self.describe(items[i]["traits"]))
+        return results
+
+    def describe(self, traits: Dict[str, str]) -> str:
+        """Human-readable stand-in for a prompt"""
+        return "Layered: " + ", ".join(f"{t}={v}" for t, v in traits.items())
+
+    def _build_result(self, item: dict, image_path: str) -> dict:
+        description = self.describe(item["traits"])
+        metadata = {
+            "name": f"Layered NFT - {item['filename']}",
+            "description": "Generative artwork composed from trait layers",
+            "image": image_path,
+            "prompt": description,
+            "attributes": [{"trait_type": "Generation Method", "value": "Layered Composite"}]
+                          + [{"trait_type": t, "value": v} for t, v in item["traits"].items()]
+                          + [{"trait_type": "Created", "value": datetime.now().isoformat()}],
+        }
+        overrides = dict(item.get("metadata_overrides") or {})
+        # Trait attributes come from the layers themselves
+        overrides.pop("attributes", None)
+        metadata.update(overrides)
+
+        return {
+            "success": True,
+            "image_bytes": None,
+            "mime_type": "image/png",
+            "image_write": None,
+            "image_path": image_path,
+            "metadata_path": self.metadata.location(item["filename"]),
+            "metadata": metadata,
+            "prompt": description,
+            "filename": item["filename"],
+            "cached": False,
+            "cache_key": None,
+        }
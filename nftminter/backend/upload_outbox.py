@@ -0,0 +1,461 @@
+"""
+Durable IPFS Upload Outbox
+Persists every generated artifact before upload and retries failed uploads
+in the background, so IPFS outages delay NFTs instead of discarding them
+"""
+
+import json
+import time
+import uuid
+import random
+import sqlite3
+import asyncio
+import threading
+from pathlib import Path
+from concurrent.futures import Future
+from typing import Callable, Optional, Dict, List
+
+from ipfs_uploader import IPFSUploader
+from image_encoder import ImageEncoder
+
+
+# Columns returned to callers (the image blob stays internal)
+COLUMNS = "id, image_path, metadata, status, attempts, next_attempt_at, last_error, result, created_at, updated_at, artifact_name, hook"
+
+# Upload states stored in the outbox
+PENDING = "pending"
+IN_PROGRESS = "in_progress"
+DONE = "done"
+FAILED = "failed"
+
+# Completion hooks stored with an upload and applied by the drainer once it is pinned
+HOOK_RECORD_CIDS = "record_cids"
+# Also records the pinned name/description (metadata customized for the request)
+HOOK_RECORD_PINNED = "record_pinned"
+
+
+class UploadHandle:
+    """
+    Handle for a queued upload.
+
+    Can be polled with status(), waited on with wait(), or awaited directly
+    from async code (`ipfs_result = await handle`).
+    """
+
+    def __init__(self, outbox: "UploadOutbox", upload_id: str, future: Future):
+        self.outbox = outbox
+        self.upload_id = upload_id
+        self.future = future
+
+    def done(self) -> bool:
+        """True once the upload finished (successfully or permanently failed)"""
+        return self.future.done()
+
+    def status(self) -> Optional[dict]:
+        """Current persisted state of the upload"""
+        return self.outbox.get(self.upload_id)
+
+    def wait(self, timeout: Optional[float] = None) -> Dict[str, str]:
+        """
+        Block until the upload completes.
+
+        Args:
+            timeout: Seconds to wait. Raises TimeoutError if exceeded; the
+                     upload stays queued and keeps retrying.
+
+        Returns:
+            dict: IPFS result from IPFSUploader.upload_nft_complete
+        """
+        return self.future.result(timeout=timeout)
+
+    async def wait_async(self, timeout: Optional[float] = None) -> Dict[str, str]:
+        """Async version of wait(); the upload keeps retrying on timeout"""
+        return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(self.future)), timeout)
+
+    def __await__(self):
+        return asyncio.wrap_future(self.future).__await__()
+
+
+class UploadOutbox:
+    """SQLite-backed outbox with a background drainer that retries with backoff"""
+
+    def __init__(
+        self,
+        uploader: IPFSUploader,
+        db_path: str = "generated_nfts/upload_outbox.db",
+        workers: int = 2,
+        base_delay: float = 2.0,
+        max_delay: float = 300.0,
+        max_attempts: Optional[int] = None,
+        encoder: Optional[ImageEncoder] = None,
+        on_complete: Optional[Callable[[str, str, dict, dict], None]] = None
+    ):
+        """
+        Initialize the outbox.
+
+        Args:
+            uploader: IPFS uploader used to drain the queue
+            db_path: SQLite database file for queued uploads
+            workers: Number of drainer threads
+            base_delay: First retry delay in seconds (doubles per attempt)
+            max_delay: Upper bound for the retry delay in seconds
+            max_attempts: Give up after this many attempts (None = retry forever)
+            encoder: Optional encoder that transcodes images before pinning
+                     (the local original is kept as-is)
+            on_complete: Applies an upload's hook once it is pinned, called as
+                         on_complete(artifact_name, hook, metadata, ipfs_result).
+                         It runs before the upload is marked done, so a crash
+                         in between re-applies it after the restart.
+        """
+        self.uploader = uploader
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.workers = workers
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_attempts = max_attempts
+        self.encoder = encoder
+        self.on_complete = on_complete
+
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition()
+        self._futures: Dict[str, Future] = {}
+        self._payloads: Dict[str, bytes] = {}
+        self._threads: List[threading.Thread] = []
+        self._stopping = threading.Event()
+
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS uploads (
+                    id TEXT PRIMARY KEY,
+                    image_path TEXT NOT NULL,
+                    metadata TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt_at REAL NOT NULL,
+                    last_error TEXT,
+                    result TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+                """
+            )
+            columns = [row[1] for row in self._conn.execute("PRAGMA table_info(uploads)")]
+            if "image_blob" not in columns:
+                # Holds the image only when it is not persisted anywhere else
+                self._conn.execute("ALTER TABLE uploads ADD COLUMN image_blob BLOB")
+            if "artifact_name" not in columns:
+                self._conn.execute("ALTER TABLE uploads ADD COLUMN artifact_name TEXT")
+            if "hook" not in columns:
+                self._conn.execute("ALTER TABLE uploads ADD COLUMN hook TEXT")
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_uploads_due ON uploads (status, next_attempt_at)"
+            )
+            # Uploads interrupted by a crash or redeploy are retried
+            self._conn.execute(
+                "UPDATE uploads SET status = ? WHERE status = ?", (PENDING, IN_PROGRESS)
+            )
+
+    def start(self):
+        """Start the background drainer threads"""
+        if self._threads:
+            return
+        self._stopping.clear()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._drain_loop, name=f"upload-outbox-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        print(f"✅ Upload outbox started ({self.workers} workers, {self.pending_count()} pending)")
+
+    def stop(self, timeout: float = 5.0):
+        """Stop the drainer threads. Queued uploads stay persisted."""
+        self._stopping.set()
+        with self._wakeup:
+            self._wakeup.notify_all()
+        for thread in self._threads:
+            thread.join(timeout=timeout)
+        self._threads = []
+
+    def enqueue(
+        self,
+        image_path: str,
+        metadata: dict,
+        image_bytes: Optional[bytes] = None,
+        persisted: bool = True,
+        artifact_name: Optional[str] = None,
+        hook: Optional[str] = None,
+        image_write: Optional[Future] = None
+    ) -> UploadHandle:
+        """
+        Persist an artifact for upload and return a handle to it.
+
+        Args:
+            image_path: Path to the generated image
+            metadata: NFT metadata (image URI is filled in on upload)
+            image_bytes: In-memory image, kept only while image_write is pending
+            persisted: Whether image_path is (or is being) written to disk. If False,
+                       the outbox stores image_bytes itself so it survives a restart.
+            image_write: Future of the background write of image_path. The bytes
+                         are dropped once it succeeds (the drainer reads the file),
+                         and stored in the outbox if it fails.
+            artifact_name: Artifact the upload belongs to, passed to the completion hook
+            hook: Completion hook to apply once pinned (e.g. HOOK_RECORD_CIDS)
+
+        Returns:
+            UploadHandle: Handle that can be awaited or polled
+        """
+        if image_bytes is None and not persisted:
+            raise ValueError("image_bytes is required when the image is not persisted")
+
+        upload_id = uuid.uuid4().hex
+        now = time.time()
+        future = Future()
+        image_blob = None if persisted else sqlite3.Binary(image_bytes)
+
+        # The bytes are only held until the background write has put them on disk
+        pending_write = image_bytes is not None and image_write is not None
+        with self._lock:
+            self._futures[upload_id] = future
+            if pending_write:
+                self._payloads[upload_id] = image_bytes
+            with self._conn:
+                self._conn.execute(
+                    """
+                    INSERT INTO uploads (id, image_path, metadata, status, next_attempt_at, created_at, updated_at, image_blob, artifact_name, hook)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    """,
+                    (upload_id, str(image_path), json.dumps(metadata), PENDING, now, now, now, image_blob, artifact_name, hook)
+                )
+
+        with self._wakeup:
+            self._wakeup.notify()
+
+        if pending_write:
+            image_write.add_done_callback(lambda write: self._written(upload_id, write))
+
+        print(f"📥 Queued IPFS upload {upload_id} for {image_path}")
+        return UploadHandle(self, upload_id, future)
+
+    def _written(self, upload_id: str, write: Future):
+        """The background image write finished: keep the image in the outbox if it failed, then free the bytes"""
+        with self._lock:
+            payload = self._payloads.pop(upload_id, None)
+            if payload is None:
+                return
+            error = write.exception() if not write.cancelled() else Exception("image write cancelled")
+            if error is not None:
+                print(f"⚠️  Image write for upload {upload_id} failed, keeping the image in the outbox: {error}")
+                with self._conn:
+                    self._conn.execute(
+                        "UPDATE uploads SET image_blob = ? WHERE id = ? AND status != ?",
+                        (sqlite3.Binary(payload), upload_id, DONE)
+                    )
+
+    def handle(self, upload_id: str) -> Optional[UploadHandle]:
+        """Get a handle for an existing upload (e.g. one queued before a restart)"""
+        with self._lock:
+            row = self._conn.execute(f"SELECT {COLUMNS} FROM uploads WHERE id = ?", (upload_id,)).fetchone()
+            if row is None:
+                return None
+            record = self._row_to_dict(row)
+            future = self._futures.get(upload_id)
+            if future is None:
+                future = Future()
+                if record["status"] == DONE:
+                    future.set_result(record["result"])
+                elif record["status"] == FAILED:
+                    future.set_exception(Exception(record["last_error"]))
+                else:
+                    self._futures[upload_id] = future
+        return UploadHandle(self, upload_id, future)
+
+    def get(self, upload_id: str) -> Optional[dict]:
+        """Return the persisted state of an upload"""
+        with self._lock:
+            row = self._conn.execute(f"SELECT {COLUMNS} FROM uploads WHERE id = ?", (upload_id,)).fetchone()
+        return self._row_to_dict(row) if row else None
+
+    def pending_count(self) -> int:
+        """Number of uploads that have not completed yet"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT COUNT(*) FROM uploads WHERE status IN (?, ?)", (PENDING, IN_PROGRESS)
+            ).fetchone()
+        return row[0]
+
+    def retry(self, upload_id: str) -> bool:
+        """Requeue a permanently failed upload. Returns False if not found."""
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "UPDATE uploads SET status = ?, attempts = 0, next_attempt_at = ?, updated_at = ? WHERE id = ? AND status = ?",
+                (PENDING, time.time(), time.time(), upload_id, FAILED)
+            )
+        with self._wakeup:
+            self._wakeup.notify()
+        return cursor.rowcount > 0
+
+    def _row_to_dict(self, row: sqlite3.Row) -> dict:
+        record = dict(row)
+        record["metadata"] = json.loads(record["metadata"])
+        record["result"] = json.loads(record["result"]) if record["result"] else None
+        return record
+
+    def _claim_next(self) -> Optional[dict]:
+        """Atomically claim the next due upload, or return None"""
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                f"SELECT {COLUMNS} FROM uploads WHERE status = ? AND next_attempt_at <= ? ORDER BY next_attempt_at LIMIT 1",
+                (PENDING, time.time())
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE uploads SET status = ?, attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                (IN_PROGRESS, time.time(), row["id"])
+            )
+        record = self._row_to_dict(row)
+        record["attempts"] += 1
+        return record
+
+    def _image_source(self, record: dict):
+        """In-memory bytes while the image is still being written, else the stored blob or file"""
+        with self._lock:
+            payload = self._payloads.get(record["id"])
+            if payload is not None:
+                return payload
+            row = self._conn.execute(
+                "SELECT image_blob FROM uploads WHERE id = ?", (record["id"],)
+            ).fetchone()
+        if row and row[0] is not None:
+            return bytes(row[0])
+        return record["image_path"]
+
+    def _next_wait(self) -> float:
+        """Seconds until the next queued upload is due"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT MIN(next_attempt_at) FROM uploads WHERE status = ?", (PENDING,)
+            ).fetchone()
+        if row[0] is None:
+            return self.max_delay
+        return max(0.0, min(self.max_delay, row[0] - time.time()))
+
+    def _backoff(self, attempts: int) -> float:
+        """Exponential backoff with full jitter"""
+        delay = min(self.max_delay, self.base_delay * (2 ** (attempts - 1)))
+        return random.uniform(delay / 2, delay)
+
+    def _drain_loop(self):
+        while not self._stopping.is_set():
+            record = self._claim_next()
+            if record is None:
+                with self._wakeup:
+                    self._wakeup.wait(timeout=self._next_wait())
+                continue
+            self._process(record)
+
+    def _process(self, record: dict):
+        upload_id = record["id"]
+        try:
+            metadata = record["metadata"]
+            image = self._image_source(record)
+            filename = Path(record["image_path"]).name
+            encoding = None
+            if self.encoder:
+                image, filename, encoding = self._encode(image, filename, metadata)
+            result = self.uploader.upload_nft_complete(image, metadata, filename=filename)
+            if encoding:
+                result.update(encoding)
+        except FileNotFoundError as e:
+            # The artifact itself is gone, so retrying cannot succeed
+            self._finish(upload_id, FAILED, error=str(e))
+            return
+        except Exception as e:
+            self._retry_later(record, e)
+            return
+
+        if record["hook"] and self.on_complete:
+            try:
+                self.on_complete(record["artifact_name"], record["hook"], metadata, result)
+            except Exception as e:
+                # Pinning is idempotent, so the retry re-uploads and applies the hook again
+                self._retry_later(record, e)
+                return
+
+        self._finish(upload_id, DONE, result=result, metadata=metadata)
+
+    def _retry_later(self, record: dict, error: Exception):
+        """Schedule another attempt with backoff, or fail the upload for good"""
+        upload_id = record["id"]
+        attempts = record["attempts"]
+        if self.max_attempts is not None and attempts >= self.max_attempts:
+            print(f"❌ IPFS upload {upload_id} failed after {attempts} attempts: {error}")
+            self._finish(upload_id, FAILED, error=str(error))
+            return
+
+        delay = self._backoff(attempts)
+        print(f"⚠️  IPFS upload {upload_id} failed (attempt {attempts}), retrying in {delay:.1f}s: {error}")
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE uploads SET status = ?, next_attempt_at = ?, last_error = ?, updated_at = ? WHERE id = ?",
+                (PENDING, time.time() + delay, str(error), time.time(), upload_id)
+            )
+
+    def _encode(self, image, filename: str, metadata: dict):
+        """
+        Transcode an image before pinning. Falls back to the original if encoding fails.
+
+        Returns:
+            tuple: (image to pin, pin filename, encoding report or None)
+        """
+        if isinstance(image, (str, Path)):
+            with open(image, 'rb') as f:
+                image = f.read()
+        try:
+            encoded = self.encoder.encode(image)
+        except Exception as e:
+            print(f"⚠️  Could not encode {filename}, pinning the original: {e}")
+            return image, filename, None
+
+        report = {
+            "original_format": encoded["original_format"],
+            "original_bytes": encoded["original_bytes"],
+            "pinned_bytes": encoded["encoded_bytes"],
+            "bytes_saved": encoded["bytes_saved"],
+        }
+        if not encoded["encoded"]:
+            return image, filename, report
+
+        metadata["original_format"] = encoded["original_format"]
+        print(
+            f"🗜️  Encoded {filename} as {self.encoder.output_format}: "
+            f"{encoded['original_bytes']:,} → {encoded['encoded_bytes']:,} bytes"
+        )
+        return encoded["data"], str(Path(filename).with_suffix(encoded["extension"])), report
+
+    def _finish(self, upload_id: str, status: str, result: Optional[dict] = None, metadata: Optional[dict] = None, error: Optional[str] = None):
+        with self._lock:
+            with self._conn:
+                if metadata is not None:
+                    self._conn.execute(
+                        "UPDATE uploads SET metadata = ? WHERE id = ?", (json.dumps(metadata), upload_id)
+                    )
+                self._conn.execute(
+                    "UPDATE uploads SET status = ?, result = ?, last_error = ?, updated_at = ? WHERE id = ?",
+                    (status, json.dumps(result) if result else None, error, time.time(), upload_id)
+                )
+                if status == DONE:
+                    # The image is pinned now; the outbox no longer needs its own copy
+                    self._conn.execute("UPDATE uploads SET image_blob = NULL WHERE id = ?", (upload_id,))
+            future = self._futures.pop(upload_id, None)
+            self._payloads.pop(upload_id, None)
+
+        if future is not None and not future.done():
+            if status == DONE:
+                future.set_result(result)
+            else:
+                future.set_exception(Exception(f"IPFS upload failed: {error}"))
@@ -249,11 +249,86 @@ function closeResult(tab) {
   document.getElementById(`${tab}Result`).style.display = "none";
 }
 
-// Format IPFS URL
+// Format IPFS URL (null while an upload is still queued)
 function formatIpfsUrl(ipfsUri) {
+  if (!ipfsUri) {
+    return null;
+  }
   return ipfsUri.replace("ipfs://", "https://gateway.pinata.cloud/ipfs/");
 }
 
+// Image for a generation result: the IPFS copy once pinned, else the backend's own copy
+function resultImageUrl(result) {
+  return (
+    formatIpfsUrl(result.image_ipfs_uri || result.ipfs_uri) ||
+    `${API_BASE_URL}/api/v1/image/${encodeURIComponent(result.filename)}`
+  );
+}
+
+// Queued IPFS uploads are polled every 5 seconds for up to 10 minutes
+const UPLOAD_POLL_INTERVAL_MS = 5000;
+const UPLOAD_POLL_ATTEMPTS = 120;
+
+// Success banner for a single NFT; a queued upload gets a "pinning queued" state
+function generatedAlert(data) {
+  if (data.image_ipfs_uri || !data.upload_id) {
+    return `
+                <div class="success-alert">
+                    <strong>Success!</strong> Your NFT has been generated and uploaded to IPFS.
+                </div>`;
+  }
+  return `
+                <div class="success-alert" data-upload-status="${data.upload_id}">
+                    <strong>Pinning queued.</strong> Your NFT has been generated; the IPFS upload is
+                    being retried in the background.
+                </div>`;
+}
+
+// Poll a queued IPFS upload and update its result once it is pinned or has failed
+function watchUpload(uploadId, attempt = 0) {
+  setTimeout(async () => {
+    const status = document.querySelector(`[data-upload-status="${uploadId}"]`);
+    if (!status) {
+      // The result was closed or replaced
+      return;
+    }
+
+    let record = null;
+    try {
+      const response = await fetch(`${API_BASE_URL}/api/v1/uploads/${uploadId}`, {
+        headers: { Accept: "application/json" },
+      });
+      if (response.ok) {
+        record = await response.json();
+      }
+    } catch (error) {
+      console.error("Error polling upload:", error);
+    }
+
+    if (record && record.status === "done") {
+      const imageUrl = formatIpfsUrl(record.result.image_ipfs_uri);
+      document
+        .querySelectorAll(`img[data-upload-id="${uploadId}"]`)
+        .forEach((img) => (img.src = imageUrl));
+      status.innerHTML = "<strong>Pinned!</strong> Your NFT has been uploaded to IPFS.";
+      return;
+    }
+
+    if (record && record.status === "failed") {
+      status.classList.replace("success-alert", "error-alert");
+      status.innerHTML = `<strong>Pinning failed:</strong> ${record.last_error || "IPFS upload failed"}`;
+      return;
+    }
+
+    if (attempt + 1 < UPLOAD_POLL_ATTEMPTS) {
+      watchUpload(uploadId, attempt + 1);
+    } else {
+      status.innerHTML =
+        "<strong>Pinning queued.</strong> The IPFS upload is taking longer than usual; check back later.";
+    }
+  }, UPLOAD_POLL_INTERVAL_MS);
+}
+
 // Generate Only (without minting)
 async function generateOnly() {
   if (!walletConnected) {
@@ -326,17 +401,17 @@ async function generateOnly() {
         "success",
         "NFT Generated Successfully",
         `
-                <div class="success-alert">
-                    <strong>Success!</strong> Your NFT has been generated and uploaded to IPFS.
-                </div>
+                ${generatedAlert(data)}
                 
                 <div class="nft-preview">
-                    <img src="${formatIpfsUrl(
-                      data.image_ipfs_uri
-                    )}" alt="${name}" class="nft-image" />
+                    <img src="${resultImageUrl(data)}" alt="${name}" class="nft-image"
+                         data-upload-id="${data.upload_id || ""}" />
                 </div>
             `
       );
+      if (!data.image_ipfs_uri && data.upload_id) {
+        watchUpload(data.upload_id);
+      }
 
       document.getElementById("singleNftForm").reset();
     }, 500);
@@ -440,17 +515,17 @@ document
           "success",
           "NFT Generated Successfully",
           `
-                <div class="success-alert">
-                    <strong>Success!</strong> Your NFT has been generated and uploaded to IPFS.
-                </div>
+                ${generatedAlert(data)}
                 
                 <div class="nft-preview">
-                    <img src="${formatIpfsUrl(
-                      data.image_ipfs_uri
-                    )}" alt="${name}" class="nft-image" />
+                    <img src="${resultImageUrl(data)}" alt="${name}" class="nft-image"
+                         data-upload-id="${data.upload_id || ""}" />
                 </div>
             `
         );
+        if (!data.image_ipfs_uri && data.upload_id) {
+          watchUpload(data.upload_id);
+        }
 
         document.getElementById("singleNftForm").reset();
       }, 500);
@@ -546,12 +621,13 @@ document.getElementById("batchForm").addEventListener("submit", async (e) => {
       const successCount = data.results.filter(
         (r) => r.status === "success"
       ).length;
+      const queuedCount = data.results.filter((r) => r.status === "queued").length;
       const failCount = data.results.filter((r) => r.status === "error").length;
 
       showNotification(
         "success",
         "Batch Complete",
-        `${successCount} images generated successfully`
+        `${successCount + queuedCount} images generated successfully`
       );
 
       const resultsGrid = data.results
@@ -572,6 +648,18 @@ document.getElementById("batchForm").addEventListener("submit", async (e) => {
                             </div>
                         </div>
                     `;
+          } else if (result.status === "queued") {
+            return `
+                        <div class="batch-item">
+                            <img src="${resultImageUrl(result)}" alt="Generated image ${index + 1}"
+                                 data-upload-id="${result.upload_id}" />
+                            <div class="batch-prompt">${result.prompt}</div>
+                            <div style="margin-top: 0.5rem; font-size: 0.875rem; color: var(--text-muted);"
+                                 data-upload-status="${result.upload_id}">
+                                Pinning queued
+                            </div>
+                        </div>
+                    `;
           } else {
             return `
                         <div class="batch-item" style="border-color: var(--error);">
@@ -595,7 +683,7 @@ document.getElementById("batchForm").addEventListener("submit", async (e) => {
         "Batch Generation Complete",
         `
                 <div class="${failCount > 0 ? "error-alert" : "success-alert"}">
-                    <strong>Results:</strong> ${successCount} successful, ${failCount} failed
+                    <strong>Results:</strong> ${successCount} successful, ${queuedCount} pinning queued, ${failCount} failed
                 </div>
                 
                 <div class="batch-grid">
@@ -604,6 +692,10 @@ document.getElementById("batchForm").addEventListener("submit", async (e) => {
             `
       );
 
+      data.results
+        .filter((r) => r.status === "queued")
+        .forEach((r) => watchUpload(r.upload_id));
+
       document.getElementById("batchForm").reset();
     }, 500);
   } catch (error) {